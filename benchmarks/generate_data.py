@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+from typing import Optional
+import argparse
+import csv
+import os
+import random
+
+FIRST_NAMES = ["Melissa", "Tally", "Judy", "Diamond", "Ava", "Mia", "Zoe", "Lena", "Nora", "Iris", "Ruth", "Sofia"]
+JOURNAL_WORDS = ["baby", "kicks", "appointment", "tired", "happy", "ultrasound", "nursery", "cravings", "heartbeat",
+                 "name", "doctor", "vitamins", "nausea", "excited", "sleep", "walk", "yoga", "names", "crib", "family"]
+
+
+def user_name(index: int) -> str:
+    """Return the deterministic name of the `index`-th generated user."""
+    return f"{FIRST_NAMES[index % len(FIRST_NAMES)]} {index:08d}"
+
+
+def generate_users(file_name: str, rows: int, seed: int = 0, today: Optional[datetime] = None) -> None:
+    """
+    Writes a user_data.csv with `rows` profiles. Every LMP date lies within the 280 days before `today`,
+    so the generated profiles pass validation on that day.
+
+    Args:
+        file_name (str): The file to write.
+        rows (int): Number of profiles.
+        seed (int, optional): Seed of the random generator; the same seed and `today` give the same file. Defaults to 0.
+        today (datetime, optional): The day the LMP dates are relative to. Defaults to datetime.now().
+    """
+    rng = random.Random(seed)
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    with open(file_name, mode="w", newline="") as user_file:
+        writer = csv.writer(user_file)
+        writer.writerow(["Name", "LMP Date", "Period Length"])
+        for start in range(0, rows, 10000):  # write in chunks so memory stays flat at 10^7 rows
+            writer.writerows([user_name(i), (today - timedelta(days=rng.randint(1, 279))).strftime("%m/%d/%Y"), rng.randint(20, 45)]
+                             for i in range(start, min(start + 10000, rows)))
+
+
+def generate_journal(file_name: str, rows: int, users: int, seed: int = 0, today: Optional[datetime] = None) -> None:
+    """
+    Writes a pregnancy_journal.csv with `rows` entries spread over the first `users` generated users.
+
+    Args:
+        file_name (str): The file to write.
+        rows (int): Number of journal entries.
+        users (int): Number of distinct users writing entries.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+        today (datetime, optional): The day entry dates are relative to. Defaults to datetime.now().
+    """
+    rng = random.Random(seed + 1)
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    with open(file_name, mode="w", newline="") as journal:
+        writer = csv.writer(journal)
+        writer.writerow(["Name", "Date", "Entry"])
+        for start in range(0, rows, 10000):
+            writer.writerows([user_name(rng.randrange(max(users, 1))), (today - timedelta(days=rng.randint(0, 279))).strftime("%m/%d/%Y"),
+                              " ".join(rng.choice(JOURNAL_WORDS) for _ in range(rng.randint(4, 30)))]
+                             for _ in range(start, min(start + 10000, rows)))
+
+
+def generate_milestones(file_name: str, rows: int = 40, seed: int = 0) -> None:
+    """
+    Writes a milestone_medical_info.csv listing weeks 1 to `rows`.
+
+    Args:
+        file_name (str): The file to write.
+        rows (int, optional): Number of weeks. Defaults to 40, like the real file.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+    """
+    rng = random.Random(seed + 2)
+    with open(file_name, mode="w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["Week", "Milestone", "Medical_Info"])
+        for start in range(1, rows + 1, 10000):
+            writer.writerows([week, " ".join(rng.choice(JOURNAL_WORDS) for _ in range(12)), " ".join(rng.choice(JOURNAL_WORDS) for _ in range(12))]
+                             for week in range(start, min(start + 10000, rows + 1)))
+
+
+def generate_data_dir(data_dir: str, rows: int, seed: int = 0, today: Optional[datetime] = None, milestone_rows: int = 40) -> None:
+    """Writes the three data files of a BabyLand data directory: `rows` profiles and `rows` journal entries."""
+    os.makedirs(data_dir, exist_ok=True)
+    generate_users(os.path.join(data_dir, "user_data.csv"), rows, seed, today)
+    generate_journal(os.path.join(data_dir, "pregnancy_journal.csv"), rows, max(rows // 10, 1), seed, today)
+    generate_milestones(os.path.join(data_dir, "milestone_medical_info.csv"), milestone_rows, seed)
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic BabyLand data files.")
+    parser.add_argument("data_dir", help="directory to write user_data.csv, pregnancy_journal.csv and milestone_medical_info.csv to")
+    parser.add_argument("--rows", type=int, default=1000, help="profiles and journal entries to generate, e.g. 1000 to 10000000 (default: 1000)")
+    parser.add_argument("--milestone-rows", type=int, default=40, help="weeks listed in the milestone file (default: 40)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--today", default=None, help="MM/DD/YYYY the generated dates are relative to (default: today)")
+    args = parser.parse_args(argv)
+    today = datetime.strptime(args.today, "%m/%d/%Y") if args.today else None
+    generate_data_dir(args.data_dir, args.rows, args.seed, today, args.milestone_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, SRC_DIR)
+
+from console import ScriptedConsole
+from due_date_calculator import DueDatePredictor
+from generate_data import JOURNAL_WORDS, generate_data_dir
+from run_benchmarks import percentile
+from storage import CSVStorage
+from user_table import UserTable
+
+MAX_ENTRIES = 8  # keeps every search on one page of results, so no session is asked "Show more results?"
+
+
+class SessionScript(NamedTuple):
+    """
+    The answers of one interactive session, in order.
+
+    Attributes:
+    name (str): The user the session logs in as.
+    answers (list): Every answer typed, starting with the name.
+    lmp_date (str, optional): For generated sessions, the LMP date the profile must end up with.
+    period_length (int, optional): For generated sessions, the cycle length the profile must end up with.
+    entries (list, optional): For generated sessions, the texts the user's journal must hold at the end, in order.
+    """
+    name: str
+    answers: List[str]
+    lmp_date: Optional[str] = None
+    period_length: Optional[int] = None
+    entries: Optional[List[str]] = None
+
+
+class SessionResult(NamedTuple):
+    """How one session went: its total and per-answer latencies (seconds), and what went wrong, if anything."""
+    name: str
+    seconds: float
+    steps: List[float]
+    error: Optional[str]
+
+
+class TimedConsole(ScriptedConsole):
+    """A scripted console timing how long the program takes to answer each input, i.e. until its next prompt."""
+
+    def __init__(self, answers: List[str], clock=time.perf_counter) -> None:
+        super().__init__(answers)
+        self.clock = clock
+        self.steps: List[float] = []
+        self._answered: Optional[float] = None
+
+    def input(self, prompt: str = "") -> str:
+        self.lap()
+        answer = super().input(prompt)
+        self._answered = self.clock()
+        return answer
+
+    def lap(self) -> None:
+        """Record the time since the last answer, if any."""
+        if self._answered is not None:
+            self.steps.append(self.clock() - self._answered)
+            self._answered = None
+
+
+def generate_session(index: int, rng: random.Random, today: datetime, actions: int = 12) -> SessionScript:
+    """
+    Script a session of a new user: set up a profile, then pick `actions` random menu options (view the
+    milestone or medical info, list, add, modify, delete or search entries) and exit.
+
+    Every generated user is new, so the expected profile and journal at the end of the session are known
+    and can be checked once all sessions ran.
+    """
+    name = f"Load {index:08d}"
+    lmp_date = (today - timedelta(days=rng.randint(1, 279))).strftime("%m/%d/%Y")
+    period_length = rng.choice([28, rng.randint(20, 45)])
+    answers = [name, lmp_date, "" if period_length == 28 else str(period_length)]
+    entries: List[str] = []
+    for _ in range(actions):
+        choice = rng.choice("1234567")
+        if choice in "56" and not entries:
+            choice = "4"  # nothing to modify or delete yet
+        if choice == "4" and len(entries) >= MAX_ENTRIES:
+            choice = "3"
+        answers.append(choice)
+        if choice == "4":
+            entries.append(" ".join(rng.choice(JOURNAL_WORDS) for _ in range(rng.randint(3, 12))))
+            answers.append(entries[-1])
+        elif choice == "5":
+            number = rng.randint(1, len(entries))
+            entries[number - 1] = " ".join(rng.choice(JOURNAL_WORDS) for _ in range(rng.randint(3, 12)))
+            answers += [str(number), entries[number - 1]]
+        elif choice == "6":
+            number = rng.randint(1, len(entries))
+            del entries[number - 1]
+            answers.append(str(number))
+        elif choice == "7":
+            answers.append(rng.choice(JOURNAL_WORDS))
+    answers.append("8")
+    return SessionScript(name, answers, lmp_date, period_length, entries)
+
+
+def generate_sessions(count: int, seed: int = 0, today: Optional[datetime] = None) -> List[SessionScript]:
+    """Script `count` sessions of distinct new users (see generate_session)."""
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    return [generate_session(index, rng, today) for index in range(count)]
+
+
+def load_sessions(file_name: str) -> List[SessionScript]:
+    """Read recorded sessions: one JSON list of answers per line, as written by `due_date_calculator.py --record`."""
+    with open(file_name, mode="r", encoding="utf-8") as sessions:
+        return [SessionScript(answers[0].strip(), answers) for answers in map(json.loads, sessions) if answers]
+
+
+def save_sessions(scripts: List[SessionScript], file_name: str) -> None:
+    """Append sessions to a file of recorded sessions, in the format load_sessions reads."""
+    with open(file_name, mode="a", encoding="utf-8") as sessions:
+        sessions.writelines(json.dumps(script.answers) + "\n" for script in scripts)
+
+
+def run_session(script: SessionScript, data_dir: str, write_behind: bool = True) -> SessionResult:
+    """Run one session of the real program against `data_dir`, answering from its script."""
+    console = TimedConsole(script.answers)
+    app = DueDatePredictor(CSVStorage(data_dir), write_behind=write_behind, console=console)
+    error = None
+    start = time.perf_counter()
+    try:
+        app.run()
+    except EOFError:
+        error = f"asked {console.prompts[-1]!r} after the last answer"  # the program took another path than the one recorded
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    console.lap()
+    seconds = time.perf_counter() - start
+    if error is None and console.remaining():
+        error = f"exited with {console.remaining()} answer(s) left"
+    return SessionResult(script.name, seconds, console.steps, error)
+
+
+def check_integrity(scripts: List[SessionScript], data_dir: str) -> List[str]:
+    """
+    Check what the sessions left in `data_dir` once they all finished.
+
+        - Every generated user's profile and journal hold what their session entered, read through a new storage.
+        - Every profile read through the name index matches a full parse of the profile file (last row wins).
+        - No two journal entries share an id.
+
+    Returns:
+        List[str]: One description per problem found; empty if the data is consistent.
+    """
+    problems = []
+    storage = CSVStorage(data_dir)
+    table = UserTable(storage.user_file)
+    entry_ids: Dict[int, str] = {}
+    for script in scripts:
+        record = storage.load_user(script.name)
+        if record is None:
+            if script.lmp_date is not None:
+                problems.append(f"{script.name}: profile not saved")
+            continue
+        full_scan = table.get(script.name)
+        if full_scan is None or (full_scan.lmp_date, full_scan.period_length) != (record.lmp_date, record.period_length):
+            problems.append(f"{script.name}: the name index and a full scan disagree ({record} vs {full_scan})")
+        if script.lmp_date is not None and (record.lmp_date.strftime("%m/%d/%Y"), record.period_length) != (script.lmp_date, script.period_length):
+            problems.append(f"{script.name}: profile {record.lmp_date:%m/%d/%Y}, {record.period_length} days; "
+                            f"expected {script.lmp_date}, {script.period_length} days")
+        entries = storage.journal_entries(script.name)
+        if script.entries is not None and [entry.text for entry in entries] != script.entries:
+            problems.append(f"{script.name}: journal {[entry.text for entry in entries]}; expected {script.entries}")
+        for entry in entries:
+            if entry_ids.setdefault(entry.entry_id, script.name) != script.name:
+                problems.append(f"{script.name}: entry id {entry.entry_id} also belongs to {entry_ids[entry.entry_id]}")
+    return problems
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds."""
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4) if latencies else 0.0,
+    }
+
+
+def run_load_test(scripts: List[SessionScript], data_dir: str, workers: int = 8, write_behind: bool = True) -> dict:
+    """
+    Run sessions concurrently against `data_dir`, `workers` at a time, then check the data they left.
+
+    Each session runs the real DueDatePredictor on its own storage object over the shared directory, so
+    the sessions contend for the same files, locks and group commits as concurrent users of one data
+    directory would.
+
+    Returns:
+        dict: Throughput (sessions per second), session and per-answer latency percentiles, the sessions
+        that failed and the integrity problems found, ready to be saved as JSON.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda script: run_session(script, data_dir, write_behind), scripts))
+    seconds = time.perf_counter() - start
+    return {
+        "meta": {"sessions": len(scripts), "workers": workers, "write_behind": write_behind, "python": platform.python_version(),
+                 "platform": platform.platform(), "timestamp": datetime.now().isoformat(timespec="seconds")},
+        "seconds": round(seconds, 6),
+        "throughput": round(len(scripts) / seconds, 2) if seconds else 0.0,
+        "session_latency": latency_summary([result.seconds for result in results]),
+        "step_latency": latency_summary([step for result in results for step in result.steps]),
+        "errors": [f"{result.name}: {result.error}" for result in results if result.error],
+        "integrity": check_integrity(scripts, data_dir),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay many interactive BabyLand sessions concurrently and check the data they leave.")
+    parser.add_argument("--sessions", type=int, default=1000, help="generated sessions to run (default: 1000)")
+    parser.add_argument("--workers", type=int, default=8, help="sessions running at the same time (default: 8)")
+    parser.add_argument("--rows", type=int, default=1000, help="profiles and journal entries in the generated data (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None, help="run against a copy of this data directory instead of generating one")
+    parser.add_argument("--replay", default=None, help="replay the recorded sessions of this file instead of generating sessions")
+    parser.add_argument("--record", default=None, help="append the generated sessions to this file, to replay them later")
+    parser.add_argument("--write-through", action="store_true", help="write every change at once instead of once per session")
+    parser.add_argument("--output", default=None, help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    scripts = load_sessions(args.replay) if args.replay else generate_sessions(args.sessions, args.seed)
+    if args.record and not args.replay:
+        save_sessions(scripts, args.record)
+    scratch = tempfile.mkdtemp(prefix="babyland-load-")
+    try:
+        data_dir = os.path.join(scratch, "data")
+        if args.data_dir:
+            shutil.copytree(args.data_dir, data_dir)
+        else:
+            generate_data_dir(data_dir, args.rows, args.seed)
+        report = run_load_test(scripts, data_dir, args.workers, not args.write_through)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{len(scripts)} sessions, {args.workers} workers: {report['throughput']:,.1f} sessions/s")
+    for name in ("session_latency", "step_latency"):
+        summary = report[name]
+        print(f"{name:16} p50 {summary['p50_ms']:>9.4f} ms   p95 {summary['p95_ms']:>9.4f} ms   p99 {summary['p99_ms']:>9.4f} ms")
+    for problem in report["errors"] + report["integrity"]:
+        print(f"  {problem}")
+    if args.output:
+        with open(args.output, mode="w") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 1 if report["errors"] or report["integrity"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
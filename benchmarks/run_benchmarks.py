@@ -0,0 +1,421 @@
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, SRC_DIR)
+
+from batch_calculator import BatchDueDateCalculator
+from change_feed import ChangeFeed
+from cohort_analytics import cohort_report, read_profiles
+from csv_index import CSVOffsetIndex
+from due_date_calculator import DateValidator, DueDateCalculator, User
+from generate_data import generate_data_dir, user_name
+from journal_log import JournalLog
+from notifications import NotificationScheduler
+from snapshot import UserSnapshot
+from storage import ChangeSet, CSVStorage
+from timeline import FixedClock, TimelineCache
+from user_table import UserTable
+
+
+class Measurement(NamedTuple):
+    """The outcome of one benchmark: how many operations ran and how long each timed call took (seconds)."""
+    ops: int
+    latencies: List[float]
+
+
+class Context(NamedTuple):
+    """What every benchmark gets: a scratch data directory, its number of rows, a sample size and a seeded generator."""
+    data_dir: str
+    rows: int
+    samples: int
+    rng: random.Random
+
+    @property
+    def storage(self) -> CSVStorage:
+        return CSVStorage(self.data_dir)
+
+
+BENCHMARKS: Dict[str, Callable[[Context], Measurement]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    """Register a benchmark function under `name`. Benchmarks run in registration order."""
+    def register(function: Callable[[Context], Measurement]) -> Callable[[Context], Measurement]:
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def timed(calls: List[Callable[[], object]]) -> List[float]:
+    """Run every call and return the latency of each one."""
+    latencies = []
+    clock = time.perf_counter
+    for call in calls:
+        start = clock()
+        call()
+        latencies.append(clock() - start)
+    return latencies
+
+
+def random_names(ctx: Context) -> List[str]:
+    return [user_name(ctx.rng.randrange(ctx.rows)) for _ in range(ctx.samples)]
+
+
+def read_column(file_name: str, column: str) -> List[str]:
+    with open(file_name, mode="r", newline="") as csv_file:
+        return [row[column] for row in csv.DictReader(csv_file)]
+
+
+STARTUP_CODE = ("import time\n"
+                "start = time.perf_counter()\n"
+                "import due_date_calculator\n"
+                "due_date_calculator.DueDatePredictor()\n"
+                "print(time.perf_counter() - start)\n")
+
+
+@benchmark("startup")
+def bench_startup(ctx: Context) -> Measurement:
+    """Import the application and construct DueDatePredictor in fresh interpreters, timed from inside each one."""
+    latencies = []
+    for _ in range(max(ctx.samples // 50, 5)):
+        result = subprocess.run([sys.executable, "-c", STARTUP_CODE], cwd=ctx.data_dir, capture_output=True, text=True,
+                                check=True, env={**os.environ, "PYTHONPATH": SRC_DIR})
+        latencies.append(float(result.stdout))
+    return Measurement(len(latencies), latencies)
+
+
+@benchmark("user_index_build")
+def bench_user_index_build(ctx: Context) -> Measurement:
+    index = CSVOffsetIndex(ctx.storage.user_file)
+    return Measurement(ctx.rows, timed([index.rebuild]))
+
+
+@benchmark("user_load_from_file")
+def bench_user_load(ctx: Context) -> Measurement:
+    user_file = ctx.storage.user_file
+    User.load_from_file(user_name(0), user_file)  # build the index outside the timed calls
+    return Measurement(ctx.samples, timed([lambda name=name: User.load_from_file(name, user_file) for name in random_names(ctx)]))
+
+
+@benchmark("user_save_to_file")
+def bench_user_save(ctx: Context) -> Measurement:
+    user_file = ctx.storage.user_file
+    users = []
+    for name in random_names(ctx)[:max(ctx.samples // 10, 1)]:  # every save is fsynced: keep the count modest
+        user = User(name)
+        user.set_lmp_date(datetime(2024, 5, 9))
+        users.append(user)
+    return Measurement(len(users), timed([lambda user=user: user.save_to_file(user_file) for user in users]))
+
+
+@benchmark("user_table_load")
+def bench_user_table_load(ctx: Context) -> Measurement:
+    table = UserTable(ctx.storage.user_file)
+    return Measurement(ctx.rows, timed([table.__len__]))  # the first access loads the whole file
+
+
+@benchmark("user_table_get")
+def bench_user_table_get(ctx: Context) -> Measurement:
+    table = UserTable(ctx.storage.user_file)
+    len(table)  # load outside the timed calls
+    return Measurement(ctx.samples, timed([lambda name=name: table.get(name) for name in random_names(ctx)]))
+
+
+@benchmark("user_snapshot_build")
+def bench_user_snapshot_build(ctx: Context) -> Measurement:
+    snapshot = UserSnapshot.from_file(ctx.storage.user_file)
+    return Measurement(ctx.rows, timed([snapshot.rebuild]))
+
+
+@benchmark("user_snapshot_get")
+def bench_user_snapshot_get(ctx: Context) -> Measurement:
+    snapshot = UserSnapshot.from_file(ctx.storage.user_file)
+    snapshot.exists()  # build and map outside the timed calls
+    return Measurement(ctx.samples, timed([lambda name=name: snapshot.get(name) for name in random_names(ctx)]))
+
+
+@benchmark("validate_date")
+def bench_validate_date(ctx: Context) -> Measurement:
+    date_strs = read_column(ctx.storage.user_file, "LMP Date")[:ctx.samples]
+    return Measurement(len(date_strs), timed([lambda date_str=date_str: DateValidator.validate_date(date_str) for date_str in date_strs]))
+
+
+@benchmark("validate_dates_batch")
+def bench_validate_dates(ctx: Context) -> Measurement:
+    date_strs = read_column(ctx.storage.user_file, "LMP Date")
+    return Measurement(len(date_strs), timed([lambda: DateValidator.validate_dates(date_strs)]))
+
+
+@benchmark("due_date_calculator")
+def bench_due_date_calculator(ctx: Context) -> Measurement:
+    lmp_dates = [datetime.strptime(date_str, "%m/%d/%Y") for date_str in read_column(ctx.storage.user_file, "LMP Date")[:ctx.samples]]
+    def calculate(lmp_date: datetime) -> None:
+        calculator = DueDateCalculator(lmp_date, 28)
+        calculator.calculate_due_date()
+        calculator.calculate_current_progress()
+    return Measurement(len(lmp_dates), timed([lambda lmp_date=lmp_date: calculate(lmp_date) for lmp_date in lmp_dates]))
+
+
+@benchmark("batch_due_date_calculator")
+def bench_batch_due_date_calculator(ctx: Context) -> Measurement:
+    lmp_dates = [datetime.strptime(date_str, "%m/%d/%Y") for date_str in read_column(ctx.storage.user_file, "LMP Date")]
+    period_lengths = [int(value) for value in read_column(ctx.storage.user_file, "Period Length")]
+    def calculate() -> None:
+        calculator = BatchDueDateCalculator(lmp_dates, period_lengths)
+        calculator.calculate_due_dates()
+        calculator.calculate_current_progress()
+    return Measurement(len(lmp_dates), timed([calculate]))
+
+
+@benchmark("timeline_render")
+def bench_timeline_render(ctx: Context) -> Measurement:
+    """Render full timelines (due date, progress, 40 weeks of info) for users sharing one cache and one 'today'."""
+    lmp_dates = [datetime.strptime(date_str, "%m/%d/%Y") for date_str in read_column(ctx.storage.user_file, "LMP Date")[:ctx.samples]]
+    timelines = TimelineCache(ctx.storage)
+    timelines.clock = timelines.clock.frozen()
+    def render(lmp_date: datetime) -> None:
+        timeline = timelines.for_date(lmp_date, 28)
+        timelines.progress(timeline)
+        list(timeline.weeks())
+    return Measurement(len(lmp_dates), timed([lambda lmp_date=lmp_date: render(lmp_date) for lmp_date in lmp_dates]))
+
+
+@benchmark("cohort_report")
+def bench_cohort_report(ctx: Context) -> Measurement:
+    """Read every profile columnarly and compute the full cohort report; ops are profiles, one timed pass."""
+    user_file = ctx.storage.user_file
+    return Measurement(ctx.rows, timed([lambda: cohort_report(read_profiles(user_file), datetime(2024, 6, 1))]))
+
+
+@benchmark("notifications_pop_due")
+def bench_notifications_pop_due(ctx: Context) -> Measurement:
+    """Pop a week of daily new-week notifications for every profile; ops are notifications, one timed call per day."""
+    start = datetime.now()  # generated LMP dates are relative to today
+    scheduler = NotificationScheduler(TimelineCache(ctx.storage, clock=FixedClock(start)))
+    scheduler.load_user_file(ctx.storage.user_file)
+    days = [datetime.fromordinal(start.toordinal() + day) for day in range(1, 8)]
+    counts = []
+    latencies = timed([lambda day=day: counts.append(len(scheduler.pop_due(day))) for day in days])
+    return Measurement(sum(counts), latencies)
+
+
+@benchmark("milestone_lookup")
+def bench_milestone_lookup(ctx: Context) -> Measurement:
+    storage = ctx.storage
+    weeks = [ctx.rng.randint(1, 40) for _ in range(ctx.samples)]
+    return Measurement(len(weeks), timed([lambda week=week: storage.week_info(week) for week in weeks]))
+
+
+@benchmark("journal_append")
+def bench_journal_append(ctx: Context) -> Measurement:
+    storage = ctx.storage
+    names = random_names(ctx)[:max(ctx.samples // 10, 1)]  # every append is fsynced: keep the count modest
+    return Measurement(len(names), timed([lambda name=name: storage.add_journal_entry(name, "12/06/2024", "benchmark entry") for name in names]))
+
+
+@benchmark("journal_entries")
+def bench_journal_entries(ctx: Context) -> Measurement:
+    storage = ctx.storage
+    storage.journal_entries(user_name(0))  # build the index outside the timed calls
+    return Measurement(ctx.samples, timed([lambda name=name: storage.journal_entries(name) for name in random_names(ctx)]))
+
+
+@benchmark("journal_entries_uncached")
+def bench_journal_entries_uncached(ctx: Context) -> Measurement:
+    storage = ctx.storage
+    storage.journal_entries(user_name(0))
+    cache = JournalLog.for_file(storage.journal_file).cache
+    max_bytes = cache.max_bytes
+    cache.resize(0)  # every lookup reads the journal, as before the entry cache
+    try:
+        return Measurement(ctx.samples, timed([lambda name=name: storage.journal_entries(name) for name in random_names(ctx)]))
+    finally:
+        cache.resize(max_bytes)
+
+
+@benchmark("journal_page")
+def bench_journal_page(ctx: Context) -> Measurement:
+    storage = ctx.storage
+    return Measurement(ctx.samples, timed([lambda name=name: storage.journal_page(name, 10) for name in random_names(ctx)]))
+
+
+@benchmark("journal_search")
+def bench_journal_search(ctx: Context) -> Measurement:
+    storage = ctx.storage
+    storage.search_journal(random_names(ctx)[0], "baby")  # build the index outside the timed calls
+    return Measurement(ctx.samples, timed([lambda name=name: storage.search_journal(name, "bab* kick*", 10) for name in random_names(ctx)]))
+
+
+def _edit_targets(ctx: Context) -> List[Tuple[str, int]]:
+    storage = ctx.storage
+    targets = {}
+    for name in random_names(ctx):
+        targets.update((name, entry.entry_id) for entry in storage.journal_entries(name)[:1])
+        if len(targets) >= max(ctx.samples // 10, 1):
+            break
+    return list(targets.items())
+
+
+@benchmark("journal_modify")
+def bench_journal_modify(ctx: Context) -> Measurement:
+    storage = ctx.storage
+    targets = _edit_targets(ctx)
+    return Measurement(len(targets), timed([lambda name=name, entry_id=entry_id: storage.modify_journal_entry(name, entry_id, "edited")
+                                            for name, entry_id in targets]))
+
+
+@benchmark("journal_delete")
+def bench_journal_delete(ctx: Context) -> Measurement:
+    storage = ctx.storage
+    targets = _edit_targets(ctx)
+    return Measurement(len(targets), timed([lambda name=name, entry_id=entry_id: storage.delete_journal_entry(name, entry_id)
+                                            for name, entry_id in targets]))
+
+
+@benchmark("change_feed_delta")
+def bench_change_feed_delta(ctx: Context) -> Measurement:
+    """Read the changes made since a saved offset: ops are changes, one timed read per batch of new changes."""
+    storage = ctx.storage
+    feed = ChangeFeed(ctx.data_dir)
+    offset = feed.latest()
+    names = random_names(ctx)
+    latencies = []
+    clock = time.perf_counter
+    for first in range(0, len(names), 10):  # ten new entries between two reads
+        storage.apply_changes(ChangeSet([], [(name, "12/06/2024", "benchmark entry") for name in names[first:first + 10]], [], []))
+        start = clock()
+        for batch in feed.changes(offset):
+            offset = batch.offset
+        latencies.append(clock() - start)
+    return Measurement(len(names), latencies)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(measurement: Measurement) -> Dict[str, float]:
+    """Throughput (operations per second) and latency percentiles (milliseconds) of a measurement."""
+    latencies = sorted(measurement.latencies)
+    total = sum(latencies)
+    return {
+        "ops": measurement.ops,
+        "seconds": round(total, 6),
+        "throughput": round(measurement.ops / total, 2) if total else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+    }
+
+
+def run_benchmarks(rows: int, samples: int = 1000, seed: int = 0, names: Optional[List[str]] = None,
+                   measure_memory: bool = True, data_dir: Optional[str] = None) -> dict:
+    """
+    Generate a scratch data directory with `rows` profiles and journal entries and run the benchmarks on it.
+
+    With `measure_memory`, each benchmark runs a second time under tracemalloc to record its peak Python
+    memory; the timings always come from the run without tracing.
+
+    Returns:
+        dict: {"meta": {...}, "results": {benchmark name: summary}}, ready to be saved as a baseline.
+    """
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="babyland-bench-")
+    try:
+        source = data_dir or os.path.join(scratch, "source")
+        if data_dir is None:
+            generate_data_dir(source, rows, seed)
+        for name, function in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            work_dir = os.path.join(scratch, name)
+            shutil.copytree(source, work_dir)  # every benchmark starts from the same, untouched data
+            summary = summarize(function(Context(work_dir, rows, samples, random.Random(seed))))
+            if measure_memory:
+                memory_dir = work_dir + "-memory"
+                shutil.copytree(source, memory_dir)
+                tracemalloc.start()
+                function(Context(memory_dir, rows, samples, random.Random(seed)))
+                summary["peak_memory_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+                tracemalloc.stop()
+            results[name] = summary
+            print(f"{name:28} {summary['throughput']:>14,.1f} ops/s   p50 {summary['p50_ms']:>9.4f} ms   "
+                  f"p99 {summary['p99_ms']:>9.4f} ms" + (f"   peak {summary['peak_memory_kb']:>10,.1f} KiB" if measure_memory else ""))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {
+        "meta": {"rows": rows, "samples": samples, "seed": seed, "python": platform.python_version(),
+                 "platform": platform.platform(), "timestamp": datetime.now().isoformat(timespec="seconds")},
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.2) -> List[str]:
+    """
+    Compare a run against a baseline.
+
+    A benchmark regresses when its throughput drops, or its p95 latency grows, by more than `threshold`
+    (a fraction of the baseline value). Benchmarks missing from either run are skipped.
+
+    Returns:
+        List[str]: One description per regression; empty if the run is within the threshold.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        if base["throughput"] and result["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {result['throughput']:,.1f} ops/s vs baseline {base['throughput']:,.1f} ops/s")
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 latency {result['p95_ms']:.4f} ms vs baseline {base['p95_ms']:.4f} ms")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark BabyLand's storage, validation and calculation paths.")
+    parser.add_argument("--rows", type=int, default=1000, help="profiles and journal entries in the generated data, e.g. 1000 to 10000000 (default: 1000)")
+    parser.add_argument("--samples", type=int, default=1000, help="timed calls per latency benchmark (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None, help="benchmark a copy of this data directory instead of generating one")
+    parser.add_argument("--only", nargs="*", default=None, choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass that records peak memory")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file (e.g. to record a baseline)")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare the results against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression as a fraction of the baseline (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.rows, args.samples, args.seed, args.only, not args.no_memory, args.data_dir)
+    if args.output:
+        with open(args.output, mode="w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.compare:
+        with open(args.compare, mode="r") as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
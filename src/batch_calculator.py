@@ -0,0 +1,73 @@
+from datetime import date, datetime
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from metrics import instrumented
+
+
+class BatchDueDateCalculator:
+    """
+    Vectorized counterpart of DueDateCalculator for many profiles at once.
+
+    Every LMP date is held as a NumPy datetime64[D] value, so a whole column of profiles is
+    adjusted, shifted by 280 days and compared against today with a handful of array operations
+    instead of one DueDateCalculator object (and two timedelta additions) per profile.
+    """
+    def __init__(self, lmp_dates: Union[np.ndarray, Sequence[datetime]], period_lengths: Union[np.ndarray, Sequence[int], int] = 28) -> None:
+        """
+        Initializes an instance of the BatchDueDateCalculator class.
+
+        Args:
+            lmp_dates (array-like): The dates of the Last Menstrual Period (LMP), as date or datetime objects,
+                'YYYY-MM-DD' strings or a datetime64 array. Any time of day is dropped: profiles are whole days.
+            period_lengths (array-like or int, optional): The length of each menstrual cycle in days.
+                A single int is applied to every row. Defaults to 28.
+        """
+        self.lmp_dates = np.asarray(lmp_dates, dtype="datetime64[D]")  # truncate to whole days, like the dates stored in the CSV files
+        period_lengths = np.asarray(period_lengths)
+        if period_lengths.dtype.kind not in "iu":  # same rule as the scalar class: integers only
+            raise ValueError("Period length must be an integer between 20 and 45 days.")
+        period_lengths = np.broadcast_to(period_lengths, self.lmp_dates.shape)
+        if period_lengths.size and (period_lengths.min() < 20 or period_lengths.max() > 45):
+            raise ValueError("Period length must be an integer between 20 and 45 days.")  # Enforce validation of the period_length attribute
+        self.period_lengths = period_lengths.astype(np.int64)
+
+    def adjusted_lmp_dates(self) -> np.ndarray:
+        """
+        Shifts every LMP date by the difference between the period length and the default 28-day cycle.
+
+        Returns:
+            np.ndarray: The adjusted LMP dates as a datetime64[D] array.
+        """
+        return self.lmp_dates + (self.period_lengths - 28).astype("timedelta64[D]")
+
+    @instrumented("batch_calculator.calculate_due_dates")
+    def calculate_due_dates(self) -> np.ndarray:
+        """
+        Calculates the estimated due date of every profile, adding 280 days to the adjusted LMP.
+
+        Returns:
+            np.ndarray: The estimated due dates as a datetime64[D] array.
+        """
+        return self.adjusted_lmp_dates() + np.timedelta64(280, "D")
+
+    @instrumented("batch_calculator.calculate_current_progress")
+    def calculate_current_progress(self, today: Optional[Union[date, datetime, np.datetime64, str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculates the current progress of every pregnancy, in terms of weeks and days.
+
+        Progress counts calendar days between the adjusted LMP and `today`: like the LMP dates, `today`
+        is truncated to its day, so the time of day on either side never shifts a row by one day.
+
+        Args:
+            today (date, datetime, datetime64 or str, optional): The day to measure progress against.
+                Defaults to datetime.now(), read once for the whole batch.
+
+        Returns:
+            tuple: Two int64 arrays holding the number of weeks and days of pregnancy.
+        """
+        today = np.datetime64(today if today is not None else datetime.now(), "D")
+        total_days_pregnant = (today - self.adjusted_lmp_dates()).astype(np.int64)
+        weeks, days = np.divmod(total_days_pregnant, 7)  # floor division, same as // and % on the scalar path
+        return weeks, days
@@ -0,0 +1,137 @@
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+import argparse
+import csv
+import os
+import sys
+
+from due_date_calculator import DateValidator, DueDateCalculator
+
+OUTPUT_COLUMNS = ["Name", "LMP Date", "Period Length", "Due Date", "Weeks", "Days", "Error"]
+
+
+def process_rows(rows: List[List[str]], now: Optional[datetime] = None) -> List[List[str]]:
+    """
+    Calculates the due date and current progress of a chunk of (name, LMP date, period length) rows.
+
+    Each row goes through the same validation as the interactive program: DateValidator's checks for the
+    LMP date (in their batch form, with one 280-day window for the whole chunk) and the 20-45 day check of
+    DueDateCalculator for the period length (blank means 28 days). Rows that fail validation are returned
+    with the error message and empty result columns.
+
+    Args:
+        rows (List[List[str]]): The input rows.
+        now (datetime, optional): The current date and time shared by every row. Defaults to datetime.now(), read once.
+
+    Returns:
+        List[List[str]]: One output row per input row, in the same order, with the columns of OUTPUT_COLUMNS.
+    """
+    now = now or datetime.now()
+    rows = [(row + ["", "", ""])[:3] for row in rows]  # short rows are padded, so they fail validation instead of crashing
+    codes, ordinals = DateValidator.validate_dates((row[1].strip() for row in rows), now)
+    results = []
+    for (name, lmp_date_str, period_length_str), code, ordinal in zip(rows, codes, ordinals):
+        if code != DateValidator.VALID:
+            results.append([name, lmp_date_str, period_length_str, "", "", "", DateValidator.error_message(code, lmp_date_str.strip(), now)])
+            continue
+        try:
+            period_length = int(period_length_str) if period_length_str.strip() else 28  # default to 28 days, like the interactive prompt
+        except ValueError:
+            results.append([name, lmp_date_str, period_length_str, "", "", "", "Invalid input. Please enter a valid integer value."])
+            continue
+        try:
+            calculator = DueDateCalculator(datetime.fromordinal(ordinal), period_length)
+        except ValueError as e:  # period length outside 20-45 days
+            results.append([name, lmp_date_str, period_length_str, "", "", "", str(e)])
+            continue
+        weeks, days = calculator.calculate_current_progress(now)
+        results.append([name, lmp_date_str, period_length_str, calculator.calculate_due_date().strftime("%m/%d/%Y"), weeks, days, ""])
+    return results
+
+
+def read_chunks(rows: Iterable[List[str]], chunk_size: int) -> Iterator[List[List[str]]]:
+    """Group an iterable of rows into lists of at most `chunk_size` rows."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_bulk(input_file: str, output_file: str, chunk_size: int = 10000, workers: Optional[int] = None,
+             max_pending: Optional[int] = None, executor: Optional[Executor] = None) -> tuple:
+    """
+    Streams an input CSV through process_rows on a process pool and writes the results to an output CSV.
+
+    At most `max_pending` chunks are read ahead of the writer, so memory stays bounded by
+    chunk_size * max_pending rows whatever the size of the input. Output rows keep the input order.
+    The current date is read once, so every row is validated and measured against the same day.
+
+    Args:
+        input_file (str): CSV file with a header row and the columns "Name", "LMP Date", "Period Length".
+        output_file (str): CSV file to write, with the columns of OUTPUT_COLUMNS.
+        chunk_size (int, optional): Rows sent to a worker at a time. Defaults to 10000.
+        workers (int, optional): Size of the process pool. Defaults to the number of CPUs.
+        max_pending (int, optional): Chunks in flight at any time. Defaults to twice the number of workers.
+        executor (Executor, optional): Run the chunks on this executor instead of a new process pool.
+
+    Returns:
+        tuple: The number of rows processed and the number of rows with a validation error.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    total = errors = 0
+    now = datetime.now()
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        with open(input_file, mode="r", newline="") as source, open(output_file, mode="w", newline="") as target:
+            reader = csv.reader(source)
+            next(reader, None)  # skip the header row
+            writer = csv.writer(target)
+            writer.writerow(OUTPUT_COLUMNS)
+            pending = deque()
+            for chunk in read_chunks(reader, chunk_size):
+                pending.append(executor.submit(process_rows, chunk, now))
+                if len(pending) >= max_pending:  # wait for the oldest chunk before reading more input
+                    total, errors = _write_results(writer, pending.popleft().result(), total, errors)
+            while pending:
+                total, errors = _write_results(writer, pending.popleft().result(), total, errors)
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return total, errors
+
+
+def _write_results(writer, results: List[List[str]], total: int, errors: int) -> tuple:
+    writer.writerows(results)
+    return total + len(results), errors + sum(1 for row in results if row[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calculate due dates and pregnancy progress for every row of a CSV file.")
+    parser.add_argument("input", help="CSV file with the columns Name, LMP Date (MM/DD/YYYY), Period Length")
+    parser.add_argument("output", help="CSV file to write the due dates, progress and validation errors to")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="rows sent to a worker process at a time (default: 10000)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file not found: {args.input}")
+        return 1
+    try:
+        total, errors = run_bulk(args.input, args.output, chunk_size=args.chunk_size, workers=args.workers)
+    except IOError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Processed {total} rows ({errors} with validation errors). Results written to {args.output}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
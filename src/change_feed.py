@@ -0,0 +1,281 @@
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+import os
+import sys
+import time
+
+from csv_index import iter_records, parse_record, read_record
+from journal_log import JournalLog
+from metrics import METRICS
+
+PROFILES = "profiles"
+JOURNAL = "journal"
+
+UPSERT = "upsert"  # a profile was saved: values are (LMP date, period length) as written in the file
+ADD = "add"  # a journal entry was written: values are (date, text)
+MODIFY = "modify"  # an entry's text was replaced: values are (new text,)
+DELETE = "delete"  # an entry was deleted: values are ()
+RESET = "reset"  # the journal was compacted: drop every entry, the live ones follow as adds (with the ids they had)
+
+
+class Change(NamedTuple):
+    """
+    One change to the data files.
+
+    Attributes:
+    sequence (int): Position of the change in the feed; increases by one with every change.
+    source (str): PROFILES or JOURNAL.
+    operation (str): UPSERT for profiles; ADD, MODIFY, DELETE or RESET for the journal.
+    name (str, optional): The user the profile or entry belongs to (None for RESET).
+    entry_id (int, optional): The journal entry changed (None for profiles and RESET).
+    values (tuple): The new values, as strings (see the operation constants).
+    """
+    sequence: int
+    source: str
+    operation: str
+    name: Optional[str]
+    entry_id: Optional[int]
+    values: Tuple[str, ...]
+
+
+class FeedOffset(NamedTuple):
+    """
+    Where a consumer of the feed stands: the sequence number of the last change it got, and how far it
+    read each file (inode and byte offset). The default offset is the beginning of every file.
+    """
+    sequence: int = 0
+    user_inode: int = 0
+    user_offset: int = 0
+    journal_inode: int = 0
+    journal_offset: int = 0
+    log_offset: int = 0
+
+
+class ChangeBatch(NamedTuple):
+    """Consecutive changes, and the offset to resume from once they have been processed."""
+    changes: List[Change]
+    offset: FeedOffset
+
+
+class ChangeFeed:
+    """
+    Feed of the changes made to the CSV data files, read from where the consumer left off.
+
+    The profile file, the journal file and the journal's edit log are only ever appended to between
+    compactions, so a byte offset into each of them marks exactly what a consumer has seen. `changes`
+    reads past those offsets only, so an incremental run costs the size of what changed, not of the
+    files: saved profiles become UPSERTs, new journal rows ADDs, and edit log records MODIFYs and DELETEs.
+
+    A compaction replaces a file (new inode). Compacted profile rows are re-read from the start as
+    UPSERTs, which consumers apply idempotently. A compacted journal drops deleted entries without a
+    trace of them, so the feed sends a RESET and then every live entry as an ADD, with its same id.
+
+    Journal changes are read in two passes, new rows then new edits, with each file read up to its size
+    when the read started (the log is looked at before the journal), so an edit never comes before the
+    entry it edits. A row still being written (no line break yet) is left for the next read. Rows and
+    log records are read as CSV records (see csv_index.iter_records), so values spanning several lines,
+    such as entry texts or the new text of a modification, stay in one change.
+
+    Attributes:
+    user_file (str): The profile CSV file.
+    journal_file (str): The journal CSV file; its edit log is found through JournalLog.
+    """
+
+    def __init__(self, data_dir: str = "data", user_file: Optional[str] = None, journal_file: Optional[str] = None) -> None:
+        self.user_file = user_file or os.path.join(data_dir, "user_data.csv")
+        self.journal_file = journal_file or os.path.join(data_dir, "pregnancy_journal.csv")
+        self.log_file = JournalLog.for_file(self.journal_file).log_name
+
+    def changes(self, offset: Optional[FeedOffset] = None, batch_size: int = 1000) -> Iterator[ChangeBatch]:
+        """
+        Stream the changes made after `offset`, in batches of at most `batch_size` changes.
+
+        Files are read lazily, as batches are consumed: a consumer that is slow to process a batch holds
+        at most one batch in memory, and can stop at any point and resume later from the offset of the
+        last batch it processed.
+
+        Args:
+            offset (FeedOffset, optional): Where the consumer left off; None to read everything.
+            batch_size (int, optional): The maximum number of changes per batch. Defaults to 1000.
+
+        Yields:
+            ChangeBatch: The next changes and the offset to save once they have been processed.
+        """
+        offset = offset or FeedOffset()
+        position = offset._asdict()
+        batch: List[Change] = []
+        for change in self._read(position):
+            batch.append(change)
+            if len(batch) >= batch_size:
+                offset = FeedOffset(**position)
+                yield ChangeBatch(batch, offset)
+                batch = []
+        if batch or FeedOffset(**position) != offset:  # also report an offset that moved without a change, e.g. to a new, empty file
+            yield ChangeBatch(batch, FeedOffset(**position))
+
+    def latest(self) -> FeedOffset:
+        """Return the offset of the current end of the files, to follow new changes without reading the past ones."""
+        position = FeedOffset()._asdict()
+        for stat, inode, offset in ((self._stat(self.user_file), "user_inode", "user_offset"),
+                                    (self._stat(self.journal_file), "journal_inode", "journal_offset")):
+            if stat is not None:
+                position[inode], position[offset] = stat.st_ino, stat.st_size
+        log_stat = self._stat(self.log_file)
+        if log_stat is not None:
+            position["log_offset"] = log_stat.st_size
+        return FeedOffset(**position)
+
+    def _read(self, position: Dict[str, int]) -> Iterator[Change]:
+        """Yield the changes after `position`, updating it (offsets and sequence) before each change is yielded."""
+        yield from self._read_profiles(position)
+        yield from self._read_journal(position)
+
+    def _read_profiles(self, position: Dict[str, int]) -> Iterator[Change]:
+        try:
+            user_file = open(self.user_file, mode="rb")
+        except FileNotFoundError:
+            return
+        with user_file:
+            stat = os.fstat(user_file.fileno())
+            if position["user_inode"] != stat.st_ino or position["user_offset"] > stat.st_size:
+                position["user_inode"], position["user_offset"] = stat.st_ino, 0  # compacted or replaced: read it again
+            for offset, record in self._records(user_file, position["user_offset"], stat.st_size, PROFILES):
+                position["user_offset"] = offset + len(record)
+                row = parse_record(record)
+                if len(row) < 3:
+                    continue  # malformed row, skipped like every reader of the file does
+                position["sequence"] += 1
+                yield Change(position["sequence"], PROFILES, UPSERT, row[0], None, (row[1], row[2]))
+
+    def _read_journal(self, position: Dict[str, int]) -> Iterator[Change]:
+        try:
+            log = open(self.log_file, mode="rb")
+        except FileNotFoundError:
+            log = None
+        try:
+            log_size = os.fstat(log.fileno()).st_size if log is not None else 0
+            try:
+                journal = open(self.journal_file, mode="rb")
+            except FileNotFoundError:
+                return
+            with journal:
+                stat = os.fstat(journal.fileno())
+                if position["journal_inode"] != stat.st_ino or position["journal_offset"] > stat.st_size:
+                    if position["journal_inode"]:  # the consumer holds entries with ids of another journal file
+                        position["sequence"] += 1
+                        yield Change(position["sequence"], JOURNAL, RESET, None, None, ())
+                    position["journal_inode"], position["journal_offset"], position["log_offset"] = stat.st_ino, 0, 0
+                columns = JournalLog.for_file(self.journal_file)._columns(parse_record(read_record(journal, 0)))
+                for offset, record in self._records(journal, position["journal_offset"], stat.st_size, JOURNAL):
+                    position["journal_offset"] = offset + len(record)
+                    row = parse_record(record)
+                    if len(row) <= max(column for column in columns if column is not None):
+                        continue
+                    entry_id, name, date, text = JournalLog._row_of(row, offset, columns)
+                    position["sequence"] += 1
+                    yield Change(position["sequence"], JOURNAL, ADD, name, entry_id, (date, text))
+                if log is not None:
+                    yield from self._read_log(position, log, log_size, journal, columns[0])
+        finally:
+            if log is not None:
+                log.close()
+
+    def _read_log(self, position: Dict[str, int], log, log_size: int, journal, name_col: int) -> Iterator[Change]:
+        """Yield the edits logged after the log offset, for entries of the journal file already read."""
+        header_record = read_record(log, 0)
+        header = parse_record(header_record)
+        if header[:2] != ["Base", str(position["journal_inode"])]:
+            return  # no log for this journal file yet, or one left over from before a compaction
+        base = int(header[2]) if len(header) > 2 else 0  # the ids of new rows are their offsets plus this base
+        if position["log_offset"] < len(header_record) or position["log_offset"] > log_size:
+            position["log_offset"] = len(header_record)  # replaying edits is harmless: they are idempotent
+        for offset, raw in self._records(log, position["log_offset"], log_size, "log", skip_header=False):
+            record = parse_record(raw)
+            entry_id, operation, payload = int(record[0]), record[1], record[2]
+            if entry_id >= base + position["journal_offset"]:
+                return  # edits an entry appended after this read started: wait for the next read
+            if len(record) > 3:
+                name = record[3]
+            else:  # logged before edit records named the user: the id is the row's offset
+                name = parse_record(read_record(journal, entry_id))[name_col]
+            position["log_offset"] = offset + len(raw)
+            position["sequence"] += 1
+            if operation == JournalLog.MODIFY:
+                yield Change(position["sequence"], JOURNAL, MODIFY, name, entry_id, (payload,))
+            else:
+                yield Change(position["sequence"], JOURNAL, DELETE, name, entry_id, ())
+
+    @staticmethod
+    def _records(file, start: int, end: int, source: str, skip_header: bool = True) -> Iterator[Tuple[int, bytes]]:
+        """Yield (offset, record) for the complete, non-blank rows between `start` and `end` (0: after the header)."""
+        header_size = len(read_record(file, 0)) if skip_header else 0
+        rows = 0
+        bytes_read = 0
+        try:
+            for offset, record in iter_records(file, max(start, header_size), end):  # stops at a row written after the read started, or still being written
+                bytes_read += len(record)
+                if record.strip():
+                    rows += 1
+                    yield offset, record
+        finally:
+            METRICS.add("change_feed.read", rows_scanned=rows, bytes_read=bytes_read)
+            METRICS.add(f"change_feed.read_{source}", rows_scanned=rows, bytes_read=bytes_read)
+
+    @staticmethod
+    def _stat(path: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+
+def load_offset(file_name: str) -> Optional[FeedOffset]:
+    """Return the offset saved in a file by `save_offset`, or None if there is none yet."""
+    import json
+    try:
+        with open(file_name, mode="r") as offset_file:
+            return FeedOffset(**json.load(offset_file))
+    except FileNotFoundError:
+        return None
+
+
+def save_offset(file_name: str, offset: FeedOffset) -> None:
+    """Save an offset atomically (temporary file + rename), so a crash leaves the old or the new offset."""
+    import json
+    tmp_path = file_name + ".tmp"
+    with open(tmp_path, mode="w") as offset_file:
+        json.dump(offset._asdict(), offset_file)
+        offset_file.flush()
+        os.fsync(offset_file.fileno())
+    os.replace(tmp_path, file_name)
+
+
+def main(argv: Optional[list] = None) -> int:
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description="Print the changes made to a BabyLand data directory as JSON lines.")
+    parser.add_argument("data_dir", nargs="?", default="data")
+    parser.add_argument("--offset-file", default=None, help="resume from the offset saved in this file, and save the new offset after each batch")
+    parser.add_argument("--from-end", action="store_true", help="without a saved offset, skip the existing data and only print new changes")
+    parser.add_argument("--batch-size", type=int, default=1000, help="changes printed between two offset saves (default: 1000)")
+    parser.add_argument("--follow", action="store_true", help="keep polling for new changes")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls with --follow (default: 1)")
+    args = parser.parse_args(argv)
+
+    feed = ChangeFeed(args.data_dir)
+    offset = load_offset(args.offset_file) if args.offset_file else None
+    if offset is None and args.from_end:
+        offset = feed.latest()
+    while True:
+        for batch in feed.changes(offset, args.batch_size):
+            sys.stdout.writelines(json.dumps(change._asdict()) + "\n" for change in batch.changes)
+            sys.stdout.flush()
+            offset = batch.offset
+            if args.offset_file:
+                save_offset(args.offset_file, offset)
+        if not args.follow:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
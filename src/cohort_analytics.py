@@ -0,0 +1,356 @@
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import argparse
+import csv
+import io
+import os
+import sys
+
+import numpy as np
+
+from due_date_calculator import DateValidator
+from metrics import METRICS, instrumented
+
+MAX_ORDINAL = datetime.max.toordinal()
+FNV_OFFSET = np.uint64(14695981039346656037)
+FNV_PRIME = np.uint64(1099511628211)
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()  # datetime64[D] counts days from 1970-01-01
+
+
+class ProfileColumns(NamedTuple):
+    """The live profiles of a profile file, column by column."""
+    lmp_dates: np.ndarray  # datetime64[D]
+    period_lengths: np.ndarray  # uint8
+    skipped: int  # malformed rows left out
+
+
+@instrumented("cohort.read_profiles")
+def read_profiles(file_name: str) -> ProfileColumns:
+    """
+    Read the LMP date and cycle length of every profile in a profile file, without a Python object per row.
+
+    The file is loaded into one byte array. Plain rows, shaped 'name,MM/DD/YYYY,N' with a cycle length of
+    one to three digits, are split and parsed with array operations; only the rare others (quoted names,
+    extra columns, malformed rows) go through the csv module. Like UserTable, the last valid row of a name wins and
+    malformed rows are skipped: duplicate names are found by a vectorized FNV-1a hash of the name bytes,
+    and rows whose hashes collide are compared byte for byte.
+
+    Args:
+        file_name (str): The profile file (columns "Name", "LMP Date", "Period Length").
+
+    Returns:
+        ProfileColumns: The live profiles, in file order of their last row.
+    """
+    data = np.fromfile(file_name, dtype=np.uint8)
+    METRICS.add("cohort.read_profiles", bytes_read=int(data.size))
+    newlines = np.flatnonzero(data == ord("\n"))
+    if not newlines.size:
+        return ProfileColumns(np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=np.uint8), 0)
+    ends = newlines[1:]  # the first newline ends the header row
+    starts = newlines[:-1] + 1
+    if data[-1] != ord("\n"):  # last row without a line break
+        starts = np.append(starts, newlines[-1] + 1)
+        ends = np.append(ends, data.size)
+    stops = ends - (data[np.maximum(ends - 1, 0)] == ord("\r"))  # exclusive end of each row's content
+    keep = stops > starts
+    starts, stops = starts[keep], stops[keep]  # blank lines
+    METRICS.add("cohort.read_profiles", rows_scanned=int(starts.size))
+
+    widths = _plain_rows(data, starts, stops)
+    fast = widths > 0
+    date_stops, widths = stops[fast] - widths[fast] - 1, widths[fast]  # exclusive end of each fast row's date
+    name_starts, name_lengths = starts[fast], date_stops - 11 - starts[fast]
+    ordinals, valid = _parse_dates(data, date_stops - 10)
+    periods = np.zeros(widths.size, dtype=np.int64)
+    for i in range(3):
+        digit = i < widths
+        periods[digit] = periods[digit] * 10 + data[date_stops[digit] + 1 + i] - 48
+    valid &= periods <= 255  # the range UserTable stores
+    rows = np.flatnonzero(fast)  # row numbers, to resolve duplicates in file order
+    skipped = int(np.count_nonzero(~valid))
+    name_starts, name_lengths, ordinals, periods, rows = (column[valid] for column in (name_starts, name_lengths, ordinals, periods, rows))
+    names = data
+
+    slow = np.flatnonzero(~fast)
+    if slow.size:  # parse the remaining rows one by one, and append their names to a separate buffer
+        slow_names, slow_ordinals, slow_periods, slow_rows = [], [], [], []
+        for row in slow:
+            parsed = _parse_row(bytes(data[starts[row]:stops[row]]))
+            if parsed is None:
+                skipped += 1
+                continue
+            slow_names.append(parsed[0])
+            slow_ordinals.append(parsed[1])
+            slow_periods.append(parsed[2])
+            slow_rows.append(row)
+        if slow_rows:
+            lengths = np.array([len(name) for name in slow_names], dtype=np.int64)
+            names = np.concatenate([data, np.frombuffer(b"".join(slow_names), dtype=np.uint8)])
+            name_starts = np.concatenate([name_starts, data.size + np.cumsum(lengths) - lengths])
+            name_lengths = np.concatenate([name_lengths, lengths])
+            ordinals = np.concatenate([ordinals, slow_ordinals])
+            periods = np.concatenate([periods, slow_periods])
+            rows = np.concatenate([rows, slow_rows])
+
+    live = _last_per_name(names, name_starts, name_lengths, rows)
+    lmp_dates = (ordinals[live] - EPOCH_ORDINAL).astype("datetime64[D]")
+    return ProfileColumns(lmp_dates, periods[live].astype(np.uint8), skipped)
+
+
+def _plain_rows(data: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """
+    Return the width of the cycle length of every row shaped 'name,MM/DD/YYYY,N' (one to three digits,
+    unquoted non-empty name), and 0 for every other row.
+
+    Every position is probed through `_at`, so rows too short for the shape (such as a truncated last
+    row) only ever read bytes of the file; whatever those bytes are, such rows fail the length check.
+    """
+    widths = np.zeros(starts.size, dtype=np.int64)
+    for width in (2, 1, 3):  # the common width first; each later pass only looks at the rows left over
+        rows = np.flatnonzero(widths == 0)
+        row_starts, date_stops = starts[rows], stops[rows] - width - 1  # date_stops: the comma after the date
+        plain = (date_stops - row_starts >= 12) & (_at(data, row_starts) != ord('"'))
+        for offset, expected in ((0, ord(",")), (-11, ord(",")), (-8, ord("/")), (-5, ord("/"))):
+            plain &= _at(data, date_stops + offset) == expected
+        for offset in (-10, -9, -7, -6, -4, -3, -2, -1, *range(1, width + 1)):  # the digits of MM, DD, YYYY and the cycle length
+            digit = _at(data, date_stops + offset)
+            plain &= (digit >= ord("0")) & (digit <= ord("9"))
+        widths[rows[plain]] = width
+    commas = np.flatnonzero(data == ord(","))
+    rows = np.flatnonzero(widths)
+    first_comma = _at(commas, np.searchsorted(commas, starts[rows]))  # extra columns make csv split the name elsewhere
+    widths[rows[first_comma != stops[rows] - widths[rows] - 12]] = 0
+    return widths
+
+
+def _at(array: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """Gather `array[positions]` with the positions clamped into the array (callers discard the clamped reads)."""
+    if not array.size:
+        return np.zeros(positions.size, dtype=array.dtype)
+    return array[np.clip(positions, 0, array.size - 1)]
+
+
+def _parse_dates(data: np.ndarray, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse the MM/DD/YYYY dates starting at `positions`. Returns their day ordinals and a mask of the valid ones."""
+    def number(offset: int, width: int) -> np.ndarray:
+        value = np.zeros(positions.size, dtype=np.int64)
+        for i in range(width):
+            value = value * 10 + data[positions + offset + i] - 48
+        return value
+    month, day, year = number(0, 2), number(3, 2), number(6, 4)
+    valid = (month >= 1) & (month <= 12) & (day >= 1) & (year >= 1)
+    month_start = ((np.maximum(year, 1) - 1970).astype("datetime64[Y]").astype("datetime64[M]")
+                   + (np.clip(month, 1, 12) - 1).astype("timedelta64[M]"))
+    days_in_month = ((month_start + np.timedelta64(1, "M")).astype("datetime64[D]") - month_start.astype("datetime64[D]")).astype(np.int64)
+    valid &= day <= days_in_month  # leap years included, like DateValidator.is_valid_day_in_month
+    ordinals = month_start.astype("datetime64[D]").astype(np.int64) + day - 1 + EPOCH_ORDINAL
+    return ordinals, valid
+
+
+def _parse_row(line: bytes) -> Optional[Tuple[bytes, int, int]]:
+    """Parse one row the way UserTable does. Returns (name bytes, LMP ordinal, period length), or None if malformed."""
+    fields = next(csv.reader([line.decode("utf-8")]), [])
+    if len(fields) < 3:
+        return None
+    code, ordinal = DateValidator.parse_date(fields[1], 1, MAX_ORDINAL)
+    try:
+        period_length = int(fields[2])
+    except ValueError:
+        return None
+    if code != DateValidator.VALID or not 0 <= period_length <= 255:
+        return None
+    return fields[0].encode("utf-8"), ordinal, period_length
+
+
+def _last_per_name(names: np.ndarray, starts: np.ndarray, lengths: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Return the positions (in row order) of the last row of every distinct name."""
+    hashes = _hash_names(names, starts, lengths)
+    order = np.lexsort((rows, hashes))  # by hash, then by row
+    sorted_hashes = hashes[order]
+    last = np.ones(order.size, dtype=bool)
+    last[:-1] = sorted_hashes[:-1] != sorted_hashes[1:]
+    # Check that every row has the same name as the last row of its hash; otherwise two names collided
+    group = np.cumsum(np.concatenate([[True], last[:-1]])) - 1
+    earlier = np.flatnonzero(~last)  # rows followed by another row of the same hash
+    other, representative = order[earlier], order[np.flatnonzero(last)[group[earlier]]]
+    same = _names_equal(names, starts[other], starts[representative], lengths[other], lengths[representative])
+    live = order[last]
+    if not same.all():  # resolve the colliding hashes name by name
+        collided = np.isin(group, group[earlier[~same]])
+        exact: Dict[bytes, int] = {}
+        for position in order[collided]:  # row order within a hash, so the last row of a name is kept
+            exact[bytes(names[starts[position]:starts[position] + lengths[position]])] = position
+        live = np.concatenate([order[last & ~collided], np.fromiter(exact.values(), dtype=np.int64, count=len(exact))])
+    return live[np.argsort(rows[live], kind="stable")]
+
+
+def _names_equal(names: np.ndarray, starts: np.ndarray, other_starts: np.ndarray,
+                 lengths: np.ndarray, other_lengths: np.ndarray) -> np.ndarray:
+    """Compare two lists of names byte for byte. Returns a mask of the equal pairs."""
+    same = lengths == other_lengths
+    by_length, counts = _by_length(lengths)
+    for position, count in enumerate(counts):
+        rows = by_length[:count]
+        same[rows] &= names[starts[rows] + position] == names[other_starts[rows] + position]
+    return same
+
+
+def _hash_names(names: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Return the 64-bit FNV-1a hash of every name."""
+    hashes = np.full(starts.size, FNV_OFFSET, dtype=np.uint64)
+    by_length, counts = _by_length(lengths)
+    with np.errstate(over="ignore"):
+        for position, count in enumerate(counts):
+            if count == starts.size:  # every name is longer than `position`: no need to gather
+                hashes = (hashes ^ names[starts + position]) * FNV_PRIME
+                continue
+            rows = by_length[:count]
+            hashes[rows] = (hashes[rows] ^ names[starts[rows] + position]) * FNV_PRIME
+    return hashes
+
+
+def _by_length(lengths: np.ndarray) -> Tuple[np.ndarray, List[int]]:
+    """
+    Order names from longest to shortest, so the names having a byte at a given position are a prefix of the order.
+
+    Returns:
+        tuple: (the order, the number of names longer than each position). Processing one byte position
+        at a time over that prefix costs as much as the total length of the names, however long the longest is.
+    """
+    by_length = np.argsort(-lengths, kind="stable")
+    longest = int(lengths[by_length[0]]) if lengths.size else 0
+    counts = np.searchsorted(-lengths[by_length], -np.arange(longest), side="left")
+    return by_length, counts.tolist()
+
+
+def profile_files(data_dir: str) -> List[str]:
+    """Return the profile file of a data directory, or the profile file of every shard of a sharded one (see sharding.py)."""
+    from sharding import ShardedCSVStorage  # names never span shards, so each file is deduplicated on its own
+    if ShardedCSVStorage.recorded_shards(data_dir) is not None:
+        return [shard.user_file for shard in ShardedCSVStorage(data_dir).shards]
+    return [os.path.join(data_dir, "user_data.csv")]
+
+
+def read_data_dir(data_dir: str) -> ProfileColumns:
+    """Read the live profiles of every profile file of a data directory."""
+    parts = [read_profiles(file_name) for file_name in profile_files(data_dir) if os.path.exists(file_name)]
+    if not parts:
+        return ProfileColumns(np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=np.uint8), 0)
+    return ProfileColumns(np.concatenate([part.lmp_dates for part in parts]),
+                          np.concatenate([part.period_lengths for part in parts]),
+                          sum(part.skipped for part in parts))
+
+
+@instrumented("cohort.report")
+def cohort_report(profiles: ProfileColumns, today: Optional[datetime] = None,
+                  lmp_range: Tuple[Optional[datetime], Optional[datetime]] = (None, None),
+                  due_range: Tuple[Optional[datetime], Optional[datetime]] = (None, None)) -> dict:
+    """
+    Compute the cohort statistics of a set of profiles.
+
+    Profiles with a cycle length outside 20-45 days cannot be placed on a timeline and are only counted
+    under "invalid_period_length". Gestational weeks and due dates are computed like BatchDueDateCalculator.
+
+    Args:
+        profiles (ProfileColumns): The profiles, e.g. from `read_data_dir`.
+        today (datetime, optional): The date gestational weeks are measured at. Defaults to datetime.now(), read once.
+        lmp_range (tuple, optional): Only count profiles whose LMP date is within (first, last), inclusive; None for no bound.
+        due_range (tuple, optional): Only count profiles whose due date is within (first, last), inclusive; None for no bound.
+
+    Returns:
+        dict: {"today", "profiles", "skipped_rows", "invalid_period_length", "gestational_weeks": {week: count},
+        "due_months": {"YYYY-MM": count}, "period_lengths": {days: count}}; weeks below 0 count as "before_lmp".
+    """
+    today64 = np.datetime64((today or datetime.now()).date(), "D")
+    lmp_dates, period_lengths = profiles.lmp_dates, profiles.period_lengths.astype(np.int64)
+    selected = _within(lmp_dates, lmp_range)
+    valid_period = (period_lengths >= 20) & (period_lengths <= 45)
+    adjusted = lmp_dates + (np.where(valid_period, period_lengths, 28) - 28).astype("timedelta64[D]")
+    due_dates = adjusted + np.timedelta64(280, "D")
+    selected &= _within(due_dates, due_range) | ~valid_period
+    invalid = int(np.count_nonzero(selected & ~valid_period))
+    selected &= valid_period
+
+    weeks = (today64 - adjusted[selected]).astype(np.int64) // 7
+    week_counts = np.bincount(weeks[weeks >= 0]) if np.any(weeks >= 0) else np.zeros(0, dtype=np.int64)
+    months, month_counts = np.unique(due_dates[selected].astype("datetime64[M]"), return_counts=True)
+    period_counts = np.bincount(period_lengths[selected], minlength=46)
+
+    gestational_weeks: Dict[str, int] = {}
+    before = int(np.count_nonzero(weeks < 0))
+    if before:
+        gestational_weeks["before_lmp"] = before
+    gestational_weeks.update((str(week), int(count)) for week, count in enumerate(week_counts) if count)
+    return {
+        "today": str(today64),
+        "profiles": int(np.count_nonzero(selected)),
+        "skipped_rows": profiles.skipped,
+        "invalid_period_length": invalid,
+        "gestational_weeks": gestational_weeks,
+        "due_months": {str(month): int(count) for month, count in zip(months, month_counts)},
+        "period_lengths": {str(days): int(count) for days, count in enumerate(period_counts) if count},
+    }
+
+
+def _within(dates: np.ndarray, bounds: Tuple[Optional[datetime], Optional[datetime]]) -> np.ndarray:
+    first, last = bounds
+    mask = np.ones(dates.shape, dtype=bool)
+    if first is not None:
+        mask &= dates >= np.datetime64(first.date(), "D")
+    if last is not None:
+        mask &= dates <= np.datetime64(last.date(), "D")
+    return mask
+
+
+def to_csv(report: dict) -> str:
+    """Flatten a cohort report to CSV rows of (metric, key, count)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["Metric", "Key", "Count"])
+    for metric in ("profiles", "skipped_rows", "invalid_period_length"):
+        writer.writerow([metric, "", report[metric]])
+    for metric in ("gestational_weeks", "due_months", "period_lengths"):
+        writer.writerows([metric, key, count] for key, count in report[metric].items())
+    return buffer.getvalue()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Count BabyLand profiles by gestational week, due month and cycle length.")
+    parser.add_argument("data_dir", nargs="?", default="data")
+    parser.add_argument("--today", help="measure gestational weeks at this date, MM/DD/YYYY (default: today)")
+    parser.add_argument("--lmp-from", help="only profiles with an LMP date on or after this date, MM/DD/YYYY")
+    parser.add_argument("--lmp-to", help="only profiles with an LMP date on or before this date, MM/DD/YYYY")
+    parser.add_argument("--due-from", help="only profiles due on or after this date, MM/DD/YYYY")
+    parser.add_argument("--due-to", help="only profiles due on or before this date, MM/DD/YYYY")
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--output", help="write the report to this file instead of standard output")
+    args = parser.parse_args(argv)
+
+    try:
+        dates = {key: datetime.strptime(value, "%m/%d/%Y") if value else None
+                 for key, value in (("today", args.today), ("lmp_from", args.lmp_from), ("lmp_to", args.lmp_to),
+                                    ("due_from", args.due_from), ("due_to", args.due_to))}
+    except ValueError as e:
+        print(f"Error: Invalid date: {e}")
+        return 1
+    try:
+        report = cohort_report(read_data_dir(args.data_dir), dates["today"],
+                               (dates["lmp_from"], dates["lmp_to"]), (dates["due_from"], dates["due_to"]))
+    except IOError as e:
+        print(f"Error: {e}")
+        return 1
+    if args.format == "json":
+        import json
+        text = json.dumps(report, indent=2) + "\n"
+    else:
+        text = to_csv(report)
+    if args.output:
+        with open(args.output, mode="w", newline="") as output_file:
+            output_file.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+from collections import deque
+from typing import Iterable, List, Optional
+
+
+class Console:
+    """Where DueDatePredictor reads answers from and writes messages to. This default is the terminal (builtin input and print)."""
+
+    def input(self, prompt: str = "") -> str:
+        return input(prompt)
+
+    def print(self, *values: object, sep: str = " ", end: str = "\n") -> None:
+        print(*values, sep=sep, end=end)
+
+
+class ScriptedConsole(Console):
+    """
+    A console answering prompts from a script and keeping everything written to it, to drive sessions in tests and replays.
+
+    Attributes:
+    prompts (list): Every prompt asked, in order.
+    output (list): Every message written, one string per print call.
+    """
+
+    def __init__(self, answers: Iterable[str]) -> None:
+        self._answers = deque(answers)
+        self.prompts: List[str] = []
+        self.output: List[str] = []
+
+    def input(self, prompt: str = "") -> str:
+        self.prompts.append(prompt)
+        if not self._answers:
+            raise EOFError(f"No scripted answer left for the prompt {prompt!r}")  # what input() raises at the end of stdin
+        return self._answers.popleft()
+
+    def print(self, *values: object, sep: str = " ", end: str = "\n") -> None:
+        self.output.append(sep.join(str(value) for value in values) + end)
+
+    def remaining(self) -> int:
+        """Return the number of answers not used yet."""
+        return len(self._answers)
+
+    def text(self) -> str:
+        """Return everything written, as one string."""
+        return "".join(self.output)
+
+
+class RecordingConsole(Console):
+    """
+    A console passing everything through to another one and recording the answers, so the session can be replayed
+    with a ScriptedConsole (see benchmarks/load_test.py).
+
+    Attributes:
+    console (Console): The console actually read from and written to.
+    answers (list): Every answer given, in order.
+    """
+
+    def __init__(self, console: Optional[Console] = None) -> None:
+        self.console = console or Console()
+        self.answers: List[str] = []
+
+    def input(self, prompt: str = "") -> str:
+        answer = self.console.input(prompt)
+        self.answers.append(answer)
+        return answer
+
+    def print(self, *values: object, sep: str = " ", end: str = "\n") -> None:
+        self.console.print(*values, sep=sep, end=end)
+
+    def save(self, file_name: str) -> None:
+        """Append the recorded answers to a file of recorded sessions, one JSON list of answers per line."""
+        import json
+        with open(file_name, mode="a", encoding="utf-8") as sessions:
+            sessions.write(json.dumps(self.answers) + "\n")
@@ -0,0 +1,322 @@
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+import csv
+import os
+import threading
+from os.path import exists
+
+from metrics import METRICS, instrumented
+
+
+# (inode, size, mtime_ns) of a CSV file: a replaced file differs by inode, an appended one by size and mtime
+Fingerprint = Tuple[int, int, int]
+
+
+def fingerprint_of(stat: os.stat_result) -> Fingerprint:
+    """Return the fingerprint of a file from its stat."""
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _open_quote(record: bytes) -> bool:
+    """Return whether `record` ends inside a quoted field, i.e. whether its last line break belongs to a value."""
+    if b'"' not in record:
+        return False  # fast path: most records quote nothing
+    field_start, quoted, closing = True, False, False
+    for byte in record:
+        if quoted:
+            if byte == 0x22:  # '"' closes the field, unless the next byte is another '"' (an escaped quote)
+                quoted, closing = False, True
+        elif closing and byte == 0x22:
+            quoted, closing = True, False
+        elif byte in (0x2C, 0x0A):  # ',' or '\n' starts a new field
+            field_start, closing = True, False
+            continue
+        elif field_start and byte == 0x22:
+            quoted = True  # quotes only open a quoted field at its start; elsewhere they are literal
+        else:
+            closing = False
+        field_start = False
+    return quoted
+
+
+def read_record(csv_file: BinaryIO, offset: int) -> bytes:
+    """
+    Return the CSV record starting at byte `offset` of a file opened in binary mode: one line, or several
+    when a quoted field holds line breaks.
+    """
+    csv_file.seek(offset)
+    record = csv_file.readline()
+    while record.endswith(b"\n") and _open_quote(record):
+        line = csv_file.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+
+def iter_records(csv_file: BinaryIO, start: int, end: Optional[int] = None, partial: bool = False) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (offset, record) for every CSV record of a file opened in binary mode, from byte `start` up to
+    byte `end` (the end of the file by default), reading records as `read_record` does.
+
+    A record running past `end` is not yielded, nor, unless `partial` is set, is a last record missing its
+    final line break (still being written, or a file saved without a trailing newline).
+    """
+    csv_file.seek(start)
+    offset = start
+    record = b""
+    for line in csv_file:
+        record += line
+        if line.endswith(b"\n") and _open_quote(record):
+            continue  # the line break is part of a quoted value
+        if end is not None and offset + len(record) > end:
+            return
+        if not record.endswith(b"\n") and not partial:
+            return
+        yield offset, record
+        offset += len(record)
+        record = b""
+    if record and partial and (end is None or offset + len(record) <= end):
+        yield offset, record  # a quoted field left open at the end of the file
+
+
+def parse_record(record: bytes) -> List[str]:
+    """Parse one CSV record (see `read_record`) into its fields; a blank record has none."""
+    return next(csv.reader([record.decode("utf-8")]), [])
+
+
+class CSVOffsetIndex:
+    """
+    Persistent index from the value of one CSV column to the byte offsets of the rows holding it.
+
+    The index lives next to the CSV file ('<file>.idx'). Its first line records the inode, size and
+    modification time of the CSV file it was built from; the following lines are 'offset,key' pairs in
+    file order. Whenever the CSV no longer matches that fingerprint (edited by hand, rewritten or replaced,
+    appended to by a process that did not update the index) the index is rebuilt from a single scan of the
+    file. A file replaced by a compaction has a new inode, so it is never mistaken for the old one, even
+    once it has grown back to the same size.
+
+    The index is shared by every thread of the process (see `for_file`): lookups, rebuilds and appends
+    are serialized by a lock, and a rebuild only indexes the bytes its fingerprint covers, so rows a
+    writer appends meanwhile are registered once, by that writer's `record_appends`. Readers that need
+    the row of a key should use `read_key_row`, which checks the row it reads against the key.
+
+    Attributes:
+    csv_path (str): The CSV file being indexed.
+    index_path (str): The file the index is persisted to.
+    key_column (int): The position of the indexed column in each row.
+    """
+
+    HEADER_FORMAT = "{inode:020d} {size:020d} {mtime_ns:020d}\n"  # fixed width, so the header can be rewritten in place
+
+    _instances: Dict[Tuple[str, int], "CSVOffsetIndex"] = {}  # one shared index per file and column in the process
+
+    def __init__(self, csv_path: str, key_column: int = 0, index_path: Optional[str] = None) -> None:
+        self.csv_path = csv_path
+        self.index_path = index_path or csv_path + ".idx"
+        self.key_column = key_column
+        self._offsets: Dict[str, List[int]] = {}
+        self._rows = 0  # number of indexed rows, duplicates included
+        self._fingerprint: Optional[Fingerprint] = None  # (inode, size, mtime_ns) of the CSV the in-memory index matches
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_file(cls, csv_path: str, key_column: int = 0) -> "CSVOffsetIndex":
+        """Return the process-wide index for the given file and column, creating it on first use."""
+        key = (os.path.abspath(csv_path), key_column)
+        if key not in cls._instances:
+            cls._instances[key] = cls(csv_path, key_column)
+        return cls._instances[key]
+
+    def offsets(self, key: str) -> List[int]:
+        """Return the byte offsets of every row whose key column equals `key`, in file order."""
+        with self._lock:
+            self._refresh()
+            return self._offsets.get(key, [])
+
+    def first(self, key: str) -> Optional[int]:
+        """Return the byte offset of the first row whose key column equals `key`, or None."""
+        offsets = self.offsets(key)
+        return offsets[0] if offsets else None
+
+    def last(self, key: str) -> Optional[int]:
+        """Return the byte offset of the last (most recently appended) row whose key column equals `key`, or None."""
+        offsets = self.offsets(key)
+        return offsets[-1] if offsets else None
+
+    def live(self) -> List[int]:
+        """Return the byte offset of the last row of every key, in file order."""
+        with self._lock:
+            self._refresh()
+            return sorted(offsets[-1] for offsets in self._offsets.values())
+
+    def superseded(self) -> int:
+        """Return the number of rows whose key appears again further down the file."""
+        with self._lock:
+            self._refresh()
+            return self._rows - len(self._offsets)
+
+    def rows(self) -> int:
+        """Return the number of indexed rows."""
+        with self._lock:
+            self._refresh()
+            return self._rows
+
+    def keys(self) -> List[str]:
+        """Return every indexed key."""
+        with self._lock:
+            self._refresh()
+            return list(self._offsets)
+
+    def read_row(self, offset: int) -> List[str]:
+        """Seek to `offset` in the CSV file and parse the single row found there."""
+        with open(self.csv_path, mode="rb") as csv_file:
+            record = read_record(csv_file, offset)
+        METRICS.add("csv_index.read_row", rows_scanned=1, bytes_read=len(record))
+        return parse_record(record)
+
+    def read_key_row(self, key: str) -> Optional[List[str]]:
+        """
+        Return the last (most recently appended) row whose key column equals `key`, or None.
+
+        The row read is checked against the key: if it holds another key, the index was stale (the file
+        changed in a way its fingerprint did not show), so it is rebuilt and the lookup made again.
+        """
+        with self._lock:
+            for _ in range(2):
+                offset = self.last(key)
+                if offset is None:
+                    return None
+                row = self.read_row(offset)
+                if len(row) > self.key_column and row[self.key_column] == key:
+                    return row
+                self.rebuild()
+            return None
+
+    def record_append(self, key: str, offset: int, before: Optional[Fingerprint]) -> None:
+        """Register a single row that was just appended to the CSV file at byte `offset` (see `record_appends`)."""
+        self.record_appends([(key, offset)], before)
+
+    def record_appends(self, entries: List[Tuple[str, int]], before: Optional[Fingerprint]) -> None:
+        """
+        Register rows that were just appended, in order, to the CSV file, given as (key, byte offset) pairs.
+
+        `before` is the (inode, size, mtime_ns) of the file just before the append, taken under the file's
+        lock (see file_lock.GroupCommitWriter). If the index matched exactly that file, it stays current by
+        adding one line per row; otherwise it is left stale and rebuilt on the next lookup. Callers appending
+        concurrently with other writers must hold the file's lock until this returns.
+        """
+        if not entries:
+            return
+        with self._lock:
+            self._record_appends(entries, before)
+
+    def _record_appends(self, entries: List[Tuple[str, int]], before: Optional[Fingerprint]) -> None:
+        fingerprint = self._stat()
+        if before is not None and self._fingerprint == before:
+            for key, offset in entries:
+                self._offsets.setdefault(key, []).append(offset)
+            self._rows += len(entries)
+            self._fingerprint = fingerprint
+        else:
+            self._fingerprint = None  # e.g. a lookup rebuilt the index between the append and this call
+
+        if before is None or fingerprint is None or self._read_header() != before:
+            return  # the file on disk is behind as well; it will be rebuilt on demand
+        try:
+            with open(self.index_path, mode="r+", newline="") as index_file:
+                start = index_file.seek(0, os.SEEK_END)
+                csv.writer(index_file).writerows([offset, key] for key, offset in entries)
+                METRICS.add("csv_index.record_appends", bytes_written=index_file.tell() - start)
+                index_file.seek(0)
+                index_file.write(self._header(fingerprint))
+        except IOError:
+            pass  # a missing or unwritable index only costs a rebuild
+
+    @instrumented("csv_index.rebuild")
+    def rebuild(self) -> None:
+        """Scan the CSV file once, rebuild the in-memory index and persist it next to the file."""
+        with self._lock:
+            fingerprint = self._stat()
+            if fingerprint is None:
+                self._offsets, self._rows, self._fingerprint = {}, 0, None
+                return
+            entries = self._scan(fingerprint[1])  # rows appended after the stat are left to their writer's record_appends
+            self._offsets = {}
+            for offset, key in entries:
+                self._offsets.setdefault(key, []).append(offset)
+            self._rows = len(entries)
+            self._fingerprint = fingerprint
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, mode="w", newline="") as index_file:
+                    index_file.write(self._header(fingerprint))
+                    csv.writer(index_file).writerows(entries)
+                os.replace(tmp_path, self.index_path)  # other processes never load a half-written index
+            except IOError:
+                pass  # keep serving lookups from memory
+
+    def _refresh(self) -> None:
+        """Make sure the in-memory index matches the CSV file, loading or rebuilding it if needed."""
+        fingerprint = self._stat()
+        if fingerprint == self._fingerprint:
+            return
+        if fingerprint is None:  # the CSV file does not exist
+            self._offsets, self._rows, self._fingerprint = {}, 0, None
+            return
+        if self._read_header() == fingerprint:
+            self._load()
+        else:
+            self.rebuild()
+
+    def _load(self) -> None:
+        """Load the persisted index file into memory."""
+        offsets: Dict[str, List[int]] = {}
+        rows = 0
+        with open(self.index_path, mode="r", newline="") as index_file:
+            header = index_file.readline()
+            for offset, key in csv.reader(index_file):
+                offsets.setdefault(key, []).append(int(offset))
+                rows += 1
+            METRICS.add("csv_index.load", rows_scanned=rows, bytes_read=os.fstat(index_file.fileno()).st_size)
+        self._offsets = offsets
+        self._rows = rows
+        inode, size, mtime_ns = header.split()
+        self._fingerprint = (int(inode), int(size), int(mtime_ns))
+
+    def _scan(self, size: Optional[int] = None) -> List[Tuple[int, str]]:
+        """Return (offset, key) for every data row of the CSV file, or of its first `size` bytes."""
+        entries = []
+        offset = 0
+        with open(self.csv_path, mode="rb") as csv_file:
+            header = read_record(csv_file, 0)
+            for offset, record in iter_records(csv_file, len(header), size, partial=True):
+                if record.strip():
+                    if self.key_column == 0 and not record.startswith(b'"'):  # fast path for plain, unquoted keys
+                        key = record.split(b",", 1)[0].decode("utf-8")
+                    else:
+                        key = parse_record(record)[self.key_column]
+                    entries.append((offset, key))
+            METRICS.add("csv_index.scan", rows_scanned=len(entries), bytes_read=csv_file.tell())
+        return entries
+
+    def _header(self, fingerprint: Fingerprint) -> str:
+        inode, size, mtime_ns = fingerprint
+        return self.HEADER_FORMAT.format(inode=inode, size=size, mtime_ns=mtime_ns)
+
+    def _read_header(self) -> Optional[Fingerprint]:
+        """Return the fingerprint stored in the index file, or None if there is no usable index file."""
+        if not exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path, mode="r") as index_file:
+                inode, size, mtime_ns = index_file.readline().split()  # indexes written before the inode was recorded do not unpack
+            return int(inode), int(size), int(mtime_ns)
+        except (IOError, ValueError):
+            return None
+
+    def _stat(self) -> Optional[Fingerprint]:
+        """Return the (inode, size, mtime_ns) fingerprint of the CSV file, or None if it does not exist."""
+        try:
+            return fingerprint_of(os.stat(self.csv_path))
+        except OSError:
+            return None
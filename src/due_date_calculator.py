@@ -1,14 +1,23 @@
-from datetime import datetime, timedelta
-from typing import Union
-import csv
-from os.path import exists
+from array import array
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, Tuple, Union
+
+from console import Console, RecordingConsole
+from metrics import instrumented
+
+if TYPE_CHECKING:  # the storage layer (files, indexes, sqlite3) is only imported once data is actually needed
+    from storage import Storage
+
+# reported when a write-behind session flushes, writes everything else and drops an edit of an entry deleted meanwhile
+STALE_EDIT_ERROR = "Error: An entry you edited no longer exists; that change was not saved."
 
 
 class User:
     """
     This class stores the user's name, the date of their last menstrual period (LMP),
     and the length of their menstrual cycle. It provides methods to set the LMP date,
-    set the period length, save user data to a CSV file, and load user data from a CSV file.
+    set the period length, save user data to storage, and load user data from storage.
 
     Attributes:
     name (str): The name of the user.
@@ -22,14 +31,28 @@ class User:
     set_period_length(period_length: int) -> None:
         Sets the period length for the user.
 
+    save(storage: Storage) -> None:
+        Saves the user's data through the given storage backend.
+
+    load(user_name: str, storage: Storage) -> Union[User, None]:
+        Loads a user's data from the given storage backend. Returns a User object if found, or None if
+        the user is not found or the data cannot be read.
+
     save_to_file(file_name: str = "data/user_data.csv") -> None:
-        Saves the user's data to a CSV file. If the file does not exist, it creates it.
+        Saves the user's data to a CSV file, replacing any profile saved earlier under the same name. If the
+        file does not exist, it creates it.
 
     load_from_file(user_name: str, file_name: str = "data/user_data.csv") -> Union[User, None]:
         Loads a user's data from a CSV file based on the provided user name. Returns a User object
-        if found, or None if the user is not found or the file cannot be read.
+        if found, or None if the user is not found or the file cannot be read. The row is located
+        through a name -> byte offset index kept next to the CSV file (see CSVOffsetIndex).
+
+    User declares __slots__, so it carries no per-instance __dict__; to keep many profiles in memory,
+    use UserTable (user_table.py), which stores them column by column and hands out User objects on demand.
     """
-    
+
+    __slots__ = ("name", "lmp_date", "period_length")
+
     def __init__(self, name: str) -> None :
         self.name = name
         self.lmp_date = None  # Last menstrual period (lmp) date (datetime object)
@@ -41,42 +64,62 @@ class User:
     def set_period_length(self, period_length: int) -> None:
         self.period_length = period_length
 
-    def save_to_file(self, file_name: str = "data/user_data.csv") -> None:
-        """Save user data to a CSV file."""
-        file_exists = exists(file_name)
+    def save(self, storage: "Storage") -> None:
+        """Save user data through a storage backend."""
+        from journal_log import EntryNotFoundError
+        from storage import UserRecord
         try:
-            # append mode, if the file already exists, the new data will be added to the end of the file. If the file doesn't exist, it will be created.
-            # the variable user_file is a file object representing the opened file. 
-            with open(file_name, mode="a", newline="") as user_file:  
-                writer = csv.writer(user_file)  #creates a CSV writer object that is used to write data to the user_file in CSV
-                if not file_exists:
-                    writer.writerow(["Name", "LMP Date", "Period Length"])  # create the header if the specified cvs file does not exist
-                writer.writerow([self.name, self.lmp_date.strftime("%m/%d/%Y"), self.period_length])  #if the specified csv file already exist, add new entry to the file along with the current date info
+            storage.save_user(UserRecord(self.name, self.lmp_date, self.period_length))
         except IOError:
             print("Error: Unable to save user data.")
+        except EntryNotFoundError:  # raised by the flush of a write-behind session, after the profile was saved
+            print(STALE_EDIT_ERROR)
 
     @staticmethod
-    def load_from_file(user_name: str, file_name: str ="data/user_data.csv") -> None:
-        """Load user data from a CSV file if it exists."""
-        if not exists(file_name):
-            return None
-
+    def load(user_name: str, storage: "Storage") -> Optional["User"]:
+        """Load user data from a storage backend if it exists."""
         try:
-            with open(file_name, mode="r") as user_file:
-                reader = csv.DictReader(user_file)  # reads the contents of a CSV file and returns each row as a dictionary. "Name", "LMP date" and "Period Length" are keys and the corresponding input are values.
-                for row in reader:
-                    if row["Name"] == user_name:  # access the value from a dictionary by its key ("Name")
-                        user = User(name=user_name)  # creating a new instance (or object) of the User class and assigning it to the variable user.
-                        user.set_lmp_date(datetime.strptime(row["LMP Date"], "%m/%d/%Y"))  # accesses the value of last menstruation period (lmp) from the row dictionary using key "LMP date"
-                        user.set_period_length(int(row["Period Length"]))  # access the value of period length from the row dictionary using key "Period Length"
-                        return user
+            record = storage.load_user(user_name)
         except IOError:
             print("Error: Unable to load user data.")
-        return None
+            return None
+        if record is None:
+            return None
+        user = User(name=record.name)  # creating a new instance (or object) of the User class and assigning it to the variable user.
+        user.set_lmp_date(record.lmp_date)
+        user.set_period_length(record.period_length)
+        return user
+
+    def save_to_file(self, file_name: str = "data/user_data.csv") -> None:
+        """Save user data to a CSV file."""
+        from storage import CSVStorage
+        self.save(CSVStorage(user_file=file_name))
+
+    @staticmethod
+    def load_from_file(user_name: str, file_name: str ="data/user_data.csv") -> Optional["User"]:
+        """Load user data from a CSV file if it exists."""
+        from storage import CSVStorage
+        return User.load(user_name, CSVStorage(user_file=file_name))
 
 
 class DateValidator:
-    """Class to handle date validation and parsing."""
+    """
+    Class to handle date validation and parsing.
+
+    Besides `validate_date`, which checks one date string and returns either a datetime or a user-facing
+    message, `validate_dates` checks many strings at once: each date is parsed once without `strptime`,
+    the 280-day window is computed once for the whole batch, and every result is a compact code
+    (see the VALID, INVALID_* and OUT_OF_RANGE constants) that `error_message` turns back into the
+    user-facing message when needed.
+    """
+    VALID = 0
+    INVALID_FORMAT = 1
+    INVALID_MONTH = 2
+    INVALID_DAY = 3
+    OUT_OF_RANGE = 4
+
+    DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)  # index 0 is unused so months map directly
+
     @staticmethod
     def is_valid_day_in_month(month: int, day: int, year: int) -> bool:
         """
@@ -90,14 +133,34 @@ class DateValidator:
         Returns:
             bool: True if the day is a valid day in the specified month and year, False otherwise.
         """
-        days_in_month = {
-            1: 31, 2: 29 if (year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)) else 28,
-            3: 31, 4: 30, 5: 31, 6: 30, 7: 31, 8: 31, 9: 30, 10: 31, 11: 30, 12: 31
-        }
-        return 1 <= day <= days_in_month.get(month, 0)  # if the month number does not exist, get 0 instead of raising error
+        if not 1 <= month <= 12:  # if the month number does not exist, no day is valid instead of raising error
+            return False
+        if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+            return 1 <= day <= 29  # February 29th only exists in leap years
+        return 1 <= day <= DateValidator.DAYS_IN_MONTH[month]
+
+    @staticmethod
+    def date_window(now: Optional[datetime] = None) -> Tuple[int, int]:
+        """
+        Computes the range of valid Last Menstrual Period (LMP) dates as day ordinals (see `date.toordinal`).
+
+        A date is valid if it falls between 280 days before `now` and `now` itself, the same rule as `is_valid_date_range`.
+
+        Args:
+            now (datetime, optional): The current date and time. Defaults to datetime.now().
+
+        Returns:
+            Tuple[int, int]: The ordinals of the earliest and the latest valid LMP date.
+        """
+        now = now or datetime.now()
+        start_date = now - timedelta(days=280)
+        first = start_date.toordinal()
+        if start_date.time() != time.min:  # midnight of that day is earlier than start_date, so the day itself is out of range
+            first += 1
+        return first, now.toordinal()
 
     @staticmethod
-    def is_valid_date_range(date: datetime) -> bool:
+    def is_valid_date_range(date: datetime, now: Optional[datetime] = None) -> bool:
         """
         Checks if the given date is within a valid range for a Last Menstrual Period (LMP) date.
 
@@ -106,42 +169,119 @@ class DateValidator:
 
         Args:
             date (datetime): The LMP date to check.
+            now (datetime, optional): The current date and time. Defaults to datetime.now().
 
         Returns:
             bool: True if the given date is within the valid range, False otherwise.
         """
-        start_date = datetime.now() - timedelta(days=280)  # the earliest last menstruation date allowed by the program
-        current_date = datetime.now()  # getting the current date as a datetime object
+        current_date = now or datetime.now()  # getting the current date as a datetime object, only once
+        start_date = current_date - timedelta(days=280)  # the earliest last menstruation date allowed by the program
         return start_date <= date <= current_date  # the input lmp date must be between the two date limits to make sense
 
     @staticmethod
-    def validate_date(date_str: str) -> Union[datetime, str]:
+    def parse_date(date_str: str, first: int, last: int) -> Tuple[int, int]:
+        """
+        Parses and checks a date string in the format 'MM/DD/YYYY' without `strptime`.
+
+        Accepts and rejects exactly the same strings as `validate_date`.
+
+        Args:
+            date_str (str): A string representing the date in 'MM/DD/YYYY' format.
+            first (int): The ordinal of the earliest valid date, from `date_window`.
+            last (int): The ordinal of the latest valid date, from `date_window`.
+
+        Returns:
+            Tuple[int, int]: The result code, and the ordinal of the date (0 unless the code is VALID or OUT_OF_RANGE).
+        """
+        parts = date_str.split("/")
+        if len(parts) != 3:
+            return DateValidator.INVALID_FORMAT, 0
+        month_str, day_str, year_str = parts
+        try:
+            month, day, year = int(month_str), int(day_str), int(year_str)
+        except ValueError:
+            return DateValidator.INVALID_FORMAT, 0
+        if month < 1 or month > 12:
+            return DateValidator.INVALID_MONTH, 0
+        if not DateValidator.is_valid_day_in_month(month, day, year):
+            return DateValidator.INVALID_DAY, 0
+        # int() is more lenient than the 'MM/DD/YYYY' format: reject signs, spaces, underscores and wrong widths like strptime does
+        if not (len(month_str) <= 2 and month_str.isascii() and month_str.isdigit()
+                and len(day_str) <= 2 and day_str.isascii() and (day_str.isdigit() or day_str[0] == " " and day_str[1:].isdigit())
+                and len(year_str) == 4 and year_str.isdigit() and year >= 1):
+            return DateValidator.INVALID_FORMAT, 0
+        ordinal = date(year, month, day).toordinal()
+        if not first <= ordinal <= last:
+            return DateValidator.OUT_OF_RANGE, ordinal
+        return DateValidator.VALID, ordinal
+
+    @staticmethod
+    @instrumented("calculator.validate_dates")
+    def validate_dates(date_strs: Iterable[str], now: Optional[datetime] = None) -> Tuple[array, array]:
+        """
+        Validates many date strings in the format 'MM/DD/YYYY' against one shared 280-day window.
+
+        Args:
+            date_strs (Iterable[str]): The date strings to validate.
+            now (datetime, optional): The current date and time for the whole batch. Defaults to datetime.now(), read once.
+
+        Returns:
+            Tuple[array, array]: The result code of each string (array of signed chars) and the day ordinal of each
+            valid date (array of ints, 0 for invalid dates).
+        """
+        first, last = DateValidator.date_window(now)
+        codes, ordinals = array("b"), array("i")
+        parse = DateValidator.parse_date
+        for date_str in date_strs:
+            code, ordinal = parse(date_str, first, last)
+            codes.append(code)
+            ordinals.append(ordinal if code == DateValidator.VALID else 0)
+        return codes, ordinals
+
+    @staticmethod
+    def error_message(code: int, date_str: str, now: Optional[datetime] = None) -> str:
+        """
+        Returns the user-facing message of a result code from `parse_date` or `validate_dates`.
+
+        Args:
+            code (int): The result code. Must not be VALID.
+            date_str (str): The date string the code was computed for.
+            now (datetime, optional): The current date and time used for validation. Defaults to datetime.now().
+
+        Returns:
+            str: The same error message `validate_date` returns for that string.
+        """
+        if code == DateValidator.INVALID_MONTH:
+            return "Invalid month. Month must be between 01 and 12."
+        if code == DateValidator.INVALID_DAY:
+            month, day, year = map(int, date_str.split("/"))
+            return f"The date you entered is not valid: {month:02}/{day:02}/{year}. Please double-check and try again."
+        if code == DateValidator.OUT_OF_RANGE:
+            # If the date entered in invalid, give the valid date range suggestion, which is between today's date and the date 280 days before today)
+            current_date = now or datetime.now()
+            start_date = (current_date - timedelta(days=280)).strftime("%m/%d/%Y")
+            return f"Invalid date range. Please enter a date between {start_date} and today's date ({current_date.strftime('%m/%d/%Y')})."
+        return "Invalid date format. Please use 'MM/DD/YYYY', and only numbers 0-9."  # for any input that is not in the format of MM/DD/YYYY with MM DD YYYY only being decimal digits
+
+    @staticmethod
+    def validate_date(date_str: str, now: Optional[datetime] = None) -> Union[datetime, str]:
         """
         Validates a date string in the format 'MM/DD/YYYY'.
 
         Args:
             date_str (str): A string representing the date in 'MM/DD/YYYY' format.
+            now (datetime, optional): The current date and time. Defaults to datetime.now(), read once.
 
         Returns:
             Union[datetime, str]: 
                 - If the date is valid, returns a `datetime` object representing the input date.
                 - If the date is invalid, returns an error message as a string indicating the corresponding issue.
         """
-        try:
-            month, day, year = map(int, date_str.split("/"))  # # Split the date string (format: 'MM/DD/YYYY') by '/' and convert each part to an integer (month, day, year)
-            if month < 1 or month > 12:
-                return "Invalid month. Month must be between 01 and 12."
-            if not DateValidator.is_valid_day_in_month(month, day, year):
-                return f"The date you entered is not valid: {month:02}/{day:02}/{year}. Please double-check and try again."
-            date = datetime.strptime(date_str, '%m/%d/%Y')
-            if not DateValidator.is_valid_date_range(date):
-                start_date = (datetime.now() - timedelta(days=280)).strftime("%m/%d/%Y")
-                current_date = datetime.now().strftime("%m/%d/%Y")
-                return f"Invalid date range. Please enter a date between {start_date} and today's date ({current_date})."
-            # If the date entered in invalid, give the valid date range suggestion, which is between today's date and the date 280 days before today)
-            return date
-        except ValueError:  # for any input that is not in the format of MM/DD/YYYY with MM DD YYYY only being decimal digits
-            return "Invalid date format. Please use 'MM/DD/YYYY', and only numbers 0-9."
+        now = now or datetime.now()
+        code, ordinal = DateValidator.parse_date(date_str, *DateValidator.date_window(now))
+        if code != DateValidator.VALID:
+            return DateValidator.error_message(code, date_str, now)
+        return datetime.fromordinal(ordinal)
         
 
 class DueDateCalculator:
@@ -159,6 +299,7 @@ class DueDateCalculator:
         self.lmp_date = lmp_date
         self.period_length = period_length
 
+    @instrumented("calculator.calculate_due_date")
     def calculate_due_date(self) -> datetime:
         """
         The estimated due date is calculated by adjusting the LMP date based on the difference between the user's period length and the default 28-day cycle. 
@@ -170,15 +311,19 @@ class DueDateCalculator:
         adjusted_lmp = self.lmp_date + timedelta(days=(self.period_length - 28))
         return adjusted_lmp + timedelta(days=280)
 
-    def calculate_current_progress(self) -> tuple:
+    @instrumented("calculator.calculate_current_progress")
+    def calculate_current_progress(self, now: Optional[datetime] = None) -> tuple:
         """
         Calculates the current progress in pregnancy, in terms of weeks and days, based on the LMP and period length.
 
+        Args:
+            now (datetime, optional): The current date and time. Defaults to datetime.now().
+
         Returns:
             tuple: A tuple containing the number of weeks and days of pregnancy.
         """
         adjusted_lmp = self.lmp_date + timedelta(days=(self.period_length - 28))  # Adjusted LMP date
-        total_days_pregnant = (datetime.now() - adjusted_lmp).days
+        total_days_pregnant = ((now or datetime.now()) - adjusted_lmp).days
         weeks = total_days_pregnant // 7
         days = total_days_pregnant % 7
         return weeks, days  # weeks and days are returned as a tuple
@@ -186,26 +331,102 @@ class DueDateCalculator:
 
 class DueDatePredictor:
     """Class to run the program and get the predicted due date with user input."""
-    def __init__(self) -> None:
+    def __init__(self, storage: Optional["Storage"] = None, data_dir: str = "data", write_behind: bool = True,
+                 flush_interval: Optional[float] = None, console: Optional[Console] = None) -> None:
         """
         Initializes the DueDatePredictor class.
 
+        Construction only wires dependencies: it prints nothing, reads no input and touches no file, so an
+        instance can be created ahead of time (or reused) at no cost. The storage backend is opened on first
+        use, and the session (greeting, name prompt, profile lookup) starts in `start_session`, which `run`
+        calls if needed.
+
+        Args:
+            storage (Storage, optional): Where profiles, milestone info and journal entries are kept.
+                Defaults to the CSV files in `data_dir`, opened on first use.
+            data_dir (str, optional): The directory of the CSV data files used when no storage is given. Defaults to 'data'.
+            write_behind (bool, optional): Buffer the profile and journal changes of a `run` in memory and write them
+                in one batch when it ends (see session.py), instead of writing each change straight away. Defaults to True.
+            flush_interval (float, optional): With write-behind, also write the buffered changes after a change once this
+                many seconds have passed since the last write. Defaults to None (only when the run ends).
+            console (Console, optional): Where prompts are answered and messages written (see console.py). Defaults to the terminal.
+
+        Attributes:
+            - self.storage (Storage): The storage backend every read and write goes through.
+            - self.console (Console): Every prompt and message of the program goes through it.
+            - self.user (User): The user's profile loaded from storage or created for new users; None until the session starts.
+            - self.is_new_user (bool): A flag indicating whether the user is new (True) or returning (False); None until the session starts.
+        """
+        self._storage = storage
+        self.data_dir = data_dir
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.console = console or Console()
+        self.user: Optional[User] = None
+        self.is_new_user: Optional[bool] = None
+
+    @property
+    def storage(self) -> "Storage":
+        """The storage backend, created on first access when none was injected (sharded if the data directory is)."""
+        if self._storage is None:
+            from sharding import ShardedCSVStorage
+            from storage import CSVStorage
+            if ShardedCSVStorage.recorded_shards(self.data_dir) is not None:
+                self._storage = ShardedCSVStorage(self.data_dir)
+            else:
+                self._storage = CSVStorage(self.data_dir)
+        return self._storage
+
+    @storage.setter
+    def storage(self, storage: "Storage") -> None:
+        self._storage = storage
+
+    @contextmanager
+    def buffered(self) -> Iterator[None]:
+        """
+        Buffer the profile and journal changes made inside the block in a Session, and write them in one batch when it ends.
+
+        Reads inside the block see the buffered changes. Does nothing if write-behind is disabled or a session is already active.
+        """
+        from session import Session
+        if not self.write_behind or isinstance(self.storage, Session):
+            yield
+            return
+        session = Session(self.storage, self.flush_interval)
+        self.storage = session
+        try:
+            yield
+        finally:
+            self.storage = session.storage
+            from journal_log import EntryNotFoundError
+            try:
+                session.flush()
+            except IOError:
+                self.console.print("Error: Unable to save your changes.")
+            except EntryNotFoundError:  # the rest of the changes were saved
+                self.console.print(STALE_EDIT_ERROR)
+
+    def start_session(self, user_name: Optional[str] = None) -> None:
+        """
+        Starts a session for a user.
+
             - Greets the user with an opening message.
-            - Prompts the user to enter their name.
+            - Prompts the user to enter their name, unless `user_name` is given.
             - Attempts to load an existing user profile using the provided name.
             - Sets the `is_new_user` flag to `True` if no existing user data is found, otherwise `False`.
             - If the user is new, guides them to set up their profile by creating a new User object with the entered name.
 
-        Attributes:
-            - self.user (User): The user's profile loaded from file or created for new users.
-            - self.is_new_user (bool): A flag indicating whether the user is new (True) or returning (False).
+        Args:
+            user_name (str, optional): The user to start the session for. Prompted for if omitted.
         """
-        print("Welcome to BabyLand - A Comprehensive Toolbox for Your Pregnancy Journey!")  # opening greeting
-        user_name = input("Please enter your name: ").strip()
-        self.user = User.load_from_file(user_name)  # load user data from file if already exists
+        self.console.print("Welcome to BabyLand - A Comprehensive Toolbox for Your Pregnancy Journey!")  # opening greeting
+        if user_name is None:
+            user_name = self.console.input("Please enter your name: ")
+        user_name = user_name.strip()
+        self.user = User.load(user_name, self.storage)  # load user data from storage if already exists
         self.is_new_user = self.user is None  # Flag to determine if user is new. True If self.user does not exist; false if otherwise
         if self.is_new_user:
-            print("No previous data found. Let's set up your profile.")
+            self.console.print("No previous data found. Let's set up your profile.")
             self.user = User(name=user_name)  # create a new User object for the new user
 
 
@@ -215,6 +436,7 @@ class DueDatePredictor:
         
         Steps:
             
+            - Starts the session (greeting, name prompt, profile lookup) if `start_session` was not called yet.
             - Collects user data if LMP date is missing.
             - Terminates if the user exits during data collection.
             - Calculates the due date and pregnancy progress.
@@ -225,27 +447,30 @@ class DueDatePredictor:
             - self.user (User): object under class User to represent the user's profile containing LMP date and other details.
             - self.is_new_user (bool): A flag indicating if the user is new (True) or returning (False).
         """
+        with self.buffered():  # the whole session's profile and journal changes are written in one batch at the end
+            if self.user is None:  # nothing is prompted for or loaded before the program actually runs
+                self.start_session()
 
-        if not self.user.lmp_date:  # if user does not already exist, then collect user data by running method collect_user_data()
-            self.collect_user_data()
+            if not self.user.lmp_date:  # if user does not already exist, then collect user data by running method collect_user_data()
+                self.collect_user_data()
 
-        # If the user exited during data collection, terminate the program
-        if not self.user.lmp_date:
-            return
+            # If the user exited during data collection, terminate the program
+            if not self.user.lmp_date:
+                return
 
-        calculator = DueDateCalculator(self.user.lmp_date, self.user.period_length)  # calculate due date based on user lmp date and period length input
-        due_date = calculator.calculate_due_date()  
-        weeks, days = calculator.calculate_current_progress()
+            calculator = DueDateCalculator(self.user.lmp_date, self.user.period_length)  # calculate due date based on user lmp date and period length input
+            due_date = calculator.calculate_due_date()  
+            weeks, days = calculator.calculate_current_progress()
 
         
-        if self.is_new_user:  # Use the is_new_user flag to determine the message
-            print(f"\nWelcome, {self.user.name}!")  # greeting for new user
-        else:
-            print(f"\nWelcome back, {self.user.name}!")  # greeting for returning user
+            if self.is_new_user:  # Use the is_new_user flag to determine the message
+                self.console.print(f"\nWelcome, {self.user.name}!")  # greeting for new user
+            else:
+                self.console.print(f"\nWelcome back, {self.user.name}!")  # greeting for returning user
 
-        print(f"Congratulations ! You are currently {weeks} weeks and {days} days pregnant.")
-        print(f"Your baby's estimated due date is: {due_date.strftime('%m/%d/%Y')}")
-        self.display_options(weeks)
+            self.console.print(f"Congratulations ! You are currently {weeks} weeks and {days} days pregnant.")
+            self.console.print(f"Your baby's estimated due date is: {due_date.strftime('%m/%d/%Y')}")
+            self.display_options(weeks)
 
 
     def collect_user_data(self) -> None:
@@ -263,9 +488,9 @@ class DueDatePredictor:
             - self.user.period_length (int): The user's menstrual cycle length in days.
         """
         while True:
-            lmp_date_str = input("Please enter the first day of your last menstrual period (MM/DD/YYYY), or type 'exit' to quit: ")
+            lmp_date_str = self.console.input("Please enter the first day of your last menstrual period (MM/DD/YYYY), or type 'exit' to quit: ")
             if lmp_date_str.lower() == 'exit':  # if input is "exit"
-                print("Thank you for using BabyLand. Goodbye!")
+                self.console.print("Thank you for using BabyLand. Goodbye!")
                 return  # Exit immediately without saving the lmp info, also automatically breaks the while loop
 
             validation_result = DateValidator.validate_date(lmp_date_str)
@@ -273,30 +498,30 @@ class DueDatePredictor:
                 self.user.set_lmp_date(validation_result)  # if the user input of lmp date is valid, program takes the input
                 break  # exit the while loop
             else:
-                print(validation_result)  # if the user input of lmp date is invalid, bounce back to the beginning of the loop to ask user input one more time
+                self.console.print(validation_result)  # if the user input of lmp date is invalid, bounce back to the beginning of the loop to ask user input one more time
 
         while True:
-            period_length_str = input("Please enter your normal menstrual cycle length in days (default is 28), or type 'exit' to quit: ")
+            period_length_str = self.console.input("Please enter your normal menstrual cycle length in days (default is 28), or type 'exit' to quit: ")
             if period_length_str.lower() == 'exit':  # if input is "exit"
-                print("Thank you for using BabyLand. Goodbye!")
+                self.console.print("Thank you for using BabyLand. Goodbye!")
                 self.user.lmp_date = None  # Reset LMP date to avoid saving incomplete data ( need both valid lmp date and period length to store user info)
                 return  # Exit immediately without saving period length, also automatically breaks the while loop
 
             if period_length_str.strip() == "":  # If the user presses Enter without input
                 self.user.set_period_length(28)  # Use the default value
-                self.user.save_to_file()  # utilize the method save_to_file under class User to save the period length info
+                self.user.save(self.storage)  # utilize the method save under class User to save the period length info
                 break
 
             try:
                 period_length = int(period_length_str)  # convert the type of input from str to int
                 if 20 <= period_length <= 45:  # check if the period length is within the set range
                     self.user.set_period_length(period_length)  # set the period length to user input 
-                    self.user.save_to_file()
+                    self.user.save(self.storage)
                     break
                 else:
-                    print("Invalid period length. Please enter a value between 20 and 45.")  # print the error message, then return to the beginning of the while loop to ask user input again
+                    self.console.print("Invalid period length. Please enter a value between 20 and 45.")  # print the error message, then return to the beginning of the while loop to ask user input again
             except ValueError:
-                print("Invalid input. Please enter a valid integer value.")
+                self.console.print("Invalid input. Please enter a valid integer value.")
 
 
     def display_options(self, current_week : int) -> None:
@@ -306,21 +531,23 @@ class DueDatePredictor:
         Prompts the user to select an option to:
             - View pregnancy milestones, medical info, or journal entries.
             - Add, modify, or delete journal entries.
+            - Search journal entries.
             - Exit the program.
 
         Args:
             current_week (int): The current week of pregnancy to display relevant information.
         """
         while True:
-            print("\nOptions:")
-            print("1: Display pregnancy milestone info corresponding to the week.")
-            print("2: Display weekly medical info corresponding to the week.")
-            print("3: Display current journal entries.")
-            print("4: Add a new journal entry.")
-            print("5: Modify an existing journal entry.")
-            print("6: Delete a journal entry.")
-            print("7: Exit.")
-            choice = input("Please select an option (1-7): ")
+            self.console.print("\nOptions:")
+            self.console.print("1: Display pregnancy milestone info corresponding to the week.")
+            self.console.print("2: Display weekly medical info corresponding to the week.")
+            self.console.print("3: Display current journal entries.")
+            self.console.print("4: Add a new journal entry.")
+            self.console.print("5: Modify an existing journal entry.")
+            self.console.print("6: Delete a journal entry.")
+            self.console.print("7: Search journal entries.")
+            self.console.print("8: Exit.")
+            choice = self.console.input("Please select an option (1-8): ")
             if choice == "1":
                 self.display_milestone_info(current_week)
             elif choice == "2":
@@ -334,93 +561,133 @@ class DueDatePredictor:
             elif choice == "6":
                 self.delete_journal_entry()
             elif choice == "7":
-                print("Thank you for using BabyLand! Take care.")
+                self.search_journal_entries()
+            elif choice == "8":
+                self.console.print("Thank you for using BabyLand! Take care.")
                 break
             else:
-                print("Invalid choice. Please try again.")
+                self.console.print("Invalid choice. Please try again.")
 
 
     def display_milestone_info(self, week : int) -> None:
         """
         Displays the pregnancy milestone for the given week.
 
-        Searches the 'milestone_medical_info.csv' file for the milestone corresponding to the specified week to display.
+        Looks up the milestone corresponding to the specified week through the storage backend (with the CSV
+        backend, a shared, week-indexed copy of 'milestone_medical_info.csv' that is only re-read when the file changes).
         If the file is missing or no data is found for the week, a corresponding error message is displayed.
 
         Args:
             week (int): The week of pregnancy for which to display milestone information.
         """
-        file = "data/milestone_medical_info.csv"  # specify the relative file path
-        if not exists(file):
-            print("Data file not found.")
+        if not self.storage.has_milestones():
+            self.console.print("Data file not found.")
             return
 
-        with open(file, mode="r") as csv_file:
-            reader = csv.DictReader(csv_file)
-            for row in reader:
-                if int(row["Week"]) == week:  # find corresponding week information
-                    print(f"Week {row['Week']}: {row['Milestone']}")  # print values associated with keys "Week" and "Milestone"
-                    return
-            print(f"No milestone info found for week {week}.")  # output if no info stored in the csv file for a specific week
+        info = self.storage.week_info(week)  # find corresponding week information
+        if info is None:
+            self.console.print(f"No milestone info found for week {week}.")  # output if no info stored in the csv file for a specific week
+            return
+        self.console.print(f"Week {info.week}: {info.milestone}")
 
     def display_medical_info(self, week: int) -> None:
         """Display weekly medical information for the given week.
 
-        Searches the 'milestone_medical_info.csv' file for the medical info corresponding to the specified week to display.
+        Looks up the medical info corresponding to the specified week through the storage backend (with the CSV
+        backend, a shared, week-indexed copy of 'milestone_medical_info.csv' that is only re-read when the file changes).
         If the file is missing or no data is found for the week, a corresponding error message is displayed.
 
         Args:
             week (int): The week of pregnancy for which to display milestone information.
         """
-        file = "data/milestone_medical_info.csv"  # specify the relative file path
-        if not exists(file):
-            print("Data file not found.")
+        if not self.storage.has_milestones():
+            self.console.print("Data file not found.")
             return
 
-        with open(file, mode="r") as csv_file:
-            reader = csv.DictReader(csv_file)
-            for row in reader:  # find corresponding week information
-                if int(row["Week"]) == week:
-                    print(f"Week {row['Week']}: {row['Medical_Info']}") # print values associated with keys "Week" and "Milestone"
-                    return
-            print(f"No medical info found for week {week}.")  # output if no info stored in the csv file for a specific week
+        info = self.storage.week_info(week)  # find corresponding week information
+        if info is None:
+            self.console.print(f"No medical info found for week {week}.")  # output if no info stored in the csv file for a specific week
+            return
+        self.console.print(f"Week {info.week}: {info.medical_info}")
 
 
-    def display_journal_entries(self) -> None:
+    def display_journal_entries(self, page_size: int = 20) -> None:
         """
         Display current journal entries specific to the logged-in user.
+
+        Args:
+            page_size (int, optional): How many entries are read from the journal at a time. Defaults to 20.
         
         Attributes:
         self.user.name (str): The name of the currently logged-in user, used to filter entries.
         """
-        journal_file = "data/pregnancy_journal.csv"  # define the relative file path
-
-        if not exists(journal_file):
-            print("\nNo journal entries found.")
+        if not self.storage.has_journal():
+            self.console.print("\nNo journal entries found.")
             return
 
-        print(f"\nJournal entries for {self.user.name}:")
+        self.console.print(f"\nJournal entries for {self.user.name}:")
         try:
-            with open(journal_file, mode="r") as journal:
-                reader = csv.DictReader(journal)
-                
-                # Check if "Name" column exists in the header
-                if "Name" not in reader.fieldnames:
-                    print("Error: The journal file is missing the 'Name' column in its header.")
-                    return
-
-                entries = [row for row in reader if row["Name"] == self.user.name]
+            # live entries of this user, with modifications and deletions applied, read one page at a time through the per-user index
+            entries, cursor = self.storage.journal_page(self.user.name, page_size=page_size, newest_first=False)
 
             # If there are no entries for the current user
             if not entries:
-                print("\nNo journal entries found for your profile.")
-            else:
-                for idx, row in enumerate(entries, start=1):  # by default the enumerate function index starts with 0, but here we specify it starts from 1 instead
-                    print(f"{idx}. {row['Date']} - {row['Entry']}")  # define the format in which the journal entries are displayed
+                self.console.print("\nNo journal entries found for your profile.")
+            idx = 0
+            while entries:
+                for entry in entries:
+                    idx += 1
+                    self.console.print(f"{idx}. {entry.date} - {entry.text}")  # define the format in which the journal entries are displayed
+                if cursor is None:
+                    break
+                entries, cursor = self.storage.journal_page(self.user.name, page_size=page_size, cursor=cursor, newest_first=False)
+        except IOError:
+            self.console.print("Error: Unable to read the journal file.")
+        except KeyError as e:
+            self.console.print(f"Error: Missing expected column in the file: {e}")
+
+
+    def search_journal_entries(self, page_size: int = 10) -> None:
+        """
+        Search the journal entries of the logged-in user and display the best matches first.
+
+        Every search word must appear in an entry; a word ending with '*' matches any word starting with it
+        (e.g. 'kick*' finds 'kicks' and 'kicking'). Results are shown a page at a time.
+
+        Args:
+            page_size (int, optional): How many results are shown at a time. Defaults to 10.
+
+        Attributes:
+        self.user.name (str): The name of the currently logged-in user, whose entries are searched.
+        """
+        if not self.storage.has_journal():
+            self.console.print("\nNo journal entries found.")
+            return
+
+        query = self.console.input("\nEnter the words to search for (or type 'exit' to cancel):\n> ")
+        if query.lower() == 'exit':
+            self.console.print("Search canceled.")
+            return
+
+        try:
+            entries, cursor = self.storage.search_journal(self.user.name, query, page_size=page_size)
+            if not entries:
+                self.console.print("\nNo journal entries match your search.")
+                return
+            idx = 0
+            while True:
+                for entry in entries:
+                    idx += 1
+                    self.console.print(f"{idx}. {entry.date} - {entry.text}")
+                if cursor is None:
+                    break
+                if self.console.input("Show more results? (y/n): ").strip().lower() != "y":
+                    break
+                entries, cursor = self.storage.search_journal(self.user.name, query, page_size=page_size, cursor=cursor)
         except IOError:
-            print("Error: Unable to read the journal file.")
+            self.console.print("Error: Unable to search the journal.")
         except KeyError as e:
-            print(f"Error: Missing expected column in the file: {e}")
+            self.console.print(f"Error: Missing expected column in the file: {e}")
 
 
     def add_journal_entry(self) -> None:
@@ -431,28 +698,21 @@ class DueDatePredictor:
         Attributes:
         self.user.name (str): The name of the logged-in user.
         """
-        journal_file = "data/pregnancy_journal.csv"  # define the relative file path
-
-        # Check if the file exists
-        file_exists = exists(journal_file)
-
         # Write a new entry
-        new_entry = input("\nWrite a new entry below (or type 'exit' to cancel):\n> ")
+        new_entry = self.console.input("\nWrite a new entry below (or type 'exit' to cancel):\n> ")
         if new_entry.lower() == 'exit':  #if input is "exit"
-            print("Entry creation canceled.")
+            self.console.print("Entry creation canceled.")
             return  # Exit the method
 
+        from journal_log import EntryNotFoundError
         try:
-            # append mode, if the file already exists, the new data will be added to the end of the file. If the file doesn't exist, it will be created. 
-            # The variable journal is the file object representing the opened file.
-            with open(journal_file, mode="a", newline="") as journal:  
-                writer = csv.writer(journal)  #creates a CSV writer object that is used to write data to the journal in CSV
-                if not file_exists:
-                    writer.writerow(["Name", "Date", "Entry"])  # create the header if the specified cvs file does not exist
-                writer.writerow([self.user.name, datetime.now().strftime("%m/%d/%Y"), new_entry]) # if the specified csv file already exist, add new entry to the file along with the current date info
-                print("Entry saved!")
+            self.storage.add_journal_entry(self.user.name, datetime.now().strftime("%m/%d/%Y"), new_entry)  # with the CSV backend, appended to the end of the journal file, which is created with its header if it doesn't exist
+            self.console.print("Entry saved!")
         except IOError:
-            print("Error: Unable to save the journal entry.")
+            self.console.print("Error: Unable to save the journal entry.")
+        except EntryNotFoundError:  # raised by the flush of a write-behind session, which saved the new entry and dropped an earlier edit
+            self.console.print("Entry saved!")
+            self.console.print(STALE_EDIT_ERROR)
 
 
     def modify_journal_entry(self) -> None:
@@ -460,62 +720,48 @@ class DueDatePredictor:
         Modify an existing journal entry.
         
         If the user types 'exit', the operation is canceled. If the journal entry does not exist, it will exit the method and prompt user to start the option menu all over again. 
-        If the journal entry does exist, modification will overwrite the original entry. 
+        If the journal entry does exist, the new text replaces the original entry in storage.
 
         Attributes:
         self.user.name (str): The name of the logged-in user.
         """
-        journal_file = "data/pregnancy_journal.csv"  # define the relative file path
-
-        if not exists(journal_file):
-            print("\nNo journal entries found.")
-            return
-
-        # Display current entries
-        with open(journal_file, mode="r") as journal:
-            reader = csv.reader(journal)  # Create a CSV reader object to read the content of the journal file
-            entries = list(reader)  # Convert the CSV reader object into a list of rows (entries)
-
-        if len(entries) <= 1:  # if the file is empty or only contain header row
-            print("\nNo journal entries found.")
+        if not self.storage.has_journal():
+            self.console.print("\nNo journal entries found.")
             return
 
         # Filter entries for the current user
-        user_entries = [row for row in entries[1:] if row[0] == self.user.name]  # slices the entries list, excluding the first element (index 0), which is excluding the header row
+        user_entries = self.storage.journal_entries(self.user.name)
 
         # handle situation when there is no user entried found
         if not user_entries:  
-            print("\nNo journal entries found for your profile.")
+            self.console.print("\nNo journal entries found for your profile.")
             return
 
         # For user journal entries found, display them
-        print("\nCurrent journal entries:")
-        for idx, row in enumerate(user_entries, start=1):
-            print(f"{idx}. {row[1]} - {row[2]}")  # Assuming columns: Name, Date, Entry. row[1] represents Date and row[2] represents Entry
+        self.console.print("\nCurrent journal entries:")
+        for idx, entry in enumerate(user_entries, start=1):
+            self.console.print(f"{idx}. {entry.date} - {entry.text}")
 
         try:
-            entry_num = input("\nEnter the number of the entry you want to modify (or type 'exit' to cancel): ")
+            entry_num = self.console.input("\nEnter the number of the entry you want to modify (or type 'exit' to cancel): ")
             if entry_num.lower() == 'exit':  #if user put in "exit" then program end without modifying any journal entries
-                print("Modification canceled.")  
+                self.console.print("Modification canceled.")  
                 return  # Exit the method
             
             entry_num = int(entry_num)
             if 1 <= entry_num <= len(user_entries):
-                new_text = input("Enter the new text for the entry (or type 'exit' to cancel):\n> ")
+                new_text = self.console.input("Enter the new text for the entry (or type 'exit' to cancel):\n> ")
                 if new_text.lower() == 'exit':  # handle the case where the input is "exit"
-                    print("Modification canceled.")
+                    self.console.print("Modification canceled.")
                     return  # Exit the method
                 
-                user_entries[entry_num - 1][2] = new_text  # Update the entry text. user_entries[entry_num - 1][2] allow access to the 3rd column in the csv file of the selected entry number, which is the corresponding journal entry. 
-                # Write the modified entries back to the file
-                with open(journal_file, mode="w", newline="") as journal:
-                    writer = csv.writer(journal)  # Creates a csv.writer object, which is used to write rows of data to the journal file in CSV format.
-                    writer.writerows(entries)  # write back all rows, including the updated one, to the file.
-                print("Entry updated!")
+                if not self._edit_journal(self.storage.modify_journal_entry, user_entries[entry_num - 1].entry_id, new_text):  # with the CSV backend, appended to the edit log instead of rewriting the whole file
+                    return
+                self.console.print("Entry updated!")
             else:
-                print("Invalid entry number. Please try again from the menu below.")
+                self.console.print("Invalid entry number. Please try again from the menu below.")
         except ValueError:
-            print("Invalid input. Please enter a number.")
+            self.console.print("Invalid input. Please enter a number.")
 
 
     def delete_journal_entry(self) -> None:
@@ -523,67 +769,89 @@ class DueDatePredictor:
         Allow the user to delete a journal entry by number.
         
         If the user types 'exit', the operation is canceled. If the journal entry does not exist, it will exit the method and prompt user to start the option menu all over again. 
-        If the journal entry does exist, the original entry will be removed from the journal file. 
+        If the journal entry does exist, the original entry will be removed from storage.
 
         Attributes:
         self.user.name (str): The name of the logged-in user.
         """
-        journal_file = "data/pregnancy_journal.csv"  # define the relative file path
-        
-        if not exists(journal_file):
-            print("\nNo journal entries found.")
-            return
-
-        # Read all entries
-        with open(journal_file, mode="r") as journal:
-            reader = csv.reader(journal)  # Create a CSV reader object to read the content of the journal file
-            entries = list(reader)  # Convert the CSV reader object into a list of rows (entries)
-
-        # If there are no entries or only the header exists
-        if len(entries) <= 1:
-            print("\nNo journal entries found.")
+        if not self.storage.has_journal():
+            self.console.print("\nNo journal entries found.")
             return
 
         # Filter entries for the current user
-        user_entries = [row for row in entries[1:] if row[0] == self.user.name]  #slices the entries list, excluding the first element (index 0), which is excluding the header row
+        user_entries = self.storage.journal_entries(self.user.name)
 
         # handle situation when there is no user entried found
         if not user_entries:
-            print("\nNo journal entries found for your profile.")
+            self.console.print("\nNo journal entries found for your profile.")
             return
 
         # Display current journal entries with numbers
-        print("\nCurrent journal entries:")
-        for idx, row in enumerate(user_entries, start=1):
-            print(f"{idx}. {row[1]} - {row[2]}")  # Assuming columns: Name, Date, Entry. row[1] represents Date and row[2] represents Entry
+        self.console.print("\nCurrent journal entries:")
+        for idx, entry in enumerate(user_entries, start=1):
+            self.console.print(f"{idx}. {entry.date} - {entry.text}")
 
         # Prompt the user to enter the journal entry number to delete
         try:
-            entry_to_delete = input("\nEnter the number of the journal entry you want to delete (or type 'exit' to cancel): ")
+            entry_to_delete = self.console.input("\nEnter the number of the journal entry you want to delete (or type 'exit' to cancel): ")
             if entry_to_delete.lower() == 'exit':  #if user put in "exit" then program end without deleting any journal entries
-                print("Deletion canceled.")
+                self.console.print("Deletion canceled.")
                 return  # Exit the method
 
             entry_to_delete = int(entry_to_delete)
             if entry_to_delete < 1 or entry_to_delete > len(user_entries):  # Check if the entry exists
-                print("Error: Invalid entry number. Please try again from the menu below.")
+                self.console.print("Error: Invalid entry number. Please try again from the menu below.")
                 return
         except ValueError:
-            print("Error: Invalid input. Please enter a valid number.")
+            self.console.print("Error: Invalid input. Please enter a valid number.")
             return
 
         # Delete the selected journal entry
         entry_to_delete = user_entries[entry_to_delete - 1]
-        entries.remove(entry_to_delete)
+        if not self._edit_journal(self.storage.delete_journal_entry, entry_to_delete.entry_id):  # with the CSV backend, a deletion record is appended to the edit log instead of rewriting the whole file
+            return
+        self.console.print(f"Entry {entry_to_delete.date} has been deleted.")  
+
+    def _edit_journal(self, edit: Callable[..., None], entry_id: int, *args) -> bool:
+        """
+        Apply a modification or deletion of one of the user's entries. Inside a write-behind session, the edit stays buffered,
+        but the session reads the journal to check that the entry still exists, so an entry deleted meanwhile (e.g. from
+        another session) is reported now rather than when the session ends.
+
+        Args:
+            edit (callable): The storage's modify_journal_entry or delete_journal_entry.
+            entry_id (int): The id of the entry, as listed to the user.
+            *args: The remaining arguments of `edit` (the new text of a modification).
 
-        # Write the updated entries back to the file
-        with open(journal_file, mode="w", newline="") as journal:
-            writer = csv.writer(journal)  # Creates a csv.writer object, which is used to write rows of data to the journal file in CSV format.
-            writer.writerows(entries)  # write back all rows, including the updated one, to the file.
-            print(f"Entry {entry_to_delete[1]} has been deleted.")  
+        Returns:
+            bool: Whether the edit was applied; if not, the user has been told.
+        """
+        from journal_log import EntryNotFoundError
+        try:
+            edit(self.user.name, entry_id, *args)
+        except EntryNotFoundError as e:
+            if e.entry_id != entry_id:  # raised by the flush this edit triggered, which saved it and dropped an earlier edit
+                self.console.print(STALE_EDIT_ERROR)
+                return True
+            self.console.print("Error: That entry no longer exists.")
+            return False
+        return True
+
+
+def main(argv: Optional[list] = None) -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description="BabyLand - A Comprehensive Toolbox for Your Pregnancy Journey.")
+    parser.add_argument("--data-dir", default="data", help="directory of the CSV data files (default: data)")
+    parser.add_argument("--record", help="append the answers of this session to a file of recorded sessions, for replay (see benchmarks/load_test.py)")
+    args = parser.parse_args(argv)
+    console = RecordingConsole() if args.record else Console()
+    try:
+        DueDatePredictor(data_dir=args.data_dir, console=console).run()
+    finally:
+        if args.record:
+            console.save(args.record)
 
 
 # Run the app
 if __name__ == "__main__":
-    app = DueDatePredictor()
-    app.run()
+    main()
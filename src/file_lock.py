@@ -0,0 +1,232 @@
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import csv
+import io
+import os
+import queue
+import threading
+import time
+
+from metrics import METRICS, instrumented
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on a data file, across threads and processes.
+
+    The lock is taken on a separate '<file>.lock' file rather than the data file itself, because data
+    files are replaced by rename during compaction and a lock on the old inode would protect nothing.
+
+    Args:
+        path (str): The data file to lock.
+    """
+    with open(path + ".lock", mode="a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def fsync_directory(path: str) -> None:
+    """
+    Make the renames into the directory of a data file durable, so a crash right after an os.replace does not
+    bring the old file back. Windows cannot open a directory, and makes renames durable by itself.
+
+    Args:
+        path (str): A file of the directory.
+    """
+    if fcntl is None:
+        return
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def encode_row(row: Sequence) -> bytes:
+    """Encode one row the way csv.writer writes it to a file opened with newline=""."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue().encode("utf-8")
+
+
+class _PendingRow:
+    """A row waiting for its batch to be committed (a lighter stand-in for concurrent.futures.Future)."""
+
+    __slots__ = ("row", "offset", "error", "_done")
+
+    def __init__(self, row: Sequence) -> None:
+        self.row = row
+        self.offset: Optional[int] = None
+        self.error: Optional[BaseException] = None
+        self._done = threading.Event()
+
+    def resolve(self, offset: Optional[int] = None, error: Optional[BaseException] = None) -> None:
+        self.offset, self.error = offset, error
+        self._done.set()
+
+    def wait(self) -> int:
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.offset
+
+
+class GroupCommitWriter:
+    """
+    Appends CSV rows to a file durably, batching the rows of many concurrent callers into one commit.
+
+    Callers block in `append` until their row is on disk. A background thread collects the rows that
+    arrive within `window` seconds of the first one, then writes them with a single write and a single
+    fsync while holding the file's advisory lock (see `locked`), so rows from different threads or
+    processes never interleave and each batch costs one fsync instead of one per row.
+
+    Attributes:
+    path (str): The CSV file appended to.
+    header (list, optional): Header row written first when the file is new or empty.
+    window (float): How long, in seconds, to wait for more rows before committing a batch.
+    on_commit (callable, optional): Called after each batch, still under the lock, with [(row, offset), ...] and
+        the (inode, size, mtime_ns) of the file just before the batch was written, so followers of the file
+        can tell whether they were current up to the append.
+    id_base (callable, optional): Called under the lock with the size of the file before each batch. When it
+        returns a number, every row is written with that number plus the row's offset appended as its last
+        field, an id that `append` returns instead of the offset.
+    """
+
+    _instances: Dict[str, "GroupCommitWriter"] = {}  # one shared writer per file in the process
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: str, header: Optional[Sequence] = None, window: float = 0.002, max_batch: int = 1000,
+                 on_commit: Optional[Callable[[List[Tuple[Sequence, int]], Tuple[int, int, int]], None]] = None,
+                 id_base: Optional[Callable[[int], Optional[int]]] = None) -> None:
+        self.path = path
+        self.header = header
+        self.window = window
+        self.max_batch = max_batch
+        self.on_commit = on_commit
+        self.id_base = id_base
+        self._queue: "queue.Queue[_PendingRow]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def for_file(cls, path: str, header: Optional[Sequence] = None,
+                 on_commit: Optional[Callable[[List[Tuple[Sequence, int]], Tuple[int, int, int]], None]] = None,
+                 id_base: Optional[Callable[[int], Optional[int]]] = None) -> "GroupCommitWriter":
+        """Return the process-wide writer of the given file, creating it on first use."""
+        key = os.path.abspath(path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(path, header, on_commit=on_commit, id_base=id_base)
+            return cls._instances[key]
+
+    def append(self, row: Sequence) -> int:
+        """
+        Append one row and wait until it is durably written.
+
+        Returns:
+            int: The byte offset of the row in the file (its id, with `id_base`).
+
+        Raises:
+            IOError: If the batch holding the row could not be written.
+        """
+        pending = _PendingRow(row)
+        self._ensure_started()
+        self._queue.put(pending)
+        return pending.wait()
+
+    def append_many(self, rows: Sequence[Sequence]) -> List[int]:
+        """
+        Append several rows next to each other with one write and one fsync, without waiting for a batching window.
+
+        Returns:
+            list: The byte offset (the id, with `id_base`) of each row in the file.
+
+        Raises:
+            IOError: If the rows could not be written.
+        """
+        if not rows:
+            return []
+        try:
+            return self._write(rows)
+        except IOError:
+            raise
+        except Exception as e:
+            raise IOError(f"Unable to write to {self.path}: {e}") from e
+
+    def _ensure_started(self) -> None:
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"group-commit:{os.path.basename(self.path)}", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]  # wait for the first row of the next batch
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch: List[_PendingRow]) -> None:
+        try:
+            row_ids = self._write([pending.row for pending in batch])
+        except Exception as e:  # hand any failure to the waiting callers instead of killing the writer thread
+            error = e if isinstance(e, IOError) else IOError(f"Unable to write to {self.path}: {e}")
+            for pending in batch:
+                pending.resolve(error=error)
+            return
+        for pending, row_id in zip(batch, row_ids):
+            pending.resolve(row_id)
+
+    @instrumented("group_commit.commit")
+    def _write(self, rows: Sequence[Sequence]) -> List[int]:
+        """Write rows under the file's lock with one write and one fsync. Returns the offset (or id) of each row."""
+        with locked(self.path):
+            with open(self.path, mode="ab") as target:
+                offset = target.seek(0, os.SEEK_END)
+                stat = os.fstat(target.fileno())
+                before = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+                base = self.id_base(offset) if self.id_base is not None else None
+                data = []
+                if offset == 0 and self.header is not None:
+                    data.append(encode_row(self.header))
+                    offset += len(data[0])
+                committed = []
+                row_ids = []
+                for row in rows:
+                    if base is not None:
+                        row = list(row) + [base + offset]
+                    row_ids.append(row[-1] if base is not None else offset)
+                    encoded = encode_row(row)
+                    data.append(encoded)
+                    committed.append((row, offset))
+                    offset += len(encoded)
+                target.write(b"".join(data))  # one write ...
+                METRICS.add("group_commit.commit", bytes_written=sum(len(chunk) for chunk in data))
+                target.flush()
+                os.fsync(target.fileno())  # ... and one fsync for the whole batch
+            if self.on_commit is not None:
+                self.on_commit(committed, before)
+        return row_ids
@@ -0,0 +1,366 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import re
+
+from due_date_calculator import DateValidator
+from journal_log import EntryNotFoundError
+from metrics import METRICS
+from notifications import Notification, NotificationScheduler
+from storage import CSVStorage, SQLiteStorage, Storage, UserRecord
+from timeline import TimelineCache
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    """An error answered with the given HTTP status and a JSON {"error": message} body."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class BabyLandService:
+    """
+    Asyncio HTTP/JSON server exposing profiles, due dates, milestone info and the journal.
+
+    Routes:
+        GET    /users/{name}                  the stored profile
+        PUT    /users/{name}                  save a profile, body {"lmp_date": "MM/DD/YYYY", "period_length": 28}
+        GET    /users/{name}/progress         due date and current weeks/days of pregnancy
+        GET    /users/{name}/timeline         week-by-week schedule with milestone and medical info (?from=week)
+        GET    /weeks/{week}                  milestone and medical info of a week
+        GET    /users/{name}/journal          a page of journal entries (?page_size=10&cursor=...&order=newest|oldest)
+        GET    /users/{name}/journal/search   journal entries matching a full-text query, best first (?q=...&page_size=10&cursor=...)
+        POST   /users/{name}/journal          add an entry, body {"text": "..."}
+        PUT    /users/{name}/journal/{id}     replace the text of an entry, body {"text": "..."}
+        DELETE /users/{name}/journal/{id}     delete an entry
+        GET    /metrics                       instrumentation snapshot, Prometheus text (?format=json for JSON)
+
+    Connections are kept alive (HTTP/1.1) and served by the event loop; every storage call runs in a
+    bounded thread pool, so file I/O never blocks the loop.
+
+    Attributes:
+    storage (Storage): The storage backend requests are served from.
+    timelines (TimelineCache): Cached pregnancy timelines; its clock decides 'today' for progress and timelines.
+    notifications (NotificationScheduler, optional): New-week notifications sharing `timelines`, rescheduled on every profile save through `storage`; None if disabled.
+    host (str): The address to listen on.
+    port (int): The port to listen on (0 picks a free port, see `port` after `start`).
+    """
+
+    MAX_HEADER_BYTES = 16 * 1024
+    MAX_BODY_BYTES = 1024 * 1024
+
+    def __init__(self, storage: Storage, host: str = "127.0.0.1", port: int = 8080, max_workers: int = 8,
+                 notifications: bool = False) -> None:
+        self.storage = storage
+        self.timelines = TimelineCache(storage)  # shared by every request: users with the same LMP and cycle share a schedule
+        self.notifications = NotificationScheduler(self.timelines) if notifications else None
+        if self.notifications is not None:
+            self.notifications.follow(storage)  # every profile save through the storage reschedules its user
+        self.host = host
+        self.port = port
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="babyland-io")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._routes = [
+            ("GET", re.compile(r"^/users/([^/]+)$"), self.get_user),
+            ("PUT", re.compile(r"^/users/([^/]+)$"), self.put_user),
+            ("GET", re.compile(r"^/users/([^/]+)/progress$"), self.get_progress),
+            ("GET", re.compile(r"^/users/([^/]+)/timeline$"), self.get_timeline),
+            ("GET", re.compile(r"^/weeks/(\d+)$"), self.get_week),
+            ("GET", re.compile(r"^/users/([^/]+)/journal$"), self.get_journal),
+            ("GET", re.compile(r"^/users/([^/]+)/journal/search$"), self.search_journal),
+            ("POST", re.compile(r"^/users/([^/]+)/journal$"), self.post_journal),
+            ("PUT", re.compile(r"^/users/([^/]+)/journal/(\d+)$"), self.put_journal),
+            ("DELETE", re.compile(r"^/users/([^/]+)/journal/(\d+)$"), self.delete_journal),
+            ("GET", re.compile(r"^/metrics$"), self.get_metrics),
+        ]
+
+    async def start(self) -> None:
+        """Start listening. With port 0, `self.port` is set to the port actually bound."""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port,
+                                                  limit=self.MAX_HEADER_BYTES, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def notify_forever(self, deliver: Callable[[Notification], None], interval: float = 3600.0) -> None:
+        """Every `interval` seconds, pass the due new-week notifications to `deliver`."""
+        while True:
+            for notification in await self.pop_notifications():
+                deliver(notification)
+            await asyncio.sleep(interval)
+
+    async def pop_notifications(self) -> List[Notification]:
+        """Pop the notifications due today (milestone info may be read from storage on first use)."""
+        if self.notifications is None:
+            return []
+        return await self._io(self.notifications.pop_due)
+
+    async def stop(self) -> None:
+        """Stop accepting connections and release the I/O threads."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    async def _io(self, function: Callable, *args) -> Any:
+        """Run a blocking storage call in the I/O thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args))
+
+    # Route handlers: each returns (status, JSON-serializable body or None)
+
+    async def get_user(self, query: Dict, body: Any, name: str) -> Tuple[int, Any]:
+        record = await self._load_user(name)
+        return 200, {"name": record.name, "lmp_date": record.lmp_date.strftime("%m/%d/%Y"), "period_length": record.period_length}
+
+    async def put_user(self, query: Dict, body: Any, name: str) -> Tuple[int, Any]:
+        if not isinstance(body, dict) or not isinstance(body.get("lmp_date"), str):
+            raise HTTPError(400, "Expected a JSON object with 'lmp_date' (MM/DD/YYYY) and optional 'period_length'.")
+        lmp_date = DateValidator.validate_date(body["lmp_date"])
+        if not isinstance(lmp_date, datetime):
+            raise HTTPError(400, lmp_date)  # the same message the interactive program prints
+        period_length = body.get("period_length", 28)
+        if not isinstance(period_length, int) or isinstance(period_length, bool) or not 20 <= period_length <= 45:
+            raise HTTPError(400, "Invalid period length. Please enter a value between 20 and 45.")
+        record = UserRecord(name, lmp_date, period_length)
+        await self._io(self.storage.save_user, record)
+        return 201, {"name": name, "lmp_date": lmp_date.strftime("%m/%d/%Y"), "period_length": period_length}
+
+    async def get_progress(self, query: Dict, body: Any, name: str) -> Tuple[int, Any]:
+        record = await self._load_user(name)
+        timeline = await self._io(self.timelines.for_date, record.lmp_date, record.period_length)
+        weeks, days = self.timelines.progress(timeline)
+        return 200, {"name": record.name, "due_date": timeline.due_date.strftime("%m/%d/%Y"), "weeks": weeks, "days": days}
+
+    async def get_timeline(self, query: Dict, body: Any, name: str) -> Tuple[int, Any]:
+        try:
+            start = int(query.get("from", ["1"])[0])
+        except ValueError:
+            raise HTTPError(400, "'from' must be an integer.")
+        record = await self._load_user(name)
+        timeline = await self._io(self.timelines.for_date, record.lmp_date, record.period_length)
+        weeks, _ = self.timelines.progress(timeline)
+        return 200, {"name": record.name, "due_date": timeline.due_date.strftime("%m/%d/%Y"), "current_week": weeks,
+                     "weeks": [{"week": w.week, "start": w.start.strftime("%m/%d/%Y"), "end": w.end.strftime("%m/%d/%Y"),
+                                "milestone": w.milestone, "medical_info": w.medical_info} for w in timeline.weeks(start)]}
+
+    async def get_week(self, query: Dict, body: Any, week: str) -> Tuple[int, Any]:
+        info = await self._io(self.storage.week_info, int(week))
+        if info is None:
+            raise HTTPError(404, f"No milestone info found for week {int(week)}.")
+        return 200, {"week": info.week, "milestone": info.milestone, "medical_info": info.medical_info}
+
+    async def get_journal(self, query: Dict, body: Any, name: str) -> Tuple[int, Any]:
+        try:
+            page_size = int(query.get("page_size", ["10"])[0])
+            cursor = int(query["cursor"][0]) if "cursor" in query else None
+        except ValueError:
+            raise HTTPError(400, "'page_size' and 'cursor' must be integers.")
+        if not 1 <= page_size <= 1000:
+            raise HTTPError(400, "'page_size' must be between 1 and 1000.")
+        newest_first = query.get("order", ["newest"])[0] != "oldest"
+        entries, next_cursor = await self._io(self.storage.journal_page, name, page_size, cursor, newest_first)
+        return 200, {"entries": [{"entry_id": e.entry_id, "date": e.date, "text": e.text} for e in entries], "next_cursor": next_cursor}
+
+    async def search_journal(self, query: Dict, body: Any, name: str) -> Tuple[int, Any]:
+        text = query.get("q", [""])[0]
+        if not text.strip():
+            raise HTTPError(400, "Expected a search query in 'q'.")
+        try:
+            page_size = int(query.get("page_size", ["10"])[0])
+            cursor = int(query["cursor"][0]) if "cursor" in query else None
+        except ValueError:
+            raise HTTPError(400, "'page_size' and 'cursor' must be integers.")
+        if not 1 <= page_size <= 1000:
+            raise HTTPError(400, "'page_size' must be between 1 and 1000.")
+        entries, next_cursor = await self._io(self.storage.search_journal, name, text, page_size, cursor)
+        return 200, {"entries": [{"entry_id": e.entry_id, "date": e.date, "text": e.text} for e in entries], "next_cursor": next_cursor}
+
+    async def post_journal(self, query: Dict, body: Any, name: str) -> Tuple[int, Any]:
+        text = self._text(body)
+        date = datetime.now().strftime("%m/%d/%Y")
+        entry_id = await self._io(self.storage.add_journal_entry, name, date, text)
+        return 201, {"entry_id": entry_id, "date": date, "text": text}
+
+    async def put_journal(self, query: Dict, body: Any, name: str, entry_id: str) -> Tuple[int, Any]:
+        text = self._text(body)
+        await self._io(self.storage.modify_journal_entry, name, int(entry_id), text)
+        return 200, {"entry_id": int(entry_id), "text": text}
+
+    async def delete_journal(self, query: Dict, body: Any, name: str, entry_id: str) -> Tuple[int, Any]:
+        await self._io(self.storage.delete_journal_entry, name, int(entry_id))
+        return 204, None
+
+    async def get_metrics(self, query: Dict, body: Any) -> Tuple[int, Any]:
+        if query.get("format", ["prometheus"])[0] == "json":
+            return 200, METRICS.snapshot()
+        return 200, METRICS.to_prometheus()  # a str payload is sent as plain text
+
+    async def _load_user(self, name: str) -> UserRecord:
+        record = await self._io(self.storage.load_user, name)
+        if record is None:
+            raise HTTPError(404, f"No profile found for {name}.")
+        return record
+
+    @staticmethod
+    def _text(body: Any) -> str:
+        if not isinstance(body, dict) or not isinstance(body.get("text"), str):
+            raise HTTPError(400, "Expected a JSON object with a 'text' string.")
+        return body["text"]
+
+    # HTTP plumbing
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._respond(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:  # the client closed the connection
+                    break
+                method, target, headers, raw_body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self._dispatch(method, target, raw_body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass  # broken or malformed connection: just drop it
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3:
+            raise HTTPError(400, "Malformed request line.")
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or "0")
+        if length > self.MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large.")
+        body = await reader.readexactly(length) if length else b""
+        return parts[0].upper(), parts[1], headers, body
+
+    async def _dispatch(self, method: str, target: str, raw_body: bytes) -> Tuple[int, Any]:
+        url = urlsplit(target)
+        path = url.path
+        allowed = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            try:
+                body = json.loads(raw_body) if raw_body else None
+            except ValueError:
+                return 400, {"error": "Request body is not valid JSON."}
+            try:
+                return await handler(parse_qs(url.query), body, *(unquote(group) for group in match.groups()))
+            except HTTPError as e:
+                return e.status, {"error": e.message}
+            except EntryNotFoundError as e:  # checked by the storage under the journal's lock, so a concurrent delete is seen too
+                return 404, {"error": f"No journal entry {e.entry_id} found for {e.name}."}
+            except (IOError, KeyError) as e:
+                logger.exception("Storage error on %s %s", method, path)
+                return 500, {"error": f"Storage error: {e}"}
+            except Exception:
+                logger.exception("Unhandled error on %s %s", method, path)  # answer instead of dropping the connection
+                return 500, {"error": "Internal server error."}
+        if allowed:
+            return 405, {"error": f"Method {method} not allowed on {path}."}
+        return 404, {"error": f"No route for {path}."}
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = b"" if payload is None else json.dumps(payload).encode("utf-8"), "application/json"
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve BabyLand over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-dir", default="data", help="directory of the CSV data files (default: data)")
+    parser.add_argument("--sqlite", default=None, help="serve from this SQLite database instead of the CSV files")
+    parser.add_argument("--sharded", action="store_true", help="serve the hash-sharded layout of the data directory (see sharding.py)")
+    parser.add_argument("--io-threads", type=int, default=8, help="threads running file and database I/O (default: 8)")
+    parser.add_argument("--metrics", action="store_true", help="record call counts, latencies and I/O volumes, served at /metrics")
+    parser.add_argument("--journal-cache-mb", type=float, default=16.0,
+                        help="memory budget of the cache of users' journal entries, 0 to disable it (CSV layouts, default: 16)")
+    parser.add_argument("--notify", action="store_true", help="print a notification when a user enters a new week of pregnancy (CSV layouts)")
+    parser.add_argument("--notify-interval", type=float, default=3600.0, help="seconds between notification checks (default: 3600)")
+    args = parser.parse_args(argv)
+    if args.notify and args.sqlite:
+        parser.error("--notify reads the CSV profile files and cannot be used with --sqlite")
+
+    if args.metrics:
+        METRICS.enable()
+
+    if args.sqlite:
+        storage = SQLiteStorage(args.sqlite)
+    elif args.sharded:
+        from sharding import ShardedCSVStorage
+        storage = ShardedCSVStorage(args.data_dir, journal_cache_bytes=int(args.journal_cache_mb * 1024 * 1024))
+    else:
+        storage = CSVStorage(args.data_dir, journal_cache_bytes=int(args.journal_cache_mb * 1024 * 1024))
+    service = BabyLandService(storage, args.host, args.port, max_workers=args.io_threads, notifications=args.notify)
+    if service.notifications is not None:
+        for shard in getattr(storage, "shards", [storage]):  # every shard of a sharded layout
+            service.notifications.load_user_file(shard.user_file)
+        print(f"{len(service.notifications)} users scheduled for new-week notifications")
+    print(f"BabyLand service listening on http://{args.host}:{args.port}")
+
+    def deliver(notification: Notification) -> None:
+        print(f"Notify {notification.name}: week {notification.week} starts {notification.start:%m/%d/%Y}. "
+              f"{notification.milestone or ''} {notification.medical_info or ''}".rstrip())
+
+    async def run() -> None:
+        if service.notifications is None:
+            await service.serve_forever()
+        else:
+            await asyncio.gather(service.serve_forever(), service.notify_forever(deliver, args.notify_interval))
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
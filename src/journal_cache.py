@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import sys
+import threading
+
+if TYPE_CHECKING:  # journal_log imports this module
+    from journal_log import JournalEntry
+
+# (journal inode, journal size, journal mtime_ns, log size, log mtime_ns): the state of the files the cache matches
+Fingerprint = Tuple[int, int, int, int, int]
+
+
+def entry_size(entry: "JournalEntry") -> int:
+    """Estimate the memory an entry takes in the cache: the tuple, its id, date and text, and its list slot."""
+    return sys.getsizeof(entry) + sys.getsizeof(entry.entry_id) + sys.getsizeof(entry.date) + sys.getsizeof(entry.text) + 8
+
+
+class JournalCache:
+    """
+    LRU cache of users' live journal entries, bounded by an estimate of the memory they take.
+
+    Each cached user holds their entries in file order (ascending entry ids) with every edit applied.
+    Once the entries cached exceed `max_bytes`, the least recently used users are evicted; a user whose
+    entries alone exceed the budget is not cached.
+
+    The cache is kept coherent in two ways. Writes made through the owning JournalLog update the cached
+    users in place (`appended`, `edited`), under the journal's file lock. Anything else that changes the
+    files (another process, another JournalLog on the same file, a compaction) is caught by the
+    fingerprint of the journal file and its edit log: every lookup passes the current one, and the cache
+    is dropped whenever it differs from the state the cache last followed. A write that finds the files
+    in another state than the cache expects (someone else wrote in between) drops the cache as well.
+
+    Attributes:
+    max_bytes (int): Budget of the cached entries, in (estimated) bytes; 0 disables the cache.
+    hits (int): Lookups served from memory.
+    misses (int): Lookups that had to read the journal.
+    evictions (int): Users evicted to stay within the budget.
+    invalidations (int): Times the whole cache was dropped because the files changed behind its back.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._users: "OrderedDict[str, Tuple[List[JournalEntry], int]]" = OrderedDict()  # name -> (entries, bytes), least recently used first
+        self._owners: Dict[int, str] = {}  # entry id -> name, for the cached entries
+        self._bytes = 0
+        self._fingerprint: Optional[Fingerprint] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached users."""
+        return len(self._users)
+
+    def get(self, name: str, fingerprint: Optional[Fingerprint]) -> Optional[List["JournalEntry"]]:
+        """
+        Return a copy of a user's cached entries, or None on a miss.
+
+        Args:
+            name (str): The user.
+            fingerprint (tuple): The current state of the files (see Fingerprint); None if there is no journal.
+        """
+        with self._lock:
+            self._follow(fingerprint)
+            cached = self._users.get(name)
+            if cached is None:
+                self.misses += 1
+                return None
+            self._users.move_to_end(name)
+            self.hits += 1
+            return list(cached[0])
+
+    def put(self, name: str, entries: List["JournalEntry"], fingerprint: Optional[Fingerprint]) -> None:
+        """
+        Cache a user's entries, read from the files while they were in the state `fingerprint`.
+
+        Entries read before a write the cache has followed since are stale and are not cached.
+        """
+        with self._lock:
+            if fingerprint is None or fingerprint != self._fingerprint:
+                return
+            size = sys.getsizeof(name) + sum(entry_size(entry) for entry in entries)
+            if size > self.max_bytes:
+                return
+            self._drop(name)
+            self._users[name] = (list(entries), size)
+            self._owners.update((entry.entry_id, name) for entry in entries)
+            self._bytes += size
+            self._evict()
+
+    def appended(self, entries: List["JournalEntry"], before: Tuple[int, int, int], fingerprint: Fingerprint) -> None:
+        """
+        Follow entries just appended to the journal, in file order. `before` is the (inode, size, mtime_ns) of the
+        journal file just before the append, and `fingerprint` the state of the files after it.
+
+        The journal must have been exactly in the state the cache follows, and the log must be unchanged, for
+        the cached users to be current; otherwise the cache is dropped.
+        """
+        with self._lock:
+            known = self._fingerprint
+            if known is None or known[:3] != tuple(before) or known[3:] != fingerprint[3:]:
+                self._clear(fingerprint)
+                return
+            for entry in entries:
+                cached = self._users.get(entry.name)
+                if cached is not None and entry.entry_id not in self._owners:  # a read racing the append may have cached it already
+                    size = entry_size(entry)
+                    cached[0].append(entry)
+                    self._users[entry.name] = (cached[0], cached[1] + size)
+                    self._owners[entry.entry_id] = entry.name
+                    self._bytes += size
+            self._fingerprint = fingerprint
+            self._evict()
+
+    def edited(self, edits: List[Tuple[int, str, str, str]], before: Fingerprint, after: Fingerprint, delete: str) -> None:
+        """
+        Follow (entry id, operation, payload, name) records just appended to the edit log.
+
+        Args:
+            edits (list): The records, in log order.
+            before (tuple): The state of the files just before the records were written.
+            after (tuple): The state of the files just after.
+            delete (str): The operation of a deletion (JournalLog.DELETE); any other operation replaces the text.
+        """
+        with self._lock:
+            if before != self._fingerprint:
+                self._clear(after)
+                return
+            for entry_id, operation, payload, _ in edits:
+                name = self._owners.get(entry_id)
+                if name is None:
+                    continue
+                entries, size = self._users[name]
+                position = next(i for i, entry in enumerate(entries) if entry.entry_id == entry_id)
+                old = entries[position]
+                if operation == delete:
+                    del entries[position]
+                    del self._owners[entry_id]
+                    new_size = size - entry_size(old)
+                else:
+                    entries[position] = old._replace(text=payload)
+                    new_size = size - entry_size(old) + entry_size(entries[position])
+                self._users[name] = (entries, new_size)
+                self._bytes += new_size - size
+            self._fingerprint = after
+            self._evict()
+
+    def clear(self) -> None:
+        """Drop every cached user (the counters are kept)."""
+        with self._lock:
+            self._clear(None, invalidated=False)
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the budget, evicting users until the cache fits."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters and the current size of the cache."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "invalidations": self.invalidations,
+                    "users": len(self._users), "entries": len(self._owners), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def _follow(self, fingerprint: Optional[Fingerprint]) -> None:
+        """Drop the cache if the files are no longer in the state it follows."""
+        if fingerprint != self._fingerprint:
+            self._clear(fingerprint)
+
+    def _clear(self, fingerprint: Optional[Fingerprint], invalidated: bool = True) -> None:
+        if self._users and invalidated:
+            self.invalidations += 1
+        self._users.clear()
+        self._owners.clear()
+        self._bytes = 0
+        self._fingerprint = fingerprint
+
+    def _drop(self, name: str) -> None:
+        cached = self._users.pop(name, None)
+        if cached is not None:
+            for entry in cached[0]:
+                self._owners.pop(entry.entry_id, None)
+            self._bytes -= cached[1]
+
+    def _evict(self) -> None:
+        """Evict least recently used users until the cache fits its budget."""
+        while self._bytes > self.max_bytes and self._users:
+            self._drop(next(iter(self._users)))
+            self.evictions += 1
@@ -0,0 +1,557 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import bisect
+import csv
+import os
+import threading
+from os.path import exists
+
+from csv_index import CSVOffsetIndex, iter_records, parse_record, read_record
+from file_lock import GroupCommitWriter, encode_row, fsync_directory, locked
+from journal_cache import Fingerprint, JournalCache
+from metrics import METRICS, instrumented
+
+
+class JournalEntry(NamedTuple):
+    """One live journal entry. `entry_id` is the entry's stable id (see JournalLog)."""
+    entry_id: int
+    name: str
+    date: str
+    text: str
+
+
+class EntryNotFoundError(KeyError):
+    """
+    Raised by an edit naming a journal entry that is not a live entry of the given user: it never existed,
+    was deleted, or belongs to someone else.
+
+    Attributes:
+    name (str): The user the edit was made for.
+    entry_id (int): The entry id given.
+    """
+
+    def __init__(self, name: str, entry_id: int) -> None:
+        super().__init__(entry_id)
+        self.name = name
+        self.entry_id = entry_id
+
+    def __str__(self) -> str:
+        return f"{self.name} has no journal entry {self.entry_id}"
+
+
+class JournalLog:
+    """
+    The pregnancy journal, stored as the journal CSV plus an append-only log of edits.
+
+    New entries are appended to the journal CSV as before. Modifications and deletions never rewrite
+    the CSV: they are appended to '<journal>.log' as (entry id, operation, payload, name) records, and
+    reads apply them in order. An edit therefore costs one small append whatever the size of the
+    journal, and concurrent edits cannot overwrite each other. Edits name the user they are made for,
+    and are rejected (EntryNotFoundError) unless the entry is one of that user's live entries, checked
+    under the same lock the edit is written with. Appends, edits and compaction all hold the journal's
+    advisory file lock (see file_lock.locked), and new entries go through a group-commit writer that
+    makes them durable with one fsync per batch.
+
+    Entry ids are stable: every row carries its id in the "Id" column, and compaction keeps it. A new
+    entry gets the id base plus the byte offset of its row, which is larger than every id in the file;
+    the base is recorded in the log header and moves past the old file size at each compaction. In
+    journals written before the "Id" column existed, the id of a row is its byte offset, until the first
+    compaction adds the column.
+
+    Once the log grows past `compaction_threshold` of the combined size of both files, the journal is
+    compacted: the CSV is rewritten with every edit applied and the log starts over. The first line of
+    the log records the inode of the journal file it applies to (and the id base), so a log left over
+    from an interrupted compaction (whose edits are already in the new journal file) is recognized and
+    ignored.
+
+    Entry texts may span several lines: rows are read as CSV records (see csv_index.read_record), not
+    as lines.
+
+    Reads for a single user go through a name -> row offsets index of the journal file (see
+    CSVOffsetIndex), maintained on append, so they only touch that user's rows. The entries read are
+    kept in a per-user LRU cache bounded by `cache_bytes` (see JournalCache), which appends and edits
+    made through this journal update in place; repeated reads of an active user never touch the disk.
+
+    Attributes:
+    file_name (str): The journal CSV file (columns "Name", "Date", "Entry" and, in journals written since, "Id").
+    log_name (str): The edit log kept next to the journal file.
+    compaction_threshold (float): Fraction of dead (log) bytes above which the journal is compacted.
+    background (bool): Whether compaction runs in a background thread instead of inline.
+    cache (JournalCache): Recently read users' entries, with hit, miss and eviction counters.
+    """
+
+    HEADER = ["Name", "Date", "Entry", "Id"]
+    MODIFY = "M"
+    DELETE = "D"
+    CACHE_FILL_ROWS = 1000  # `page` reads users with more rows than this a page at a time instead of caching them whole
+
+    _instances: Dict[str, "JournalLog"] = {}  # one shared journal per file in the process
+
+    def __init__(self, file_name: str = "data/pregnancy_journal.csv", log_name: Optional[str] = None,
+                 compaction_threshold: float = 0.5, background: bool = True, cache_bytes: int = 16 * 1024 * 1024) -> None:
+        self.file_name = file_name
+        self.log_name = log_name or file_name + ".log"
+        self.compaction_threshold = compaction_threshold
+        self.background = background
+        self.cache = JournalCache(cache_bytes)
+        self._lock = threading.RLock()  # serializes writers and compaction within the process
+        self._compaction: Optional[threading.Thread] = None
+        self._edits: Optional[Tuple[Tuple[int, int, int], Dict[int, Tuple[str, str]]]] = None  # parsed log, keyed by its fingerprint
+
+    @classmethod
+    def for_file(cls, file_name: str = "data/pregnancy_journal.csv") -> "JournalLog":
+        """Return the process-wide journal for the given file, creating it on first use."""
+        key = os.path.abspath(file_name)
+        if key not in cls._instances:
+            cls._instances[key] = cls(file_name)
+        return cls._instances[key]
+
+    def exists(self) -> bool:
+        """Return True if the journal file exists."""
+        return exists(self.file_name)
+
+    def fieldnames(self) -> List[str]:
+        """Return the column names in the header row of the journal file."""
+        with open(self.file_name, mode="r", newline="") as journal:
+            return next(csv.reader(journal), [])
+
+    def append(self, name: str, date: str, text: str) -> int:
+        """
+        Append a new entry to the journal, creating the file with its header if needed.
+
+        Returns:
+            int: The id of the new entry.
+        """
+        # appended under the journal's file lock and fsynced together with the entries of concurrent callers
+        return self._writer().append([name, date, text])
+
+    def append_many(self, entries: List[Tuple[str, str, str]]) -> List[int]:
+        """
+        Append several (name, date, text) entries with one write and one fsync.
+
+        Returns:
+            list: The ids of the new entries.
+        """
+        return self._writer().append_many([list(entry) for entry in entries])
+
+    def modify(self, name: str, entry_id: int, text: str) -> None:
+        """
+        Replace the text of one of a user's entries by appending a modification record to the log.
+
+        Raises:
+            EntryNotFoundError: If the entry is not a live entry of the user.
+        """
+        self._append_log(name, entry_id, self.MODIFY, text)
+
+    def delete(self, name: str, entry_id: int) -> None:
+        """
+        Delete one of a user's entries by appending a tombstone record to the log.
+
+        Raises:
+            EntryNotFoundError: If the entry is not a live entry of the user.
+        """
+        self._append_log(name, entry_id, self.DELETE, "")
+
+    def edit_many(self, edits: List[Tuple[str, int, str, str]]) -> None:
+        """
+        Append several (name, entry id, MODIFY or DELETE, payload) edits to the log with one write and one fsync.
+
+        Raises:
+            EntryNotFoundError: If an entry is not a live entry of its user (once earlier edits of the batch
+                are applied); nothing is written then.
+        """
+        if edits:
+            self._append_log_records(edits)
+
+    def entries(self, name: Optional[str] = None) -> List[JournalEntry]:
+        """
+        Return the live journal entries, in the order they were written, with every logged edit applied.
+
+        Args:
+            name (str, optional): Only return the entries written by this user.
+
+        Raises:
+            KeyError: If the journal file is missing one of the expected columns.
+        """
+        with self._lock:
+            if name is None:
+                return self._apply_edits(self._scan())
+            fingerprint = self._fingerprint()
+            entries = self.cache.get(name, fingerprint)
+            if entries is None:
+                entries = self._apply_edits(self._read_user(name))  # only this user's rows are read
+                self.cache.put(name, entries, fingerprint)
+            return entries
+
+    def read(self, name: str, entry_ids: List[int]) -> List[JournalEntry]:
+        """Return a user's live entries with the given ids, in the order given (ids of other users' or deleted entries are left out)."""
+        with self._lock:
+            entries = {entry.entry_id: entry for entry in self.entries(name)}
+            return [entries[entry_id] for entry_id in entry_ids if entry_id in entries]
+
+    def page(self, name: str, page_size: int = 10, cursor: Optional[int] = None,
+             newest_first: bool = True) -> Tuple[List[JournalEntry], Optional[int]]:
+        """
+        Return one page of a user's live journal entries.
+
+        Args:
+            name (str): The user whose entries are returned.
+            page_size (int, optional): The maximum number of entries on the page. Defaults to 10.
+            cursor (int, optional): The cursor returned with the previous page; None for the first page.
+            newest_first (bool, optional): Page from the most recent entry backwards. Defaults to True.
+
+        Returns:
+            tuple: The entries on the page, and the cursor of the next page (None once there are no more entries).
+        """
+        with self._lock:
+            fingerprint = self._fingerprint()
+            cached = self.cache.get(name, fingerprint)
+            if cached is not None:
+                return self._page_of(cached, page_size, cursor, newest_first)
+            rows = self._read_user(name, self.CACHE_FILL_ROWS)
+            if rows is not None:  # read the user whole once; the following pages come from memory
+                entries = self._apply_edits(rows)
+                self.cache.put(name, entries, fingerprint)
+                return self._page_of(entries, page_size, cursor, newest_first)
+            offsets = self._index().offsets(name)
+            if newest_first:
+                end = len(offsets) if cursor is None else self._bisect(offsets, cursor, right=False)
+                candidates = offsets[:end][::-1]
+            else:
+                start = 0 if cursor is None else self._bisect(offsets, cursor, right=True)
+                candidates = offsets[start:]
+            entries: List[JournalEntry] = []
+            position = 0
+            while len(entries) < page_size and position < len(candidates):  # read a page at a time, skipping deleted entries
+                batch = candidates[position:position + page_size - len(entries)]
+                position += len(batch)
+                rows = self._read_rows(batch)
+                if any(row[1] != name for row in rows):  # the index was stale: page through the user's rows read whole
+                    self._index().rebuild()
+                    return self._page_of(self._apply_edits(self._read_user(name)), page_size, cursor, newest_first)
+                entries.extend(self._apply_edits(rows))
+            next_cursor = entries[-1].entry_id if entries and position < len(candidates) else None
+            return entries, next_cursor
+
+    def _bisect(self, offsets: List[int], cursor: int, right: bool) -> int:
+        """
+        Return the number of rows, among rows given by their offsets in file order, whose id is below `cursor`
+        (or not above it, if `right`). Ids grow with offsets, so only the probed rows are read.
+        """
+        with open(self.file_name, mode="rb") as journal:
+            columns = self._columns(parse_record(journal.readline()))
+            if columns[3] is None:  # ids are offsets
+                return (bisect.bisect_right if right else bisect.bisect_left)(offsets, cursor)
+            low, high = 0, len(offsets)
+            while low < high:
+                middle = (low + high) // 2
+                entry_id = self._rows_at(journal, [offsets[middle]], columns)[0][0]
+                if entry_id < cursor or (right and entry_id == cursor):
+                    low = middle + 1
+                else:
+                    high = middle
+            return low
+
+    @staticmethod
+    def _page_of(entries: List[JournalEntry], page_size: int, cursor: Optional[int],
+                 newest_first: bool) -> Tuple[List[JournalEntry], Optional[int]]:
+        """Return one page of entries held in memory, in file order, with the same cursors as `page`."""
+        if newest_first:
+            candidates = [entry for entry in reversed(entries) if cursor is None or entry.entry_id < cursor]
+        else:
+            candidates = [entry for entry in entries if cursor is None or entry.entry_id > cursor]
+        page = candidates[:page_size]
+        return page, (page[-1].entry_id if len(candidates) > page_size else None)
+
+    def rebuild_index(self) -> None:
+        """Rebuild (and persist) the name -> row offsets index of the journal file from a scan of the file."""
+        with self._lock:
+            self._index().rebuild()
+
+    def dead_ratio(self) -> float:
+        """Return the fraction of the journal's bytes taken by the edit log."""
+        try:
+            journal_size = os.path.getsize(self.file_name)
+            log_size = os.path.getsize(self.log_name) - self._log_header_size() if self._log_is_current() else 0
+        except OSError:
+            return 0.0
+        total = journal_size + log_size
+        return log_size / total if total else 0.0
+
+    def compact_if_needed(self) -> bool:
+        """
+        Compact the journal if the dead ratio crossed the threshold.
+
+        Returns:
+            bool: True if a compaction was started (or run, when `background` is False).
+        """
+        if self.dead_ratio() <= self.compaction_threshold:
+            return False
+        if not self.background:
+            self.compact()
+            return True
+        with self._lock:
+            if self._compaction is not None and self._compaction.is_alive():
+                return False
+            self._compaction = threading.Thread(target=self.compact, daemon=True)
+            self._compaction.start()
+            return True
+
+    def wait_for_compaction(self) -> None:
+        """Block until a background compaction, if any, has finished."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    @instrumented("journal.compact")
+    def compact(self) -> None:
+        """
+        Rewrite the journal file with every logged edit applied, then start a new, empty log. Both new files are
+        fsynced before they replace the old ones, and the directory after, so a crash leaves a readable journal.
+        """
+        with self._lock, locked(self.file_name):  # writers in other threads and processes wait until the new files are in place
+            if not exists(self.file_name):
+                return
+            entries = self.entries()
+            base = self._current_base() + os.path.getsize(self.file_name)  # past every id handed out so far
+            journal_tmp = self.file_name + ".tmp"
+            with open(journal_tmp, mode="w", newline="") as journal:
+                writer = csv.writer(journal)
+                writer.writerow(self.HEADER)
+                writer.writerows([entry.name, entry.date, entry.text, entry.entry_id] for entry in entries)  # ids are kept
+                METRICS.add("journal.compact", bytes_written=journal.tell())
+                journal.flush()
+                os.fsync(journal.fileno())  # both files are on disk before either replaces the old one
+            log_tmp = self.log_name + ".tmp"
+            with open(log_tmp, mode="w", newline="") as log:
+                csv.writer(log).writerow(["Base", os.stat(journal_tmp).st_ino, base])
+                log.flush()
+                os.fsync(log.fileno())
+            os.replace(journal_tmp, self.file_name)  # the old log no longer matches the journal's inode from here on
+            os.replace(log_tmp, self.log_name)
+            fsync_directory(self.file_name)  # and so are the renames
+            self.cache.clear()  # every row moved
+
+    def _append_log(self, name: str, entry_id: int, operation: str, payload: str) -> None:
+        """Append one edit record to the log (see `_append_log_records`)."""
+        self._append_log_records([(name, entry_id, operation, payload)])
+
+    @instrumented("journal.append_log")
+    def _append_log_records(self, edits: List[Tuple[str, int, str, str]]) -> None:
+        """
+        Check that (name, entry id, operation, payload) edits apply to live entries of their users, then append
+        them to the log as (entry id, operation, payload, name) records, starting a new log if there is none for
+        the current journal file.
+        """
+        with self._lock, locked(self.file_name):
+            live: Dict[str, Set[int]] = {}
+            for name, entry_id, operation, _ in edits:  # checked under the lock, so no other writer can delete the entry meanwhile
+                if name not in live:
+                    live[name] = {entry.entry_id for entry in self.entries(name)}
+                if entry_id not in live[name]:
+                    raise EntryNotFoundError(name, entry_id)
+                if operation == self.DELETE:
+                    live[name].discard(entry_id)
+            records = [(entry_id, operation, payload, name) for name, entry_id, operation, payload in edits]
+            before = self._fingerprint()
+            if not self._log_is_current():
+                self._start_log(self._current_base())
+            with open(self.log_name, mode="ab") as log:
+                data = b"".join(encode_row(list(record)) for record in records)
+                log.write(data)
+                METRICS.add("journal.append_log", bytes_written=len(data))
+                log.flush()
+                os.fsync(log.fileno())
+            self.cache.edited(records, before, self._fingerprint(), self.DELETE)
+        self.compact_if_needed()
+
+    def _log_is_current(self) -> bool:
+        """Return True if the log exists and applies to the current journal file."""
+        return self._log_header() is not None
+
+    def _log_header(self) -> Optional[List[str]]:
+        """Return the header row of the log ("Base", journal inode and, if recorded, id base), or None if there is no current log."""
+        if not exists(self.log_name):
+            return None
+        with open(self.log_name, mode="r", newline="") as log:
+            header = next(csv.reader(log), [])
+        if len(header) < 2 or header[0] != "Base" or header[1] != str(os.stat(self.file_name).st_ino):
+            return None
+        return header
+
+    def _start_log(self, base: int) -> None:
+        """Start a new, empty log for the current journal file, recording the id base."""
+        with open(self.log_name, mode="w", newline="") as log:
+            csv.writer(log).writerow(["Base", os.stat(self.file_name).st_ino, base])
+
+    def _current_base(self) -> int:
+        """
+        Return the base of the ids of new entries, as recorded in the log. Without a log recording it (lost, or
+        written before ids were stored), any base past the largest id of the journal keeps ids unique.
+        """
+        header = self._log_header()
+        if header is not None and len(header) > 2:
+            return int(header[2])
+        if not exists(self.file_name) or "Id" not in self.fieldnames():
+            return 0  # ids are offsets
+        return max((row[0] for row in self._scan()), default=-1) + 1
+
+    def _id_base(self, size: int) -> Optional[int]:
+        """
+        Return the base the writer adds to the offset of each new row to give its id, or None if the journal has
+        no "Id" column (ids are then offsets). Called by the writer under the file lock, with the journal's size.
+        """
+        if size == 0:  # the writer starts the file with HEADER
+            self._start_log(0)
+            return 0
+        if "Id" not in self.fieldnames():
+            return None
+        base = self._current_base()
+        if not self._log_is_current():
+            self._start_log(base)  # record it, so the next batch does not scan the journal again
+        return base
+
+    def _log_header_size(self) -> int:
+        """Return the size in bytes of the log's header line, which holds no edits."""
+        with open(self.log_name, mode="rb") as log:
+            return len(log.readline())
+
+    def _read_log(self) -> Dict[int, Tuple[str, str]]:
+        """Return the final (operation, payload) of every edited entry. A deletion is final."""
+        edits: Dict[int, Tuple[str, str]] = {}
+        if not self._log_is_current():
+            return edits
+        stat = os.stat(self.log_name)
+        fingerprint = (stat.st_size, stat.st_mtime_ns, os.stat(self.file_name).st_ino)
+        if self._edits is not None and self._edits[0] == fingerprint:
+            return self._edits[1]  # the log has not changed since it was last parsed
+        rows = 0
+        with open(self.log_name, mode="r", newline="") as log:
+            reader = csv.reader(log)
+            next(reader)  # skip the header row
+            for record in reader:
+                if not record:
+                    continue
+                entry_id, operation, payload = int(record[0]), record[1], record[2]  # then the name, in records written since names are logged
+                if edits.get(entry_id, (None,))[0] != self.DELETE:
+                    edits[entry_id] = (operation, payload)
+                rows += 1
+        METRICS.add("journal.read_log", rows_scanned=rows, bytes_read=stat.st_size)
+        self._edits = (fingerprint, edits)
+        return edits
+
+    def _apply_edits(self, rows: Iterable[Tuple[int, str, str, str]]) -> List[JournalEntry]:
+        """Apply the logged edits to (entry id, name, date, text) rows, dropping deleted entries."""
+        edits = self._read_log()
+        entries = []
+        for entry_id, row_name, date, text in rows:
+            operation, payload = edits.get(entry_id, (None, None))
+            if operation == self.DELETE:
+                continue
+            if operation == self.MODIFY:
+                text = payload
+            entries.append(JournalEntry(entry_id, row_name, date, text))
+        return entries
+
+    def _writer(self) -> GroupCommitWriter:
+        """Return the group-commit writer of the journal file, which also keeps the name index up to date."""
+        return GroupCommitWriter.for_file(self.file_name, header=self.HEADER, on_commit=self._committed, id_base=self._id_base)
+
+    def _committed(self, batch: List[Tuple[List[str], int]], before: Tuple[int, int, int]) -> None:
+        """
+        Register rows just appended by the group-commit writer, still under the file lock, in the name index and the cache.
+        `before` is the (inode, size, mtime_ns) of the journal file just before the append.
+        """
+        self._index().record_appends([(row[0], offset) for row, offset in batch], before)
+        entries = [JournalEntry(row[3] if len(row) > 3 else offset, row[0], row[1], row[2]) for row, offset in batch]
+        self.cache.appended(entries, before, self._fingerprint())
+
+    def _fingerprint(self) -> Optional[Fingerprint]:
+        """Return the state of the journal file and its log (see JournalCache), or None if there is no journal."""
+        try:
+            journal = os.stat(self.file_name)
+        except OSError:
+            return None
+        try:
+            log = os.stat(self.log_name)
+            log_state = (log.st_size, log.st_mtime_ns)
+        except OSError:
+            log_state = (0, 0)
+        return (journal.st_ino, journal.st_size, journal.st_mtime_ns) + log_state
+
+    def _index(self) -> CSVOffsetIndex:
+        """Return the name -> row offsets index of the journal file."""
+        name_col = 0
+        if exists(self.file_name):
+            name_col = self._columns(self.fieldnames())[0]
+        return CSVOffsetIndex.for_file(self.file_name, key_column=name_col)
+
+    def _columns(self, header: List[str]) -> Tuple[int, int, int, Optional[int]]:
+        """Return the positions of the "Name", "Date", "Entry" and "Id" (None if missing) columns in a header row."""
+        for column in self.HEADER[:3]:
+            if column not in header:
+                raise KeyError(column)
+        name_col, date_col, entry_col = (header.index(column) for column in self.HEADER[:3])
+        return name_col, date_col, entry_col, header.index("Id") if "Id" in header else None
+
+    @staticmethod
+    def _row_of(record: List[str], offset: int, columns: Tuple[int, int, int, Optional[int]]) -> Tuple[int, str, str, str]:
+        """Return (entry id, name, date, text) for a parsed row found at byte `offset`, given the `_columns` of its file."""
+        name_col, date_col, entry_col, id_col = columns
+        return (int(record[id_col]) if id_col is not None else offset), record[name_col], record[date_col], record[entry_col]
+
+    def _read_rows(self, offsets: List[int]) -> List[Tuple[int, str, str, str]]:
+        """Return (entry id, name, date, text) for the rows starting at the given byte offsets."""
+        rows = []
+        if not offsets:
+            return rows
+        with open(self.file_name, mode="rb") as journal:
+            columns = self._columns(parse_record(journal.readline()))
+            return self._rows_at(journal, offsets, columns)
+
+    def _rows_at(self, journal, offsets: List[int], columns: Tuple[int, int, int, Optional[int]]) -> List[Tuple[int, str, str, str]]:
+        """Read the rows starting at the given byte offsets of an open journal file, whose header was just read."""
+        rows = []
+        bytes_read = journal.tell()
+        for offset in offsets:
+            record = read_record(journal, offset)
+            bytes_read += len(record)
+            rows.append(self._row_of(parse_record(record), offset, columns))
+        METRICS.add("journal.read_rows", rows_scanned=len(rows), bytes_read=bytes_read)
+        return rows
+
+    def _read_user(self, name: str, max_rows: Optional[int] = None) -> Optional[List[Tuple[int, str, str, str]]]:
+        """
+        Return (entry id, name, date, text) for every row of a user, found through the name index, reading the
+        header and the rows through one open file. Returns None if the user has more than `max_rows` rows.
+
+        A row holding another name means the index was stale (the file changed in a way its fingerprint did not
+        show): the index is rebuilt and the rows read again, and rows of other users are never returned.
+        """
+        try:
+            journal = open(self.file_name, mode="rb")
+        except FileNotFoundError:
+            return []
+        with journal:
+            columns = self._columns(parse_record(journal.readline()))
+            index = CSVOffsetIndex.for_file(self.file_name, key_column=columns[0])
+            for _ in range(2):
+                offsets = index.offsets(name)
+                if max_rows is not None and len(offsets) > max_rows:
+                    return None
+                rows = self._rows_at(journal, offsets, columns)
+                if all(row[1] == name for row in rows):
+                    return rows
+                index.rebuild()
+            return [row for row in rows if row[1] == name]
+
+    def _scan(self) -> List[Tuple[int, str, str, str]]:
+        """Return (entry id, name, date, text) for every row of the journal file."""
+        rows = []
+        with open(self.file_name, mode="rb") as journal:
+            header = journal.readline()
+            columns = self._columns(parse_record(header))
+            for offset, record in iter_records(journal, len(header), partial=True):
+                if record.strip():
+                    rows.append(self._row_of(parse_record(record), offset, columns))
+            METRICS.add("journal.scan", rows_scanned=len(rows), bytes_read=journal.tell())
+        return rows
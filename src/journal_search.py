@@ -0,0 +1,407 @@
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import marshal
+import math
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+
+from csv_index import iter_records, parse_record
+from file_lock import locked
+from journal_log import JournalLog
+from metrics import METRICS, instrumented
+
+TOKEN = re.compile(r"[^\W_]+")  # runs of letters and digits, like SQLite FTS5's unicode61 tokenizer
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a text into lowercase search terms."""
+    return TOKEN.findall(text.lower())
+
+
+def checksum(text: str) -> int:
+    """Return the checksum of an entry's text, which tells whether an indexed entry still has the same text."""
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def parse_query(query: str) -> List[str]:
+    """
+    Split a search query into terms. A word ending with '*' is a prefix query: its last term keeps the '*'.
+
+    >>> parse_query("Baby kick* first-time")
+    ['baby', 'kick*', 'first', 'time']
+    """
+    terms = []
+    for word in query.split():
+        tokens = tokenize(word)
+        if tokens and word.endswith("*"):
+            tokens[-1] += "*"
+        terms.extend(tokens)
+    return terms
+
+
+class SearchHit(NamedTuple):
+    """One ranked search result: a journal entry id and its BM25 score."""
+    entry_id: int
+    score: float
+
+
+class JournalSearchIndex:
+    """
+    Inverted index over the text of journal entries, scoped by user, with ranked term and prefix queries.
+
+    The index keeps, per user, a posting set of entry ids for every term, and per entry its owner, term
+    frequencies and a checksum of its text. It is brought up to date before every query by reading only
+    what was written since the last update: rows appended to the journal file since a byte watermark (new
+    entries) and records appended to the edit log since a second watermark (modified and deleted entries,
+    see JournalLog). Writes made through any JournalLog, in any process, are therefore picked up
+    incrementally. Entries are keyed by JournalLog's stable ids, which a compaction keeps: a compacted
+    journal (a new file, with the edits applied) is scanned and compared with the index by id and checksum,
+    so only the deleted entries are removed and only new or changed ones indexed again.
+
+    The index is persisted to '<journal>.fts', so a new process only indexes the changes made since the
+    last save: a header (version, journal inode, snapshot length), a snapshot of the whole index with its
+    watermarks, then delta segments, each holding the entries added and removed between two pairs of
+    watermarks. A save appends one delta segment, with one write, after every `save_every` indexed changes
+    and on `save()`. A new snapshot is written instead (atomically: temporary file + rename) when the
+    deltas would outgrow the snapshot, after a compaction, or when another process saved in between; a
+    delta that does not continue from the state before it (or was cut short by a crash) ends the loading.
+
+    Queries match entries containing every query term (AND); a term ending with '*' matches every term
+    starting with it. Results are ranked by BM25 over the user's own entries, best first, newest first
+    among equal scores.
+
+    Attributes:
+    file_name (str): The journal CSV file.
+    index_path (str): The file the index is persisted to.
+    save_every (int): Number of indexed changes after which the index is saved.
+    """
+
+    VERSION = 4  # 4: a snapshot followed by delta segments, entries with a checksum; 3: entry ids are JournalLog's stable ids
+    K1 = 1.2  # BM25 term frequency saturation
+    B = 0.75  # BM25 length normalization
+    HEADER = struct.Struct("<IQQ")  # version, inode of the indexed journal, length of the snapshot
+    SEGMENT = struct.Struct("<I")  # length of the delta segment that follows
+
+    _instances: Dict[str, "JournalSearchIndex"] = {}  # one shared index per journal in the process
+
+    def __init__(self, file_name: str = "data/pregnancy_journal.csv", index_path: Optional[str] = None, save_every: int = 100) -> None:
+        self.file_name = file_name
+        self.log_name = JournalLog.for_file(file_name).log_name
+        self.index_path = index_path or file_name + ".fts"
+        self.save_every = save_every
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    @classmethod
+    def for_file(cls, file_name: str = "data/pregnancy_journal.csv") -> "JournalSearchIndex":
+        """Return the process-wide index of the given journal, creating it on first use."""
+        key = os.path.abspath(file_name)
+        if key not in cls._instances:
+            cls._instances[key] = cls(file_name)
+        return cls._instances[key]
+
+    def search(self, name: str, query: str, page_size: int = 10, cursor: Optional[int] = None) -> Tuple[List[SearchHit], Optional[int]]:
+        """
+        Search a user's journal entries.
+
+        Args:
+            name (str): The user whose entries are searched.
+            query (str): Search terms, all of which must appear in an entry; 'term*' matches any term with that prefix.
+            page_size (int, optional): The maximum number of hits on the page. Defaults to 10.
+            cursor (int, optional): The cursor returned with the previous page; None for the first page.
+
+        Returns:
+            tuple: The hits on the page, best first, and the cursor of the next page (None on the last page).
+        """
+        with self._lock:
+            self.refresh()
+            hits = self._rank(name, query)
+        start = cursor or 0
+        end = start + page_size
+        return hits[start:end], (end if end < len(hits) else None)
+
+    @instrumented("journal_search.refresh")
+    def refresh(self) -> None:
+        """Index whatever was appended to the journal and its edit log since the last update."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+            try:
+                journal_stat = os.stat(self.file_name)
+            except OSError:
+                if self._entries:
+                    self._reset()
+                return
+            if journal_stat.st_ino != self._inode or journal_stat.st_size < self._journal_offset:  # compacted or replaced
+                changes = self._read_compacted(journal_stat.st_ino)
+            else:
+                changes = self._read_journal() + self._read_log()
+            self._unsaved += changes
+            if self._unsaved >= self.save_every:
+                self.save()
+
+    def save(self) -> None:
+        """Persist the changes indexed since the last save, as a delta segment or a new snapshot (see the class docstring)."""
+        with self._lock:
+            if self._inode is None:
+                return  # no journal, nothing to keep
+            try:
+                with locked(self.index_path):  # saves from other processes append to the same file
+                    if not self._append_delta():
+                        self._write_snapshot()
+            except OSError:
+                self._saved = None  # an index that cannot be saved is indexed from the journal next time; the next save starts over
+                self._delta = []
+                return
+            self._delta = []
+            self._unsaved = 0
+
+    def _append_delta(self) -> bool:
+        """
+        Append the entries added and removed since the last save to the index file as one delta segment. Returns
+        False, writing nothing, if a snapshot must be written instead: the file is not the one this index last
+        loaded or saved (or has grown since), or its deltas would outgrow its snapshot.
+        """
+        if self._saved is None:
+            return False
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return False
+        if (stat.st_ino, stat.st_size) != self._saved:
+            return False
+        marks = (self._journal_offset, self._log_offset)
+        if not self._delta and marks == self._delta_start:
+            return True  # nothing changed since the last save
+        data = marshal.dumps(self._delta_start + marks + (self._delta,))
+        with open(self.index_path, mode="r+b") as index_file:
+            snapshot_size = self.HEADER.unpack(index_file.read(self.HEADER.size))[2]
+            if stat.st_size - self.HEADER.size - snapshot_size + self.SEGMENT.size + len(data) > snapshot_size:
+                return False  # loading would replay more than it reads from the snapshot: start a new one
+            index_file.seek(0, os.SEEK_END)
+            index_file.write(self.SEGMENT.pack(len(data)) + data)
+            size = index_file.tell()
+        METRICS.add("journal_search.save", bytes_written=self.SEGMENT.size + len(data))
+        self._saved = (stat.st_ino, size)
+        self._delta_start = marks
+        return True
+
+    def _write_snapshot(self) -> None:
+        """Replace the index file (atomically) with a snapshot of the whole index and its watermarks."""
+        postings = {name: {term: list(entry_ids) for term, entry_ids in terms.items()} for name, terms in self._postings.items()}
+        snapshot = marshal.dumps((self._journal_offset, self._log_offset, self._entries, postings, self._documents, self._lengths))
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, mode="wb") as index_file:
+            index_file.write(self.HEADER.pack(self.VERSION, self._inode, len(snapshot)) + snapshot)
+            size = index_file.tell()
+        METRICS.add("journal_search.save", bytes_written=size)
+        os.replace(tmp_path, self.index_path)
+        self._saved = (os.stat(self.index_path).st_ino, size)
+        self._delta_start = (self._journal_offset, self._log_offset)
+
+    def _reset(self) -> None:
+        self._inode: Optional[int] = None
+        self._journal_offset = 0  # bytes of the journal file already indexed (0: header not read yet)
+        self._log_offset = 0  # bytes of the edit log already applied
+        self._entries: Dict[int, Tuple[str, Dict[str, int], int]] = {}  # entry id -> (user, term -> frequency, checksum of the text)
+        self._postings: Dict[str, Dict[str, Set[int]]] = {}  # user -> term -> entry ids
+        self._documents: Dict[str, int] = {}  # user -> number of indexed entries
+        self._lengths: Dict[str, int] = {}  # user -> total number of terms in the user's entries
+        self._sorted_terms: Dict[str, List[str]] = {}  # user -> sorted terms, for prefix queries; dropped when terms change
+        self._columns: Optional[Tuple[int, int, int, Optional[int]]] = None
+        self._unsaved = 0
+        self._delta: List[tuple] = []  # changes since the last save: (entry id, user, frequencies, checksum) added, (entry id,) removed
+        self._delta_start = (0, 0)  # the watermarks at the last save, where the next delta segment starts
+        self._saved: Optional[Tuple[int, int]] = None  # (inode, size) of the index file as last loaded or saved; None: write a snapshot
+
+    def _load(self) -> None:
+        """
+        Load the persisted index: its snapshot, then every delta segment that continues from the state before it.
+        An index of an older journal file is loaded too; `refresh` then brings it up to date like after a compaction.
+        """
+        try:
+            with open(self.index_path, mode="rb") as index_file:
+                data = memoryview(index_file.read())  # one read: marshal.load on a file reads it in many small pieces
+                index_inode = os.fstat(index_file.fileno()).st_ino
+            METRICS.add("journal_search.load", bytes_read=len(data))
+            version, inode, snapshot_size = self.HEADER.unpack_from(data)
+            if version != self.VERSION:
+                return
+            position = self.HEADER.size + snapshot_size
+            self._journal_offset, self._log_offset, self._entries, postings, self._documents, self._lengths = \
+                marshal.loads(data[self.HEADER.size:position])
+            self._postings = {name: {term: set(entry_ids) for term, entry_ids in terms.items()} for name, terms in postings.items()}
+            self._inode = inode
+            while position + self.SEGMENT.size <= len(data):
+                end = position + self.SEGMENT.size + self.SEGMENT.unpack_from(data, position)[0]
+                if end > len(data):
+                    break  # cut short by a crash
+                journal_start, log_start, journal_offset, log_offset, changes = marshal.loads(data[position + self.SEGMENT.size:end])
+                if (journal_start, log_start) != (self._journal_offset, self._log_offset):
+                    break  # saved from another state: not applicable
+                for change in changes:
+                    if len(change) > 1:
+                        self._add(*change)
+                    elif change[0] in self._entries:
+                        self._remove(change[0])
+                self._journal_offset, self._log_offset = journal_offset, log_offset
+                position = end
+        except (OSError, EOFError, ValueError, TypeError, struct.error):
+            self._reset()
+            return
+        self._delta = []
+        self._delta_start = (self._journal_offset, self._log_offset)
+        self._saved = (index_inode, position) if position == len(data) else None  # a file with segments left over is replaced at the next save
+
+    def _read_compacted(self, inode: int) -> int:
+        """
+        Bring the index up to date with a compacted (or replaced) journal file. Compaction keeps entry ids and
+        applies the logged edits, so the whole new file is read and compared with the index: entries missing from
+        it are removed, new ones and ones whose text changed are indexed, the rest are left as they are. Returns
+        the number of entries removed or indexed.
+        """
+        self._inode, self._journal_offset, self._log_offset, self._columns = inode, 0, 0, None
+        self._saved = None  # the index file describes the old journal: the next save writes a new snapshot
+        seen: Set[int] = set()
+        changes = self._read_journal(seen)
+        for entry_id in [entry_id for entry_id in self._entries if entry_id not in seen]:
+            self._remove(entry_id)
+            changes += 1
+        return changes + self._read_log()
+
+    def _read_journal(self, seen: Optional[Set[int]] = None) -> int:
+        """
+        Index the entries appended to the journal since the watermark, skipping entries already indexed with the
+        same text. Returns the number of entries indexed. The ids of the rows read are added to `seen`, if given.
+        """
+        indexed = rows = 0
+        with open(self.file_name, mode="rb") as journal:
+            if self._journal_offset == 0 or self._columns is None:
+                header = journal.readline()
+                self._columns = JournalLog.for_file(self.file_name)._columns(parse_record(header))
+                self._journal_offset = max(self._journal_offset, len(header))
+            offset = self._journal_offset
+            for offset, record in iter_records(journal, self._journal_offset):  # a row still being written is indexed next time
+                if record.strip():
+                    entry_id, name, _, text = JournalLog._row_of(parse_record(record), offset, self._columns)
+                    rows += 1
+                    if seen is not None:
+                        seen.add(entry_id)
+                    known = self._entries.get(entry_id)
+                    if known is None or known[0] != name or known[2] != checksum(text):
+                        self._index_entry(entry_id, name, text)
+                        indexed += 1
+                offset += len(record)
+            METRICS.add("journal_search.read_journal", rows_scanned=rows, bytes_read=offset - self._journal_offset)
+            self._journal_offset = offset
+        return indexed
+
+    def _read_log(self) -> int:
+        """Apply the edit records appended to the log since the watermark. Returns the number of records applied."""
+        applied = 0
+        try:
+            with open(self.log_name, mode="rb") as log:
+                header = log.readline()
+                if parse_record(header)[:2] != ["Base", str(self._inode)]:
+                    return 0  # no log yet, or a log left over from before a compaction
+                if self._log_offset < len(header) or self._log_offset > os.fstat(log.fileno()).st_size:
+                    self._log_offset = len(header)
+                offset = self._log_offset
+                for offset, record in iter_records(log, self._log_offset):
+                    fields = parse_record(record)
+                    entry_id, operation, payload = int(fields[0]), fields[1], fields[2]
+                    if entry_id in self._entries:
+                        name = self._entries[entry_id][0]
+                        self._remove(entry_id)
+                        if operation == JournalLog.MODIFY:
+                            self._index_entry(entry_id, name, payload)
+                    applied += 1
+                    offset += len(record)
+                METRICS.add("journal_search.read_log", rows_scanned=applied, bytes_read=offset - self._log_offset)
+                self._log_offset = offset
+        except OSError:
+            return 0
+        return applied
+
+    def _index_entry(self, entry_id: int, name: str, text: str) -> None:
+        frequencies: Dict[str, int] = {}
+        for term in tokenize(text):
+            term = sys.intern(term)  # one string per distinct term, shared by every posting list and saved once by marshal
+            frequencies[term] = frequencies.get(term, 0) + 1
+        self._add(entry_id, name, frequencies, checksum(text))
+
+    def _add(self, entry_id: int, name: str, frequencies: Dict[str, int], text_checksum: int) -> None:
+        if entry_id in self._entries:  # indexed again with a new text
+            self._remove(entry_id)
+        self._entries[entry_id] = (name, frequencies, text_checksum)
+        self._delta.append((entry_id, name, frequencies, text_checksum))
+        postings = self._postings.setdefault(name, {})
+        for term in frequencies:
+            if term not in postings:
+                postings[term] = set()
+                self._sorted_terms.pop(name, None)
+            postings[term].add(entry_id)
+        self._documents[name] = self._documents.get(name, 0) + 1
+        self._lengths[name] = self._lengths.get(name, 0) + sum(frequencies.values())
+
+    def _remove(self, entry_id: int) -> None:
+        name, frequencies, _ = self._entries.pop(entry_id)
+        self._delta.append((entry_id,))
+        postings = self._postings[name]
+        for term in frequencies:
+            postings[term].discard(entry_id)
+            if not postings[term]:
+                del postings[term]
+                self._sorted_terms.pop(name, None)
+        self._documents[name] -= 1
+        self._lengths[name] -= sum(frequencies.values())
+
+    def _expand(self, name: str, term: str) -> List[str]:
+        """Return the indexed terms of a user matched by a query term ('term*' for a prefix)."""
+        postings = self._postings.get(name, {})
+        if not term.endswith("*"):
+            return [term] if term in postings else []
+        prefix = term[:-1]
+        terms = self._sorted_terms.get(name)
+        if terms is None:
+            terms = self._sorted_terms[name] = sorted(postings)
+        matches = []
+        for position in range(bisect_left(terms, prefix), len(terms)):
+            if not terms[position].startswith(prefix):
+                break
+            matches.append(terms[position])
+        return matches
+
+    def _rank(self, name: str, query: str) -> List[SearchHit]:
+        """Return every entry of the user matching all query terms, ranked by BM25."""
+        postings = self._postings.get(name)
+        query_terms = parse_query(query)
+        if not postings or not query_terms:
+            return []
+        documents = self._documents[name]
+        average_length = self._lengths[name] / documents if documents else 0.0
+        scores: Optional[Dict[int, float]] = None
+        for query_term in query_terms:
+            term_scores: Dict[int, float] = {}
+            for term in self._expand(name, query_term):
+                entry_ids = postings[term]
+                idf = math.log(1 + (documents - len(entry_ids) + 0.5) / (len(entry_ids) + 0.5))
+                for entry_id in entry_ids:
+                    frequencies = self._entries[entry_id][1]
+                    frequency = frequencies[term]
+                    length = sum(frequencies.values())
+                    norm = self.K1 * (1 - self.B + self.B * length / average_length) if average_length else self.K1
+                    term_scores[entry_id] = term_scores.get(entry_id, 0.0) + idf * frequency * (self.K1 + 1) / (frequency + norm)
+            if scores is None:
+                scores = term_scores
+            else:  # every query term must match
+                scores = {entry_id: score + term_scores[entry_id] for entry_id, score in scores.items() if entry_id in term_scores}
+            if not scores:
+                return []
+        return sorted((SearchHit(entry_id, score) for entry_id, score in scores.items()), key=lambda hit: (-hit.score, -hit.entry_id))
@@ -0,0 +1,175 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+import functools
+import os
+import threading
+import time
+
+COUNTERS = ("rows_scanned", "bytes_read", "bytes_written")
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed bucket bounds, in the layout Prometheus expects.
+
+    Attributes:
+    bounds (tuple): Upper bounds of the buckets, in seconds; a final +Inf bucket is implied.
+    counts (list): Number of observations that fell in each bucket (not cumulative), +Inf last.
+    sum (float): Total of every observation, in seconds.
+    count (int): Number of observations.
+    """
+
+    BOUNDS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, bounds: Tuple[float, ...] = BOUNDS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Return (upper bound, observations at or below it) for every bucket, ending with '+Inf'."""
+        buckets, total = [], 0
+        for bound, count in zip([repr(b) for b in self.bounds] + ["+Inf"], self.counts):
+            total += count
+            buckets.append((bound, total))
+        return buckets
+
+
+class Metrics:
+    """
+    Process-wide registry of per-operation call counts, errors, latency histograms and I/O counters.
+
+    Instrumentation is opt-in: while the registry is disabled (the default), instrumented functions
+    check a single attribute and call straight through, and `add` returns immediately. Enable it with
+    `enable()` or by setting the BABYLAND_METRICS environment variable to 1 before the program starts.
+
+    Operations are dotted names such as "csv.load_user" or "journal.read_rows". Besides calls and
+    latency, each operation can report the rows it scanned and the bytes it read or wrote (see COUNTERS).
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._latency: Dict[str, Histogram] = {}
+        self._counters: Dict[str, Dict[str, int]] = {counter: {} for counter in COUNTERS}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._calls, self._errors, self._latency = {}, {}, {}
+            self._counters = {counter: {} for counter in COUNTERS}
+
+    def observe(self, operation: str, seconds: float, error: bool = False) -> None:
+        """Record one call of an operation, its latency and whether it raised."""
+        with self._lock:
+            self._calls[operation] = self._calls.get(operation, 0) + 1
+            if error:
+                self._errors[operation] = self._errors.get(operation, 0) + 1
+            histogram = self._latency.get(operation)
+            if histogram is None:
+                histogram = self._latency[operation] = Histogram()
+            histogram.observe(seconds)
+
+    def add(self, operation: str, rows_scanned: int = 0, bytes_read: int = 0, bytes_written: int = 0) -> None:
+        """Add to the I/O counters of an operation. Does nothing while the registry is disabled."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for counter, amount in (("rows_scanned", rows_scanned), ("bytes_read", bytes_read), ("bytes_written", bytes_written)):
+                if amount:
+                    values = self._counters[counter]
+                    values[operation] = values.get(operation, 0) + amount
+
+    def snapshot(self) -> dict:
+        """
+        Return a consistent copy of everything recorded so far.
+
+        Returns:
+            dict: {operation: {"calls", "errors", "latency_seconds": {"sum", "count", "buckets"},
+            "rows_scanned", "bytes_read", "bytes_written"}}.
+        """
+        with self._lock:
+            operations = set(self._calls)
+            for values in self._counters.values():
+                operations.update(values)
+            snapshot = {}
+            for operation in sorted(operations):
+                entry = {"calls": self._calls.get(operation, 0), "errors": self._errors.get(operation, 0)}
+                histogram = self._latency.get(operation)
+                if histogram is not None:
+                    entry["latency_seconds"] = {"sum": histogram.sum, "count": histogram.count, "buckets": dict(histogram.cumulative())}
+                for counter in COUNTERS:
+                    entry[counter] = self._counters[counter].get(operation, 0)
+                snapshot[operation] = entry
+            return snapshot
+
+    def to_json(self) -> str:
+        """Return the snapshot as a JSON document."""
+        import json  # only needed when exporting; kept off the import path of every program
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self) -> str:
+        """Return the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        family("babyland_calls_total", "counter", "Calls of each instrumented operation.")
+        lines.extend(f'babyland_calls_total{{operation="{op}"}} {entry["calls"]}' for op, entry in snapshot.items() if entry["calls"])
+        family("babyland_errors_total", "counter", "Calls of each instrumented operation that raised an exception.")
+        lines.extend(f'babyland_errors_total{{operation="{op}"}} {entry["errors"]}' for op, entry in snapshot.items() if entry["calls"])
+        family("babyland_latency_seconds", "histogram", "Latency of each instrumented operation.")
+        for op, entry in snapshot.items():
+            latency = entry.get("latency_seconds")
+            if latency is None:
+                continue
+            lines.extend(f'babyland_latency_seconds_bucket{{operation="{op}",le="{bound}"}} {count}' for bound, count in latency["buckets"].items())
+            lines.append(f'babyland_latency_seconds_sum{{operation="{op}"}} {latency["sum"]!r}')
+            lines.append(f'babyland_latency_seconds_count{{operation="{op}"}} {latency["count"]}')
+        for counter in COUNTERS:
+            family(f"babyland_{counter}_total", "counter", counter.replace("_", " ").capitalize() + " by each operation.")
+            lines.extend(f'babyland_{counter}_total{{operation="{op}"}} {entry[counter]}' for op, entry in snapshot.items() if entry[counter])
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics(enabled=os.environ.get("BABYLAND_METRICS", "") == "1")  # the process-wide registry
+
+
+def instrumented(operation: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator recording the calls, errors and latency of a function under `operation` in METRICS.
+
+    While METRICS is disabled the wrapper costs one attribute check on top of the call.
+    """
+    def decorate(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                METRICS.observe(operation, time.perf_counter() - start, error=True)
+                raise
+            METRICS.observe(operation, time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorate
@@ -0,0 +1,87 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+import csv
+import os
+
+from metrics import METRICS
+
+
+class WeekInfo(NamedTuple):
+    """The milestone and medical information listed for one week of pregnancy."""
+    week: int
+    milestone: str
+    medical_info: str
+
+
+class MilestoneTable:
+    """
+    Week-indexed, in-memory copy of the milestone and medical info file.
+
+    Tables are shared by the whole process through `for_file`, so the CSV is parsed once and
+    only parsed again when its modification time changes.
+
+    Attributes:
+    file_name (str): The milestone/medical info CSV file (columns "Week", "Milestone", "Medical_Info").
+    """
+
+    _instances: Dict[str, "MilestoneTable"] = {}  # one shared table per file in the process
+
+    def __init__(self, file_name: str) -> None:
+        self.file_name = file_name
+        self._weeks: Dict[int, WeekInfo] = {}
+        self._mtime_ns: Optional[int] = None  # modification time of the file the table was loaded from
+
+    @classmethod
+    def for_file(cls, file_name: str = "data/milestone_medical_info.csv") -> "MilestoneTable":
+        """Return the process-wide table for the given file, creating it on first use."""
+        key = os.path.abspath(file_name)
+        if key not in cls._instances:
+            cls._instances[key] = cls(file_name)
+        return cls._instances[key]
+
+    def exists(self) -> bool:
+        """Return True if the data file is present (and loaded), False otherwise."""
+        return self._refresh()
+
+    def get(self, week: int) -> Optional[WeekInfo]:
+        """
+        Look up the information for a given week.
+
+        Args:
+            week (int): The week of pregnancy.
+
+        Returns:
+            Optional[WeekInfo]: The week's milestone and medical info, or None if the week is not listed
+            or the data file is missing.
+        """
+        self._refresh()
+        return self._weeks.get(week)
+
+    def fingerprint(self) -> Optional[int]:
+        """Return the modification time of the file, which the table reloads on, or None if the file is missing."""
+        try:
+            return os.stat(self.file_name).st_mtime_ns
+        except OSError:
+            return None
+
+    def weeks(self) -> Tuple[int, ...]:
+        """Return every week listed in the file, in ascending order."""
+        self._refresh()
+        return tuple(sorted(self._weeks))
+
+    def _refresh(self) -> bool:
+        """Reload the file if it changed since the last load. Returns False if the file is missing."""
+        mtime_ns = self.fingerprint()
+        if mtime_ns is None:
+            self._weeks, self._mtime_ns = {}, None
+            return False
+        if mtime_ns != self._mtime_ns:
+            weeks = {}
+            rows = 0
+            with open(self.file_name, mode="r", newline="") as csv_file:
+                for row in csv.DictReader(csv_file):
+                    week = int(row["Week"])
+                    weeks.setdefault(week, WeekInfo(week, row["Milestone"], row["Medical_Info"]))  # keep the first row of a week, like the old scan did
+                    rows += 1
+                METRICS.add("milestones.load", rows_scanned=rows, bytes_read=os.fstat(csv_file.fileno()).st_size)
+            self._weeks, self._mtime_ns = weeks, mtime_ns
+        return True
@@ -0,0 +1,148 @@
+from datetime import date, datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import heapq
+import threading
+
+from metrics import METRICS, instrumented
+from storage import Storage, UserRecord
+from timeline import WEEKS, TimelineCache
+from user_table import UserTable
+
+
+class Notification(NamedTuple):
+    """A user entering a new week of pregnancy, with the milestone and medical info listed for that week."""
+    name: str
+    week: int
+    start: date
+    due_date: date
+    milestone: Optional[str]
+    medical_info: Optional[str]
+
+
+class NotificationScheduler:
+    """
+    Min-heap of the day each profile enters its next week of pregnancy.
+
+    Every profile has one heap entry, keyed by the day ordinal of its next week boundary, so finding the
+    users due for a notification only pops the entries at the top of the heap: a day's cost grows with
+    the number of notifications, not with the number of users. Popped users are re-enqueued at their
+    following boundary, until week 40.
+
+    `follow` a storage to reschedule users whenever their profile is saved through it, whoever saves it.
+    Saving a profile pushes a new entry and invalidates the old one through a per-user generation
+    number, instead of searching the heap for it; stale entries are dropped when they reach the top,
+    and the heap is rebuilt once they make up half of it.
+
+    Attributes:
+    timelines (TimelineCache): Where week boundaries, milestone and medical info come from; its clock decides 'today'.
+    """
+
+    def __init__(self, timelines: Optional[TimelineCache] = None) -> None:
+        self.timelines = timelines or TimelineCache()
+        self._heap: List[Tuple[int, int, str]] = []  # (day ordinal of the next boundary, generation, name)
+        self._profiles: Dict[str, Tuple[int, int, int]] = {}  # name -> (generation, LMP ordinal, cycle length)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of users waiting for a notification."""
+        return len(self._profiles)
+
+    def schedule(self, record: UserRecord) -> None:
+        """Schedule (or reschedule, after a profile save) the next notification of a user."""
+        with self._lock:
+            self._push(record.name, record.lmp_date.toordinal(), record.period_length, self.timelines.clock.now().toordinal())
+            if len(self._heap) > 2 * len(self._profiles) + 64:  # mostly stale entries: rebuild
+                self._rebuild()
+
+    def follow(self, storage: Storage) -> None:
+        """Reschedule users whenever the storage writes their profile (see Storage.add_user_listener)."""
+        storage.add_user_listener(self.schedule)
+
+    def unschedule(self, name: str) -> None:
+        """Stop notifying a user."""
+        with self._lock:
+            self._profiles.pop(name, None)
+
+    def load(self, profiles: Iterable[Tuple[str, int, int]]) -> int:
+        """
+        Schedule many users at once, given as (name, LMP ordinal, cycle length), and heapify once.
+
+        Returns:
+            int: The number of users with a notification left.
+        """
+        with self._lock:
+            today = self.timelines.clock.now().toordinal()
+            for name, lmp_ordinal, period_length in profiles:
+                self._push(name, lmp_ordinal, period_length, today, heapify=False)
+            self._rebuild()
+            return len(self._profiles)
+
+    def load_user_file(self, file_name: str) -> int:
+        """Schedule every profile of a CSV profile file (the last row of each name, see UserTable)."""
+        table = UserTable(file_name)
+        return self.load(zip(table.names(), table.lmp_ordinals(), table.period_lengths()))
+
+    def next_due(self) -> Optional[date]:
+        """Return the day of the earliest pending notification, or None."""
+        with self._lock:
+            self._drop_stale()
+            return date.fromordinal(self._heap[0][0]) if self._heap else None
+
+    @instrumented("notifications.pop_due")
+    def pop_due(self, now: Optional[datetime] = None) -> List[Notification]:
+        """
+        Pop the notifications due by `now` and re-enqueue their users at their next week boundary.
+
+        A user whose boundaries were missed (the scheduler was not run for a while) gets one notification,
+        for the week they are in now.
+
+        Args:
+            now (datetime, optional): Defaults to the clock of `timelines`.
+
+        Returns:
+            list: The due notifications, earliest boundary first.
+        """
+        with self._lock:
+            today = (now or self.timelines.clock.now()).toordinal()
+            notifications = []
+            while self._heap and self._heap[0][0] <= today:
+                _, generation, name = heapq.heappop(self._heap)
+                profile = self._profiles.get(name)
+                if profile is None or profile[0] != generation:
+                    continue  # superseded by a later save, or unscheduled
+                _, lmp_ordinal, period_length = profile
+                timeline = self.timelines.get(lmp_ordinal, period_length)
+                week = timeline.week(min(timeline.progress(datetime.fromordinal(today))[0], WEEKS))
+                notifications.append(Notification(name, week.week, week.start, timeline.due_date, week.milestone, week.medical_info))
+                self._push(name, lmp_ordinal, period_length, today)
+            METRICS.add("notifications.pop_due", rows_scanned=len(notifications))
+            return notifications
+
+    def _push(self, name: str, lmp_ordinal: int, period_length: int, today: int, heapify: bool = True) -> None:
+        """Enqueue the next week boundary of a user after `today`, if any, replacing their current entry."""
+        self._profiles.pop(name, None)
+        adjusted_lmp = lmp_ordinal + period_length - 28  # same adjustment as Timeline
+        week = max((today - adjusted_lmp) // 7 + 1, 1)  # the next week to start, after today
+        if week > WEEKS:
+            return
+        self._generation += 1
+        self._profiles[name] = (self._generation, lmp_ordinal, period_length)
+        entry = (adjusted_lmp + 7 * week, self._generation, name)
+        if heapify:
+            heapq.heappush(self._heap, entry)
+        else:
+            self._heap.append(entry)
+
+    def _drop_stale(self) -> None:
+        while self._heap:
+            _, generation, name = self._heap[0]
+            profile = self._profiles.get(name)
+            if profile is not None and profile[0] == generation:
+                return
+            heapq.heappop(self._heap)
+
+    def _rebuild(self) -> None:
+        """Drop every stale entry and restore the heap property."""
+        self._heap = [entry for entry in self._heap if self._profiles.get(entry[2], (None,))[0] == entry[1]]
+        heapq.heapify(self._heap)
@@ -0,0 +1,201 @@
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+import time
+
+from journal_log import EntryNotFoundError, JournalEntry
+from metrics import instrumented
+from milestone_table import WeekInfo
+from storage import ChangeSet, Storage, UserRecord
+
+
+class Session(Storage):
+    """
+    Unit of work over a storage backend: profile and journal changes are kept in memory and written in one batch.
+
+    A Session is itself a Storage, so code written against Storage (DueDatePredictor, User.save) runs on
+    it unchanged. Reads see the session's own pending changes: a saved profile is loaded back, added
+    entries are listed with provisional (negative) ids, and modified or deleted entries show their
+    pending state. `flush` hands everything to `Storage.apply_changes`, which writes the batch at once
+    (one transaction with SQLite, one write and one fsync per file with CSV files); it runs when the
+    session is used as a context manager and exits, and after a change once `flush_interval` seconds have
+    passed since the last flush.
+
+    Edits of stored entries are checked twice: when they are made, by reading the user's live entries (so
+    an entry deleted meanwhile or another user's entry is rejected at once, while the edit stays buffered),
+    and by the backend when they are flushed, against the journal as it is then. An edit that fails the
+    second check is dropped, the rest of the batch is written, and `flush` raises EntryNotFoundError for it,
+    also from the flush a later change triggers once `flush_interval` has passed.
+
+    Full-text search runs on the backend's index, so `search_journal` flushes pending journal changes first.
+    Cursors of `journal_page` are positions in the merged entries while journal changes are pending.
+
+    Attributes:
+    storage (Storage): The backend changes are written to.
+    flush_interval (float, optional): Seconds after which a change triggers a flush; None to flush only on exit.
+    """
+
+    def __init__(self, storage: Storage, flush_interval: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            storage (Storage): The backend changes are written to.
+            flush_interval (float, optional): Seconds after which a change triggers a flush; None to flush only on exit.
+            clock (callable, optional): Returns the current time in seconds, for `flush_interval`. Defaults to time.monotonic.
+        """
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._last_flush = clock()
+        self._users: Dict[str, UserRecord] = {}
+        self._added: Dict[int, JournalEntry] = {}  # provisional id (-1, -2, ...) -> entry; a deleted one is removed
+        self._modified: Dict[int, Tuple[str, str]] = {}  # stored entry id -> (name, new text)
+        self._deleted: Dict[int, str] = {}  # stored entry id -> name
+        self._next_id = -1
+        self._flushed: Dict[int, int] = {}  # provisional id -> id in storage, for ids handed out before a flush
+
+    def __enter__(self) -> "Session":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        self.flush()  # whatever ended the session, keep what the user entered
+        return False
+
+    def pending(self) -> int:
+        """Return the number of buffered changes."""
+        return len(self._users) + len(self._added) + len(self._modified) + len(self._deleted)
+
+    @instrumented("session.flush")
+    def flush(self) -> List[int]:
+        """
+        Write every pending change to the backend in one batch and start over with an empty buffer.
+
+        Returns:
+            list: The storage ids of the entries added since the last flush, in order.
+
+        Raises:
+            IOError: If the backend could not write the batch; the changes stay pending.
+            EntryNotFoundError: If an edit named an entry that is no longer a live entry of its user. That edit
+                is dropped and everything else is written first; with several, the first one is raised.
+        """
+        self._last_flush = self._clock()
+        if not self.pending():
+            return []
+        provisional = list(self._added)
+        stale: Optional[EntryNotFoundError] = None
+        while True:
+            changes = ChangeSet(list(self._users.values()), [(e.name, e.date, e.text) for e in self._added.values()],
+                                [(name, entry_id, text) for entry_id, (name, text) in self._modified.items()],
+                                [(name, entry_id) for entry_id, name in sorted(self._deleted.items())])
+            try:
+                entry_ids = self.storage.apply_changes(changes)
+                break
+            except EntryNotFoundError as e:  # edits go first, so nothing else was written: drop the stale edit and retry the rest
+                if e.entry_id not in self._modified and e.entry_id not in self._deleted:
+                    raise
+                self._modified.pop(e.entry_id, None)
+                self._deleted.pop(e.entry_id, None)
+                stale = stale or e
+        self._flushed.update(zip(provisional, entry_ids))
+        self.discard()
+        if stale is not None:
+            raise stale
+        return entry_ids
+
+    def discard(self) -> None:
+        """Drop every pending change."""
+        self._users.clear()
+        self._added.clear()
+        self._modified.clear()
+        self._deleted.clear()
+
+    def load_user(self, name: str) -> Optional[UserRecord]:
+        return self._users[name] if name in self._users else self.storage.load_user(name)
+
+    def save_user(self, record: UserRecord) -> None:
+        self._users.pop(record.name, None)  # keep saves in order: the latest one last
+        self._users[record.name] = record
+        self._changed()
+
+    def add_user_listener(self, listener: Callable[[UserRecord], None]) -> None:
+        self.storage.add_user_listener(listener)  # called when the backend writes the profiles, at flush time
+
+    def has_milestones(self) -> bool:
+        return self.storage.has_milestones()
+
+    def week_info(self, week: int) -> Optional[WeekInfo]:
+        return self.storage.week_info(week)
+
+    def milestones_fingerprint(self) -> Optional[Hashable]:
+        return self.storage.milestones_fingerprint()
+
+    def has_journal(self) -> bool:
+        return bool(self._added) or self.storage.has_journal()
+
+    def journal_entries(self, name: str) -> List[JournalEntry]:
+        entries = self.storage.journal_entries(name) if self.storage.has_journal() else []
+        if self._modified or self._deleted:
+            entries = [entry._replace(text=self._modified[entry.entry_id][1]) if entry.entry_id in self._modified else entry
+                       for entry in entries if entry.entry_id not in self._deleted]
+        return entries + [entry for entry in self._added.values() if entry.name == name]
+
+    def journal_page(self, name: str, page_size: int = 10, cursor: Optional[int] = None,
+                     newest_first: bool = True) -> Tuple[List[JournalEntry], Optional[int]]:
+        if not (self._added or self._modified or self._deleted):
+            return self.storage.journal_page(name, page_size, cursor, newest_first)
+        entries = self.journal_entries(name)
+        if newest_first:
+            entries.reverse()
+        start = cursor or 0
+        return entries[start:start + page_size], (start + page_size if start + page_size < len(entries) else None)
+
+    def search_journal(self, name: str, query: str, page_size: int = 10,
+                       cursor: Optional[int] = None) -> Tuple[List[JournalEntry], Optional[int]]:
+        if self._added or self._modified or self._deleted:
+            self.flush()
+        return self.storage.search_journal(name, query, page_size, cursor)
+
+    def add_journal_entry(self, name: str, date: str, text: str) -> int:
+        entry_id = self._next_id
+        self._next_id -= 1
+        self._added[entry_id] = JournalEntry(entry_id, name, date, text)
+        self._changed()
+        return entry_id
+
+    def modify_journal_entry(self, name: str, entry_id: int, text: str) -> None:
+        stored_id = self._flushed.get(entry_id, entry_id)  # errors name the id the caller gave
+        if stored_id in self._added:
+            self._check_owner(name, stored_id, entry_id)
+            self._added[stored_id] = self._added[stored_id]._replace(text=text)
+        elif stored_id in self._deleted:
+            raise EntryNotFoundError(name, entry_id)
+        else:
+            self._check_stored(name, stored_id, entry_id)
+            self._modified[stored_id] = (name, text)  # checked against the backend again when flushed
+        self._changed()
+
+    def delete_journal_entry(self, name: str, entry_id: int) -> None:
+        stored_id = self._flushed.get(entry_id, entry_id)
+        if stored_id in self._added:
+            self._check_owner(name, stored_id, entry_id)
+            del self._added[stored_id]
+        elif stored_id in self._deleted:
+            raise EntryNotFoundError(name, entry_id)
+        else:
+            self._check_stored(name, stored_id, entry_id)
+            self._modified.pop(stored_id, None)
+            self._deleted[stored_id] = name
+        self._changed()
+
+    def _check_owner(self, name: str, stored_id: int, entry_id: int) -> None:
+        """Raise EntryNotFoundError for `entry_id` unless the pending new entry `stored_id` belongs to the user."""
+        if self._added[stored_id].name != name:
+            raise EntryNotFoundError(name, entry_id)
+
+    def _check_stored(self, name: str, stored_id: int, entry_id: int) -> None:
+        """Raise EntryNotFoundError for `entry_id` unless the stored entry `stored_id` is a live entry of the user, as the backend reads it now."""
+        if not self.storage.has_journal() or all(entry.entry_id != stored_id for entry in self.storage.journal_entries(name)):
+            raise EntryNotFoundError(name, entry_id)
+
+    def _changed(self) -> None:
+        """Flush if the flush interval has passed since the last flush."""
+        if self.flush_interval is not None and self._clock() - self._last_flush >= self.flush_interval:
+            self.flush()
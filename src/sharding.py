@@ -0,0 +1,371 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+import argparse
+import csv
+import os
+import zlib
+
+from csv_index import CSVOffsetIndex
+from journal_log import EntryNotFoundError, JournalEntry, JournalLog
+from journal_search import JournalSearchIndex
+from metrics import instrumented
+from milestone_table import WeekInfo
+from storage import ChangeSet, CSVStorage, Storage, UserRecord
+from user_table import UserTable
+
+T = TypeVar("T")
+
+MANIFEST = "shards.txt"  # in the data directory: the number of shards, which must never change for existing data
+DEFAULT_SHARDS = 8
+
+
+def shard_of(name: str, shards: int) -> int:
+    """Return the shard holding a user's data: a stable hash (crc32, unlike hash() not salted per process) of the name."""
+    return zlib.crc32(name.encode("utf-8")) % shards
+
+
+class ShardedCSVStorage(Storage):
+    """
+    CSV storage split into `shards` directories by a stable hash of the user name.
+
+    Each shard ('<data_dir>/shard-NNN') is an ordinary CSV data directory with its own profile file,
+    journal, edit log and indexes, served by a CSVStorage; the milestone file stays shared in the data
+    directory. Profile and journal methods are routed to the shard of the user, so a user's saves, edits
+    and compactions only ever touch that shard's files, and a tenant's data never shares a file lock with
+    most other tenants.
+
+    Journal entry ids are global: the entry's id in its shard's journal times the number of shards, plus
+    the shard number. Edits are routed on the user's name, and rejected if the id is from another shard.
+
+    The number of shards is recorded in '<data_dir>/shards.txt' on the first write (or by `split`), and a
+    data directory is always opened with the recorded number. Cross-user operations (`map`, `export_users`,
+    `reindex`, `compact`, `stats`) fan out over a process pool, one shard per task.
+
+    Attributes:
+    data_dir (str): The data directory.
+    shard_count (int): The number of shards.
+    shards (list): The CSVStorage of every shard, by shard number.
+    milestone_file (str): The shared milestone and medical info file.
+    """
+
+    def __init__(self, data_dir: str = "data", shards: Optional[int] = None, snapshots: bool = False,
+                 journal_cache_bytes: Optional[int] = None) -> None:
+        """
+        Args:
+            data_dir (str, optional): The data directory. Defaults to "data".
+            shards (int, optional): The number of shards of a new layout. Defaults to the recorded number, or 8.
+            snapshots (bool, optional): Serve lookups from binary snapshots (see CSVStorage). Defaults to False.
+            journal_cache_bytes (int, optional): Memory budget of the journal entry caches, split evenly between the shards
+                (see CSVStorage). Defaults to None, which keeps the current budgets.
+
+        Raises:
+            ValueError: If `shards` differs from the number recorded for the data directory.
+        """
+        self.data_dir = data_dir
+        self.milestone_file = os.path.join(data_dir, "milestone_medical_info.csv")
+        recorded = self.recorded_shards(data_dir)
+        if recorded is not None and shards is not None and shards != recorded:
+            raise ValueError(f"{data_dir} is split into {recorded} shards, not {shards}.")
+        self.shard_count = recorded or shards or DEFAULT_SHARDS
+        shard_cache_bytes = journal_cache_bytes // self.shard_count if journal_cache_bytes is not None else None
+        self.shards = [CSVStorage(self.shard_dir(shard), milestone_file=self.milestone_file, snapshots=snapshots,
+                                  journal_cache_bytes=shard_cache_bytes)
+                       for shard in range(self.shard_count)]
+
+    @staticmethod
+    def recorded_shards(data_dir: str) -> Optional[int]:
+        """Return the number of shards recorded for a data directory, or None if it is not sharded."""
+        try:
+            with open(os.path.join(data_dir, MANIFEST), mode="r") as manifest:
+                return int(manifest.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def shard_dir(self, shard: int) -> str:
+        return os.path.join(self.data_dir, f"shard-{shard:03d}")
+
+    def shard_for(self, name: str) -> CSVStorage:
+        """Return the storage of the shard holding a user's data."""
+        return self.shards[shard_of(name, self.shard_count)]
+
+    def load_user(self, name: str) -> Optional[UserRecord]:
+        return self.shard_for(name).load_user(name)
+
+    def save_user(self, record: UserRecord) -> None:
+        self._prepare(shard_of(record.name, self.shard_count))
+        self.shard_for(record.name).save_user(record)
+
+    def add_user_listener(self, listener: Callable[[UserRecord], None]) -> None:
+        for shard in self.shards:  # every profile is written by its shard's storage
+            shard.add_user_listener(listener)
+
+    def has_milestones(self) -> bool:
+        return self.shards[0].has_milestones()  # every shard shares the milestone file
+
+    def week_info(self, week: int) -> Optional[WeekInfo]:
+        return self.shards[0].week_info(week)
+
+    def milestones_fingerprint(self) -> Optional[Hashable]:
+        return self.shards[0].milestones_fingerprint()
+
+    def has_journal(self) -> bool:
+        return any(shard.has_journal() for shard in self.shards)
+
+    def journal_entries(self, name: str) -> List[JournalEntry]:
+        shard = shard_of(name, self.shard_count)
+        return [self._global(entry, shard) for entry in self.shards[shard].journal_entries(name)]
+
+    def journal_page(self, name: str, page_size: int = 10, cursor: Optional[int] = None,
+                     newest_first: bool = True) -> Tuple[List[JournalEntry], Optional[int]]:
+        shard = shard_of(name, self.shard_count)
+        local_cursor = self._local(cursor)[1] if cursor is not None else None
+        entries, next_cursor = self.shards[shard].journal_page(name, page_size, local_cursor, newest_first)
+        return ([self._global(entry, shard) for entry in entries],
+                next_cursor * self.shard_count + shard if next_cursor is not None else None)
+
+    def search_journal(self, name: str, query: str, page_size: int = 10,
+                       cursor: Optional[int] = None) -> Tuple[List[JournalEntry], Optional[int]]:
+        shard = shard_of(name, self.shard_count)
+        entries, next_cursor = self.shards[shard].search_journal(name, query, page_size, cursor)  # the cursor is a position in the results
+        return [self._global(entry, shard) for entry in entries], next_cursor
+
+    def add_journal_entry(self, name: str, date: str, text: str) -> int:
+        shard = shard_of(name, self.shard_count)
+        self._prepare(shard)
+        return self.shards[shard].add_journal_entry(name, date, text) * self.shard_count + shard
+
+    def modify_journal_entry(self, name: str, entry_id: int, text: str) -> None:
+        shard, local_id = self._owned(name, entry_id)
+        self.shards[shard].modify_journal_entry(name, local_id, text)
+
+    def delete_journal_entry(self, name: str, entry_id: int) -> None:
+        shard, local_id = self._owned(name, entry_id)
+        self.shards[shard].delete_journal_entry(name, local_id)
+
+    def apply_changes(self, changes: ChangeSet) -> List[int]:
+        """
+        Split a batch of changes by shard and write each part with that shard's batched write. The edits of
+        every shard are written first, so an edit of an entry that is gone fails before the rest is written.
+        """
+        parts: Dict[int, ChangeSet] = {}
+        def part(shard: int) -> ChangeSet:
+            return parts.setdefault(shard, ChangeSet([], [], [], []))
+        added = []  # (shard, position in the shard's part) of every added entry
+        for record in changes.users:
+            part(shard_of(record.name, self.shard_count)).users.append(record)
+        for entry in changes.added:
+            shard = shard_of(entry[0], self.shard_count)
+            added.append((shard, len(part(shard).added)))
+            part(shard).added.append(entry)
+        for name, entry_id, text in changes.modified:
+            shard, local_id = self._owned(name, entry_id)
+            part(shard).modified.append((name, local_id, text))
+        for name, entry_id in changes.deleted:
+            shard, local_id = self._owned(name, entry_id)
+            part(shard).deleted.append((name, local_id))
+        for shard, shard_changes in sorted(parts.items()):
+            if shard_changes.modified or shard_changes.deleted:
+                self.shards[shard].apply_changes(ChangeSet([], [], shard_changes.modified, shard_changes.deleted))
+        local_ids = {}
+        for shard, shard_changes in sorted(parts.items()):
+            if shard_changes.users or shard_changes.added:
+                self._prepare(shard)
+            local_ids[shard] = self.shards[shard].apply_changes(ChangeSet(shard_changes.users, shard_changes.added, [], []))
+        return [local_ids[shard][position] * self.shard_count + shard for shard, position in added]
+
+    @instrumented("sharded.map")
+    def map(self, function: Callable[[CSVStorage], T], workers: Optional[int] = None,
+            executor: Optional[Executor] = None) -> List[T]:
+        """
+        Run `function` on the storage of every shard, in parallel on a process pool, one shard per task.
+
+        Args:
+            function (callable): A module-level (picklable) function taking a shard's CSVStorage.
+            workers (int, optional): Size of the process pool. Defaults to the number of CPUs, at most one per shard.
+            executor (Executor, optional): Run the tasks on this executor instead of a new process pool.
+
+        Returns:
+            list: The result of every shard, by shard number.
+        """
+        if executor is not None:
+            return list(executor.map(function, self.shards))
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, self.shard_count)) as pool:
+            return list(pool.map(function, self.shards))
+
+    def export_users(self, output_file: str, workers: Optional[int] = None, executor: Optional[Executor] = None) -> int:
+        """
+        Write the live profile of every user to one CSV file (columns "Name", "LMP Date", "Period Length"), shard by shard.
+
+        Returns:
+            int: The number of profiles written.
+        """
+        total = 0
+        with open(output_file, mode="w", newline="") as target:
+            writer = csv.writer(target)
+            writer.writerow(CSVStorage.USER_HEADER)
+            for rows in self.map(_export_shard, workers, executor):
+                writer.writerows(rows)
+                total += len(rows)
+        return total
+
+    def reindex(self, workers: Optional[int] = None, executor: Optional[Executor] = None) -> None:
+        """Rebuild and persist the name indexes and the journal search index of every shard."""
+        self.map(_reindex_shard, workers, executor)
+
+    def compact(self, workers: Optional[int] = None, executor: Optional[Executor] = None) -> None:
+        """Compact the profile file and the journal of every shard."""
+        self.map(_compact_shard, workers, executor)
+
+    def stats(self, workers: Optional[int] = None, executor: Optional[Executor] = None) -> Dict[str, int]:
+        """Return the number of profiles and live journal entries over all shards, and the bytes the shards take."""
+        totals = {"profiles": 0, "journal_entries": 0, "bytes": 0}
+        for shard_stats in self.map(_shard_stats, workers, executor):
+            for key, value in shard_stats.items():
+                totals[key] += value
+        return totals
+
+    def _prepare(self, shard: int) -> None:
+        """Before writing to a shard: record the number of shards and create the shard's directory."""
+        if self.recorded_shards(self.data_dir) is None:
+            _write_manifest(self.data_dir, self.shard_count)
+        os.makedirs(self.shard_dir(shard), exist_ok=True)
+
+    def _global(self, entry: JournalEntry, shard: int) -> JournalEntry:
+        return entry._replace(entry_id=entry.entry_id * self.shard_count + shard)
+
+    def _local(self, entry_id: int) -> Tuple[int, int]:
+        """Return the shard and the shard-local id of a global journal entry id."""
+        local_id, shard = divmod(entry_id, self.shard_count)
+        return shard, local_id
+
+    def _owned(self, name: str, entry_id: int) -> Tuple[int, int]:
+        """Return the shard and the shard-local id of one of a user's entries; raises EntryNotFoundError if it is from another shard."""
+        shard, local_id = self._local(entry_id)
+        if shard != shard_of(name, self.shard_count):
+            raise EntryNotFoundError(name, entry_id)
+        return shard, local_id
+
+
+def _write_manifest(data_dir: str, shards: int) -> None:
+    os.makedirs(data_dir, exist_ok=True)
+    tmp_path = os.path.join(data_dir, MANIFEST + ".tmp")
+    with open(tmp_path, mode="w") as manifest:
+        manifest.write(f"{shards}\n")
+    os.replace(tmp_path, os.path.join(data_dir, MANIFEST))
+
+
+def _export_shard(shard: CSVStorage) -> List[Tuple[str, str, int]]:
+    table = UserTable(shard.user_file)
+    return [(user.name, user.lmp_date.strftime("%m/%d/%Y"), user.period_length) for user in table]
+
+
+def _reindex_shard(shard: CSVStorage) -> None:
+    if os.path.exists(shard.user_file):
+        CSVOffsetIndex(shard.user_file).rebuild()
+    if shard.has_journal():
+        JournalLog(shard.journal_file).rebuild_index()
+        search_index = JournalSearchIndex(shard.journal_file)
+        search_index.refresh()
+        search_index.save()
+
+
+def _compact_shard(shard: CSVStorage) -> None:
+    shard.compact_users()
+    if shard.has_journal():
+        JournalLog(shard.journal_file, background=False).compact()
+
+
+def _shard_stats(shard: CSVStorage) -> Dict[str, int]:
+    stats = {"profiles": 0, "journal_entries": 0, "bytes": 0}
+    if os.path.exists(shard.user_file):
+        stats["profiles"] = len(UserTable(shard.user_file))
+    if shard.has_journal():
+        stats["journal_entries"] = len(JournalLog(shard.journal_file).entries())
+    if os.path.isdir(os.path.dirname(shard.user_file)):
+        for entry in os.scandir(os.path.dirname(shard.user_file)):
+            if entry.is_file():
+                stats["bytes"] += entry.stat().st_size
+    return stats
+
+
+def split(data_dir: str, shards: int = DEFAULT_SHARDS) -> Tuple[int, int]:
+    """
+    Split the single-file profiles and journal of a data directory into shards, in the same directory.
+
+    The original files are left in place (and no longer used by ShardedCSVStorage). Only live data is
+    copied: the last profile of every name and the journal entries with their logged edits applied, so
+    journal entry ids change.
+
+    Returns:
+        tuple: The number of profiles and journal entries copied.
+
+    Raises:
+        ValueError: If the data directory is already sharded.
+    """
+    if ShardedCSVStorage.recorded_shards(data_dir) is not None:
+        raise ValueError(f"{data_dir} is already sharded.")
+    source = CSVStorage(data_dir)
+    storage = ShardedCSVStorage(data_dir, shards)
+    for shard in range(shards):
+        os.makedirs(storage.shard_dir(shard), exist_ok=True)
+    profiles = entries = 0
+    if os.path.exists(source.user_file):
+        files = [open(shard.user_file, mode="w", newline="") for shard in storage.shards]
+        try:
+            writers = [csv.writer(user_file) for user_file in files]
+            for writer in writers:
+                writer.writerow(CSVStorage.USER_HEADER)
+            for user in UserTable(source.user_file):
+                writers[shard_of(user.name, shards)].writerow([user.name, user.lmp_date.strftime("%m/%d/%Y"), user.period_length])
+                profiles += 1
+        finally:
+            for user_file in files:
+                user_file.close()
+    if source.has_journal():
+        by_shard: List[List[Tuple[str, str, str]]] = [[] for _ in range(shards)]
+        for entry in JournalLog(source.journal_file).entries():
+            by_shard[shard_of(entry.name, shards)].append((entry.name, entry.date, entry.text))
+            entries += 1
+        for shard, shard_entries in zip(storage.shards, by_shard):
+            with open(shard.journal_file, mode="w", newline="") as journal_file:
+                csv.writer(journal_file).writerow(JournalLog.HEADER)
+            JournalLog.for_file(shard.journal_file).append_many(shard_entries)  # new ids, from the shard's id base
+    _write_manifest(data_dir, shards)  # last: a directory only counts as sharded once every shard is written
+    return profiles, entries
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Split a BabyLand data directory into shards and run cross-user jobs over them.")
+    parser.add_argument("command", choices=["split", "reindex", "compact", "export", "stats"])
+    parser.add_argument("data_dir", nargs="?", default="data")
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS, help=f"number of shards for 'split' (default: {DEFAULT_SHARDS})")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--output", default="users_export.csv", help="file written by 'export' (default: users_export.csv)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "split":
+            profiles, entries = split(args.data_dir, args.shards)
+            print(f"Split {profiles} profiles and {entries} journal entries into {args.shards} shards.")
+            return
+        if ShardedCSVStorage.recorded_shards(args.data_dir) is None:
+            print(f"Error: {args.data_dir} is not sharded (run 'split' first).")
+            return
+        storage = ShardedCSVStorage(args.data_dir)
+        if args.command == "reindex":
+            storage.reindex(args.workers)
+            print(f"Reindexed {storage.shard_count} shards.")
+        elif args.command == "compact":
+            storage.compact(args.workers)
+            print(f"Compacted {storage.shard_count} shards.")
+        elif args.command == "export":
+            print(f"Exported {storage.export_users(args.output, args.workers)} profiles to {args.output}.")
+        else:
+            for key, value in storage.stats(args.workers).items():
+                print(f"{key}: {value}")
+    except (IOError, ValueError) as e:
+        print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import argparse
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+from metrics import METRICS, instrumented
+from milestone_table import MilestoneTable, WeekInfo
+from user_table import UserTable
+
+EMPTY_SLOT = 0xFFFFFFFF
+
+
+class Snapshot(ABC):
+    """
+    Read-only binary image of a data file, memory-mapped so lookups read pages on demand without parsing.
+
+    Layout: a fixed header, an offsets table, then the sections of the snapshot kind.
+
+        header    magic (8s), kind (4s), number of sections (I), then the (size, mtime_ns) of each source
+                  file (2 x qq) the snapshot was built from
+        offsets   (offset, length) of every section (qq each)
+        sections  fixed-width records, hash tables and string heaps; see each subclass
+
+    The snapshot lives next to its source ('<file>.snap'). Whenever a source file no longer matches the
+    fingerprint in the header, the snapshot is rebuilt from the source (written to a uniquely named
+    temporary file and renamed over the old one) before the next lookup, so readers never see a stale or
+    half-written image, and processes rebuilding it at the same time never write to the same file.
+    Snapshots suit read-mostly processes: each write to the source costs a rebuild on the next read.
+
+    Attributes:
+    sources (tuple): The files the snapshot is built from; the first one is the data file itself.
+    path (str): The snapshot file.
+    """
+
+    MAGIC = b"BLSNAP02"  # 02: user snapshots resolve duplicate names to the last row
+    KIND = b"    "
+    HEADER = struct.Struct("<8s4sIqqqq")
+    SECTION = struct.Struct("<qq")
+
+    _instances: Dict[Tuple[type, str], "Snapshot"] = {}  # one shared snapshot per kind and file in the process
+
+    def __init__(self, sources: Sequence[str], path: Optional[str] = None) -> None:
+        self.sources = tuple(sources)
+        self.path = path or self.sources[0] + ".snap"
+        self._lock = threading.Lock()
+        # (fingerprint, map, (offset, length) of each section), swapped as a whole so readers never mix two snapshots
+        self._state: Optional[Tuple[Tuple[int, int, int, int], mmap.mmap, List[Tuple[int, int]]]] = None
+
+    @classmethod
+    def for_file(cls, file_name: str) -> "Snapshot":
+        """Return the process-wide snapshot of the given data file, creating it on first use."""
+        key = (cls, os.path.abspath(file_name))
+        if key not in cls._instances:
+            cls._instances[key] = cls.from_file(file_name)
+        return cls._instances[key]
+
+    @classmethod
+    def from_file(cls, file_name: str) -> "Snapshot":
+        return cls([file_name])
+
+    def exists(self) -> bool:
+        """Return True if the data file exists (and the snapshot is therefore available)."""
+        return self._refresh() is not None
+
+    def rebuild(self) -> None:
+        """Write the snapshot again from the source files, whether or not it is stale."""
+        with self._lock:
+            fingerprint = self._source_fingerprint()
+            if fingerprint is not None:
+                self._build(fingerprint)
+                self._open()
+
+    def _source_fingerprint(self) -> Optional[Tuple[int, int, int, int]]:
+        """Return the (size, mtime_ns) of the first two sources (0, 0 for a missing extra source), or None without a data file."""
+        stats = []
+        for index, source in enumerate((self.sources + ("",))[:2]):
+            try:
+                stat = os.stat(source)
+            except OSError:
+                if index == 0:
+                    return None
+                stats.extend((0, 0))
+                continue
+            stats.extend((stat.st_size, stat.st_mtime_ns))
+        return tuple(stats)
+
+    def _refresh(self) -> Optional[Tuple[mmap.mmap, List[Tuple[int, int]]]]:
+        """
+        Return the current map and its sections, reopening or rebuilding the snapshot if the sources changed.
+        Returns None if there is no data file.
+        """
+        fingerprint = self._source_fingerprint()
+        state = self._state
+        if fingerprint is not None and state is not None and fingerprint == state[0]:
+            return state[1], state[2]
+        with self._lock:
+            if fingerprint is None:
+                self._state = None
+                return None
+            if self._state is None or fingerprint != self._state[0]:
+                if self._read_fingerprint() != fingerprint:  # missing or stale on disk (another process may have rebuilt it already)
+                    self._build(fingerprint)
+                self._open()
+            return self._state[1], self._state[2]
+
+    def _read_fingerprint(self) -> Optional[Tuple[int, int, int, int]]:
+        try:
+            with open(self.path, mode="rb") as snapshot:
+                header = snapshot.read(self.HEADER.size)
+        except OSError:
+            return None
+        if len(header) != self.HEADER.size:
+            return None
+        magic, kind, _, *fingerprint = self.HEADER.unpack(header)
+        if magic != self.MAGIC or kind != self.KIND:
+            return None
+        return tuple(fingerprint)
+
+    def _open(self) -> None:
+        """Map the snapshot file and read its header and offsets table."""
+        with open(self.path, mode="rb") as snapshot:
+            snapshot_map = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, count, *fingerprint = self.HEADER.unpack_from(snapshot_map, 0)
+        sections = [self.SECTION.unpack_from(snapshot_map, self.HEADER.size + i * self.SECTION.size) for i in range(count)]
+        self._state = (tuple(fingerprint), snapshot_map, sections)  # the previous map is released once no reader holds it
+
+    @instrumented("snapshot.build")
+    def _build(self, fingerprint: Tuple[int, int, int, int]) -> None:
+        """Build the sections from the sources and write the snapshot atomically."""
+        sections = self._build_sections()
+        position = self.HEADER.size + len(sections) * self.SECTION.size
+        table = []
+        for section in sections:
+            table.append(self.SECTION.pack(position, len(section)))
+            position += len(section)
+        descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                                prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, mode="wb") as snapshot:
+                snapshot.write(self.HEADER.pack(self.MAGIC, self.KIND, len(sections), *fingerprint))
+                snapshot.write(b"".join(table))
+                for section in sections:
+                    snapshot.write(section)
+                METRICS.add("snapshot.build", bytes_written=snapshot.tell())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)  # never leave a half-written file behind
+            raise
+
+    @abstractmethod
+    def _build_sections(self) -> List[bytes]:
+        """Return the sections of the snapshot, built from the sources, in the order the lookups expect them."""
+
+
+def _hash_slots(count: int, key_at: Callable[[int], bytes]) -> bytes:
+    """Build an open-addressing table (uint32 slots, power-of-two size, at most half full) of `count` keys, hashed with crc32."""
+    size = 8
+    while size < 2 * count:
+        size *= 2
+    slots = [EMPTY_SLOT] * size
+    mask = size - 1
+    for index in range(count):
+        slot = zlib.crc32(key_at(index)) & mask
+        while slots[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask  # linear probing
+        slots[slot] = index
+    return struct.pack(f"<{size}I", *slots)
+
+
+def _probe(snapshot_map: mmap.mmap, slots: Tuple[int, int], key: bytes, key_at: Callable[[int], bytes]) -> Optional[int]:
+    """Look `key` up in a hash table section built by `_hash_slots`. Returns its index, or None."""
+    offset, length = slots
+    mask = length // 4 - 1
+    slot = zlib.crc32(key) & mask
+    while True:
+        index = struct.unpack_from("<I", snapshot_map, offset + 4 * slot)[0]
+        if index == EMPTY_SLOT:
+            return None
+        if key_at(index) == key:
+            return index
+        slot = (slot + 1) & mask
+
+
+class UserSnapshot(Snapshot):
+    """
+    Snapshot of the user file: one profile per name, as resolved by UserTable.
+
+    Sections: records (name offset Q, name length I, LMP day ordinal i, period length B per profile, in file
+    order), a crc32 hash table of record numbers by name, and the heap of UTF-8 names.
+    """
+
+    KIND = b"USER"
+    RECORD = struct.Struct("<QIiB")
+
+    def __len__(self) -> int:
+        state = self._refresh()
+        return state[1][0][1] // self.RECORD.size if state is not None else 0
+
+    def get(self, name: str) -> Optional[Tuple[int, int]]:
+        """Return the (LMP day ordinal, period length) of a user, or None if there is no profile for that name."""
+        state = self._refresh()
+        if state is None:
+            return None
+        snapshot_map, (records, slots, names) = state
+        index = _probe(snapshot_map, slots, name.encode("utf-8"), lambda i: self._name(snapshot_map, records, names, i))
+        if index is None:
+            return None
+        _, _, lmp_ordinal, period_length = self.RECORD.unpack_from(snapshot_map, records[0] + index * self.RECORD.size)
+        return lmp_ordinal, period_length
+
+    def _name(self, snapshot_map: mmap.mmap, records: Tuple[int, int], names: Tuple[int, int], index: int) -> bytes:
+        name_offset, name_length, _, _ = self.RECORD.unpack_from(snapshot_map, records[0] + index * self.RECORD.size)
+        return snapshot_map[names[0] + name_offset:names[0] + name_offset + name_length]
+
+    def _build_sections(self) -> List[bytes]:
+        table = UserTable(self.sources[0])
+        names = [table.name(row).encode("utf-8") for row in range(len(table))]
+        lmp_ordinals, period_lengths = table.lmp_ordinals(), table.period_lengths()
+        records, position = [], 0
+        for row, name in enumerate(names):
+            records.append(self.RECORD.pack(position, len(name), lmp_ordinals[row], period_lengths[row]))
+            position += len(name)
+        return [b"".join(records), _hash_slots(len(names), names.__getitem__), b"".join(names)]
+
+
+class MilestoneSnapshot(Snapshot):
+    """
+    Snapshot of the milestone and medical info file.
+
+    Sections: records (week i, milestone offset Q and length I, medical info offset Q and length I), sorted
+    by week, and the heap of UTF-8 texts.
+    """
+
+    KIND = b"MILE"
+    RECORD = struct.Struct("<iQIQI")
+
+    def get(self, week: int) -> Optional[WeekInfo]:
+        """Return the milestone and medical info of a week, or None if the week is not listed."""
+        state = self._refresh()
+        if state is None:
+            return None
+        snapshot_map, (records, texts) = state
+        low, high = 0, records[1] // self.RECORD.size
+        while low < high:  # binary search on the sorted weeks
+            middle = (low + high) // 2
+            record = self.RECORD.unpack_from(snapshot_map, records[0] + middle * self.RECORD.size)
+            if record[0] < week:
+                low = middle + 1
+            elif record[0] > week:
+                high = middle
+            else:
+                _, milestone_offset, milestone_length, medical_offset, medical_length = record
+                return WeekInfo(week,
+                                snapshot_map[texts[0] + milestone_offset:texts[0] + milestone_offset + milestone_length].decode("utf-8"),
+                                snapshot_map[texts[0] + medical_offset:texts[0] + medical_offset + medical_length].decode("utf-8"))
+        return None
+
+    def _build_sections(self) -> List[bytes]:
+        table = MilestoneTable(self.sources[0])
+        records, texts, position = [], [], 0
+        for week in table.weeks():
+            info = table.get(week)
+            milestone, medical_info = info.milestone.encode("utf-8"), info.medical_info.encode("utf-8")
+            records.append(self.RECORD.pack(week, position, len(milestone), position + len(milestone), len(medical_info)))
+            texts.extend((milestone, medical_info))
+            position += len(milestone) + len(medical_info)
+        return [b"".join(records), b"".join(texts)]
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build (or refresh) the binary snapshots of a BabyLand data directory.")
+    parser.add_argument("data_dir", nargs="?", default="data")
+    args = parser.parse_args(argv)
+    for snapshot_class, file_name in ((UserSnapshot, "user_data.csv"), (MilestoneSnapshot, "milestone_medical_info.csv")):
+        snapshot = snapshot_class.from_file(os.path.join(args.data_dir, file_name))
+        print(f"{snapshot.path}: {'up to date' if snapshot.exists() else 'no data file'}")
+
+
+if __name__ == "__main__":
+    main()
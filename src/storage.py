@@ -0,0 +1,597 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+import csv
+import os
+import sqlite3
+import threading
+from os.path import exists
+
+from csv_index import CSVOffsetIndex, iter_records, read_record
+from file_lock import GroupCommitWriter, fsync_directory, locked
+from journal_log import EntryNotFoundError, JournalEntry, JournalLog
+from journal_search import JournalSearchIndex, parse_query
+from metrics import METRICS, instrumented
+from milestone_table import MilestoneTable, WeekInfo
+from snapshot import MilestoneSnapshot, UserSnapshot
+
+
+class UserRecord(NamedTuple):
+    """A stored user profile."""
+    name: str
+    lmp_date: datetime
+    period_length: int
+
+
+class ChangeSet(NamedTuple):
+    """Profile and journal changes written together by `Storage.apply_changes` (see session.py)."""
+    users: List[UserRecord]  # profiles to save, in order
+    added: List[Tuple[str, str, str]]  # new journal entries, as (name, date, text)
+    modified: List[Tuple[str, int, str]]  # (name, entry id, new text) of existing entries
+    deleted: List[Tuple[str, int]]  # (name, entry id) of existing entries
+
+
+class Storage(ABC):
+    """
+    Interface that every read and write of profiles, milestone info and journal entries goes through.
+
+    Backends report I/O problems by raising IOError (or one of its subclasses), whatever the
+    underlying technology, so callers can keep handling failures the same way. Backends also call the
+    user listeners (see `add_user_listener`) with every profile they write, whichever call wrote it.
+    """
+
+    _user_listeners: Tuple[Callable[[UserRecord], None], ...] = ()  # replaced per instance by add_user_listener
+
+    @abstractmethod
+    def load_user(self, name: str) -> Optional[UserRecord]:
+        """Return the stored profile of the given user, or None if there is none."""
+
+    @abstractmethod
+    def save_user(self, record: UserRecord) -> None:
+        """Store a user profile, replacing any previous profile of the same name (the last write wins)."""
+
+    def add_user_listener(self, listener: Callable[[UserRecord], None]) -> None:
+        """
+        Call `listener` with every profile this storage writes from now on, once it is written: single saves
+        (User.save, the interactive predictor) and batches (apply_changes, bulk imports) alike.
+        """
+        self._user_listeners = self._user_listeners + (listener,)
+
+    def _users_saved(self, records: Iterable[UserRecord]) -> None:
+        """Pass profiles just written to the user listeners."""
+        for record in records:
+            for listener in self._user_listeners:
+                listener(record)
+
+    @abstractmethod
+    def has_milestones(self) -> bool:
+        """Return True if milestone and medical info is available."""
+
+    @abstractmethod
+    def week_info(self, week: int) -> Optional[WeekInfo]:
+        """Return the milestone and medical info of a week of pregnancy, or None if the week is not listed."""
+
+    def milestones_fingerprint(self) -> Optional[Hashable]:
+        """
+        Return a value that changes whenever the milestone and medical info changes, so copies of it (see
+        timeline.TimelineCache) know when to read it again. This default returns None: the info never changes.
+        """
+        return None
+
+    @abstractmethod
+    def has_journal(self) -> bool:
+        """Return True if a journal exists."""
+
+    @abstractmethod
+    def journal_entries(self, name: str) -> List[JournalEntry]:
+        """Return the live journal entries of a user, oldest first."""
+
+    @abstractmethod
+    def journal_page(self, name: str, page_size: int = 10, cursor: Optional[int] = None,
+                     newest_first: bool = True) -> Tuple[List[JournalEntry], Optional[int]]:
+        """Return one page of a user's journal entries and the cursor of the next page (None on the last page)."""
+
+    @abstractmethod
+    def search_journal(self, name: str, query: str, page_size: int = 10,
+                       cursor: Optional[int] = None) -> Tuple[List[JournalEntry], Optional[int]]:
+        """
+        Return one page of a user's journal entries matching a full-text query, best match first, and the
+        cursor of the next page (None on the last page). Every query term must appear in an entry; a term
+        ending with '*' matches any word starting with it.
+        """
+
+    @abstractmethod
+    def add_journal_entry(self, name: str, date: str, text: str) -> int:
+        """Add a journal entry and return its id."""
+
+    @abstractmethod
+    def modify_journal_entry(self, name: str, entry_id: int, text: str) -> None:
+        """Replace the text of one of a user's journal entries; raises EntryNotFoundError if the user has no such live entry."""
+
+    @abstractmethod
+    def delete_journal_entry(self, name: str, entry_id: int) -> None:
+        """Delete one of a user's journal entries; raises EntryNotFoundError if the user has no such live entry."""
+
+    def apply_changes(self, changes: ChangeSet) -> List[int]:
+        """
+        Write a batch of profile and journal changes. Backends override this to write the whole batch at once;
+        this default applies the changes one by one. Edits of existing entries go first, so one that names an
+        entry that is gone fails before the rest of the batch is written.
+
+        Returns:
+            list: The ids of the added journal entries, in order.
+
+        Raises:
+            EntryNotFoundError: If an edit names an entry that is not a live entry of its user.
+        """
+        for name, entry_id, text in changes.modified:
+            self.modify_journal_entry(name, entry_id, text)
+        for name, entry_id in changes.deleted:
+            self.delete_journal_entry(name, entry_id)
+        for record in changes.users:
+            self.save_user(record)
+        return [self.add_journal_entry(*entry) for entry in changes.added]
+
+
+class CSVStorage(Storage):
+    """
+    Storage backed by the CSV files in the data directory (the original BabyLand file layout).
+
+    The profile file is a log of versions: every save appends a row, and the last row of a name is the
+    live profile. Lookups go straight to that row through the name index, so they cost the same however
+    many times a profile was edited. Once superseded rows make up more than `user_compaction_threshold`
+    of the file, the next save compacts it (see `compact_users`).
+
+    Attributes:
+    user_file (str): The profile file (columns "Name", "LMP Date", "Period Length").
+    journal_file (str): The journal file (columns "Name", "Date", "Entry"), edited through JournalLog.
+    milestone_file (str): The milestone and medical info file (columns "Week", "Milestone", "Medical_Info").
+    snapshots (bool): Serve profile and milestone lookups from memory-mapped binary snapshots of the files
+        (see snapshot.py), rebuilt whenever a file changes. Best for read-mostly processes.
+    user_compaction_threshold (float): Fraction of superseded profile rows above which saves compact the profile file.
+    """
+
+    USER_HEADER = ["Name", "LMP Date", "Period Length"]
+
+    def __init__(self, data_dir: str = "data", user_file: Optional[str] = None, journal_file: Optional[str] = None,
+                 milestone_file: Optional[str] = None, snapshots: bool = False, user_compaction_threshold: float = 0.5,
+                 journal_cache_bytes: Optional[int] = None) -> None:
+        """
+        Args:
+            journal_cache_bytes (int, optional): Memory budget of the process-wide cache of users' journal entries
+                (see JournalCache); 0 disables it. Defaults to None, which keeps the current budget (16 MiB unless set before).
+        """
+        self.user_file = user_file or os.path.join(data_dir, "user_data.csv")
+        self.journal_file = journal_file or os.path.join(data_dir, "pregnancy_journal.csv")
+        self.milestone_file = milestone_file or os.path.join(data_dir, "milestone_medical_info.csv")
+        self.snapshots = snapshots
+        self.user_compaction_threshold = user_compaction_threshold
+        if journal_cache_bytes is not None:
+            JournalLog.for_file(self.journal_file).cache.resize(journal_cache_bytes)
+
+    @instrumented("csv.load_user")
+    def load_user(self, name: str) -> Optional[UserRecord]:
+        if self.snapshots:
+            found = UserSnapshot.for_file(self.user_file).get(name)
+            return UserRecord(name, datetime.fromordinal(found[0]), found[1]) if found is not None else None
+        if not exists(self.user_file):
+            return None
+        index = CSVOffsetIndex.for_file(self.user_file)  # name -> byte offset index, rebuilt automatically if the file changed behind its back
+        row = index.read_key_row(name)  # seek straight to the latest version of the profile instead of scanning the file
+        if row is None:
+            return None
+        name, lmp_date, period_length = row[:3]
+        return UserRecord(name, datetime.strptime(lmp_date, "%m/%d/%Y"), int(period_length))
+
+    @instrumented("csv.save_user")
+    def save_user(self, record: UserRecord) -> None:
+        # appended under the file lock and fsynced together with the saves of concurrent callers; the name index is updated in the same commit
+        self._user_writer().append([record.name, record.lmp_date.strftime("%m/%d/%Y"), record.period_length])
+        self._users_saved([record])
+        self.compact_users_if_needed()
+
+    @instrumented("csv.apply_changes")
+    def apply_changes(self, changes: ChangeSet) -> List[int]:
+        """
+        Write a batch of changes with one write and one fsync per file: edit records, profile rows, then journal rows.
+
+        Each file's part of the batch is written whole under that file's lock; the files themselves are
+        written one after the other, so a crash can only lose the tail of the sequence. Edits are checked
+        and written first, so an edit of an entry that is gone fails before anything is written.
+        """
+        journal = JournalLog.for_file(self.journal_file)
+        journal.edit_many([(name, entry_id, JournalLog.MODIFY, text) for name, entry_id, text in changes.modified]
+                          + [(name, entry_id, JournalLog.DELETE, "") for name, entry_id in changes.deleted])
+        if changes.users:
+            self._user_writer().append_many([[r.name, r.lmp_date.strftime("%m/%d/%Y"), r.period_length] for r in changes.users])
+            self._users_saved(changes.users)
+            self.compact_users_if_needed()
+        return journal.append_many(changes.added) if changes.added else []
+
+    def _user_writer(self) -> GroupCommitWriter:
+        """Return the group-commit writer of the profile file, which also keeps the name index up to date."""
+        index = CSVOffsetIndex.for_file(self.user_file)
+        return GroupCommitWriter.for_file(self.user_file, header=self.USER_HEADER,
+                                          on_commit=lambda batch, before: index.record_appends([(row[0], offset) for row, offset in batch], before))
+
+    def compact_users_if_needed(self) -> bool:
+        """
+        Compact the profile file if superseded rows crossed the threshold.
+
+        Returns:
+            bool: True if the file was compacted.
+        """
+        index = CSVOffsetIndex.for_file(self.user_file)
+        rows = index.rows()
+        if not rows or index.superseded() <= self.user_compaction_threshold * rows:
+            return False
+        self.compact_users()
+        return True
+
+    @instrumented("csv.compact_users")
+    def compact_users(self) -> None:
+        """
+        Rewrite the profile file with only the live (last) row of every name, in file order.
+
+        The new file is written next to the old one, fsynced and renamed over it, all under the file's
+        lock: saves from other threads and processes wait, readers keep reading the old file until they
+        reopen it, and a crash leaves either the old or the new file, never a mix. The live rows are taken
+        from an index rebuilt under the lock, never from one that might be stale, and copied record by
+        record, so a quoted name spanning lines moves whole.
+        """
+        with locked(self.user_file):
+            if not exists(self.user_file):
+                return
+            index = CSVOffsetIndex.for_file(self.user_file)
+            index.rebuild()
+            live = set(index.live())
+            tmp_path = self.user_file + ".tmp"
+            with open(self.user_file, mode="rb") as source, open(tmp_path, mode="wb") as target:
+                header = read_record(source, 0)
+                target.write(header)
+                for offset, record in iter_records(source, len(header), partial=True):
+                    if offset in live:
+                        target.write(record if record.endswith(b"\n") else record + b"\r\n")
+                METRICS.add("csv.compact_users", rows_scanned=index.rows(), bytes_read=source.tell(), bytes_written=target.tell())
+                target.flush()
+                os.fsync(target.fileno())
+            os.replace(tmp_path, self.user_file)
+            fsync_directory(self.user_file)
+            index.rebuild()  # while still holding the lock, so the next append extends an index of the new file
+
+    @instrumented("csv.has_milestones")
+    def has_milestones(self) -> bool:
+        if self.snapshots:
+            return MilestoneSnapshot.for_file(self.milestone_file).exists()
+        return MilestoneTable.for_file(self.milestone_file).exists()
+
+    @instrumented("csv.week_info")
+    def week_info(self, week: int) -> Optional[WeekInfo]:
+        if self.snapshots:
+            return MilestoneSnapshot.for_file(self.milestone_file).get(week)
+        return MilestoneTable.for_file(self.milestone_file).get(week)
+
+    def milestones_fingerprint(self) -> Optional[Hashable]:
+        return MilestoneTable.for_file(self.milestone_file).fingerprint()  # the snapshot is rebuilt on the same changes
+
+    @instrumented("csv.has_journal")
+    def has_journal(self) -> bool:
+        return exists(self.journal_file)
+
+    @instrumented("csv.journal_entries")
+    def journal_entries(self, name: str) -> List[JournalEntry]:
+        return JournalLog.for_file(self.journal_file).entries(name)
+
+    @instrumented("csv.journal_page")
+    def journal_page(self, name: str, page_size: int = 10, cursor: Optional[int] = None,
+                     newest_first: bool = True) -> Tuple[List[JournalEntry], Optional[int]]:
+        return JournalLog.for_file(self.journal_file).page(name, page_size, cursor, newest_first)
+
+    def journal_cache_stats(self) -> Dict[str, int]:
+        """Return the hit, miss, eviction and invalidation counters and the size of the journal entry cache."""
+        return JournalLog.for_file(self.journal_file).cache.stats()
+
+    @instrumented("csv.search_journal")
+    def search_journal(self, name: str, query: str, page_size: int = 10,
+                       cursor: Optional[int] = None) -> Tuple[List[JournalEntry], Optional[int]]:
+        if not exists(self.journal_file):
+            return [], None
+        hits, next_cursor = JournalSearchIndex.for_file(self.journal_file).search(name, query, page_size, cursor)
+        return JournalLog.for_file(self.journal_file).read(name, [hit.entry_id for hit in hits]), next_cursor
+
+    @instrumented("csv.add_journal_entry")
+    def add_journal_entry(self, name: str, date: str, text: str) -> int:
+        return JournalLog.for_file(self.journal_file).append(name, date, text)
+
+    @instrumented("csv.modify_journal_entry")
+    def modify_journal_entry(self, name: str, entry_id: int, text: str) -> None:
+        JournalLog.for_file(self.journal_file).modify(name, entry_id, text)
+
+    @instrumented("csv.delete_journal_entry")
+    def delete_journal_entry(self, name: str, entry_id: int) -> None:
+        JournalLog.for_file(self.journal_file).delete(name, entry_id)
+
+
+class SQLiteStorage(Storage):
+    """
+    Storage backed by an embedded SQLite database (stdlib sqlite3, no server needed).
+
+    Profiles are indexed by name, journal entries by (name, id) and milestone info by week; the text of
+    journal entries is also indexed for full-text search by an FTS5 table kept in sync by triggers. The
+    database runs in WAL mode, so readers never block the single writer and several processes can
+    share the file. Each thread gets its own connection.
+
+    Attributes:
+    db_path (str): The SQLite database file.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            lmp_date TEXT NOT NULL,
+            period_length INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS users_name ON users (name, id);
+        CREATE TABLE IF NOT EXISTS journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            entry TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS journal_name ON journal (name, id);
+        CREATE TABLE IF NOT EXISTS milestones (
+            week INTEGER PRIMARY KEY,
+            milestone TEXT NOT NULL,
+            medical_info TEXT NOT NULL
+        );
+    """
+
+    # external-content FTS5 index over journal.entry: the text is stored once, in the journal table
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE journal_fts USING fts5(entry, content='journal', content_rowid='id');
+        CREATE TRIGGER journal_fts_insert AFTER INSERT ON journal BEGIN
+            INSERT INTO journal_fts (rowid, entry) VALUES (new.id, new.entry);
+        END;
+        CREATE TRIGGER journal_fts_delete AFTER DELETE ON journal BEGIN
+            INSERT INTO journal_fts (journal_fts, rowid, entry) VALUES ('delete', old.id, old.entry);
+        END;
+        CREATE TRIGGER journal_fts_update AFTER UPDATE OF entry ON journal BEGIN
+            INSERT INTO journal_fts (journal_fts, rowid, entry) VALUES ('delete', old.id, old.entry);
+            INSERT INTO journal_fts (rowid, entry) VALUES (new.id, new.entry);
+        END;
+        INSERT INTO journal_fts (journal_fts) VALUES ('rebuild');
+    """
+
+    def __init__(self, db_path: str = "data/babyland.db") -> None:
+        self.db_path = db_path
+        self._local = threading.local()
+        self._milestones_version = 0  # bumped by every bulk_save_milestones of this process
+        try:
+            connection = self._connection()
+            connection.executescript(self.SCHEMA)
+        except sqlite3.Error as e:
+            raise IOError(f"Unable to create the schema of {self.db_path}: {e}") from e
+        self.full_text_search = True
+        try:
+            if connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'journal_fts'").fetchone() is None:
+                connection.executescript("BEGIN IMMEDIATE;" + self.FTS_SCHEMA + "COMMIT;")  # indexes the entries already in the journal
+        except sqlite3.OperationalError:  # an SQLite build without FTS5
+            if connection.in_transaction:
+                connection.rollback()
+            self.full_text_search = False
+
+    def close(self) -> None:
+        """Close the calling thread's connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    @instrumented("sqlite.load_user")
+    def load_user(self, name: str) -> Optional[UserRecord]:
+        row = self._query_one("SELECT name, lmp_date, period_length FROM users WHERE name = ? ORDER BY id DESC LIMIT 1", (name,))
+        if row is None:
+            return None
+        return UserRecord(row[0], datetime.strptime(row[1], "%Y-%m-%d"), row[2])
+
+    @instrumented("sqlite.save_user")
+    def save_user(self, record: UserRecord) -> None:
+        self.bulk_save_users([record])
+
+    @instrumented("sqlite.bulk_save_users")
+    def bulk_save_users(self, records: Iterable[UserRecord]) -> None:
+        """Store (or replace, the last one winning) many profiles in a single transaction."""
+        if self._user_listeners:
+            records = list(records)  # passed to the listeners once written
+        with self._transaction() as connection:
+            self._upsert_users(connection, records)
+        if self._user_listeners:
+            self._users_saved(records)
+
+    @instrumented("sqlite.apply_changes")
+    def apply_changes(self, changes: ChangeSet) -> List[int]:
+        """Write a batch of changes in a single transaction: all of it or, on failure, none of it."""
+        with self._transaction() as connection:
+            for name, entry_id, text in changes.modified:
+                self._edit(connection, "UPDATE journal SET entry = ? WHERE id = ? AND name = ?", (text, entry_id, name))
+            for name, entry_id in changes.deleted:
+                self._edit(connection, "DELETE FROM journal WHERE id = ? AND name = ?", (entry_id, name))
+            self._upsert_users(connection, changes.users)
+            entry_ids = [connection.execute("INSERT INTO journal (name, date, entry) VALUES (?, ?, ?)", entry).lastrowid
+                         for entry in changes.added]
+        self._users_saved(changes.users)  # once committed
+        return entry_ids
+
+    @staticmethod
+    def _edit(connection: sqlite3.Connection, statement: str, parameters: Tuple) -> None:
+        """Run an UPDATE or DELETE of one of a user's journal entries (id and name are the last two parameters)."""
+        if connection.execute(statement, parameters).rowcount == 0:  # raised inside the transaction, which is rolled back
+            raise EntryNotFoundError(parameters[-1], parameters[-2])
+
+    @staticmethod
+    def _upsert_users(connection: sqlite3.Connection, records: Iterable[UserRecord]) -> None:
+        for r in records:
+            values = (r.lmp_date.strftime("%Y-%m-%d"), r.period_length, r.name)
+            # update the live row in place, so a profile keeps a single row however often it is saved
+            if connection.execute("UPDATE users SET lmp_date = ?, period_length = ? "
+                                  "WHERE id = (SELECT MAX(id) FROM users WHERE name = ?)", values).rowcount == 0:
+                connection.execute("INSERT INTO users (lmp_date, period_length, name) VALUES (?, ?, ?)", values)
+
+    @instrumented("sqlite.compact_users")
+    def compact_users(self) -> None:
+        """Delete the superseded rows left by databases written before saves became upserts."""
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM users WHERE id NOT IN (SELECT MAX(id) FROM users GROUP BY name)")
+
+    @instrumented("sqlite.has_milestones")
+    def has_milestones(self) -> bool:
+        return self._query_one("SELECT 1 FROM milestones LIMIT 1") is not None
+
+    @instrumented("sqlite.week_info")
+    def week_info(self, week: int) -> Optional[WeekInfo]:
+        row = self._query_one("SELECT week, milestone, medical_info FROM milestones WHERE week = ?", (week,))
+        return WeekInfo(*row) if row is not None else None
+
+    def milestones_fingerprint(self) -> Optional[Hashable]:
+        return self._milestones_version  # milestones are only written by bulk_save_milestones, e.g. on import
+
+    @instrumented("sqlite.bulk_save_milestones")
+    def bulk_save_milestones(self, weeks: Iterable[WeekInfo]) -> None:
+        """Store (or replace) the milestone and medical info of many weeks in a single transaction."""
+        with self._transaction() as connection:
+            connection.executemany("INSERT OR REPLACE INTO milestones (week, milestone, medical_info) VALUES (?, ?, ?)", weeks)
+        self._milestones_version += 1
+
+    @instrumented("sqlite.has_journal")
+    def has_journal(self) -> bool:
+        return self._query_one("SELECT 1 FROM journal LIMIT 1") is not None
+
+    @instrumented("sqlite.journal_entries")
+    def journal_entries(self, name: str) -> List[JournalEntry]:
+        rows = self._query_all("SELECT id, name, date, entry FROM journal WHERE name = ? ORDER BY id", (name,))
+        return [JournalEntry(*row) for row in rows]
+
+    @instrumented("sqlite.journal_page")
+    def journal_page(self, name: str, page_size: int = 10, cursor: Optional[int] = None,
+                     newest_first: bool = True) -> Tuple[List[JournalEntry], Optional[int]]:
+        if newest_first:
+            sql = "SELECT id, name, date, entry FROM journal WHERE name = ? AND id < ? ORDER BY id DESC LIMIT ?"
+            bound = cursor if cursor is not None else 2 ** 63 - 1
+        else:
+            sql = "SELECT id, name, date, entry FROM journal WHERE name = ? AND id > ? ORDER BY id LIMIT ?"
+            bound = cursor if cursor is not None else -1
+        rows = self._query_all(sql, (name, bound, page_size + 1))  # one extra row tells whether there is a next page
+        entries = [JournalEntry(*row) for row in rows[:page_size]]
+        return entries, (entries[-1].entry_id if len(rows) > page_size else None)
+
+    @instrumented("sqlite.search_journal")
+    def search_journal(self, name: str, query: str, page_size: int = 10,
+                       cursor: Optional[int] = None) -> Tuple[List[JournalEntry], Optional[int]]:
+        if not self.full_text_search:
+            raise IOError(f"Full-text search needs an SQLite library with FTS5 support ({sqlite3.sqlite_version} has none)")
+        match = self._match_expression(query)
+        if not match:
+            return [], None
+        start = cursor or 0
+        rows = self._query_all("SELECT journal.id, journal.name, journal.date, journal.entry FROM journal_fts "
+                               "JOIN journal ON journal.id = journal_fts.rowid "
+                               "WHERE journal_fts MATCH ? AND journal.name = ? "
+                               "ORDER BY bm25(journal_fts), journal.id DESC LIMIT ? OFFSET ?",
+                               (match, name, page_size + 1, start))  # one extra row tells whether there is a next page
+        next_cursor = start + page_size if len(rows) > page_size else None
+        return [JournalEntry(*row) for row in rows[:page_size]], next_cursor
+
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        """Turn a search query into an FTS5 MATCH expression: quoted terms (implicitly ANDed), 'term*' for prefixes."""
+        return " ".join(f'"{term[:-1]}"*' if term.endswith("*") else f'"{term}"' for term in parse_query(query))
+
+    @instrumented("sqlite.add_journal_entry")
+    def add_journal_entry(self, name: str, date: str, text: str) -> int:
+        with self._transaction() as connection:
+            return connection.execute("INSERT INTO journal (name, date, entry) VALUES (?, ?, ?)", (name, date, text)).lastrowid
+
+    @instrumented("sqlite.bulk_add_journal_entries")
+    def bulk_add_journal_entries(self, entries: Iterable[Tuple[str, str, str]]) -> None:
+        """Add many (name, date, text) journal entries in a single transaction."""
+        with self._transaction() as connection:
+            connection.executemany("INSERT INTO journal (name, date, entry) VALUES (?, ?, ?)", entries)
+
+    @instrumented("sqlite.modify_journal_entry")
+    def modify_journal_entry(self, name: str, entry_id: int, text: str) -> None:
+        with self._transaction() as connection:
+            self._edit(connection, "UPDATE journal SET entry = ? WHERE id = ? AND name = ?", (text, entry_id, name))
+
+    @instrumented("sqlite.delete_journal_entry")
+    def delete_journal_entry(self, name: str, entry_id: int) -> None:
+        with self._transaction() as connection:
+            self._edit(connection, "DELETE FROM journal WHERE id = ? AND name = ?", (entry_id, name))
+
+    @instrumented("sqlite.import_csv")
+    def import_csv(self, source: CSVStorage) -> None:
+        """Copy the profiles, milestone info and live journal entries of a CSV data directory into the database."""
+        if exists(source.user_file):
+            with open(source.user_file, mode="r", newline="") as user_file:
+                self.bulk_save_users(UserRecord(row["Name"], datetime.strptime(row["LMP Date"], "%m/%d/%Y"), int(row["Period Length"]))
+                                     for row in csv.DictReader(user_file))
+        if source.has_milestones():
+            table = MilestoneTable.for_file(source.milestone_file)
+            self.bulk_save_milestones(table.get(week) for week in table.weeks())
+        if source.has_journal():
+            self.bulk_add_journal_entries((entry.name, entry.date, entry.text)
+                                          for entry in JournalLog.for_file(source.journal_file).entries())
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it in WAL mode on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            try:
+                connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)  # transactions are managed explicitly by _Transaction
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, safe against corruption in WAL mode
+            except sqlite3.Error as e:
+                raise IOError(f"Unable to open database {self.db_path}: {e}") from e
+            self._local.connection = connection
+        return connection
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self._connection())
+
+    def _query_one(self, sql: str, parameters: tuple = ()) -> Optional[tuple]:
+        try:
+            return self._connection().execute(sql, parameters).fetchone()
+        except sqlite3.Error as e:
+            raise IOError(f"Database query failed: {e}") from e
+
+    def _query_all(self, sql: str, parameters: tuple = ()) -> List[tuple]:
+        try:
+            rows = self._connection().execute(sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            raise IOError(f"Database query failed: {e}") from e
+        METRICS.add("sqlite.query", rows_scanned=len(rows))
+        return rows
+
+
+class _Transaction:
+    """Context manager running a block in one SQLite transaction and turning sqlite3 errors into IOError."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.connection.execute("BEGIN IMMEDIATE")  # take the write lock up front instead of failing half-way
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        if exc_type is None:
+            try:
+                self.connection.commit()
+                return False
+            except sqlite3.Error as e:
+                self.connection.rollback()
+                raise IOError(f"Database write failed: {e}") from e
+        self.connection.rollback()
+        if issubclass(exc_type, sqlite3.Error):
+            raise IOError(f"Database write failed: {exc}") from exc
+        return False
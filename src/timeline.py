@@ -0,0 +1,164 @@
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Hashable, Iterator, List, NamedTuple, Optional, Tuple
+import functools
+import threading
+
+from milestone_table import WeekInfo
+
+if TYPE_CHECKING:  # timelines only talk to storage through the Storage interface
+    from storage import Storage
+
+WEEKS = 40  # weeks of pregnancy in a timeline; week 40 starts on the due date
+
+
+class Clock:
+    """Source of the current date and time. The default reads the system clock on every call."""
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def frozen(self) -> "FixedClock":
+        """Return a clock stuck at the current time, so a whole batch of requests shares one 'today'."""
+        return FixedClock(self.now())
+
+
+class FixedClock(Clock):
+    """A clock that always answers the same time (a batch's shared 'today', or a fixed date in tests)."""
+
+    def __init__(self, now: datetime) -> None:
+        self._now = now
+
+    def now(self) -> datetime:
+        return self._now
+
+
+class TimelineWeek(NamedTuple):
+    """One week of a pregnancy timeline: its first and last day, and the milestone and medical info listed for it."""
+    week: int
+    start: date
+    end: date
+    milestone: Optional[str]
+    medical_info: Optional[str]
+
+
+class Timeline:
+    """
+    The week-by-week schedule of a pregnancy, for one (LMP, cycle length) pair.
+
+    Timelines do not depend on the user or on the current date, so one object is shared by every user
+    with the same LMP date and cycle length (see TimelineCache). Weeks are computed the first time they
+    are iterated over and kept, so later iterations only walk a list.
+
+    Attributes:
+    lmp_ordinal (int): The LMP date as a day ordinal (date.toordinal).
+    period_length (int): The length of the menstrual cycle in days.
+    adjusted_lmp (date): The LMP shifted by the difference between the cycle length and 28 days.
+    due_date (date): The estimated due date, 280 days after the adjusted LMP.
+    """
+
+    def __init__(self, lmp_ordinal: int, period_length: int, week_info: Tuple[Optional[WeekInfo], ...] = ()) -> None:
+        """
+        Args:
+            lmp_ordinal (int): The LMP date as a day ordinal.
+            period_length (int): The length of the menstrual cycle in days.
+            week_info (tuple, optional): Milestone and medical info indexed by week (index 0 unused), None for unlisted weeks.
+        """
+        self.lmp_ordinal = lmp_ordinal
+        self.period_length = period_length
+        self.adjusted_lmp = date.fromordinal(lmp_ordinal + period_length - 28)  # same adjustment as DueDateCalculator
+        self.due_date = self.adjusted_lmp + timedelta(days=280)
+        self._week_info = week_info
+        self._weeks: List[TimelineWeek] = []  # weeks computed so far, from week 1
+        self._lock = threading.Lock()
+
+    def weeks(self, start: int = 1) -> Iterator[TimelineWeek]:
+        """Yield the weeks of the timeline from week `start` to week 40, computing each one only the first time."""
+        for week in range(max(start, 1), WEEKS + 1):
+            if week > len(self._weeks):
+                self._compute(week)
+            yield self._weeks[week - 1]
+
+    def week(self, week: int) -> Optional[TimelineWeek]:
+        """Return one week of the timeline, or None outside weeks 1 to 40."""
+        return next(self.weeks(week), None) if 1 <= week <= WEEKS else None
+
+    def progress(self, now: datetime) -> Tuple[int, int]:
+        """Return the (weeks, days) of pregnancy at `now`, like DueDateCalculator.calculate_current_progress."""
+        return divmod(now.toordinal() - self.adjusted_lmp.toordinal(), 7)
+
+    def _compute(self, week: int) -> None:
+        """Compute the weeks up to `week` that are not computed yet."""
+        with self._lock:  # concurrent iterations must not append the same week twice
+            for number in range(len(self._weeks) + 1, week + 1):
+                start = self.adjusted_lmp + timedelta(days=7 * number)
+                info = self._week_info[number] if number < len(self._week_info) else None
+                self._weeks.append(TimelineWeek(number, start, start + timedelta(days=6),
+                                                info.milestone if info is not None else None,
+                                                info.medical_info if info is not None else None))
+
+
+class TimelineCache:
+    """
+    Bounded LRU cache of Timelines keyed by (LMP ordinal, cycle length), with an injectable clock.
+
+    Profiles share LMP dates and cycle lengths heavily (there are only so many days and 26 cycle lengths),
+    so dashboards rendering timelines for many users mostly get cached schedules. Milestone and medical
+    info is read from storage on first use and shared by every timeline. Each lookup compares the storage's
+    milestones fingerprint (see Storage.milestones_fingerprint) with the one the info was read at; when the
+    milestone data changed, the info and every cached timeline are dropped and built again.
+
+    Attributes:
+    storage (Storage, optional): Where milestone and medical info is read from; None for timelines without it.
+    clock (Clock): The clock `progress` reads 'today' from.
+    maxsize (int): The maximum number of timelines kept.
+    """
+
+    def __init__(self, storage: Optional["Storage"] = None, maxsize: int = 4096, clock: Optional[Clock] = None) -> None:
+        self.storage = storage
+        self.clock = clock or Clock()
+        self.maxsize = maxsize
+        self._week_info: Optional[Tuple[Optional[WeekInfo], ...]] = None
+        self._fingerprint: Optional[Hashable] = None  # the storage's milestones fingerprint when `_week_info` was read
+        self._timeline = functools.lru_cache(maxsize=maxsize)(self._build)
+
+    def get(self, lmp_ordinal: int, period_length: int) -> Timeline:
+        """Return the timeline of an LMP date (as a day ordinal) and cycle length, building it on a cache miss."""
+        self._check_milestones()
+        return self._timeline(lmp_ordinal, period_length)
+
+    def for_date(self, lmp_date: datetime, period_length: int = 28) -> Timeline:
+        """Return the timeline of an LMP date and cycle length."""
+        return self.get(lmp_date.toordinal(), period_length)
+
+    def progress(self, timeline: Timeline) -> Tuple[int, int]:
+        """Return the (weeks, days) of pregnancy of a timeline today, according to the cache's clock."""
+        return timeline.progress(self.clock.now())
+
+    def cache_info(self) -> "functools._CacheInfo":
+        """Return the hits, misses, maxsize and current size of the cache."""
+        return self._timeline.cache_info()
+
+    def clear(self) -> None:
+        """Forget every cached timeline and the milestone and medical info."""
+        self._timeline.cache_clear()
+        self._week_info = None
+
+    def _check_milestones(self) -> None:
+        """Drop the milestone info and the timelines built with it if the storage's milestone data changed since it was read."""
+        if self._week_info is not None and self.storage is not None and self.storage.milestones_fingerprint() != self._fingerprint:
+            self.clear()
+
+    def _build(self, lmp_ordinal: int, period_length: int) -> Timeline:
+        return Timeline(lmp_ordinal, period_length, self._milestones())
+
+    def _milestones(self) -> Tuple[Optional[WeekInfo], ...]:
+        """Return the milestone and medical info of weeks 0 to 40, read from storage the first time after a change."""
+        week_info = self._week_info
+        if week_info is None:
+            self._fingerprint = self.storage.milestones_fingerprint() if self.storage is not None else None  # read first: a change made meanwhile triggers another reload
+            if self.storage is not None and self.storage.has_milestones():
+                week_info = tuple(self.storage.week_info(week) if week else None for week in range(WEEKS + 1))
+            else:
+                week_info = ()
+            self._week_info = week_info
+        return week_info
@@ -0,0 +1,238 @@
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+
+from csv_index import iter_records, parse_record, read_record
+from due_date_calculator import DateValidator, User
+from metrics import METRICS, instrumented
+
+MAX_ORDINAL = datetime.max.toordinal()
+
+
+class UserTable:
+    """
+    Columnar, in-memory copy of every profile in the user file.
+
+    Instead of one User object (with a datetime and a name string) per row, the table keeps a handful of
+    flat arrays: every name once, UTF-8 encoded, in a single byte buffer with an array of end offsets; LMP
+    dates as int32 day ordinals; cycle lengths as uint8; and an open-addressing hash table of int32 row
+    numbers for lookups by name. A profile costs little more than the bytes of its name, so every profile
+    of a large file can stay resident in each worker; `get` hands out a User only for the rows asked for.
+
+    Like `User.load_from_file`, the table answers with the last row written for a name (the latest version
+    of the profile), kept at the position of the name's first row. Rows that cannot be parsed (missing
+    columns, malformed date or cycle length) are skipped and counted in `skipped`.
+
+    Tables shared through `for_file` follow the file: rows appended since the last load are read
+    incrementally, and a file that was replaced or truncated is loaded again from scratch.
+
+    Attributes:
+    file_name (str): The profile file (columns "Name", "LMP Date", "Period Length"), if loaded from one.
+    skipped (int): Number of malformed rows left out of the table.
+    """
+
+    _instances: Dict[str, "UserTable"] = {}  # one shared table per file in the process
+
+    def __init__(self, file_name: Optional[str] = None) -> None:
+        self.file_name = file_name
+        self._fingerprint: Optional[Tuple[int, int, int]] = None  # (inode, size, mtime_ns) of the file loaded so far
+        self._reset()
+
+    @classmethod
+    def for_file(cls, file_name: str = "data/user_data.csv") -> "UserTable":
+        """Return the process-wide table of the given file, creating it on first use."""
+        key = os.path.abspath(file_name)
+        if key not in cls._instances:
+            cls._instances[key] = cls(file_name)
+        return cls._instances[key]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, datetime, int]]) -> "UserTable":
+        """Build a table from (name, LMP date, period length) tuples, such as UserRecords."""
+        table = cls()
+        table._extend((name, lmp_date.toordinal(), period_length) for name, lmp_date, period_length in rows)
+        return table
+
+    def __len__(self) -> int:
+        self._refresh()
+        return len(self._lmp_ordinals)
+
+    def __contains__(self, name: str) -> bool:
+        return self.row(name) is not None
+
+    def __iter__(self) -> Iterator[User]:
+        """Yield every profile, in file order."""
+        self._refresh()
+        for row in range(len(self._lmp_ordinals)):
+            yield self._user(row)
+
+    def row(self, name: str) -> Optional[int]:
+        """Return the row number of a user's profile, or None if the table has no row for that name."""
+        self._refresh()
+        return self._probe(name.encode("utf-8"))[1]
+
+    def get(self, name: str) -> Optional[User]:
+        """Return the profile of a user as a User, or None if the table has no row for that name."""
+        row = self.row(name)
+        return self._user(row) if row is not None else None
+
+    def name(self, row: int) -> str:
+        """Return the name on a row."""
+        return self._name_bytes(row).decode("utf-8")
+
+    def names(self) -> List[str]:
+        """Return the name of every profile, in file order."""
+        self._refresh()
+        return [self.name(row) for row in range(len(self._lmp_ordinals))]
+
+    def lmp_ordinals(self) -> array:
+        """Return the LMP column as an array of int32 day ordinals (shared, do not modify)."""
+        self._refresh()
+        return self._lmp_ordinals
+
+    def period_lengths(self) -> array:
+        """Return the cycle length column as an array of uint8 (shared, do not modify)."""
+        self._refresh()
+        return self._period_lengths
+
+    def append(self, name: str, lmp_ordinal: int, period_length: int) -> bool:
+        """
+        Add a profile to the table, or replace the one the table already has for that name.
+
+        Returns:
+            bool: True if the profile was added, False if it replaced an existing one.
+        """
+        encoded = name.encode("utf-8")
+        slot, row = self._probe(encoded)
+        if row is not None:
+            self._lmp_ordinals[row] = lmp_ordinal
+            self._period_lengths[row] = period_length
+            return False
+        row = len(self._lmp_ordinals)
+        self._name_data += encoded
+        self._name_ends.append(len(self._name_data))
+        self._lmp_ordinals.append(lmp_ordinal)
+        self._period_lengths.append(period_length)
+        self._slots[slot] = row
+        if 2 * (row + 1) > len(self._slots):  # keep the hash table at most half full
+            self._resize(2 * len(self._slots))
+        return True
+
+    def _extend(self, rows: Iterable[Tuple[str, int, int]]) -> None:
+        for name, lmp_ordinal, period_length in rows:
+            self.append(name, lmp_ordinal, period_length)
+
+    def _name_bytes(self, row: int) -> bytearray:
+        return self._name_data[self._name_ends[row - 1] if row else 0:self._name_ends[row]]
+
+    def _probe(self, encoded: bytes) -> Tuple[int, Optional[int]]:
+        """Find `encoded` in the hash table. Returns its slot, or the free slot it would take, and its row (None if absent)."""
+        slots = self._slots
+        mask = len(slots) - 1
+        slot = hash(encoded) & mask
+        while True:
+            row = slots[slot]
+            if row < 0:
+                return slot, None
+            if self._name_bytes(row) == encoded:
+                return slot, row
+            slot = (slot + 1) & mask  # linear probing
+
+    def _resize(self, size: int) -> None:
+        """Rebuild the hash table with `size` slots (a power of two)."""
+        slots = array("i", [-1]) * size
+        mask = size - 1
+        for row in range(len(self._lmp_ordinals)):
+            slot = hash(bytes(self._name_bytes(row))) & mask
+            while slots[slot] >= 0:
+                slot = (slot + 1) & mask
+            slots[slot] = row
+        self._slots = slots
+
+    def _user(self, row: int) -> User:
+        user = User(self.name(row))
+        user.set_lmp_date(datetime.fromordinal(self._lmp_ordinals[row]))
+        user.set_period_length(self._period_lengths[row])
+        return user
+
+    def _refresh(self) -> None:
+        """Bring a file-backed table up to date with its file: read appended rows, or reload a replaced file."""
+        if self.file_name is None:
+            return
+        try:
+            stat = os.stat(self.file_name)
+        except OSError:
+            stat = None
+        fingerprint = (stat.st_ino, stat.st_size, stat.st_mtime_ns) if stat is not None else None
+        if fingerprint == self._fingerprint:
+            return
+        if fingerprint is None:
+            self._reset()
+            return
+        loaded = self._fingerprint
+        if loaded is None or loaded[0] != fingerprint[0] or loaded[1] > fingerprint[1]:  # new, replaced or truncated file
+            self._reset()
+            self._load(0)
+        else:
+            self._load(self._end)
+        self._fingerprint = fingerprint
+
+    def _reset(self) -> None:
+        self.skipped = 0
+        self._name_data = bytearray()
+        self._name_ends = array("I")  # end offset of each row's name in _name_data
+        self._lmp_ordinals = array("i")  # int32 day ordinals (datetime.toordinal)
+        self._period_lengths = array("B")  # uint8, cycle lengths are 20 to 45 days
+        self._slots = array("i", [-1]) * 8  # hash table of row numbers, -1 for free slots; the size is a power of two
+        self._fingerprint = None
+        self._end = 0  # offset just past the last complete row read: appended rows are read from there
+
+    @instrumented("user_table.load")
+    def _load(self, start: int) -> None:
+        """Add the rows of the user file from byte offset `start` (0 for the whole file) to the table."""
+        self._extend(self._parse(start))
+
+    def _parse(self, start: int) -> Iterator[Tuple[str, int, int]]:
+        """
+        Yield (name, LMP ordinal, period length) for the rows of the user file from byte offset `start`.
+
+        Rows are read as CSV records (see csv_index.iter_records), so a quoted name may span lines. A last row
+        missing its line break may still be being written: a full load reads it (like a file saved without a
+        final line break), an incremental one leaves it, and either way the next load starts from that row.
+        """
+        ordinals: Dict[str, int] = {}  # LMP dates repeat a lot: parse each distinct string once
+        rows = 0
+        with open(self.file_name, mode="rb") as user_file:
+            full = start == 0
+            if full:
+                start = len(read_record(user_file, 0))  # skip the header row
+            self._end = start
+            for offset, record in iter_records(user_file, start, partial=full):
+                self._end = offset + len(record) if record.endswith(b"\n") else offset
+                if not record.strip():
+                    continue
+                rows += 1
+                if record.startswith(b'"') or record.count(b",") != 2:  # quoted names: let csv handle them
+                    fields = parse_record(record)
+                else:
+                    fields = record.decode("utf-8").rstrip("\r\n").split(",")
+                if len(fields) < 3:
+                    self.skipped += 1
+                    continue
+                name, lmp_date_str, period_length_str = fields[:3]
+                ordinal = ordinals.get(lmp_date_str)
+                if ordinal is None:
+                    code, ordinal = DateValidator.parse_date(lmp_date_str, 1, MAX_ORDINAL)
+                    if code != DateValidator.VALID:
+                        ordinal = -1
+                    ordinals[lmp_date_str] = ordinal
+                try:
+                    period_length = int(period_length_str)
+                except ValueError:
+                    period_length = -1
+                if ordinal < 0 or not 0 <= period_length <= 255:
+                    self.skipped += 1
+                    continue
+                yield name, ordinal, period_length
+            METRICS.add("user_table.load", rows_scanned=rows, bytes_read=self._end - start)
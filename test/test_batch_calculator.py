@@ -0,0 +1,55 @@
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import date, datetime, timedelta
+import numpy as np
+from due_date_calculator import DueDateCalculator
+from batch_calculator import BatchDueDateCalculator
+
+class TestBatchDueDateCalculator(unittest.TestCase):
+
+    def setUp(self):
+        self.lmp_dates = [datetime(2024, 1, 1), datetime(2024, 2, 29), datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=100)]
+        self.period_lengths = [28, 20, 45]
+        self.calculator = BatchDueDateCalculator(self.lmp_dates, self.period_lengths)
+
+    def test_calculate_due_dates_matches_scalar(self):
+        due_dates = self.calculator.calculate_due_dates()
+        for lmp_date, period_length, due_date in zip(self.lmp_dates, self.period_lengths, due_dates):
+            expected = DueDateCalculator(lmp_date, period_length).calculate_due_date()
+            self.assertEqual(due_date, np.datetime64(expected.date()))
+
+    def test_calculate_current_progress_matches_scalar(self):
+        weeks, days = self.calculator.calculate_current_progress()
+        for i, (lmp_date, period_length) in enumerate(zip(self.lmp_dates, self.period_lengths)):
+            expected = DueDateCalculator(lmp_date, period_length).calculate_current_progress()
+            self.assertEqual((weeks[i], days[i]), expected)
+
+    def test_calculate_current_progress_with_fixed_today(self):
+        calculator = BatchDueDateCalculator([datetime(2024, 1, 1)], 30)
+        weeks, days = calculator.calculate_current_progress(today=datetime(2024, 3, 1))
+        self.assertEqual((weeks[0], days[0]), (8, 2))  # 60 days minus the 2 day adjustment
+
+    def test_today_and_lmp_dates_are_whole_days(self):
+        calculator = BatchDueDateCalculator([datetime(2024, 1, 1, 18, 30)], 30)
+        for today in (date(2024, 3, 1), datetime(2024, 3, 1, 8, 0), np.datetime64("2024-03-01T08:00"), "2024-03-01"):
+            weeks, days = calculator.calculate_current_progress(today=today)
+            self.assertEqual((weeks[0], days[0]), (8, 2), today)
+
+    def test_scalar_period_length_is_broadcast(self):
+        calculator = BatchDueDateCalculator(np.array(["2024-01-01", "2024-01-02"], dtype="datetime64[D]"))
+        self.assertEqual(list(calculator.calculate_due_dates()), list(np.array(["2024-10-07", "2024-10-08"], dtype="datetime64[D]")))
+
+    def test_period_length_validation(self):
+        with self.assertRaises(ValueError):
+            BatchDueDateCalculator(self.lmp_dates, [28, 19, 28])  # Too short
+        with self.assertRaises(ValueError):
+            BatchDueDateCalculator(self.lmp_dates, [28, 46, 28])  # Too long
+        with self.assertRaises(ValueError):
+            BatchDueDateCalculator(self.lmp_dates, [28.0, 30.0, 32.0])  # Not integers
+
+if __name__ == "__main__":
+    unittest.main()
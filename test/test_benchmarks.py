@@ -0,0 +1,61 @@
+import unittest
+import sys
+import os
+import csv
+import filecmp
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from datetime import datetime
+from due_date_calculator import DateValidator
+from generate_data import generate_data_dir
+from run_benchmarks import compare, run_benchmarks
+
+class TestBenchmarks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.today = datetime(2024, 6, 1)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_generator_is_deterministic(self):
+        first = os.path.join(self.tmp_dir.name, "first")
+        second = os.path.join(self.tmp_dir.name, "second")
+        generate_data_dir(first, 200, seed=7, today=self.today)
+        generate_data_dir(second, 200, seed=7, today=self.today)
+        for file_name in ("user_data.csv", "pregnancy_journal.csv", "milestone_medical_info.csv"):
+            self.assertTrue(filecmp.cmp(os.path.join(first, file_name), os.path.join(second, file_name), shallow=False))
+
+    def test_generated_users_are_valid(self):
+        generate_data_dir(self.tmp_dir.name, 200, seed=1, today=self.today)
+        with open(os.path.join(self.tmp_dir.name, "user_data.csv"), mode="r", newline="") as user_file:
+            rows = list(csv.DictReader(user_file))
+        self.assertEqual(len(rows), 200)
+        codes, _ = DateValidator.validate_dates((row["LMP Date"] for row in rows), self.today)
+        self.assertTrue(all(code == DateValidator.VALID for code in codes))
+        self.assertTrue(all(20 <= int(row["Period Length"]) <= 45 for row in rows))
+
+    def test_run_benchmarks_report(self):
+        report = run_benchmarks(100, samples=20, names=["validate_date", "journal_page"], measure_memory=True)
+        self.assertEqual(set(report["results"]), {"validate_date", "journal_page"})
+        for result in report["results"].values():
+            self.assertGreater(result["throughput"], 0)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertIn("peak_memory_kb", result)
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": {"a": {"throughput": 1000.0, "p95_ms": 1.0}, "b": {"throughput": 1000.0, "p95_ms": 1.0}}}
+        current = {"results": {"a": {"throughput": 900.0, "p95_ms": 1.1},  # within 20%
+                               "b": {"throughput": 700.0, "p95_ms": 1.5},  # slower on both counts
+                               "c": {"throughput": 1.0, "p95_ms": 100.0}}}  # not in the baseline
+        regressions = compare(current, baseline, threshold=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(regression.startswith("b:") for regression in regressions))
+        self.assertEqual(compare(current, baseline, threshold=0.6), [])
+
+if __name__ == '__main__':
+    unittest.main()
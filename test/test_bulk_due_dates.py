@@ -0,0 +1,53 @@
+import unittest
+import sys
+import os
+import csv
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bulk_due_dates import main, process_rows, run_bulk
+
+class TestBulkDueDates(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.input_file = os.path.join(self.tmp_dir.name, "input.csv")
+        self.output_file = os.path.join(self.tmp_dir.name, "output.csv")
+        self.lmp = (datetime.now() - timedelta(days=100)).strftime("%m/%d/%Y")
+        rows = [["Name", "LMP Date", "Period Length"]]
+        rows += [[f"User {i}", self.lmp, "30" if i % 2 else ""] for i in range(25)]
+        rows += [["Bad date", "13/01/2024", "28"], ["Bad cycle", self.lmp, "50"], ["Not a number", self.lmp, "abc"]]
+        with open(self.input_file, mode="w", newline="") as input_file:
+            csv.writer(input_file).writerows(rows)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_output(self):
+        with open(self.output_file, mode="r", newline="") as output_file:
+            return list(csv.DictReader(output_file))
+
+    def test_process_rows(self):
+        result = process_rows([["Judy", self.lmp, ""]])[0]
+        expected_due = (datetime.strptime(self.lmp, "%m/%d/%Y") + timedelta(days=280)).strftime("%m/%d/%Y")
+        self.assertEqual(result, ["Judy", self.lmp, "", expected_due, 14, 2, ""])
+
+    def test_run_bulk_keeps_order_and_reports_errors(self):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            total, errors = run_bulk(self.input_file, self.output_file, chunk_size=4, max_pending=2, executor=executor)
+        self.assertEqual((total, errors), (28, 3))
+        rows = self.read_output()
+        self.assertEqual([row["Name"] for row in rows[:25]], [f"User {i}" for i in range(25)])
+        self.assertEqual(rows[25]["Error"], "Invalid month. Month must be between 01 and 12.")
+        self.assertEqual(rows[26]["Error"], "Period length must be an integer between 20 and 45 days.")
+        self.assertEqual(rows[27]["Error"], "Invalid input. Please enter a valid integer value.")
+
+    def test_main_with_process_pool(self):
+        self.assertEqual(main([self.input_file, self.output_file, "--chunk-size", "10", "--workers", "2"]), 0)
+        self.assertEqual(len(self.read_output()), 28)
+
+if __name__ == "__main__":
+    unittest.main()
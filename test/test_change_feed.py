@@ -0,0 +1,165 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime
+from change_feed import ADD, DELETE, JOURNAL, MODIFY, PROFILES, RESET, UPSERT, ChangeFeed, FeedOffset, load_offset, main, save_offset
+from journal_log import JournalLog
+from metrics import METRICS
+from storage import CSVStorage, UserRecord
+
+class TestChangeFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = CSVStorage(self.tmp_dir.name)
+        self.feed = ChangeFeed(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self, offset=None, batch_size=1000):
+        """Return every change after `offset` and the offset after the last batch."""
+        changes = []
+        for batch in self.feed.changes(offset, batch_size):
+            self.assertLessEqual(len(batch.changes), batch_size)
+            changes.extend(batch.changes)
+            offset = batch.offset
+        return [(c.sequence, c.source, c.operation, c.name, c.entry_id, c.values) for c in changes], offset
+
+    def test_empty_directory(self):
+        self.assertEqual(self.read(), ([], None))
+        self.assertEqual(self.feed.latest(), FeedOffset())
+
+    def test_appends_and_edits(self):
+        self.storage.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+        first = self.storage.add_journal_entry("Judy", "06/01/2024", "Baby kicks")
+        second = self.storage.add_journal_entry("Tally", "06/02/2024", "Nursery")
+        self.storage.modify_journal_entry("Judy", first, "Baby kicks a lot")
+        self.storage.delete_journal_entry("Tally", second)
+        changes, offset = self.read(batch_size=2)
+        self.assertEqual(changes, [(1, PROFILES, UPSERT, "Judy", None, ("05/09/2024", "30")),
+                                   (2, JOURNAL, ADD, "Judy", first, ("06/01/2024", "Baby kicks")),
+                                   (3, JOURNAL, ADD, "Tally", second, ("06/02/2024", "Nursery")),
+                                   (4, JOURNAL, MODIFY, "Judy", first, ("Baby kicks a lot",)),
+                                   (5, JOURNAL, DELETE, "Tally", second, ())])
+        self.assertEqual(offset.sequence, 5)
+        self.assertEqual(self.read(offset), ([], offset))  # nothing new
+
+        self.storage.save_user(UserRecord("Judy", datetime(2024, 5, 10), 30))
+        third = self.storage.add_journal_entry("Judy", "06/03/2024", "Ultrasound")
+        changes, _ = self.read(offset)
+        self.assertEqual(changes, [(6, PROFILES, UPSERT, "Judy", None, ("05/10/2024", "30")),
+                                   (7, JOURNAL, ADD, "Judy", third, ("06/03/2024", "Ultrasound"))])
+
+    def test_resume_reads_only_the_delta(self):
+        for i in range(50):
+            self.storage.add_journal_entry("User %d" % i, "06/01/2024", "entry %d" % i)
+        _, offset = self.read()
+        self.storage.add_journal_entry("Judy", "06/02/2024", "New")
+        METRICS.enable()
+        try:
+            METRICS.reset()
+            changes, _ = self.read(offset)
+            snapshot = METRICS.snapshot()
+        finally:
+            METRICS.disable()
+        self.assertEqual([change[3:] for change in changes], [("Judy", changes[0][4], ("06/02/2024", "New"))])
+        self.assertEqual(snapshot["change_feed.read_journal"]["rows_scanned"], 1)
+        self.assertEqual(snapshot["change_feed.read_journal"]["bytes_read"], len(b"Judy,06/02/2024,New,%d\r\n" % changes[0][4]))
+
+    def test_stopping_between_batches(self):
+        for i in range(5):
+            self.storage.add_journal_entry("Judy", "06/01/2024", "entry %d" % i)
+        batches = self.feed.changes(batch_size=2)
+        first = next(batches)
+        batches.close()  # the consumer stops after one batch
+        changes, _ = self.read(first.offset)
+        self.assertEqual([change[0] for change in changes], [3, 4, 5])
+        self.assertEqual([change[5][1] for change in changes], ["entry 2", "entry 3", "entry 4"])
+
+    def test_partial_row_is_left_for_the_next_read(self):
+        self.storage.add_journal_entry("Judy", "06/01/2024", "Complete")
+        with open(self.storage.journal_file, mode="ab") as journal:
+            journal.write(b"Tally,06/02/2024,Half wri")  # a writer is still writing this row
+        changes, offset = self.read()
+        self.assertEqual([change[5] for change in changes], [("06/01/2024", "Complete")])
+        with open(self.storage.journal_file, mode="ab") as journal:
+            journal.write(b"tten,1000\r\n")
+        changes, _ = self.read(offset)
+        self.assertEqual([change[5] for change in changes], [("06/02/2024", "Half written")])
+
+    def test_edit_of_an_entry_not_read_yet_waits(self):
+        entry_id = self.storage.add_journal_entry("Judy", "06/01/2024", "Baby kicks")
+        self.storage.modify_journal_entry("Judy", entry_id, "Edited")
+        records = ChangeFeed._records
+
+        def journal_looked_at_early(file, start, end, source, skip_header=True):  # the entry was written after the journal was looked at
+            return records(file, start, entry_id if source == JOURNAL else end, source, skip_header)
+
+        with mock.patch.object(ChangeFeed, "_records", staticmethod(journal_looked_at_early)):
+            changes, offset = self.read()
+        self.assertEqual(changes, [])
+        changes, _ = self.read(offset)
+        self.assertEqual([change[2:5] for change in changes], [(ADD, "Judy", entry_id), (MODIFY, "Judy", entry_id)])
+
+    def test_values_spanning_lines(self):
+        entry_id = self.storage.add_journal_entry("Judy", "06/01/2024", "Baby kicks\nall night")
+        changes, offset = self.read()
+        self.assertEqual(changes, [(1, JOURNAL, ADD, "Judy", entry_id, ("06/01/2024", "Baby kicks\nall night"))])
+        self.storage.modify_journal_entry("Judy", entry_id, "Edited\r\nover two lines")
+        self.storage.delete_journal_entry("Judy", entry_id)
+        changes, _ = self.read(offset)
+        self.assertEqual(changes, [(2, JOURNAL, MODIFY, "Judy", entry_id, ("Edited\r\nover two lines",)),
+                                   (3, JOURNAL, DELETE, "Judy", entry_id, ())])
+
+    def test_compaction(self):
+        self.storage.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+        self.storage.save_user(UserRecord("Judy", datetime(2024, 5, 10), 30))
+        kept = self.storage.add_journal_entry("Judy", "06/01/2024", "Kept")
+        dropped = self.storage.add_journal_entry("Judy", "06/02/2024", "Dropped")
+        _, offset = self.read()
+        self.storage.delete_journal_entry("Judy", dropped)
+        self.storage.modify_journal_entry("Judy", kept, "Kept, edited")
+        JournalLog.for_file(self.storage.journal_file).compact()
+        self.storage.compact_users()
+        changes, offset = self.read(offset)
+        self.assertEqual([change[1:4] + change[5:] for change in changes],
+                         [(PROFILES, UPSERT, "Judy", ("05/10/2024", "30")),  # compacted profiles are sent again
+                          (JOURNAL, RESET, None, ()),
+                          (JOURNAL, ADD, "Judy", ("06/01/2024", "Kept, edited"))])
+        self.assertEqual([change[0] for change in changes], [5, 6, 7])  # sequence numbers keep increasing
+        self.assertEqual(self.read(offset), ([], offset))
+
+    def test_latest_skips_existing_data(self):
+        self.storage.add_journal_entry("Judy", "06/01/2024", "Old")
+        offset = self.feed.latest()
+        self.storage.add_journal_entry("Judy", "06/02/2024", "New")
+        self.assertEqual([change[5][1] for change in self.read(offset)[0]], ["New"])
+
+    def test_offset_file(self):
+        offset_file = os.path.join(self.tmp_dir.name, "feed.offset")
+        self.assertIsNone(load_offset(offset_file))
+        save_offset(offset_file, FeedOffset(3, 1, 2, 3, 4, 5))
+        self.assertEqual(load_offset(offset_file), FeedOffset(3, 1, 2, 3, 4, 5))
+
+    def test_command_line(self):
+        offset_file = os.path.join(self.tmp_dir.name, "feed.offset")
+        self.storage.add_journal_entry("Judy", "06/01/2024", "First")
+        output = []
+        with mock.patch("sys.stdout") as stdout:
+            stdout.writelines.side_effect = lambda lines: output.extend(lines)
+            self.assertEqual(main([self.tmp_dir.name, "--offset-file", offset_file]), 0)
+            self.storage.add_journal_entry("Judy", "06/02/2024", "Second")
+            self.assertEqual(main([self.tmp_dir.name, "--offset-file", offset_file]), 0)
+        self.assertEqual([json.loads(line)["values"] for line in output], [["06/01/2024", "First"], ["06/02/2024", "Second"]])
+        self.assertEqual(load_offset(offset_file).sequence, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
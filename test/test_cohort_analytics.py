@@ -0,0 +1,148 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime
+import numpy as np
+import cohort_analytics
+from cohort_analytics import cohort_report, main, read_data_dir, read_profiles, to_csv
+from sharding import ShardedCSVStorage
+from storage import UserRecord
+from user_table import UserTable
+
+ROWS = (
+    'Name,LMP Date,Period Length\r\n'
+    'Alice,01/10/2024,28\r\n'
+    '"Doe, Jane",02/29/2024,30\n'  # quoted name, leap day, LF line ending
+    'Bob,03/01/2024,5\r\n'  # one-digit cycle length
+    'Carol,13/01/2024,28\r\n'  # no month 13
+    'Dave,02/30/2024,28\r\n'  # no February 30
+    '\r\n'
+    'Alice,05/15/2024,21\r\n'  # supersedes the first Alice row
+    'Eve,12/31/2023,100\r\n'  # three-digit cycle length
+    'Carol,04/01/2024\r\n'  # missing column
+    'Gina,Smith,04/01/2024,28\r\n'  # extra column: the date column holds 'Smith'
+    'Hank,04/01/2024,300\r\n'  # cycle length out of range
+    'Frank,06/20/2024,45'  # no final line break
+)
+
+
+class TestReadProfiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.user_file = os.path.join(self.tmp_dir.name, "user_data.csv")
+        with open(self.user_file, mode="w", newline="") as csv_file:
+            csv_file.write(ROWS)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def profiles(self, columns):
+        ordinals = columns.lmp_dates.astype(np.int64) + cohort_analytics.EPOCH_ORDINAL
+        return sorted(zip(ordinals.tolist(), columns.period_lengths.tolist()))
+
+    def test_matches_user_table(self):
+        columns = read_profiles(self.user_file)
+        table = UserTable(self.user_file)
+        expected = sorted(zip(np.frombuffer(table.lmp_ordinals(), dtype=np.int32).tolist(), table.period_lengths().tolist()))
+        self.assertEqual(len(columns.lmp_dates), len(table))
+        self.assertEqual(self.profiles(columns), expected)
+        self.assertEqual(columns.skipped, 5)  # Carol twice, Dave, Gina and Hank; the blank line and superseded Alice row are not malformed
+        self.assertIn((datetime(2024, 5, 15).toordinal(), 21), self.profiles(columns))
+        self.assertNotIn((datetime(2024, 1, 10).toordinal(), 28), self.profiles(columns))
+
+    def test_hash_collisions_are_resolved_by_name(self):
+        with mock.patch.object(cohort_analytics, "_hash_names", lambda names, starts, lengths: np.zeros(starts.size, dtype=np.uint64)):
+            self.assertEqual(self.profiles(read_profiles(self.user_file)), self.profiles(UserTableColumns(self.user_file)))
+
+    def test_empty_files(self):
+        for content in ("", "Name,LMP Date,Period Length\r\n"):
+            with open(self.user_file, mode="w", newline="") as csv_file:
+                csv_file.write(content)
+            columns = read_profiles(self.user_file)
+            self.assertEqual((len(columns.lmp_dates), columns.skipped), (0, 0))
+            self.assertEqual(cohort_report(columns, datetime(2024, 6, 1))["profiles"], 0)
+
+    def test_malformed_last_row(self):
+        for last_row, skipped in (("x,bad\n", 1), ("x,bad", 1), ("x\n", 1), (",\n", 1), ("Zed,01/30/2024,2", 0)):  # shorter than a plain row
+            with open(self.user_file, mode="w", newline="") as csv_file:
+                csv_file.write("Name,LMP Date,Period Length\nAlice,01/30/2024,28\n" + last_row)
+            columns = read_profiles(self.user_file)
+            self.assertEqual(self.profiles(columns), self.profiles(UserTableColumns(self.user_file)), last_row)
+            self.assertEqual((len(columns.lmp_dates), columns.skipped), (2 - skipped, skipped), last_row)
+
+    def test_sharded_directory(self):
+        data_dir = os.path.join(self.tmp_dir.name, "sharded")
+        storage = ShardedCSVStorage(data_dir, shards=3)
+        for i in range(20):
+            storage.save_user(UserRecord("User %d" % i, datetime(2024, 1, i + 1), 28))
+        storage.save_user(UserRecord("User 0", datetime(2024, 2, 1), 30))
+        columns = read_data_dir(data_dir)
+        self.assertEqual(len(columns.lmp_dates), 20)
+        self.assertIn((datetime(2024, 2, 1).toordinal(), 30), self.profiles(columns))
+
+
+def UserTableColumns(user_file):
+    table = UserTable(user_file)
+    lmp_dates = (np.frombuffer(table.lmp_ordinals(), dtype=np.int32).astype(np.int64) - cohort_analytics.EPOCH_ORDINAL).astype("datetime64[D]")
+    return cohort_analytics.ProfileColumns(lmp_dates, np.array(table.period_lengths(), dtype=np.uint8), 0)
+
+
+class TestCohortReport(unittest.TestCase):
+
+    def setUp(self):
+        lmp_dates = np.array(["2024-01-01", "2024-01-01", "2024-03-01", "2024-07-01", "2024-02-01"], dtype="datetime64[D]")
+        self.profiles = cohort_analytics.ProfileColumns(lmp_dates, np.array([28, 35, 28, 28, 5], dtype=np.uint8), 2)
+
+    def test_report(self):
+        report = cohort_report(self.profiles, datetime(2024, 6, 1))
+        self.assertEqual(report["today"], "2024-06-01")
+        self.assertEqual((report["profiles"], report["skipped_rows"], report["invalid_period_length"]), (4, 2, 1))
+        # 152 days after 01/01 is week 21; a 35-day cycle shifts the LMP a week later; 03/01 is 92 days before
+        self.assertEqual(report["gestational_weeks"], {"before_lmp": 1, "13": 1, "20": 1, "21": 1})
+        self.assertEqual(report["due_months"], {"2024-10": 2, "2024-12": 1, "2025-04": 1})
+        self.assertEqual(report["period_lengths"], {"28": 3, "35": 1})
+
+    def test_filters(self):
+        report = cohort_report(self.profiles, datetime(2024, 6, 1), lmp_range=(datetime(2024, 2, 1), None))
+        self.assertEqual((report["profiles"], report["invalid_period_length"]), (2, 1))
+        report = cohort_report(self.profiles, datetime(2024, 6, 1), due_range=(datetime(2024, 10, 1), datetime(2024, 12, 31)))
+        self.assertEqual(report["due_months"], {"2024-10": 2, "2024-12": 1})
+        report = cohort_report(self.profiles, datetime(2024, 6, 1), (None, datetime(2024, 1, 31)), (None, datetime(2024, 10, 31)))
+        self.assertEqual((report["profiles"], report["period_lengths"]), (2, {"28": 1, "35": 1}))
+
+    def test_csv(self):
+        rows = to_csv(cohort_report(self.profiles, datetime(2024, 6, 1))).splitlines()
+        self.assertEqual(rows[:2], ["Metric,Key,Count", "profiles,,4"])
+        self.assertIn("gestational_weeks,before_lmp,1", rows)
+        self.assertIn("due_months,2024-10,2", rows)
+        self.assertIn("period_lengths,28,3", rows)
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def test_json_and_csv_output(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            with open(os.path.join(data_dir, "user_data.csv"), mode="w", newline="") as csv_file:
+                csv_file.write(ROWS)
+            output = os.path.join(data_dir, "report.json")
+            self.assertEqual(main([data_dir, "--today", "06/01/2024", "--due-from", "01/01/2024", "--output", output]), 0)
+            with open(output) as report_file:
+                report = json.load(report_file)
+            self.assertEqual((report["profiles"], report["invalid_period_length"]), (3, 2))
+            output = os.path.join(data_dir, "report.csv")
+            self.assertEqual(main([data_dir, "--format", "csv", "--lmp-to", "03/01/2024", "--output", output]), 0)
+            with open(output) as report_file:
+                self.assertIn("profiles,,1", report_file.read())  # Jane; Bob and Eve have invalid cycle lengths
+            with mock.patch("sys.stdout"):
+                self.assertEqual(main([data_dir, "--today", "2024-06-01"]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime, timedelta
+from console import Console, RecordingConsole, ScriptedConsole
+from due_date_calculator import DueDatePredictor, main
+from storage import CSVStorage
+
+class TestScriptedConsole(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = CSVStorage(self.tmp_dir.name)
+        self.lmp = (datetime.now() - timedelta(days=70)).strftime("%m/%d/%Y")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_drives_a_whole_session(self):
+        console = ScriptedConsole(["Judy", self.lmp, "30", "4", "Baby kicks", "3", "8"])
+        with mock.patch("builtins.input", side_effect=AssertionError), mock.patch("builtins.print", side_effect=AssertionError):
+            DueDatePredictor(self.storage, console=console).run()  # the terminal is never touched
+        self.assertEqual(console.remaining(), 0)
+        self.assertEqual(console.prompts[0], "Please enter your name: ")
+        self.assertIn("Welcome, Judy!", console.text())
+        self.assertIn("1. " + datetime.now().strftime("%m/%d/%Y") + " - Baby kicks\n", console.output)
+        self.assertEqual(self.storage.load_user("Judy").period_length, 30)
+
+    def test_running_out_of_answers_is_end_of_input(self):
+        console = ScriptedConsole(["Judy"])
+        with self.assertRaises(EOFError):
+            DueDatePredictor(self.storage, console=console).run()
+        self.assertIsNone(self.storage.load_user("Judy"))
+
+    def test_print_joins_like_the_builtin(self):
+        console = ScriptedConsole([])
+        console.print("a", 1, sep="-", end="")
+        console.print()
+        self.assertEqual(console.output, ["a-1", "\n"])
+
+
+class TestRecordingConsole(unittest.TestCase):
+
+    def test_records_and_passes_through(self):
+        inner = ScriptedConsole(["Judy", "8"])
+        console = RecordingConsole(inner)
+        self.assertEqual((console.input("Name? "), console.input("Choice? ")), ("Judy", "8"))
+        console.print("Bye")
+        self.assertEqual((console.answers, inner.prompts, inner.output), (["Judy", "8"], ["Name? ", "Choice? "], ["Bye\n"]))
+
+    def test_default_console_is_the_terminal(self):
+        with mock.patch("builtins.input", return_value="Judy") as fake_input, mock.patch("builtins.print") as fake_print:
+            console = RecordingConsole()
+            self.assertEqual(console.input("Name? "), "Judy")
+            console.print("Hi", end="")
+        fake_input.assert_called_once_with("Name? ")
+        fake_print.assert_called_once_with("Hi", sep=" ", end="")
+        self.assertIsInstance(console.console, Console)
+
+    def test_command_line_records_sessions(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            record = os.path.join(data_dir, "sessions.jsonl")
+            lmp = (datetime.now() - timedelta(days=70)).strftime("%m/%d/%Y")
+            for answers in (["Judy", lmp, "", "8"], ["Judy", "1", "8"]):
+                with mock.patch("builtins.input", side_effect=answers), mock.patch("builtins.print"):
+                    main(["--data-dir", data_dir, "--record", record])
+            with open(record) as sessions:
+                self.assertEqual([json.loads(line) for line in sessions], [["Judy", lmp, "", "8"], ["Judy", "1", "8"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
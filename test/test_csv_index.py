@@ -0,0 +1,116 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime
+from csv_index import CSVOffsetIndex
+from file_lock import GroupCommitWriter
+from due_date_calculator import User
+
+class TestCSVOffsetIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "user_data.csv")
+        with open(self.file_name, mode="w", newline="") as user_file:
+            user_file.write("Name,LMP Date,Period Length\r\nMelissa,04/04/2024,30\r\nTally,05/11/2024,28\r\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_lookup_reads_row_at_offset(self):
+        index = CSVOffsetIndex(self.file_name)
+        self.assertEqual(index.read_row(index.first("Tally")), ["Tally", "05/11/2024", "28"])
+        self.assertIsNone(index.first("Nobody"))
+        self.assertTrue(os.path.exists(self.file_name + ".idx"))  # persisted next to the CSV
+
+    def test_persisted_index_is_reused(self):
+        CSVOffsetIndex(self.file_name).rebuild()
+        index = CSVOffsetIndex(self.file_name)
+        index.rebuild = None  # a fresh instance must load the file instead of rescanning the CSV
+        self.assertEqual(index.keys(), ["Melissa", "Tally"])
+
+    def test_rebuilds_when_csv_changes(self):
+        index = CSVOffsetIndex(self.file_name)
+        self.assertEqual(index.keys(), ["Melissa", "Tally"])
+        with open(self.file_name, mode="a", newline="") as user_file:
+            user_file.write("Judy,05/09/2024,30\r\n")  # written without updating the index
+        self.assertEqual(index.read_row(index.first("Judy")), ["Judy", "05/09/2024", "30"])
+
+    def test_latest_rows(self):
+        with open(self.file_name, mode="a", newline="") as user_file:
+            user_file.write("Melissa,05/01/2024,28\r\n")
+        index = CSVOffsetIndex(self.file_name)
+        self.assertEqual(index.read_row(index.last("Melissa")), ["Melissa", "05/01/2024", "28"])
+        self.assertEqual(index.last("Tally"), index.first("Tally"))
+        self.assertEqual(index.live(), [index.first("Tally"), index.last("Melissa")])
+        self.assertEqual((index.rows(), index.superseded()), (3, 1))
+
+    def test_user_save_and_load_use_index(self):
+        self.assertEqual(User.load_from_file("Melissa", self.file_name).period_length, 30)  # builds the index
+        user = User("Judy")
+        user.set_lmp_date(datetime(2024, 5, 9))
+        user.set_period_length(30)
+        user.save_to_file(self.file_name)
+        with open(self.file_name + ".idx") as index_file:
+            self.assertIn("Judy", index_file.read())  # updated incrementally on save
+        loaded = User.load_from_file("Judy", self.file_name)
+        self.assertEqual((loaded.name, loaded.lmp_date, loaded.period_length), ("Judy", datetime(2024, 5, 9), 30))
+        self.assertIsNone(User.load_from_file("Nobody", self.file_name))
+
+    def test_quoted_line_breaks_stay_in_their_row(self):
+        with open(self.file_name, mode="a", newline="") as user_file:
+            user_file.write('"Judy\r\nSmith",05/09/2024,30\r\nZoe,"05/10/2024\n",28\r\nAmy,06/01/2024,29')  # no trailing newline
+        index = CSVOffsetIndex(self.file_name)
+        self.assertEqual(index.keys(), ["Melissa", "Tally", "Judy\r\nSmith", "Zoe", "Amy"])
+        self.assertEqual(index.read_row(index.first("Judy\r\nSmith")), ["Judy\r\nSmith", "05/09/2024", "30"])
+        self.assertEqual(index.read_row(index.first("Zoe")), ["Zoe", "05/10/2024\n", "28"])
+        self.assertEqual(index.read_row(index.first("Amy")), ["Amy", "06/01/2024", "29"])
+
+    def test_rebuild_racing_an_append_counts_the_row_once(self):
+        index = CSVOffsetIndex(self.file_name)
+        before = index._stat()
+        offset = before[1]
+        with open(self.file_name, mode="a", newline="") as user_file:
+            user_file.write("Judy,05/09/2024,30\r\n")
+        with mock.patch.object(index, "_stat", return_value=before):
+            index.rebuild()  # another thread stat'ed the file just before the writer appended, and scans it just after
+        index.record_append("Judy", offset, before)  # then the writer registers its row
+        self.assertEqual((index.offsets("Judy"), index.rows()), ([offset], 3))
+        self.assertEqual(CSVOffsetIndex(self.file_name).offsets("Judy"), [offset])  # the persisted index as well
+
+    def replace_file(self, content, same_inode=False):
+        """Rewrite the CSV as another process would, keeping its size and modification time."""
+        stat = os.stat(self.file_name)
+        target = self.file_name if same_inode else self.file_name + ".tmp"
+        with open(target, mode="w", newline="") as user_file:
+            user_file.write(content)
+        os.replace(target, self.file_name)
+        os.utime(self.file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(os.path.getsize(self.file_name), stat.st_size)
+
+    def test_append_to_a_replaced_file_of_the_same_size_rebuilds(self):
+        index = CSVOffsetIndex(self.file_name)
+        self.assertEqual(index.read_row(index.last("Tally")), ["Tally", "05/11/2024", "28"])
+        self.replace_file("Name,LMP Date,Period Length\r\nTally,05/11/2024,28\r\nMelissa,04/04/2024,30\r\n")  # compacted elsewhere
+        writer = GroupCommitWriter(self.file_name, on_commit=lambda batch, before: index.record_appends([(row[0], offset) for row, offset in batch], before))
+        writer.append_many([["Judy", "05/09/2024", "30"]])
+        for name in ("Tally", "Melissa", "Judy"):
+            self.assertEqual(index.read_row(index.last(name))[0], name)  # the offsets of the old file were dropped
+        self.assertEqual(CSVOffsetIndex(self.file_name).keys(), ["Tally", "Melissa", "Judy"])  # the persisted index as well
+
+    def test_rows_are_checked_against_their_key(self):
+        index = CSVOffsetIndex(self.file_name)
+        index.keys()
+        self.replace_file("Name,LMP Date,Period Length\r\nTally,05/11/2024,28\r\nMelissa,04/04/2024,30\r\n", same_inode=True)
+        index._fingerprint = index._stat()  # the change went unnoticed, e.g. within the file system's timestamp granularity
+        self.assertEqual(index.read_key_row("Melissa"), ["Melissa", "04/04/2024", "30"])
+        self.assertEqual(index.read_key_row("Tally"), ["Tally", "05/11/2024", "28"])
+        self.assertIsNone(index.read_key_row("Nobody"))
+
+if __name__ == "__main__":
+    unittest.main()
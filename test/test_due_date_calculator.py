@@ -66,6 +66,28 @@ class TestDateValidator(unittest.TestCase):
         self.assertFalse(DateValidator.is_valid_date_range(invalid_date))
 
 
+    def test_validate_dates_batch(self):
+        now = datetime(2026, 10, 18, 12, 30)
+        date_strs = ["10/01/2026", "2024-10-01", "13/01/2026", "02/30/2026", "01/11/2026", "01/12/2026", "1/12/2026", "01/12/+2026"]
+        codes, ordinals = DateValidator.validate_dates(date_strs, now)
+        self.assertEqual(list(codes), [DateValidator.VALID, DateValidator.INVALID_FORMAT, DateValidator.INVALID_MONTH,
+                                       DateValidator.INVALID_DAY, DateValidator.OUT_OF_RANGE, DateValidator.VALID,
+                                       DateValidator.VALID, DateValidator.INVALID_FORMAT])
+        self.assertEqual(ordinals[0], datetime(2026, 10, 1).toordinal())
+        self.assertEqual(ordinals[1], 0)
+        for date_str, code in zip(date_strs, codes):  # the codes map back to the messages of validate_date
+            if code != DateValidator.VALID:
+                self.assertEqual(DateValidator.error_message(code, date_str, now), DateValidator.validate_date(date_str, now))
+
+    def test_date_window_matches_is_valid_date_range(self):
+        for now in (datetime(2026, 10, 18, 0, 0), datetime(2026, 10, 18, 12, 30)):
+            first, last = DateValidator.date_window(now)
+            self.assertTrue(DateValidator.is_valid_date_range(datetime.fromordinal(first), now))
+            self.assertFalse(DateValidator.is_valid_date_range(datetime.fromordinal(first - 1), now))
+            self.assertTrue(DateValidator.is_valid_date_range(datetime.fromordinal(last), now))
+            self.assertFalse(DateValidator.is_valid_date_range(datetime.fromordinal(last + 1), now))
+
+
 class TestDueDateCalculator(unittest.TestCase):
 
     def setUp(self):
@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import csv
+import multiprocessing
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from concurrent.futures import ThreadPoolExecutor
+from file_lock import GroupCommitWriter, locked
+
+def append_rows(path, worker, count):
+    writer = GroupCommitWriter(path, header=["Name", "Date", "Entry"])
+    for i in range(count):
+        writer.append([f"worker {worker}", "12/06/2024", f"{i} " + "x" * 2000])  # long rows would interleave without the lock
+
+class TestGroupCommitWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "pregnancy_journal.csv")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_concurrent_appends_are_batched(self):
+        batches = []
+        writer = GroupCommitWriter(self.path, header=["Name", "Date", "Entry"], window=0.01, on_commit=lambda batch, before: batches.append(batch))
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            offsets = list(executor.map(lambda i: writer.append([f"User {i}", "12/06/2024", f"Entry {i}"]), range(100)))
+        self.assertLess(len(batches), 100)  # fewer commits (and fsyncs) than rows
+        self.assertEqual(sum(len(batch) for batch in batches), 100)
+        with open(self.path, mode="rb") as journal:
+            for i, offset in enumerate(offsets):  # each offset points at the caller's own row
+                journal.seek(offset)
+                self.assertEqual(journal.readline().decode(), f"User {i},12/06/2024,Entry {i}\r\n")
+            journal.seek(0)
+            self.assertEqual(journal.readline(), b"Name,Date,Entry\r\n")  # header written once
+
+    def test_appends_from_several_processes_do_not_interleave(self):
+        processes = [multiprocessing.Process(target=append_rows, args=(self.path, worker, 50)) for worker in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        with open(self.path, mode="r", newline="") as journal:
+            rows = list(csv.reader(journal))
+        self.assertEqual(rows[0], ["Name", "Date", "Entry"])
+        self.assertEqual(len(rows), 201)
+        self.assertTrue(all(len(row) == 3 and row[2].endswith("x" * 2000) for row in rows[1:]))
+
+    def test_id_base_numbers_the_rows(self):
+        sizes, batches = [], []
+        writer = GroupCommitWriter(self.path, header=["Name", "Id"], on_commit=lambda batch, before: batches.append(batch),
+                                   id_base=lambda size: sizes.append(size) or 1000)
+        ids = writer.append_many([["Judy"], ["Tally"]]) + [writer.append(["Ava"])]
+        header = len(b"Name,Id\r\n")
+        self.assertEqual(sizes, [0, header + len(b"Judy,1009\r\nTally,1020\r\n")])  # called once per batch, under the lock
+        self.assertEqual(ids, [1000 + header, 1000 + header + len(b"Judy,1009\r\n"), 1000 + sizes[1]])
+        self.assertEqual(batches[0], [(["Judy", ids[0]], header), (["Tally", ids[1]], header + len(b"Judy,1009\r\n"))])
+        with open(self.path, mode="r", newline="") as journal:
+            self.assertEqual(list(csv.reader(journal)), [["Name", "Id"], ["Judy", str(ids[0])], ["Tally", str(ids[1])], ["Ava", str(ids[2])]])
+
+    def test_locked_is_exclusive(self):
+        inside, overlaps = [], []
+        def critical_section():
+            with locked(self.path):
+                if inside:
+                    overlaps.append(True)
+                inside.append(True)
+                threading.Event().wait(0.001)
+                inside.pop()
+        threads = [threading.Thread(target=critical_section) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlaps, [])
+
+    def test_write_errors_reach_the_caller(self):
+        writer = GroupCommitWriter(os.path.join(self.tmp_dir.name, "missing", "journal.csv"))
+        with self.assertRaises(IOError):
+            writer.append(["Judy", "12/06/2024", "Lost"])
+
+if __name__ == "__main__":
+    unittest.main()
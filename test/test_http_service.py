@@ -0,0 +1,148 @@
+import unittest
+import sys
+import os
+import asyncio
+import json
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime, timedelta
+from http_service import BabyLandService
+from metrics import METRICS
+from notifications import NotificationScheduler
+from storage import CSVStorage
+from timeline import FixedClock
+
+class TestBabyLandService(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp_dir.name, "milestone_medical_info.csv"), mode="w", newline="") as csv_file:
+            csv_file.write("Week,Milestone,Medical_Info\r\n12,Reflexes develop.,First trimester screening.\r\n")
+        self.service = BabyLandService(CSVStorage(self.tmp_dir.name), port=0)
+        await self.service.start()
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.service.port)
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.service.stop()
+        self.tmp_dir.cleanup()
+
+    async def request(self, method, path, body=None):
+        """Send one request on the kept-alive connection and return (status, decoded JSON body)."""
+        data = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) != b"\r\n":
+            key, _, value = line.decode().partition(":")
+            headers[key.lower()] = value.strip()
+        payload = await self.reader.readexactly(int(headers["content-length"]))
+        return status, json.loads(payload) if payload else None
+
+    async def test_profile_and_progress(self):
+        self.assertEqual((await self.request("GET", "/users/Judy"))[0], 404)
+        lmp = (datetime.now() - timedelta(days=100)).strftime("%m/%d/%Y")
+        status, _ = await self.request("PUT", "/users/Judy%20M", {"lmp_date": lmp, "period_length": 28})
+        self.assertEqual(status, 201)
+        status, body = await self.request("GET", "/users/Judy%20M/progress")
+        self.assertEqual((status, body["weeks"], body["days"]), (200, 14, 2))
+        status, body = await self.request("PUT", "/users/Judy", {"lmp_date": "13/01/2024"})
+        self.assertEqual((status, body["error"]), (400, "Invalid month. Month must be between 01 and 12."))
+
+    async def test_timeline(self):
+        lmp = (datetime.now() - timedelta(days=84)).strftime("%m/%d/%Y")
+        await self.request("PUT", "/users/Judy", {"lmp_date": lmp, "period_length": 28})
+        status, body = await self.request("GET", "/users/Judy/timeline?from=12")
+        self.assertEqual((status, body["current_week"], len(body["weeks"])), (200, 12, 29))
+        self.assertEqual((body["weeks"][0]["week"], body["weeks"][0]["milestone"]), (12, "Reflexes develop."))
+        self.assertEqual(body["weeks"][-1]["start"], body["due_date"])
+        self.assertEqual(self.service.timelines.cache_info().misses, 1)
+        await self.request("GET", "/users/Judy/progress")
+        self.assertEqual(self.service.timelines.cache_info().hits, 1)
+
+    async def test_notifications(self):
+        self.assertEqual(await self.service.pop_notifications(), [])  # disabled by default
+        self.service.notifications = NotificationScheduler(self.service.timelines)
+        self.service.notifications.follow(self.service.storage)
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.service.timelines.clock = FixedClock(today)
+        lmp = (today - timedelta(days=79)).strftime("%m/%d/%Y")  # week 11, day 2
+        await self.request("PUT", "/users/Judy", {"lmp_date": lmp, "period_length": 28})
+        self.assertEqual(self.service.notifications.next_due(), (today + timedelta(days=5)).date())
+        self.service.timelines.clock = FixedClock(today + timedelta(days=5))
+        notifications = await self.service.pop_notifications()
+        self.assertEqual([(n.name, n.week, n.milestone) for n in notifications], [("Judy", 12, "Reflexes develop.")])
+
+    async def test_week_info(self):
+        status, body = await self.request("GET", "/weeks/12")
+        self.assertEqual((status, body["milestone"]), (200, "Reflexes develop."))
+        self.assertEqual((await self.request("GET", "/weeks/13"))[0], 404)
+
+    async def test_journal_crud(self):
+        status, first = await self.request("POST", "/users/Judy/journal", {"text": "First"})
+        self.assertEqual(status, 201)
+        _, second = await self.request("POST", "/users/Judy/journal", {"text": "Second"})
+        self.assertEqual((await self.request("PUT", f"/users/Judy/journal/{first['entry_id']}", {"text": "Edited"}))[0], 200)
+        self.assertEqual((await self.request("DELETE", f"/users/Tally/journal/{second['entry_id']}"))[0], 404)  # not Tally's entry
+        self.assertEqual((await self.request("DELETE", f"/users/Judy/journal/{second['entry_id']}"))[0], 204)
+        status, body = await self.request("GET", "/users/Judy/journal?page_size=5")
+        self.assertEqual([entry["text"] for entry in body["entries"]], ["Edited"])
+        self.assertIsNone(body["next_cursor"])
+
+    async def test_multi_line_entries_round_trip(self):
+        status, posted = await self.request("POST", "/users/Judy/journal", {"text": "Two\nlines, \"quoted\""})
+        self.assertEqual((status, posted["text"]), (201, "Two\nlines, \"quoted\""))
+        await self.request("POST", "/users/Judy/journal", {"text": "After"})
+        status, body = await self.request("GET", "/users/Judy/journal?order=oldest")
+        self.assertEqual([entry["text"] for entry in body["entries"]], ["Two\nlines, \"quoted\"", "After"])
+        self.assertEqual((await self.request("PUT", f"/users/Judy/journal/{posted['entry_id']}", {"text": "Carriage\r\nreturn"}))[0], 200)
+        status, body = await self.request("GET", "/users/Judy/journal?order=oldest")
+        self.assertEqual([(entry["entry_id"], entry["text"]) for entry in body["entries"]][0], (posted["entry_id"], "Carriage\r\nreturn"))
+
+    async def test_journal_search(self):
+        await self.request("POST", "/users/Judy/journal", {"text": "Felt the baby kick"})
+        await self.request("POST", "/users/Judy/journal", {"text": "Doctor visit"})
+        status, body = await self.request("GET", "/users/Judy/journal/search?q=kick*")
+        self.assertEqual((status, [entry["text"] for entry in body["entries"]]), (200, ["Felt the baby kick"]))
+        self.assertEqual((await self.request("GET", "/users/Judy/journal/search"))[0], 400)
+
+    async def test_metrics(self):
+        METRICS.reset()
+        METRICS.enable()
+        try:
+            await self.request("GET", "/weeks/12")
+            status, body = await self.request("GET", "/metrics?format=json")
+        finally:
+            METRICS.disable()
+        self.assertEqual((status, body["csv.week_info"]["calls"]), (200, 1))
+
+    async def test_errors(self):
+        self.assertEqual((await self.request("GET", "/nowhere"))[0], 404)
+        self.assertEqual((await self.request("DELETE", "/users/Judy"))[0], 405)
+        self.assertEqual((await self.request("POST", "/users/Judy/journal", {"wrong": 1}))[0], 400)
+        self.assertEqual((await self.request("PUT", "/users/Judy/journal/1", {"text": "No such entry"}))[0], 404)
+
+    async def test_unexpected_errors_are_answered(self):
+        with mock.patch.object(self.service.storage, "week_info", side_effect=ZeroDivisionError), \
+                self.assertLogs("http_service", level="ERROR") as logs:
+            status, body = await self.request("GET", "/weeks/12")
+        self.assertEqual((status, body), (500, {"error": "Internal server error."}))
+        self.assertIn("ZeroDivisionError", logs.output[0])
+        self.assertEqual((await self.request("GET", "/weeks/12"))[0], 200)  # the connection is still served
+
+    async def test_many_concurrent_connections(self):
+        async def fetch():
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.service.port)
+            writer.write(b"GET /weeks/12 HTTP/1.1\r\nConnection: close\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            return response.split(b" ", 2)[1]
+        statuses = await asyncio.gather(*(fetch() for _ in range(200)))
+        self.assertEqual(set(statuses), {b"200"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from journal_cache import JournalCache, entry_size
+from journal_log import JournalEntry, JournalLog
+from storage import CSVStorage
+
+class TestJournalCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "pregnancy_journal.csv")
+        self.journal = JournalLog(self.file_name, compaction_threshold=0.9, background=False)
+        self.first = self.journal.append("Judy", "12/06/2024", "Saw my baby's face!")
+        self.second = self.journal.append("Tally", "12/06/2024", "Expecting a girl!")
+        self.third = self.journal.append("Judy", "12/07/2024", "Almost a Mom!")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def texts(self, name):
+        return [entry.text for entry in self.journal.entries(name)]
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self.texts("Judy"), ["Saw my baby's face!", "Almost a Mom!"])
+        self.assertEqual(self.texts("Judy"), ["Saw my baby's face!", "Almost a Mom!"])
+        self.assertEqual(self.texts("Nobody"), [])
+        self.assertEqual(self.texts("Nobody"), [])  # users without entries are cached too
+        stats = self.journal.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["users"], stats["entries"]), (2, 2, 2, 2))
+
+    def test_returned_entries_are_copies(self):
+        self.journal.entries("Judy").clear()
+        self.assertEqual(len(self.journal.entries("Judy")), 2)
+
+    def test_writes_update_the_cache_in_place(self):
+        self.texts("Judy")
+        self.texts("Tally")
+        fourth = self.journal.append("Judy", "12/08/2024", "Nursery painted")
+        self.journal.modify("Judy", self.first, "Edited")
+        self.journal.delete("Tally", self.second)
+        self.assertEqual(self.texts("Judy"), ["Edited", "Almost a Mom!", "Nursery painted"])
+        self.assertEqual(self.texts("Tally"), [])
+        stats = self.journal.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["invalidations"]), (4, 2, 0))  # the edits' ownership checks hit too
+        self.assertEqual(stats["bytes"], sum(entry_size(entry) for entry in self.journal.entries("Judy")) + sys.getsizeof("Judy") + sys.getsizeof("Tally"))
+        self.assertEqual(fourth, self.journal.entries("Judy")[-1].entry_id)
+
+    def test_changes_made_elsewhere_invalidate_the_cache(self):
+        self.texts("Judy")
+        with open(self.file_name, mode="a", newline="") as journal:  # another process appending
+            journal.write("Judy,12/08/2024,Written elsewhere,1000000\r\n")
+        self.assertEqual(self.texts("Judy"), ["Saw my baby's face!", "Almost a Mom!", "Written elsewhere"])
+        other = JournalLog(self.file_name, compaction_threshold=0.9, background=False)  # edits through another journal
+        other.modify("Judy", self.third, "Edited elsewhere")
+        self.assertEqual(self.texts("Judy"), ["Saw my baby's face!", "Edited elsewhere", "Written elsewhere"])
+        self.assertEqual(self.journal.cache.invalidations, 2)
+        self.journal.append("Judy", "12/09/2024", "Written here")  # the cache no longer follows the file, so it is dropped
+        self.assertEqual(self.texts("Judy")[-1], "Written here")
+
+    def test_compaction_clears_the_cache(self):
+        self.journal.delete("Tally", self.second)
+        self.texts("Judy")
+        self.journal.compact()
+        self.assertEqual(len(self.journal.cache), 0)
+        entries = self.journal.entries("Judy")
+        self.assertEqual([entry.text for entry in entries], ["Saw my baby's face!", "Almost a Mom!"])
+        self.assertEqual(entries[-1].entry_id, self.third)  # the ids outlive the compaction
+        self.journal.modify("Judy", self.third, "Edited")
+        self.assertEqual(self.texts("Judy"), ["Saw my baby's face!", "Edited"])
+
+    def test_least_recently_used_users_are_evicted(self):
+        names = ["User %d" % i for i in range(10)]
+        self.journal.append_many([(name, "12/08/2024", "entry of " + name) for name in names])
+        for name in names[:2]:
+            self.journal.entries(name)
+        user_bytes = self.journal.cache.stats()["bytes"] // 2
+        self.journal.cache.resize(user_bytes * 3)
+        for name in names[2:]:
+            self.journal.entries(name)
+        self.assertEqual(self.journal.cache.stats()["users"], 3)
+        self.assertEqual(self.journal.cache.evictions, 7)
+        self.assertLessEqual(self.journal.cache.stats()["bytes"], self.journal.cache.max_bytes)
+        hits = self.journal.cache.hits
+        self.journal.entries(names[-1])
+        self.journal.entries(names[0])
+        self.assertEqual(self.journal.cache.hits, hits + 1)
+
+    def test_users_over_the_budget_are_not_cached(self):
+        self.journal.cache.resize(1)
+        self.assertEqual(self.texts("Judy"), ["Saw my baby's face!", "Almost a Mom!"])
+        self.assertEqual(self.texts("Judy"), ["Saw my baby's face!", "Almost a Mom!"])
+        self.assertEqual((self.journal.cache.hits, self.journal.cache.misses, len(self.journal.cache)), (0, 2, 0))
+
+    def test_pages_from_the_cache(self):
+        ids = [self.first, self.third] + self.journal.append_many([("Judy", "12/08/2024", "entry %d" % i) for i in range(5)])
+        self.journal.delete("Judy", ids[3])
+        uncached = JournalLog(self.file_name, cache_bytes=0)
+        for newest_first in (True, False):
+            for journal in (self.journal, uncached):
+                pages = []
+                cursor = None
+                while True:
+                    page, cursor = journal.page("Judy", 2, cursor, newest_first)
+                    pages.append([entry.entry_id for entry in page])
+                    if cursor is None:
+                        break
+                live = [entry_id for entry_id in ids if entry_id != ids[3]]
+                self.assertEqual([entry_id for page in pages for entry_id in page], live[::-1] if newest_first else live)
+        self.assertGreater(self.journal.cache.hits, 0)
+        self.assertEqual(uncached.cache.hits, 0)
+
+    def test_stale_reads_are_not_cached(self):
+        cache = JournalCache()
+        entry = JournalEntry(10, "Judy", "12/06/2024", "text")
+        fingerprint = (1, 10, 0, 0, 0)
+        self.assertIsNone(cache.get("Judy", fingerprint))
+        cache.appended([entry], (1, 10, 0), (1, 40, 1, 0, 0))  # a write lands between the read and its put
+        cache.put("Judy", [], fingerprint)
+        self.assertEqual(len(cache), 0)
+        cache.put("Judy", [entry], (1, 40, 1, 0, 0))
+        self.assertEqual(cache.get("Judy", (1, 40, 1, 0, 0)), [entry])
+
+    def test_storage_sets_the_budget(self):
+        storage = CSVStorage(self.tmp_dir.name, journal_cache_bytes=1024)
+        self.assertEqual(JournalLog.for_file(storage.journal_file).cache.max_bytes, 1024)
+        storage.journal_entries("Judy")
+        storage.journal_entries("Judy")
+        self.assertEqual(storage.journal_cache_stats()["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
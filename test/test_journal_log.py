@@ -0,0 +1,167 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from journal_log import EntryNotFoundError, JournalLog
+
+class TestJournalLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "pregnancy_journal.csv")
+        self.journal = JournalLog(self.file_name, compaction_threshold=0.9, background=False)
+        self.first = self.journal.append("Judy", "12/06/2024", "Saw my baby's face!")
+        self.second = self.journal.append("Tally", "12/06/2024", "Expecting a girl!")
+        self.third = self.journal.append("Judy", "12/07/2024", "Almost a Mom!")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_append_and_read(self):
+        entries = self.journal.entries("Judy")
+        self.assertEqual([(e.entry_id, e.date, e.text) for e in entries],
+                         [(self.first, "12/06/2024", "Saw my baby's face!"), (self.third, "12/07/2024", "Almost a Mom!")])
+        self.assertEqual(len(self.journal.entries()), 3)
+
+    def test_edits_do_not_rewrite_journal(self):
+        size = os.path.getsize(self.file_name)
+        self.journal.modify("Judy", self.first, "Edited")
+        self.journal.delete("Tally", self.second)
+        self.assertEqual(os.path.getsize(self.file_name), size)
+        self.assertEqual([e.text for e in self.journal.entries()], ["Edited", "Almost a Mom!"])
+
+    def test_edits_apply_in_order_and_delete_is_final(self):
+        self.journal.modify("Judy", self.first, "One")
+        self.journal.modify("Judy", self.first, "Two")
+        self.journal.delete("Judy", self.third)
+        with self.assertRaises(EntryNotFoundError):
+            self.journal.modify("Judy", self.third, "Back from the dead")
+        with self.assertRaises(EntryNotFoundError):
+            self.journal.edit_many([("Judy", self.first, JournalLog.DELETE, ""), ("Judy", self.first, JournalLog.MODIFY, "Gone")])
+        self.assertEqual([e.text for e in self.journal.entries("Judy")], ["Two"])
+
+    def test_edits_are_checked_against_the_owner(self):
+        size = os.path.getsize(self.journal.log_name)
+        with self.assertRaises(EntryNotFoundError) as raised:
+            self.journal.delete("Tally", self.first)
+        self.assertEqual((raised.exception.name, raised.exception.entry_id), ("Tally", self.first))
+        with self.assertRaises(EntryNotFoundError):
+            self.journal.edit_many([("Tally", self.second, JournalLog.MODIFY, "Mine"), ("Tally", self.third, JournalLog.MODIFY, "Not mine")])
+        self.assertEqual(os.path.getsize(self.journal.log_name), size)  # a rejected batch writes nothing
+        self.assertEqual([e.text for e in self.journal.entries()], ["Saw my baby's face!", "Expecting a girl!", "Almost a Mom!"])
+
+    def test_ids_survive_compaction(self):
+        self.journal.delete("Judy", self.first)
+        self.journal.compact()
+        self.assertEqual([e.entry_id for e in self.journal.entries()], [self.second, self.third])
+        self.journal.delete("Judy", self.third)  # an id handed out before the compaction still names the same entry
+        with self.assertRaises(EntryNotFoundError):
+            self.journal.modify("Judy", self.second, "Tally's entry")
+        fourth = self.journal.append("Judy", "12/08/2024", "After the compaction")
+        self.assertGreater(fourth, self.third)  # new ids never reuse old ones, and keep growing in file order
+        self.assertEqual([(e.entry_id, e.text) for e in self.journal.entries()],
+                         [(self.second, "Expecting a girl!"), (fourth, "After the compaction")])
+
+    def test_journals_without_ids_use_offsets_until_compacted(self):
+        with open(self.file_name, mode="w", newline="") as journal:
+            journal.write("Name,Date,Entry\r\nJudy,12/06/2024,First\r\n")
+        first = len("Name,Date,Entry\r\n")
+        second = self.journal.append("Judy", "12/07/2024", "Second")
+        self.assertEqual([e.entry_id for e in self.journal.entries("Judy")], [first, second])
+        self.assertEqual(second, first + len("Judy,12/06/2024,First\r\n"))
+        self.journal.modify("Judy", first, "Edited")
+        self.journal.compact()
+        self.assertEqual(self.journal.fieldnames(), JournalLog.HEADER)
+        self.assertEqual([(e.entry_id, e.text) for e in self.journal.entries("Judy")], [(first, "Edited"), (second, "Second")])
+
+    def test_entries_spanning_lines(self):
+        text = 'Line one,\r\n"line" two\nthree'
+        fourth = self.journal.append("Judy", "12/08/2024", text)
+        fifth = self.journal.append("Judy", "12/09/2024", "After")
+        uncached = JournalLog(self.file_name, cache_bytes=0)
+        for journal in (self.journal, uncached):
+            self.assertEqual([e.text for e in journal.entries("Judy")][-2:], [text, "After"])
+            self.assertEqual(journal.page("Judy", page_size=1, cursor=fifth)[0][0].text, text)
+        self.journal.modify("Judy", fourth, text + "\nfour")
+        self.assertEqual(self.journal.read("Judy", [fourth, fifth, self.second]),
+                         [self.journal.entries("Judy")[-2], self.journal.entries("Judy")[-1]])  # Tally's entry is left out
+        self.journal.compact()
+        self.assertEqual([(e.entry_id, e.text) for e in uncached.entries()][-2:], [(fourth, text + "\nfour"), (fifth, "After")])
+
+    def test_compaction_applies_log_and_resets_it(self):
+        self.journal.compaction_threshold = 0.0
+        self.journal.delete("Tally", self.second)  # crosses the threshold and compacts inline
+        self.assertFalse(self.journal.dead_ratio())
+        with open(self.file_name, newline="") as journal:
+            self.assertNotIn("Tally", journal.read())
+        self.assertEqual([e.name for e in self.journal.entries()], ["Judy", "Judy"])
+
+    def test_compaction_is_durable_before_the_files_are_replaced(self):
+        self.journal.delete("Tally", self.second)
+        calls = []
+        fsync, replace = os.fsync, os.replace
+        with mock.patch("os.fsync", side_effect=lambda fd: calls.append("fsync") or fsync(fd)), \
+                mock.patch("os.replace", side_effect=lambda src, dst: calls.append("replace") or replace(src, dst)):
+            self.journal.compact()
+        self.assertEqual(calls, ["fsync", "fsync", "replace", "replace", "fsync"])  # both files, then the directory
+
+    def test_background_compaction(self):
+        journal = JournalLog(self.file_name, compaction_threshold=0.0)
+        journal.modify("Judy", self.third, "Compacted")
+        journal.wait_for_compaction()
+        self.assertEqual(journal.dead_ratio(), 0.0)
+        self.assertEqual(journal.entries("Judy")[-1].text, "Compacted")
+
+    def test_stale_log_from_interrupted_compaction_is_ignored(self):
+        self.journal.delete("Judy", self.first)
+        os.replace(self.file_name, self.file_name + ".old")
+        with open(self.file_name + ".old", newline="") as old, open(self.file_name, "w", newline="") as new:
+            new.write(old.read())  # same content, new inode: as if compaction replaced the file but not the log
+        self.assertEqual(len(self.journal.entries()), 3)
+
+    def test_user_reads_use_index(self):
+        self.journal.entries("Judy")  # builds the index
+        with open(self.file_name + ".idx") as index_file:
+            self.assertEqual(index_file.read().count("Judy"), 2)
+        entry_id = self.journal.append("Judy", "12/08/2024", "Kicks!")
+        with open(self.file_name + ".idx") as index_file:
+            self.assertEqual(index_file.read().count("Judy"), 3)  # maintained on append
+        self.assertEqual(self.journal.entries("Judy")[-1].entry_id, entry_id)
+
+    def test_rows_are_checked_against_their_name(self):
+        self.journal.rebuild_index()
+        stat = os.stat(self.file_name)
+        with open(self.file_name, newline="") as journal:
+            content = journal.read()
+        with open(self.file_name, "w", newline="") as journal:  # same inode, size and mtime: the index cannot tell
+            journal.write(content.replace("Judy", "Anne"))
+        os.utime(self.file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        journal = JournalLog(self.file_name, compaction_threshold=0.9, background=False)
+        self.assertEqual(journal.entries("Judy"), [])  # never Anne's rows
+        with self.assertRaises(EntryNotFoundError):
+            journal.delete("Judy", self.first)
+        self.assertEqual([e.entry_id for e in journal.entries("Anne")], [self.first, self.third])
+
+    def test_page_newest_first(self):
+        ids = [self.first, self.third] + [self.journal.append("Judy", "12/08/2024", f"Entry {i}") for i in range(3)]
+        self.journal.delete("Judy", ids[3])
+        page, cursor = self.journal.page("Judy", page_size=2)
+        self.assertEqual([e.entry_id for e in page], [ids[4], ids[2]])  # the deleted entry is skipped
+        page, cursor = self.journal.page("Judy", page_size=2, cursor=cursor)
+        self.assertEqual([e.entry_id for e in page], [ids[1], ids[0]])
+        self.assertIsNone(cursor)
+
+    def test_page_oldest_first(self):
+        page, cursor = self.journal.page("Judy", page_size=1, newest_first=False)
+        self.assertEqual([e.entry_id for e in page], [self.first])
+        page, cursor = self.journal.page("Judy", page_size=1, cursor=cursor, newest_first=False)
+        self.assertEqual([e.entry_id for e in page], [self.third])
+        self.assertIsNone(cursor)
+        self.assertEqual(self.journal.page("Nobody"), ([], None))
+
+if __name__ == "__main__":
+    unittest.main()
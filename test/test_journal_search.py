@@ -0,0 +1,136 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from journal_log import JournalLog
+from journal_search import JournalSearchIndex, parse_query, tokenize
+
+class TestJournalSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal_file = os.path.join(self.tmp_dir.name, "pregnancy_journal.csv")
+        self.journal = JournalLog(self.journal_file, background=False)
+
+    def tearDown(self):
+        JournalLog._instances.pop(os.path.abspath(self.journal_file), None)
+        self.tmp_dir.cleanup()
+
+    def search(self, index, name, query):
+        return [hit.entry_id for hit in index.search(name, query, page_size=100)[0]]
+
+    def test_tokenize_and_parse_query(self):
+        self.assertEqual(tokenize("Baby's first-kick, 2nd time!"), ["baby", "s", "first", "kick", "2nd", "time"])
+        self.assertEqual(parse_query("Baby kick* first-time*"), ["baby", "kick*", "first", "time*"])
+
+    def test_ranking(self):
+        once = self.journal.append("Judy", "12/06/2024", "Nausea today and a long walk in the park with friends")
+        twice = self.journal.append("Judy", "12/07/2024", "Nausea, nausea")
+        index = JournalSearchIndex(self.journal_file)
+        self.assertEqual(self.search(index, "Judy", "nausea"), [twice, once])
+        self.assertEqual(self.search(index, "Judy", "nausea park"), [once])
+        self.assertEqual(self.search(index, "Judy", "nau*"), [twice, once])
+        self.assertEqual(self.search(index, "Tally", "nausea"), [])
+
+    def test_incremental_updates(self):
+        index = JournalSearchIndex(self.journal_file)
+        self.assertEqual(self.search(index, "Judy", "kick"), [])  # no journal yet
+        first = self.journal.append("Judy", "12/06/2024", "First kick")
+        self.assertEqual(self.search(index, "Judy", "kick"), [first])
+        second = self.journal.append("Judy", "12/07/2024", "Another kick")
+        self.journal.modify("Judy", first, "First hiccups")
+        self.assertEqual(self.search(index, "Judy", "kick"), [second])
+        self.assertEqual(self.search(index, "Judy", "hiccups"), [first])
+        self.journal.delete("Judy", second)
+        self.assertEqual(self.search(index, "Judy", "kick"), [])
+
+    def test_compaction_reindexes(self):
+        index = JournalSearchIndex(self.journal_file)
+        first = self.journal.append("Judy", "12/06/2024", "First kick")
+        second = self.journal.append("Judy", "12/07/2024", "Second kick")
+        self.journal.append("Tally", "12/07/2024", "Tally's kick")
+        self.assertEqual(len(self.search(index, "Judy", "kick")), 2)
+        self.journal.delete("Judy", first)
+        self.journal.compact()
+        index._delta = []
+        self.assertEqual([entry.text for entry in self.journal.read("Judy", self.search(index, "Judy", "kick"))], ["Second kick"])
+        self.assertEqual(index._delta, [(first,)])  # only the deleted entry changed: the others are kept as they are
+
+        self.journal.modify("Judy", second, "Second hiccups")  # not seen by the index before the next compaction
+        self.journal.compact()
+        self.assertEqual(self.search(index, "Judy", "hiccups"), [second])
+        self.assertEqual(self.search(index, "Judy", "kick"), [])
+        self.assertEqual(len(self.search(index, "Tally", "kick")), 1)
+
+    def test_persistence(self):
+        first = self.journal.append("Judy", "12/06/2024", "First kick")
+        index = JournalSearchIndex(self.journal_file)
+        self.search(index, "Judy", "kick")
+        index.save()
+        second = self.journal.append("Judy", "12/07/2024", "Another kick")
+        reopened = JournalSearchIndex(self.journal_file)
+        self.assertEqual(sorted(self.search(reopened, "Judy", "kick")), [first, second])
+        self.assertEqual(reopened._journal_offset, os.path.getsize(self.journal_file))
+        with open(index.index_path, mode="wb") as index_file:
+            index_file.write(b"garbage")
+        self.assertEqual(sorted(self.search(JournalSearchIndex(self.journal_file), "Judy", "kick")), [first, second])
+
+    def test_saves_append_deltas(self):
+        first = self.journal.append("Judy", "12/06/2024", "First kick " + "words " * 50)
+        index = JournalSearchIndex(self.journal_file)
+        self.search(index, "Judy", "kick")
+        index.save()
+        with open(index.index_path, mode="rb") as index_file:
+            snapshot = index_file.read()
+        second = self.journal.append("Judy", "12/07/2024", "Another kick")
+        self.journal.delete("Judy", first)
+        self.search(index, "Judy", "kick")
+        index.save()
+        with open(index.index_path, mode="rb") as index_file:
+            saved = index_file.read()
+        self.assertEqual(saved[:len(snapshot)], snapshot)  # the changes were appended after the snapshot
+        self.assertLess(len(saved) - len(snapshot), len(snapshot))
+        with open(index.index_path, mode="ab") as index_file:
+            index_file.write(b"\x40\x00\x00\x00cut short")  # a segment a crash left incomplete
+        third = self.journal.append("Judy", "12/08/2024", "Third kick")
+        reopened = JournalSearchIndex(self.journal_file)
+        self.assertEqual(self.search(reopened, "Judy", "kick"), [third, second])
+        self.assertEqual(reopened._journal_offset, os.path.getsize(self.journal_file))
+        reopened.save()  # the incomplete segment is replaced by a snapshot
+        self.assertEqual(self.search(JournalSearchIndex(self.journal_file), "Judy", "kick"), [third, second])
+
+    def test_saved_index_survives_compaction(self):
+        first = self.journal.append("Judy", "12/06/2024", "First kick")
+        second = self.journal.append("Judy", "12/07/2024", "Second kick")
+        index = JournalSearchIndex(self.journal_file)
+        self.search(index, "Judy", "kick")
+        index.save()
+        self.journal.delete("Judy", first)
+        self.journal.compact()
+        reopened = JournalSearchIndex(self.journal_file)
+        self.assertEqual(self.search(reopened, "Judy", "kick"), [second])
+        self.assertEqual(reopened._delta, [(first,)])
+
+    def test_entries_spanning_lines(self):
+        index = JournalSearchIndex(self.journal_file)
+        first = self.journal.append("Judy", "12/06/2024", "First kick,\nthen \"hiccups\"")
+        second = self.journal.append("Judy", "12/07/2024", "Second kick")
+        self.assertEqual(self.search(index, "Judy", "kick"), [second, first])
+        self.journal.modify("Judy", second, "Second\r\nhiccups")
+        self.assertEqual(sorted(self.search(index, "Judy", "hiccups")), [first, second])
+        self.assertEqual([entry.text for entry in self.journal.read("Judy", self.search(index, "Judy", "then"))], ["First kick,\nthen \"hiccups\""])
+
+    def test_saves_after_enough_changes(self):
+        index = JournalSearchIndex(self.journal_file, save_every=2)
+        self.journal.append("Judy", "12/06/2024", "One")
+        index.refresh()
+        self.assertFalse(os.path.exists(index.index_path))
+        self.journal.append("Judy", "12/06/2024", "Two")
+        index.refresh()
+        self.assertTrue(os.path.exists(index.index_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../benchmarks')))
+
+from datetime import datetime
+from generate_data import generate_data_dir
+from load_test import SessionScript, check_integrity, generate_sessions, load_sessions, main, run_load_test, run_session, save_sessions
+from storage import CSVStorage
+
+class TestLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.tmp_dir.name, "data")
+        generate_data_dir(self.data_dir, 50)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_generated_sessions_follow_the_program(self):
+        scripts = generate_sessions(20, seed=3)
+        self.assertEqual(len({script.name for script in scripts}), 20)
+        for script in scripts:
+            result = run_session(script, self.data_dir)
+            self.assertIsNone(result.error, script.answers)
+            self.assertEqual(len(result.steps), len(script.answers))  # one latency per answer
+        self.assertEqual(check_integrity(scripts, self.data_dir), [])
+
+    def test_concurrent_sessions(self):
+        scripts = generate_sessions(40, seed=4)
+        for write_behind in (True, False):
+            data_dir = os.path.join(self.tmp_dir.name, str(write_behind))
+            generate_data_dir(data_dir, 50)
+            report = run_load_test(scripts, data_dir, workers=8, write_behind=write_behind)
+            self.assertEqual((report["errors"], report["integrity"]), ([], []))
+            self.assertEqual(report["session_latency"]["count"], 40)
+            self.assertGreater(report["throughput"], 0)
+
+    def test_integrity_problems_are_reported(self):
+        script = generate_sessions(1, seed=5)[0]
+        self.assertEqual(check_integrity([script], self.data_dir), [f"{script.name}: profile not saved"])
+        run_session(script, self.data_dir)
+        CSVStorage(self.data_dir).add_journal_entry(script.name, "06/01/2024", "Written behind the session's back")
+        problems = check_integrity([script], self.data_dir)
+        self.assertEqual(len(problems), 1)
+        self.assertIn("journal", problems[0])
+
+    def test_diverging_replay_is_an_error(self):
+        error = run_session(SessionScript("Judy", ["Judy"]), self.data_dir).error
+        self.assertTrue(error.startswith("asked \"Please enter the first day of your last menstrual period"), error)
+        self.assertEqual(run_session(SessionScript("Judy", ["Judy", "exit", "8"]), self.data_dir).error, "exited with 1 answer(s) left")
+
+    def test_record_and_replay(self):
+        record = os.path.join(self.tmp_dir.name, "sessions.jsonl")
+        output = os.path.join(self.tmp_dir.name, "report.json")
+        with mock.patch("builtins.print"):
+            self.assertEqual(main(["--sessions", "10", "--rows", "20", "--record", record, "--output", output]), 0)
+            scripts = load_sessions(record)
+            self.assertEqual([script.answers for script in scripts], [script.answers for script in generate_sessions(10, today=datetime.now())])
+            save_sessions([SessionScript("Judy", ["Judy", "exit"])], record)
+            self.assertEqual(main(["--replay", record, "--data-dir", self.data_dir, "--workers", "2"]), 0)
+            save_sessions([SessionScript("Judy", ["Judy"])], record)
+            self.assertEqual(main(["--replay", record, "--data-dir", self.data_dir]), 1)
+        with open(output) as report_file:
+            self.assertEqual(json.load(report_file)["meta"]["sessions"], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
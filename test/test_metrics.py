@@ -0,0 +1,72 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime
+from metrics import METRICS, Metrics, instrumented
+from storage import CSVStorage, UserRecord
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        METRICS.reset()
+
+    def tearDown(self):
+        METRICS.disable()
+        METRICS.reset()
+        self.tmp_dir.cleanup()
+
+    def test_disabled_records_nothing(self):
+        storage = CSVStorage(self.tmp_dir.name)
+        storage.save_user(UserRecord("Judy", datetime(2024, 5, 9), 28))
+        storage.load_user("Judy")
+        self.assertEqual(METRICS.snapshot(), {})
+
+    def test_storage_calls_and_io_counters(self):
+        METRICS.enable()
+        storage = CSVStorage(self.tmp_dir.name)
+        storage.save_user(UserRecord("Judy", datetime(2024, 5, 9), 28))
+        storage.add_journal_entry("Judy", "06/12/2024", "Felt the first kick")
+        self.assertEqual(storage.load_user("Judy").period_length, 28)
+        self.assertEqual(len(storage.journal_entries("Judy")), 1)
+        snapshot = METRICS.snapshot()
+        self.assertEqual(snapshot["csv.load_user"]["calls"], 1)
+        self.assertEqual(snapshot["csv.load_user"]["latency_seconds"]["count"], 1)
+        self.assertGreater(snapshot["group_commit.commit"]["bytes_written"], 0)
+        self.assertEqual(snapshot["journal.read_rows"]["rows_scanned"], 1)
+        self.assertGreater(snapshot["csv_index.read_row"]["bytes_read"], 0)
+
+    def test_errors_are_counted(self):
+        metrics = Metrics(enabled=True)
+        METRICS.enable()
+
+        @instrumented("test.fails")
+        def fails():
+            raise IOError("disk full")
+
+        with self.assertRaises(IOError):
+            fails()
+        self.assertEqual((METRICS.snapshot()["test.fails"]["calls"], METRICS.snapshot()["test.fails"]["errors"]), (1, 1))
+        self.assertEqual(metrics.snapshot(), {})
+
+    def test_exports(self):
+        metrics = Metrics(enabled=True)
+        metrics.observe("csv.load_user", 0.0003)
+        metrics.observe("csv.load_user", 0.002)
+        metrics.add("csv_index.scan", rows_scanned=10, bytes_read=512)
+        text = metrics.to_prometheus()
+        self.assertIn('babyland_calls_total{operation="csv.load_user"} 2', text)
+        self.assertIn('babyland_latency_seconds_bucket{operation="csv.load_user",le="0.0005"} 1', text)
+        self.assertIn('babyland_latency_seconds_bucket{operation="csv.load_user",le="+Inf"} 2', text)
+        self.assertIn('babyland_rows_scanned_total{operation="csv_index.scan"} 10', text)
+        snapshot = json.loads(metrics.to_json())
+        self.assertEqual(snapshot["csv_index.scan"]["bytes_read"], 512)
+        self.assertEqual(snapshot["csv.load_user"]["latency_seconds"]["buckets"]["0.0025"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
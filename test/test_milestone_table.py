@@ -0,0 +1,52 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from milestone_table import MilestoneTable, WeekInfo
+
+class TestMilestoneTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "milestone_medical_info.csv")
+        self.write("Week,Milestone,Medical_Info\r\n1,Cells.,First appointment.\r\n2,Embryo.,Vitamins.\r\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, content, mtime_ns=None):
+        with open(self.file_name, mode="w", newline="") as csv_file:
+            csv_file.write(content)
+        if mtime_ns is not None:
+            os.utime(self.file_name, ns=(mtime_ns, mtime_ns))
+
+    def test_lookup_by_week(self):
+        table = MilestoneTable(self.file_name)
+        self.assertEqual(table.get(2), WeekInfo(2, "Embryo.", "Vitamins."))
+        self.assertIsNone(table.get(40))
+        self.assertEqual(table.weeks(), (1, 2))
+
+    def test_for_file_is_shared(self):
+        self.assertIs(MilestoneTable.for_file(self.file_name), MilestoneTable.for_file(self.file_name))
+
+    def test_reloads_only_when_mtime_changes(self):
+        table = MilestoneTable(self.file_name)
+        self.write("Week,Milestone,Medical_Info\r\n1,Cells.,First appointment.\r\n", mtime_ns=1_000_000_000)
+        self.assertEqual(table.weeks(), (1,))
+        with open(self.file_name, mode="a", newline="") as csv_file:
+            csv_file.write("3,Neural tube.,Symptoms.\r\n")
+        os.utime(self.file_name, ns=(1_000_000_000, 1_000_000_000))  # same mtime: the cached table is kept
+        self.assertIsNone(table.get(3))
+        os.utime(self.file_name, ns=(2_000_000_000, 2_000_000_000))
+        self.assertEqual(table.get(3).milestone, "Neural tube.")
+
+    def test_missing_file(self):
+        table = MilestoneTable(os.path.join(self.tmp_dir.name, "missing.csv"))
+        self.assertFalse(table.exists())
+        self.assertIsNone(table.get(1))
+
+if __name__ == "__main__":
+    unittest.main()
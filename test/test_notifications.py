@@ -0,0 +1,119 @@
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import date, datetime, timedelta
+from console import ScriptedConsole
+from due_date_calculator import DueDatePredictor, User
+from metrics import METRICS
+from notifications import NotificationScheduler
+from session import Session
+from sharding import ShardedCSVStorage
+from storage import ChangeSet, CSVStorage, SQLiteStorage, UserRecord
+from timeline import FixedClock, TimelineCache
+
+class TestNotificationScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp_dir.name, "milestone_medical_info.csv"), mode="w", newline="") as csv_file:
+            csv_file.write("Week,Milestone,Medical_Info\r\n12,Reflexes develop.,Screening.\r\n13,Vocal cords form.,\r\n")
+        self.storage = CSVStorage(self.tmp_dir.name)
+        self.timelines = TimelineCache(self.storage, clock=FixedClock(datetime(2024, 3, 20)))
+        self.scheduler = NotificationScheduler(self.timelines)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_week_boundaries(self):
+        self.scheduler.schedule(UserRecord("Judy", datetime(2024, 1, 1), 28))  # week 11 started on 03/18
+        self.scheduler.schedule(UserRecord("Ann", datetime(2024, 1, 3), 35))  # adjusted LMP 01/10: week 10 started on 03/20
+        self.assertEqual(self.scheduler.pop_due(), [])
+        self.assertEqual(self.scheduler.next_due(), date(2024, 3, 25))
+        notifications = self.scheduler.pop_due(datetime(2024, 3, 25, 8, 0))
+        self.assertEqual(len(notifications), 1)
+        judy = notifications[0]
+        self.assertEqual((judy.name, judy.week, judy.start, judy.milestone, judy.medical_info),
+                         ("Judy", 12, date(2024, 3, 25), "Reflexes develop.", "Screening."))
+        self.assertEqual(judy.due_date, date(2024, 10, 7))
+        self.assertEqual(self.scheduler.pop_due(datetime(2024, 3, 25, 20, 0)), [])  # once per week
+        self.assertEqual(self.scheduler.next_due(), date(2024, 3, 27))
+        self.assertEqual([(n.name, n.week) for n in self.scheduler.pop_due(datetime(2024, 4, 1))], [("Ann", 11), ("Judy", 13)])
+
+    def test_missed_boundaries_notify_the_current_week_once(self):
+        self.scheduler.schedule(UserRecord("Judy", datetime(2024, 1, 1), 28))
+        notifications = self.scheduler.pop_due(datetime(2024, 4, 10))
+        self.assertEqual([(n.name, n.week) for n in notifications], [("Judy", 14)])
+        self.assertEqual(self.scheduler.next_due(), date(2024, 4, 15))
+
+    def test_profile_saves_reschedule(self):
+        self.scheduler.schedule(UserRecord("Judy", datetime(2024, 1, 1), 28))
+        self.scheduler.schedule(UserRecord("Judy", datetime(2024, 1, 2), 28))  # corrected LMP date
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual(self.scheduler.next_due(), date(2024, 3, 26))
+        self.assertEqual([n.start for n in self.scheduler.pop_due(datetime(2024, 3, 31))], [date(2024, 3, 26)])
+        self.scheduler.unschedule("Judy")
+        self.assertEqual((len(self.scheduler), self.scheduler.next_due()), (0, None))
+        self.assertEqual(self.scheduler.pop_due(datetime(2024, 12, 31)), [])
+
+    def test_stale_entries_are_dropped(self):
+        for day in range(1, 29):
+            for name in ("Judy", "Ann"):
+                self.scheduler.schedule(UserRecord(name, datetime(2024, 1, day), 28))
+        self.assertLessEqual(len(self.scheduler._heap), 2 * 2 + 64)
+        self.assertEqual(len(self.scheduler.pop_due(datetime(2024, 4, 30))), 2)
+
+    def test_pregnancies_past_week_40_are_not_scheduled(self):
+        self.scheduler.schedule(UserRecord("Judy", datetime(2023, 1, 1), 28))
+        self.scheduler.schedule(UserRecord("Ann", datetime(2023, 6, 15), 28))  # week 40 starts on 03/21
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual([(n.name, n.week) for n in self.scheduler.pop_due(datetime(2024, 3, 21))], [("Ann", 40)])
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_load_user_file(self):
+        for i in range(50):
+            self.storage.save_user(UserRecord(f"User {i}", datetime(2024, 1, 1 + i % 28), 28))
+        self.storage.save_user(UserRecord("User 0", datetime(2023, 1, 1), 28))  # the last row wins: past week 40
+        self.assertEqual(self.scheduler.load_user_file(self.storage.user_file), 49)
+        METRICS.enable()
+        try:
+            METRICS.reset()
+            notifications = self.scheduler.pop_due(datetime(2024, 3, 25))
+            self.assertEqual(METRICS.snapshot()["notifications.pop_due"]["rows_scanned"], len(notifications))
+        finally:
+            METRICS.disable()
+        crossed = [f"User {i}" for i in range(1, 50) if (datetime(2024, 3, 25) - datetime(2024, 1, 1 + i % 28)).days % 7 < 5]  # 03/21 to 03/25
+        self.assertEqual(sorted(n.name for n in notifications), sorted(crossed))
+
+    def test_follows_every_profile_save(self):
+        self.scheduler.follow(self.storage)
+        judy = User("Judy")
+        judy.set_lmp_date(datetime(2024, 1, 1))
+        judy.save(self.storage)
+        with Session(self.storage) as session:
+            session.save_user(UserRecord("Ann", datetime(2024, 1, 3), 35))
+            self.assertEqual(len(self.scheduler), 1)  # scheduled when the session writes it
+        self.assertEqual(len(self.scheduler), 2)
+        self.assertEqual(sorted(n.name for n in self.scheduler.pop_due(datetime(2024, 3, 27))), ["Ann", "Judy"])
+        lmp = (datetime.now() - timedelta(days=70)).strftime("%m/%d/%Y")
+        DueDatePredictor(self.storage, console=ScriptedConsole(["Tally", lmp, "", "8"])).run()  # interactive, write-behind
+        self.assertEqual(len(self.scheduler), 3)
+        self.assertIn("Tally", self.scheduler._profiles)
+
+        sharded = ShardedCSVStorage(os.path.join(self.tmp_dir.name, "sharded"), shards=2)
+        sqlite = SQLiteStorage(os.path.join(self.tmp_dir.name, "babyland.db"))
+        try:
+            for storage in (sharded, sqlite):
+                scheduler = NotificationScheduler(self.timelines)
+                scheduler.follow(storage)
+                storage.save_user(UserRecord("Judy", datetime(2024, 1, 1), 28))
+                storage.apply_changes(ChangeSet([UserRecord(f"User {i}", datetime(2024, 1, 1), 28) for i in range(4)], [], [], []))
+                self.assertEqual(len(scheduler), 5)
+        finally:
+            sqlite.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+import unittest
+import sys
+import os
+import tempfile
+import io
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime, timedelta
+from console import ScriptedConsole
+from due_date_calculator import STALE_EDIT_ERROR, DueDatePredictor, User
+from journal_log import EntryNotFoundError
+from metrics import METRICS
+from session import Session
+from storage import CSVStorage, SQLiteStorage, UserRecord
+
+class SessionTests:
+    """Behaviour of a session over any backend. Subclasses set self.backend in setUp."""
+
+    def test_reads_see_pending_changes(self):
+        session = Session(self.backend)
+        stored = self.backend.add_journal_entry("Judy", "12/06/2024", "Stored")
+        session.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+        added = session.add_journal_entry("Judy", "12/07/2024", "Added")
+        session.add_journal_entry("Tally", "12/07/2024", "Other user")
+        session.modify_journal_entry("Judy", stored, "Edited")
+        self.assertEqual(session.load_user("Judy"), UserRecord("Judy", datetime(2024, 5, 9), 30))
+        self.assertEqual([(e.entry_id, e.text) for e in session.journal_entries("Judy")], [(stored, "Edited"), (added, "Added")])
+        self.assertEqual(session.pending(), 4)
+        # nothing reached the backend yet
+        self.assertIsNone(self.backend.load_user("Judy"))
+        self.assertEqual([e.text for e in self.backend.journal_entries("Judy")], ["Stored"])
+
+        session.delete_journal_entry("Judy", stored)
+        session.modify_journal_entry("Judy", added, "Added, then edited")
+        page, cursor = session.journal_page("Judy", page_size=1)
+        self.assertEqual(([e.text for e in page], cursor), (["Added, then edited"], None))
+        ids = session.flush()
+        self.assertEqual((len(ids), session.pending()), (2, 0))
+        self.assertEqual(self.backend.load_user("Judy"), UserRecord("Judy", datetime(2024, 5, 9), 30))
+        self.assertEqual([(e.entry_id, e.text) for e in self.backend.journal_entries("Judy")], [(ids[0], "Added, then edited")])
+        self.assertEqual([e.text for e in self.backend.journal_entries("Tally")], ["Other user"])
+
+    def test_provisional_ids_stay_valid_after_a_flush(self):
+        session = Session(self.backend)
+        added = session.add_journal_entry("Judy", "12/07/2024", "Added")
+        session.flush()
+        session.modify_journal_entry("Judy", added, "Edited")
+        session.flush()
+        self.assertEqual([e.text for e in self.backend.journal_entries("Judy")], ["Edited"])
+        session.delete_journal_entry("Judy", added)
+        session.flush()
+        self.assertEqual(self.backend.journal_entries("Judy"), [])
+
+    def test_stale_edits_are_dropped_at_flush(self):
+        stored = self.backend.add_journal_entry("Judy", "12/06/2024", "Stored")
+        self.backend.add_journal_entry("Tally", "12/06/2024", "Tally's")
+        session = Session(self.backend)
+        session.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+        session.modify_journal_entry("Judy", stored, "Edited")
+        session.add_journal_entry("Judy", "12/07/2024", "Added")
+        self.backend.delete_journal_entry("Judy", stored)  # deleted meanwhile, by another session
+        with self.assertRaises(EntryNotFoundError) as raised:
+            session.flush()
+        self.assertEqual(raised.exception.entry_id, stored)
+        self.assertEqual(session.pending(), 0)
+        self.assertEqual(self.backend.load_user("Judy"), UserRecord("Judy", datetime(2024, 5, 9), 30))  # the rest was written
+        self.assertEqual([e.text for e in self.backend.journal_entries("Judy")], ["Added"])
+        self.assertEqual([e.text for e in self.backend.journal_entries("Tally")], ["Tally's"])
+
+    def test_edits_are_checked_when_made_and_stay_buffered(self):
+        stored = self.backend.add_journal_entry("Judy", "12/06/2024", "Stored")
+        other = self.backend.add_journal_entry("Tally", "12/06/2024", "Tally's")
+        gone = self.backend.add_journal_entry("Judy", "12/06/2024", "Gone")
+        session = Session(self.backend)
+        self.backend.delete_journal_entry("Judy", gone)  # deleted by another session after this one listed it
+        for edit in (lambda: session.delete_journal_entry("Judy", other), lambda: session.modify_journal_entry("Judy", gone, "Back")):
+            with self.assertRaises(EntryNotFoundError):
+                edit()
+        session.modify_journal_entry("Judy", stored, "Edited")
+        self.assertEqual(session.pending(), 1)
+        self.assertEqual([e.text for e in self.backend.journal_entries("Judy")], ["Stored"])  # not written yet
+        session.flush()
+        self.assertEqual([e.text for e in self.backend.journal_entries("Judy")], ["Edited"])
+        self.assertEqual([e.text for e in self.backend.journal_entries("Tally")], ["Tally's"])
+
+    def test_context_manager_flushes_on_exit(self):
+        with self.assertRaises(RuntimeError):
+            with Session(self.backend) as session:
+                session.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+                raise RuntimeError("interrupted")
+        self.assertEqual(self.backend.load_user("Judy"), UserRecord("Judy", datetime(2024, 5, 9), 30))
+
+    def test_flush_interval(self):
+        now = [0.0]
+        session = Session(self.backend, flush_interval=60, clock=lambda: now[0])
+        session.add_journal_entry("Judy", "12/07/2024", "First")
+        now[0] = 59.0
+        session.add_journal_entry("Judy", "12/07/2024", "Second")
+        self.assertEqual(self.backend.journal_entries("Judy"), [])
+        now[0] = 60.0
+        session.add_journal_entry("Judy", "12/07/2024", "Third")
+        self.assertEqual(([e.text for e in self.backend.journal_entries("Judy")], session.pending()), (["First", "Second", "Third"], 0))
+
+    def test_search_flushes_pending_journal_changes(self):
+        session = Session(self.backend)
+        session.add_journal_entry("Judy", "12/07/2024", "Baby kicks")
+        self.assertEqual([e.text for e in session.search_journal("Judy", "kick*")[0]], ["Baby kicks"])
+        self.assertEqual(session.pending(), 0)
+
+
+class TestCSVSession(SessionTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.backend = CSVStorage(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_chatty_session_is_one_commit(self):
+        lmp = (datetime.now() - timedelta(days=70)).strftime("%m/%d/%Y")
+        answers = ["Judy", lmp, "",  # new profile
+                   "4", "First", "4", "Second", "4", "Third",  # add three entries
+                   "5", "2", "Second, edited",  # modify one
+                   "6", "1",  # delete one
+                   "3", "8"]  # list them and exit
+        METRICS.enable()
+        try:
+            METRICS.reset()
+            DueDatePredictor(self.backend, console=ScriptedConsole(answers)).run()
+            snapshot = METRICS.snapshot()
+        finally:
+            METRICS.disable()
+        self.assertEqual(snapshot["session.flush"]["calls"], 1)
+        self.assertEqual(snapshot["group_commit.commit"]["calls"], 2)  # one write to the profile file, one to the journal
+        self.assertNotIn("journal.append_log", snapshot)  # edits of entries added in the session never reach the edit log
+        self.assertEqual(self.backend.load_user("Judy").period_length, 28)
+        self.assertEqual([e.text for e in self.backend.journal_entries("Judy")], ["Second, edited", "Third"])
+
+    def test_edit_of_an_entry_deleted_meanwhile_is_reported(self):
+        lmp = (datetime.now() - timedelta(days=70)).strftime("%m/%d/%Y")
+        self.backend.save_user(UserRecord("Judy", datetime.strptime(lmp, "%m/%d/%Y"), 28))
+        stored = self.backend.add_journal_entry("Judy", "12/06/2024", "Stored")
+        console = ScriptedConsole(["Judy", "4", "Added", "5", "1", "Edited", "8"])
+        app = DueDatePredictor(self.backend, console=console)
+        original = console.input
+
+        def delete_meanwhile(prompt=""):  # another session deletes the entry while this one picks it
+            answer = original(prompt)
+            if answer == "Edited":
+                self.backend.delete_journal_entry("Judy", stored)
+            return answer
+
+        console.input = delete_meanwhile
+        app.run()
+        self.assertIn("Error: That entry no longer exists.", console.text())
+        self.assertNotIn("Entry updated!", console.text())
+        self.assertEqual([e.text for e in self.backend.journal_entries("Judy")], ["Added"])  # the rest of the session was saved
+
+    def test_stale_edits_found_by_an_interval_flush_are_reported(self):
+        stored = self.backend.add_journal_entry("Judy", "12/06/2024", "Stored")
+        now = [0.0]
+        app = DueDatePredictor(self.backend, console=ScriptedConsole(["Added"]))
+        app.storage = Session(self.backend, flush_interval=60, clock=lambda: now[0])
+        app.user = User("Judy")
+        app.user.set_lmp_date(datetime(2024, 5, 9))
+        app.storage.modify_journal_entry("Judy", stored, "Edited")
+        self.backend.delete_journal_entry("Judy", stored)  # deleted meanwhile, by another session
+        now[0] = 60.0
+        app.add_journal_entry()  # the new entry triggers the flush, which drops the edit
+        self.assertIn("Entry saved!\n" + STALE_EDIT_ERROR, app.console.text())
+        self.assertEqual([e.text for e in self.backend.journal_entries("Judy")], ["Added"])
+
+        stored = self.backend.add_journal_entry("Judy", "12/07/2024", "Stored again")
+        app.storage.modify_journal_entry("Judy", stored, "Edited")
+        self.backend.delete_journal_entry("Judy", stored)
+        now[0] = 120.0
+        with redirect_stdout(io.StringIO()) as output:
+            app.user.save(app.storage)
+        self.assertEqual(output.getvalue(), STALE_EDIT_ERROR + "\n")
+        self.assertEqual(self.backend.load_user("Judy"), UserRecord("Judy", datetime(2024, 5, 9), 28))
+
+    def test_write_through_when_disabled(self):
+        app = DueDatePredictor(self.backend, write_behind=False, console=ScriptedConsole(["Judy", "8"]))
+        app.start_session()
+        app.user.set_lmp_date(datetime.now() - timedelta(days=70))
+        app.run()
+        self.assertIs(app.storage, self.backend)
+
+
+class TestSQLiteSession(SessionTests, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.backend = SQLiteStorage(os.path.join(self.tmp_dir.name, "babyland.db"))
+
+    def tearDown(self):
+        self.backend.close()
+        self.tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import sys
+import os
+import csv
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime
+from journal_log import EntryNotFoundError
+from sharding import ShardedCSVStorage, shard_of, split
+from storage import CSVStorage, UserRecord
+from test_storage import StorageContract
+
+class TestShardedCSVStorage(StorageContract, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = ShardedCSVStorage(self.tmp_dir.name, shards=4)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_routing(self):
+        self.assertEqual(shard_of("Judy", 4), shard_of("Judy", 4))
+        names = [f"User {i}" for i in range(40)]
+        for name in names:
+            self.storage.save_user(UserRecord(name, datetime(2024, 5, 9), 28))
+        for shard, shard_storage in enumerate(self.storage.shards):
+            with open(shard_storage.user_file, mode="r", newline="") as user_file:
+                stored = [row[0] for row in list(csv.reader(user_file))[1:]]
+            self.assertEqual(stored, [name for name in names if shard_of(name, 4) == shard])
+        self.assertEqual(ShardedCSVStorage.recorded_shards(self.tmp_dir.name), 4)
+        with self.assertRaises(ValueError):
+            ShardedCSVStorage(self.tmp_dir.name, shards=8)
+
+    def test_edits_touch_only_the_users_shard(self):
+        judy = self.storage.add_journal_entry("Judy", "12/06/2024", "First")
+        others = [name for name in ("Tally", "Ava", "Melissa", "Smith") if shard_of(name, 4) != shard_of("Judy", 4)]
+        for name in others:
+            self.storage.add_journal_entry(name, "12/06/2024", "Other")
+        def state(shard):
+            return os.stat(shard.journal_file).st_mtime_ns, os.stat(shard.journal_file + ".log").st_mtime_ns
+        before = {shard.journal_file: state(shard) for shard in self.storage.shards if shard.has_journal()}
+        self.storage.modify_journal_entry("Judy", judy, "Edited")
+        self.storage.delete_journal_entry("Judy", judy)
+        judy_shard = self.storage.shard_for("Judy")
+        for shard in self.storage.shards:
+            if shard is not judy_shard and shard.has_journal():
+                self.assertEqual(state(shard), before[shard.journal_file])
+        self.assertEqual(self.storage.journal_entries("Judy"), [])
+        other = self.storage.add_journal_entry(others[0], "12/07/2024", "Not Judy's")
+        with self.assertRaises(EntryNotFoundError):
+            self.storage.delete_journal_entry("Judy", other)  # an id from another shard
+
+    def test_fan_out(self):
+        for i in range(20):
+            self.storage.save_user(UserRecord(f"User {i}", datetime(2024, 5, 9), 28))
+            self.storage.add_journal_entry(f"User {i}", "12/06/2024", "Kicks")
+        self.storage.save_user(UserRecord("User 0", datetime(2024, 6, 1), 30))
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            export_file = os.path.join(self.tmp_dir.name, "export.csv")
+            self.assertEqual(self.storage.export_users(export_file, executor=executor), 20)
+            with open(export_file, mode="r", newline="") as exported:
+                rows = list(csv.reader(exported))
+            self.assertIn(["User 0", "06/01/2024", "30"], rows)
+            self.storage.reindex(executor=executor)
+            self.storage.compact(executor=executor)
+        self.assertEqual(self.storage.stats(workers=2)["profiles"], 20)  # on a real process pool
+        self.assertEqual(self.storage.load_user("User 0").period_length, 30)
+        self.assertEqual(len(self.storage.search_journal("User 3", "kick*")[0]), 1)
+
+    def test_split(self):
+        source = CSVStorage(self.tmp_dir.name)
+        source.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+        source.save_user(UserRecord("Tally", datetime(2024, 5, 11), 28))
+        source.save_user(UserRecord("Judy", datetime(2024, 6, 1), 25))
+        first = source.add_journal_entry("Judy", "12/06/2024", "First")
+        source.add_journal_entry("Tally", "12/06/2024", "Hello")
+        source.modify_journal_entry("Judy", first, "Edited")
+        self.assertEqual(split(self.tmp_dir.name, shards=3), (2, 2))
+        storage = ShardedCSVStorage(self.tmp_dir.name)
+        self.assertEqual(storage.shard_count, 3)
+        self.assertEqual(storage.load_user("Judy"), UserRecord("Judy", datetime(2024, 6, 1), 25))
+        self.assertEqual([entry.text for entry in storage.journal_entries("Judy")], ["Edited"])
+        with self.assertRaises(ValueError):
+            split(self.tmp_dir.name, shards=3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+import csv
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime
+from milestone_table import WeekInfo
+from snapshot import MilestoneSnapshot, Snapshot, UserSnapshot
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.user_file = os.path.join(self.tmp_dir.name, "user_data.csv")
+        self.milestone_file = os.path.join(self.tmp_dir.name, "milestone_medical_info.csv")
+        self.write(self.user_file, [["Name", "LMP Date", "Period Length"], ["Judy", "05/09/2024", "30"],
+                                    ["Smith, Ava", "06/01/2024", "28"], ["Judy", "01/01/2024", "35"]])
+        self.write(self.milestone_file, [["Week", "Milestone", "Medical_Info"], [12, "Reflexes develop.", "Screening."],
+                                         [4, "Implantation.", "Folic acid: ✓"]])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, file_name, rows, mode="w"):
+        with open(file_name, mode=mode, newline="") as csv_file:
+            csv.writer(csv_file).writerows(rows)
+
+    def test_user_snapshot(self):
+        snapshot = UserSnapshot.from_file(self.user_file)
+        self.assertEqual(len(snapshot), 2)
+        self.assertEqual(snapshot.get("Judy"), (datetime(2024, 1, 1).toordinal(), 35))  # last row wins, like load_from_file
+        self.assertEqual(snapshot.get("Smith, Ava"), (datetime(2024, 6, 1).toordinal(), 28))
+        self.assertIsNone(snapshot.get("Nobody"))
+        with open(snapshot.path, mode="rb") as snapshot_file:
+            self.assertEqual(snapshot_file.read(8), Snapshot.MAGIC)
+
+    def test_rebuilt_when_source_changes(self):
+        snapshot = UserSnapshot.from_file(self.user_file)
+        self.assertIsNone(snapshot.get("Tally"))
+        self.write(self.user_file, [["Tally", "07/04/2024", "21"]], mode="a")
+        self.assertEqual(snapshot.get("Tally"), (datetime(2024, 7, 4).toordinal(), 21))
+        reader = UserSnapshot.from_file(self.user_file)  # e.g. another worker: maps the existing snapshot without rebuilding
+        self.assertEqual(len(reader), 3)
+        os.remove(self.user_file)
+        self.assertIsNone(snapshot.get("Judy"))
+        self.assertFalse(snapshot.exists())
+
+    def test_corrupt_snapshot_is_rebuilt(self):
+        with open(self.user_file + ".snap", mode="wb") as snapshot_file:
+            snapshot_file.write(b"garbage")
+        self.assertEqual(UserSnapshot.from_file(self.user_file).get("Judy")[1], 35)
+
+    def test_milestone_snapshot(self):
+        snapshot = MilestoneSnapshot.from_file(self.milestone_file)
+        self.assertEqual(snapshot.get(4), WeekInfo(4, "Implantation.", "Folic acid: ✓"))
+        self.assertEqual(snapshot.get(12).milestone, "Reflexes develop.")
+        self.assertIsNone(snapshot.get(5))
+
+    def test_build_writes_a_temporary_file_of_its_own(self):
+        snapshot = UserSnapshot.from_file(self.user_file)
+        with open(snapshot.path + ".tmp", mode="wb") as stray:  # e.g. left by a crashed build of another process
+            stray.write(b"not a snapshot")
+        snapshot.rebuild()
+        self.assertEqual(snapshot.get("Judy")[1], 35)
+        with open(snapshot.path + ".tmp", mode="rb") as stray:
+            self.assertEqual(stray.read(), b"not a snapshot")
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), ["milestone_medical_info.csv", "user_data.csv",
+                                                                 "user_data.csv.snap", "user_data.csv.snap.tmp"])
+
+    def test_snapshot_kinds_must_build_their_sections(self):
+        with self.assertRaises(TypeError):
+            Snapshot([self.user_file])
+
+if __name__ == '__main__':
+    unittest.main()
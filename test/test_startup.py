@@ -0,0 +1,68 @@
+import unittest
+import sys
+import os
+import json
+import subprocess
+import tempfile
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+sys.path.insert(0, SRC_DIR)
+
+from datetime import datetime
+from due_date_calculator import DueDatePredictor, User
+from storage import CSVStorage
+
+# Modules that must stay off the import path of the calculator: storage, indexes and databases are loaded on first use
+DEFERRED_MODULES = ["storage", "journal_log", "csv_index", "file_lock", "milestone_table", "sqlite3", "csv",
+                    "concurrent.futures", "json", "numpy"]
+STARTUP_BUDGET = 0.1  # seconds to import the calculator and construct a DueDatePredictor, interpreter start excluded (best of STARTUP_RUNS)
+STARTUP_RUNS = 5
+
+class TestStartup(unittest.TestCase):
+
+    def run_fresh(self, code):
+        """Run `code` in a new interpreter (stdin closed, scratch working directory) and return its last line of output, as JSON."""
+        with tempfile.TemporaryDirectory() as work_dir:
+            result = subprocess.run([sys.executable, "-c", code], cwd=work_dir, stdin=subprocess.DEVNULL,
+                                    capture_output=True, text=True, env={**os.environ, "PYTHONPATH": SRC_DIR})
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(os.listdir(work_dir), [])  # nothing was created in the working directory
+            return json.loads(result.stdout.splitlines()[-1])
+
+    def test_import_and_construction_are_side_effect_free(self):
+        output = self.run_fresh(
+            "import io, sys\n"
+            "sys.stdout = io.StringIO()\n"
+            "from due_date_calculator import DueDatePredictor, DateValidator, DueDateCalculator\n"
+            "app = DueDatePredictor()\n"
+            f"loaded = [module for module in {DEFERRED_MODULES!r} if module in sys.modules]\n"
+            "printed, sys.stdout = sys.stdout.getvalue(), sys.__stdout__\n"
+            "import json\n"
+            "print(json.dumps({'loaded': loaded, 'printed': printed}))\n")
+        self.assertEqual(output, {"loaded": [], "printed": ""})
+
+    def test_startup_time_budget(self):
+        elapsed = min(self.run_fresh(
+            "import time\n"
+            "start = time.perf_counter()\n"
+            "from due_date_calculator import DueDatePredictor\n"
+            "DueDatePredictor()\n"
+            "elapsed = time.perf_counter() - start\n"
+            "import json\n"
+            "print(json.dumps({'elapsed': elapsed}))\n")["elapsed"] for _ in range(STARTUP_RUNS))
+        self.assertLess(elapsed, STARTUP_BUDGET)  # the best run leaves out scheduling noise; see bench_startup for the distribution
+
+    def test_storage_opened_on_first_use(self):
+        with tempfile.TemporaryDirectory() as data_dir:
+            user = User("Judy")
+            user.set_lmp_date(datetime(2024, 5, 9))
+            user.save(CSVStorage(data_dir))
+            app = DueDatePredictor(data_dir=data_dir)
+            self.assertIsNone(app.user)
+            app.start_session("Judy ")
+            self.assertFalse(app.is_new_user)
+            self.assertEqual(app.user.lmp_date.day, 9)
+            self.assertEqual(app.storage.user_file, os.path.join(data_dir, "user_data.csv"))
+
+if __name__ == '__main__':
+    unittest.main()
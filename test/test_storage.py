@@ -0,0 +1,209 @@
+import unittest
+import sys
+import os
+import csv
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime
+from csv_index import CSVOffsetIndex
+from journal_log import EntryNotFoundError
+from milestone_table import WeekInfo
+from storage import ChangeSet, CSVStorage, SQLiteStorage, UserRecord
+from due_date_calculator import User
+
+class StorageContract:
+    """Behaviour every storage backend must share. Subclasses set self.storage in setUp."""
+
+    def test_save_and_load_user(self):
+        self.assertIsNone(self.storage.load_user("Judy"))
+        self.storage.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+        self.assertEqual(self.storage.load_user("Judy"), UserRecord("Judy", datetime(2024, 5, 9), 30))
+
+    def test_save_replaces_profile(self):
+        self.storage.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+        self.storage.save_user(UserRecord("Tally", datetime(2024, 5, 11), 28))
+        self.storage.save_user(UserRecord("Judy", datetime(2024, 6, 1), 25))  # the last write wins
+        self.assertEqual(self.storage.load_user("Judy"), UserRecord("Judy", datetime(2024, 6, 1), 25))
+        self.assertEqual(self.storage.load_user("Tally"), UserRecord("Tally", datetime(2024, 5, 11), 28))
+
+    def test_user_load_and_save_go_through_storage(self):
+        user = User("Tally")
+        user.set_lmp_date(datetime(2024, 5, 11))
+        user.save(self.storage)
+        self.assertEqual(User.load("Tally", self.storage).lmp_date, datetime(2024, 5, 11))
+        self.assertIsNone(User.load("Nobody", self.storage))
+
+    def test_journal_crud(self):
+        first = self.storage.add_journal_entry("Judy", "12/06/2024", "First")
+        second = self.storage.add_journal_entry("Judy", "12/07/2024", "Second")
+        self.storage.add_journal_entry("Tally", "12/07/2024", "Other user")
+        self.assertTrue(self.storage.has_journal())
+        self.storage.modify_journal_entry("Judy", first, "Edited")
+        self.assertEqual([e.text for e in self.storage.journal_entries("Judy")], ["Edited", "Second"])
+        self.storage.delete_journal_entry("Judy", second)
+        self.assertEqual([e.entry_id for e in self.storage.journal_entries("Judy")], [first])
+        for edit in (lambda: self.storage.modify_journal_entry("Tally", first, "Not mine"),  # someone else's entry
+                     lambda: self.storage.delete_journal_entry("Judy", second)):  # already deleted
+            with self.assertRaises(EntryNotFoundError):
+                edit()
+        self.assertEqual([e.text for e in self.storage.journal_entries("Judy")], ["Edited"])
+
+    def test_apply_changes_with_a_stale_edit_writes_nothing(self):
+        gone = self.storage.add_journal_entry("Judy", "12/06/2024", "Gone")
+        self.storage.delete_journal_entry("Judy", gone)
+        with self.assertRaises(EntryNotFoundError):
+            self.storage.apply_changes(ChangeSet([UserRecord("Judy", datetime(2024, 5, 9), 30)], [("Judy", "12/07/2024", "New")],
+                                                 [("Judy", gone, "Edited")], []))
+        self.assertIsNone(self.storage.load_user("Judy"))
+        self.assertEqual(self.storage.journal_entries("Judy"), [])
+
+    def test_apply_changes(self):
+        kept = self.storage.add_journal_entry("Judy", "12/06/2024", "Kept")
+        edited = self.storage.add_journal_entry("Judy", "12/06/2024", "Before")
+        gone = self.storage.add_journal_entry("Judy", "12/06/2024", "Gone")
+        ids = self.storage.apply_changes(ChangeSet(
+            [UserRecord("Judy", datetime(2024, 5, 9), 30), UserRecord("Tally", datetime(2024, 5, 11), 28), UserRecord("Judy", datetime(2024, 6, 1), 25)],
+            [("Judy", "12/07/2024", "New 1"), ("Tally", "12/07/2024", "New 2"), ("Judy", "12/08/2024", "New 3")],
+            [("Judy", edited, "After")], [("Judy", gone)]))
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(self.storage.load_user("Judy"), UserRecord("Judy", datetime(2024, 6, 1), 25))
+        self.assertEqual(self.storage.load_user("Tally"), UserRecord("Tally", datetime(2024, 5, 11), 28))
+        self.assertEqual([(e.entry_id, e.text) for e in self.storage.journal_entries("Judy")],
+                         [(kept, "Kept"), (edited, "After"), (ids[0], "New 1"), (ids[2], "New 3")])
+        self.assertEqual([e.entry_id for e in self.storage.journal_entries("Tally")], [ids[1]])
+        self.assertEqual(self.storage.apply_changes(ChangeSet([], [], [], [])), [])
+
+    def test_journal_page(self):
+        ids = [self.storage.add_journal_entry("Judy", "12/06/2024", f"Entry {i}") for i in range(5)]
+        page, cursor = self.storage.journal_page("Judy", page_size=3)
+        self.assertEqual([e.entry_id for e in page], ids[:1:-1])
+        page, cursor = self.storage.journal_page("Judy", page_size=3, cursor=cursor)
+        self.assertEqual([e.entry_id for e in page], ids[1::-1])
+        self.assertIsNone(cursor)
+
+    def test_search_journal(self):
+        kicks = self.storage.add_journal_entry("Judy", "12/06/2024", "Baby kicks, kicks")
+        kicked = self.storage.add_journal_entry("Judy", "12/07/2024", "Baby kicked once")
+        nausea = self.storage.add_journal_entry("Judy", "12/08/2024", "Morning nausea again")
+        self.storage.add_journal_entry("Tally", "12/08/2024", "Baby kicks")
+        self.assertEqual([e.entry_id for e in self.storage.search_journal("Judy", "kicks")[0]], [kicks])
+        self.assertEqual([e.entry_id for e in self.storage.search_journal("Judy", "BABY kick*")[0]], [kicks, kicked])
+        page, cursor = self.storage.search_journal("Judy", "kick*", page_size=1)
+        self.assertEqual(([e.entry_id for e in page], cursor is None), ([kicks], False))
+        page, cursor = self.storage.search_journal("Judy", "kick*", page_size=1, cursor=cursor)
+        self.assertEqual(([e.entry_id for e in page], cursor), ([kicked], None))
+        self.storage.modify_journal_entry("Judy", nausea, "Baby hiccups")
+        self.storage.delete_journal_entry("Judy", kicks)
+        self.assertEqual([e.text for e in self.storage.search_journal("Judy", "baby")[0]], ["Baby hiccups", "Baby kicked once"])
+        self.assertEqual(self.storage.search_journal("Judy", "nausea"), ([], None))
+        self.assertEqual(self.storage.search_journal("Judy", "!!"), ([], None))
+
+
+class TestCSVStorage(StorageContract, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = CSVStorage(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_week_info(self):
+        self.assertFalse(self.storage.has_milestones())
+        with open(self.storage.milestone_file, mode="w", newline="") as csv_file:
+            csv_file.write("Week,Milestone,Medical_Info\r\n1,Cells.,First appointment.\r\n")
+        self.assertEqual(self.storage.week_info(1), WeekInfo(1, "Cells.", "First appointment."))
+
+
+    def read_rows(self):
+        with open(self.storage.user_file, mode="r", newline="") as user_file:
+            return list(csv.reader(user_file))
+
+    def test_compact_users(self):
+        self.storage.user_compaction_threshold = 1.0  # compact explicitly only
+        for day in range(1, 6):
+            self.storage.save_user(UserRecord("Judy", datetime(2024, 5, day), 28))
+        self.storage.save_user(UserRecord("Tally", datetime(2024, 5, 11), 30))
+        self.storage.save_user(UserRecord("Judy", datetime(2024, 5, 9), 30))
+        self.assertEqual(len(self.read_rows()), 8)
+        self.storage.compact_users()
+        self.assertEqual(self.read_rows(), [["Name", "LMP Date", "Period Length"], ["Tally", "05/11/2024", "30"], ["Judy", "05/09/2024", "30"]])
+        self.assertEqual(self.storage.load_user("Judy"), UserRecord("Judy", datetime(2024, 5, 9), 30))
+        self.storage.save_user(UserRecord("Ava", datetime(2024, 5, 1), 28))  # the index follows the new file
+        self.assertEqual(self.storage.load_user("Ava"), UserRecord("Ava", datetime(2024, 5, 1), 28))
+        self.assertEqual(CSVOffsetIndex.for_file(self.storage.user_file).superseded(), 0)
+
+    def test_compact_users_moves_quoted_names_spanning_lines_whole(self):
+        self.storage.user_compaction_threshold = 1.0
+        self.storage.save_user(UserRecord("Judy\nSmith", datetime(2024, 5, 1), 28))
+        self.storage.save_user(UserRecord("Tally", datetime(2024, 5, 11), 30))
+        self.storage.save_user(UserRecord("Judy\nSmith", datetime(2024, 5, 9), 30))
+        self.storage.compact_users()
+        self.assertEqual(self.read_rows(), [["Name", "LMP Date", "Period Length"], ["Tally", "05/11/2024", "30"], ["Judy\nSmith", "05/09/2024", "30"]])
+        self.assertEqual(self.storage.load_user("Judy\nSmith"), UserRecord("Judy\nSmith", datetime(2024, 5, 9), 30))
+
+    def test_saves_compact_automatically(self):
+        for day in range(1, 21):
+            self.storage.save_user(UserRecord("Judy", datetime(2024, 5, day), 28))
+        self.assertLessEqual(len(self.read_rows()), 3)  # header, plus at most one superseded row
+        self.assertEqual(self.storage.load_user("Judy").lmp_date, datetime(2024, 5, 20))
+
+
+class TestSnapshotCSVStorage(TestCSVStorage):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = CSVStorage(self.tmp_dir.name, snapshots=True)
+
+
+class TestSQLiteStorage(StorageContract, unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = SQLiteStorage(os.path.join(self.tmp_dir.name, "babyland.db"))
+
+    def tearDown(self):
+        self.storage.close()
+        self.tmp_dir.cleanup()
+
+    def test_wal_mode_and_indexes(self):
+        connection = sqlite3.connect(self.storage.db_path)
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({"users_name", "journal_name"} <= indexes)
+        connection.close()
+
+    def test_week_info(self):
+        self.assertFalse(self.storage.has_milestones())
+        self.storage.bulk_save_milestones([WeekInfo(1, "Cells.", "First appointment."), WeekInfo(2, "Embryo.", "Vitamins.")])
+        self.assertEqual(self.storage.week_info(2), WeekInfo(2, "Embryo.", "Vitamins."))
+        self.assertIsNone(self.storage.week_info(3))
+
+    def test_import_csv(self):
+        data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
+        self.storage.import_csv(CSVStorage(data_dir))
+        self.assertEqual(self.storage.load_user("Judy"), UserRecord("Judy", datetime(2024, 5, 9), 30))
+        self.assertEqual(len(self.storage.journal_entries("Judy")), 2)
+        self.assertEqual(self.storage.week_info(40).week, 40)
+
+    def test_compact_users(self):
+        connection = sqlite3.connect(self.storage.db_path)
+        connection.executemany("INSERT INTO users (name, lmp_date, period_length) VALUES (?, ?, ?)",  # rows appended by older versions
+                               [("Judy", "2024-05-09", 30), ("Judy", "2024-06-01", 25), ("Tally", "2024-05-11", 28)])
+        connection.commit()
+        self.assertEqual(self.storage.load_user("Judy"), UserRecord("Judy", datetime(2024, 6, 1), 25))
+        self.storage.compact_users()
+        self.assertEqual(connection.execute("SELECT name, lmp_date FROM users ORDER BY id").fetchall(),
+                         [("Judy", "2024-06-01"), ("Tally", "2024-05-11")])
+        connection.close()
+
+    def test_failed_write_rolls_back_and_raises_ioerror(self):
+        with self.assertRaises(IOError):
+            self.storage.bulk_add_journal_entries([("Judy", "12/06/2024", "Kept?"), ("Judy", "12/06/2024", None)])  # NOT NULL violation
+        self.assertEqual(self.storage.journal_entries("Judy"), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import sys
+import os
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import date, datetime, timedelta
+from due_date_calculator import DueDateCalculator
+from milestone_table import WeekInfo
+from storage import CSVStorage, SQLiteStorage
+from timeline import Clock, FixedClock, Timeline, TimelineCache
+
+class TestTimeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp_dir.name, "milestone_medical_info.csv"), mode="w", newline="") as csv_file:
+            csv_file.write("Week,Milestone,Medical_Info\r\n1,Cells.,First appointment.\r\n12,Reflexes develop.,Screening.\r\n")
+        self.storage = CSVStorage(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_matches_due_date_calculator(self):
+        lmp_date, now = datetime(2024, 1, 10), datetime(2024, 5, 3, 18, 30)
+        for period_length in (20, 28, 45):
+            calculator = DueDateCalculator(lmp_date, period_length)
+            timeline = Timeline(lmp_date.toordinal(), period_length)
+            self.assertEqual(timeline.due_date, calculator.calculate_due_date().date())
+            self.assertEqual(timeline.progress(now), calculator.calculate_current_progress(now))
+        self.assertEqual(Timeline(lmp_date.toordinal(), 28).progress(datetime(2023, 12, 1)),
+                         DueDateCalculator(lmp_date).calculate_current_progress(datetime(2023, 12, 1)))  # before the LMP
+
+    def test_weeks(self):
+        timeline = TimelineCache(self.storage).for_date(datetime(2024, 1, 1))
+        weeks = list(timeline.weeks())
+        self.assertEqual([week.week for week in weeks], list(range(1, 41)))
+        self.assertEqual((weeks[0].start, weeks[0].end), (date(2024, 1, 8), date(2024, 1, 14)))
+        self.assertEqual(weeks[-1].start, timeline.due_date)
+        self.assertEqual((weeks[11].milestone, weeks[11].medical_info), ("Reflexes develop.", "Screening."))
+        self.assertIsNone(weeks[1].milestone)
+        self.assertEqual(timeline.week(12), weeks[11])
+        self.assertIsNone(timeline.week(41))
+        self.assertEqual([week.week for week in timeline.weeks(39)], [39, 40])
+
+    def test_weeks_are_lazy(self):
+        timeline = Timeline(datetime(2024, 1, 1).toordinal(), 28)
+        next(timeline.weeks())
+        self.assertEqual(len(timeline._weeks), 1)
+        threads = [threading.Thread(target=lambda: list(timeline.weeks())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([week.week for week in timeline._weeks], list(range(1, 41)))
+
+    def test_cache(self):
+        cache = TimelineCache(self.storage, maxsize=2)
+        first = cache.get(738000, 28)
+        self.assertIs(cache.get(738000, 28), first)
+        cache.get(738001, 28)
+        cache.get(738002, 28)  # evicts the least recently used timeline
+        self.assertIsNot(cache.get(738000, 28), first)
+        info = cache.cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 4, 2))
+        cache.clear()
+        self.assertEqual(cache.cache_info().currsize, 0)
+
+    def test_milestone_changes_are_picked_up(self):
+        cache = TimelineCache(self.storage)
+        timeline = cache.for_date(datetime(2024, 1, 1))
+        self.assertIs(cache.for_date(datetime(2024, 1, 1)), timeline)
+        milestone_file = os.path.join(self.tmp_dir.name, "milestone_medical_info.csv")
+        with open(milestone_file, mode="a", newline="") as csv_file:
+            csv_file.write("2,Embryo.,Vitamins.\r\n")
+        os.utime(milestone_file, ns=(1_000_000_000, 1_000_000_000))  # a different modification time, however coarse the clock
+        self.assertEqual(cache.for_date(datetime(2024, 1, 1)).week(2).milestone, "Embryo.")
+        self.assertEqual(cache.cache_info().currsize, 1)  # the timelines built with the old info were dropped
+
+        sqlite = SQLiteStorage(os.path.join(self.tmp_dir.name, "babyland.db"))
+        try:
+            cache = TimelineCache(sqlite)
+            self.assertIsNone(cache.get(738000, 28).week(12).milestone)
+            sqlite.bulk_save_milestones([WeekInfo(12, "Reflexes develop.", "Screening.")])
+            self.assertEqual(cache.get(738000, 28).week(12).milestone, "Reflexes develop.")
+        finally:
+            sqlite.close()
+
+    def test_clock(self):
+        now = datetime(2024, 3, 1, 12)
+        cache = TimelineCache(clock=FixedClock(now))
+        timeline = cache.for_date(datetime(2024, 1, 1))
+        self.assertEqual(cache.progress(timeline), (8, 4))
+        self.assertEqual(Clock().frozen().now().date(), date.today())
+        self.assertEqual(timeline.week(1).milestone, None)  # no storage: schedule only
+        self.assertEqual(timeline.due_date - timedelta(days=280), date(2024, 1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import csv
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from datetime import datetime
+from due_date_calculator import User
+from user_table import UserTable
+
+class TestUserTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.user_file = os.path.join(self.tmp_dir.name, "user_data.csv")
+        self.write_rows([["Name", "LMP Date", "Period Length"],
+                         ["Judy", "05/09/2024", "28"],
+                         ["Smith, Ava", "06/01/2024", "30"],  # quoted by csv
+                         ["Broken", "13/45/2024", "28"],
+                         ["Judy", "01/01/2024", "35"],  # later version: the last row wins, like load_from_file
+                         ["Short row"]])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_rows(self, rows, mode="w"):
+        with open(self.user_file, mode=mode, newline="") as user_file:
+            csv.writer(user_file).writerows(rows)
+
+    def test_load(self):
+        table = UserTable(self.user_file)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.skipped, 2)
+        self.assertEqual(table.names(), ["Judy", "Smith, Ava"])
+        judy = table.get("Judy")
+        self.assertEqual((judy.lmp_date, judy.period_length), (datetime(2024, 1, 1), 35))
+        self.assertEqual(table.get("Smith, Ava").period_length, 30)
+        self.assertIsNone(table.get("Nobody"))
+        self.assertEqual(list(table.lmp_ordinals()), [datetime(2024, 1, 1).toordinal(), datetime(2024, 6, 1).toordinal()])
+        self.assertEqual(table.lmp_ordinals().itemsize, 4)
+        self.assertEqual(table.period_lengths().typecode, "B")
+        self.assertEqual([user.name for user in table], ["Judy", "Smith, Ava"])
+
+    def test_matches_load_from_file(self):
+        table = UserTable(self.user_file)
+        for name in ("Judy", "Smith, Ava", "Nobody"):
+            expected, actual = User.load_from_file(name, self.user_file), table.get(name)
+            self.assertEqual(expected is None, actual is None)
+            if expected is not None:
+                self.assertEqual((expected.lmp_date, expected.period_length), (actual.lmp_date, actual.period_length))
+
+    def test_follows_the_file(self):
+        table = UserTable.for_file(self.user_file)
+        self.assertEqual(len(table), 2)
+        self.write_rows([["Tally", "07/04/2024", "21"]], mode="a")  # appended: read incrementally
+        self.assertEqual(table.get("Tally").period_length, 21)
+        self.assertEqual(len(table), 3)
+        replacement = self.user_file + ".tmp"
+        with open(replacement, mode="w", newline="") as user_file:
+            csv.writer(user_file).writerows([["Name", "LMP Date", "Period Length"], ["Mia", "07/04/2024", "40"]])
+        os.replace(replacement, self.user_file)  # replaced: loaded again
+        self.assertEqual(table.names(), ["Mia"])
+        os.remove(self.user_file)
+        self.assertEqual(len(table), 0)
+
+    def test_rows_being_written_are_read_once_complete(self):
+        table = UserTable.for_file(self.user_file)
+        self.assertEqual(len(table), 2)
+        with open(self.user_file, mode="ab") as user_file:
+            user_file.write(b"Tally,07/04/2024,2")  # a writer is halfway through the row
+        self.assertIsNone(table.get("Tally"))
+        with open(self.user_file, mode="ab") as user_file:
+            user_file.write(b'1\r\n"Mia\r\nSmith",07/05/2024,40\r\n')  # ... then finishes it, and adds a name spanning lines
+        self.assertEqual(table.get("Tally").period_length, 21)
+        self.assertEqual(table.get("Mia\r\nSmith").period_length, 40)
+        self.assertEqual((len(table), table.skipped), (4, 2))
+
+    def test_user_has_no_dict(self):
+        self.assertFalse(hasattr(User("Judy"), "__dict__"))
+
+    def test_memory_is_a_fraction_of_row_objects(self):
+        self.write_rows([["Name", "LMP Date", "Period Length"]] +
+                        [[f"User {i:06d}", f"{1 + i % 12:02d}/{1 + i % 28:02d}/2024", 20 + i % 26] for i in range(20000)])
+        tracemalloc.start()
+        with open(self.user_file, mode="r", newline="") as user_file:  # one User (and one DictReader dict) per row, as before
+            users = []
+            for row in csv.DictReader(user_file):
+                user = User(row["Name"])
+                user.set_lmp_date(datetime.strptime(row["LMP Date"], "%m/%d/%Y"))
+                user.set_period_length(int(row["Period Length"]))
+                users.append(user)
+        objects_size = tracemalloc.get_traced_memory()[0]
+        del users
+        tracemalloc.stop()
+        tracemalloc.start()
+        table = UserTable(self.user_file)
+        self.assertEqual(len(table), 20000)
+        table_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.assertLess(table_size, objects_size / 2)
+
+if __name__ == '__main__':
+    unittest.main()